@@ -7,7 +7,14 @@ Loader mechanism for caching data, with data expiration, etc.
 
 # Import Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import contextlib
+import errno
+import fnmatch
+import hashlib
 import logging
+import multiprocessing.util
+import os
+import threading
 import time
 
 # Import Salt libs
@@ -17,9 +24,27 @@ from salt.payload import Serial
 from salt.utils.odict import OrderedDict
 import salt.loader
 import salt.syspaths
+import salt.utils.atomicfile
+import salt.utils.files
+import salt.utils.json
+import salt.utils.stringutils
+from salt.exceptions import SaltCacheError
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
 
 log = logging.getLogger(__name__)
 
+# The counters kept by MemCache for every storage
+STATS = ('hits', 'misses', 'evictions', 'expirations', 'stores',
+         'deferred_writes', 'flushed_writes', 'write_errors')
+
+# How often a process saves its MemCache counters, in seconds
+STATS_INTERVAL = 10
+
 
 def factory(opts, **kwargs):
     '''
@@ -27,7 +52,7 @@ def factory(opts, **kwargs):
     If memory caching is enabled by opts MemCache class will be instantiated.
     If not Cache class will be returned.
     '''
-    if opts.get('memcache_expire_seconds', 0):
+    if opts.get('memcache_expire_seconds', 0) or opts.get('memcache_banks'):
         cls = MemCache
     else:
         cls = Cache
@@ -268,40 +293,208 @@ class Cache(object):
         fun = '{0}.contains'.format(self.driver)
         return self.modules[fun](bank, key, **self._kwargs)
 
+    def fetch_many(self, banks, key):
+        '''
+        Fetch the same key from several banks. Drivers providing a
+        ``fetch_many`` function do it in a single round trip to the cache
+        backend, other drivers fetch the banks one by one.
+
+        .. versionadded:: Sodium
+
+        :param banks:
+            An iterable of bank names.
+
+        :param key:
+            The name of the key to fetch from every bank.
+
+        :return:
+            A dict mapping each bank to the object fetched from it, or an
+            empty dict if the key was not found in that bank.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing data
+            in the cache backend (auth, permissions, etc).
+        '''
+        banks = list(banks)
+        if not banks:
+            return {}
+        fun = '{0}.fetch_many'.format(self.driver)
+        if fun in self.modules:
+            return self.modules[fun](banks, key, **self._kwargs)
+        return dict((bank, self.fetch(bank, key)) for bank in banks)
+
+    def store_many(self, data, key):
+        '''
+        Store the same key in several banks. Drivers providing a
+        ``store_many`` function do it in as few round trips to the cache
+        backend as possible, other drivers store the banks one by one.
+
+        .. versionadded:: Sodium
+
+        :param data:
+            A dict mapping bank names to the data to store in them.
+
+        :param key:
+            The name of the key to store in every bank.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing data
+            in the cache backend (auth, permissions, etc).
+        '''
+        if not data:
+            return
+        fun = '{0}.store_many'.format(self.driver)
+        if fun in self.modules:
+            return self.modules[fun](data, key, **self._kwargs)
+        for bank, value in six.iteritems(data):
+            self.store(bank, key, value)
+
+    def list_with_values(self, bank, key):
+        '''
+        Lists the entries of a bank along with the value of a key found in
+        each of them, for instance the cached data of every minion with
+        ``list_with_values('minions', 'data')``.
+
+        .. versionadded:: Sodium
+
+        :param bank:
+            The name of the bank holding the entries.
+
+        :param key:
+            The name of the key to fetch from the sub-bank of every entry.
+
+        :return:
+            A dict mapping each entry of the bank to the object fetched from
+            its sub-bank, or an empty dict if the key was not found there.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing data
+            in the cache backend (auth, permissions, etc).
+        '''
+        fun = '{0}.list_with_values'.format(self.driver)
+        if fun in self.modules:
+            return self.modules[fun](bank, key, **self._kwargs)
+        entries = self.list(bank)
+        if not entries:
+            return {}
+        data = self.fetch_many(
+            ['{0}/{1}'.format(bank, entry) for entry in entries], key)
+        return dict(
+            (entry, data.get('{0}/{1}'.format(bank, entry), {}))
+            for entry in entries
+        )
+
+
+class _Policy(object):
+    '''
+    Expiration time and capacity of the memcache entries matching a pattern
+    '''
+    def __init__(self, pattern, expire, max_items=0, max_bytes=0, write_mode=None):
+        self.pattern = pattern
+        self.expire = expire
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.write_mode = write_mode
+
+
+class _Segment(object):
+    '''
+    The memcache entries of a policy in least recently used order
+    '''
+    def __init__(self):
+        # {(<bank>, <key>): [<stored at>, <size>], ...}
+        self.entries = OrderedDict()
+        self.bytes = 0
+
 
 class MemCache(Cache):
     '''
-    Short-lived in-memory cache store keeping values on time and/or size (count)
-    basis.
+    Short-lived in-memory cache store keeping values on time and/or size basis.
+
+    The values are kept per cache storage (driver + driver_opts) and grouped
+    by the ``memcache_banks`` policy matching their ``<bank>/<key>`` path.
+    Every policy has its own expiration time, item count and byte size limits
+    and its least recently used values are evicted first. Values matching no
+    policy use the ``memcache_expire_seconds``, ``memcache_max_items`` and
+    ``memcache_max_bytes`` options.
+
+    With ``memcache_write_mode: behind``, or the ``write_mode: behind`` of
+    their policy, stored values are written to the cache driver by a
+    background thread, in bulk, at most ``memcache_write_behind_interval``
+    seconds later. Until then the other processes using the cache driver
+    still read the previous values. The values not written yet are written
+    when the process exits.
     '''
     # {<storage_id>: odict({<key>: [atime, data], ...}), ...}
     data = {}
+    # {<storage_id>: {<policy pattern>: _Segment, ...}, ...}
+    segments = {}
+    # {<storage_id>: {<counter>: <value>, ...}, ...}
+    counters = {}
+    # Values not written to the cache driver yet in write-behind mode
+    # {<storage_id>: {(<bank>, <key>): data, ...}, ...}
+    pending = {}
+    # The last instance used per storage, the write-behind thread writes
+    # through them
+    # {<storage_id>: MemCache, ...}
+    writers = {}
+    # Serializes the access to the cache driver between the write-behind
+    # thread and the process
+    lock = threading.RLock()
+    flusher = None
+    finalizer = None
+    pid = None
+    stats_saved = 0
 
     def __init__(self, opts, **kwargs):
         super(MemCache, self).__init__(opts, **kwargs)
         self.expire = opts.get('memcache_expire_seconds', 10)
         self.max = opts.get('memcache_max_items', 1024)
+        self.max_bytes = opts.get('memcache_max_bytes', 0)
         self.cleanup = opts.get('memcache_full_cleanup', False)
         self.debug = opts.get('memcache_debug', False)
+        self.write_behind = opts.get('memcache_write_mode', 'through') == 'behind'
+        self.write_behind_interval = opts.get('memcache_write_behind_interval', 1)
+        self.save_stats = opts.get('memcache_stats', False)
+        self.default_policy = _Policy(None, self.expire, self.max, self.max_bytes)
+        self.policies = []
+        for pattern, policy in six.iteritems(opts.get('memcache_banks') or {}):
+            policy = policy or {}
+            self.policies.append(_Policy(
+                pattern,
+                policy.get('expire', self.expire),
+                policy.get('max_items', 0),
+                policy.get('max_bytes', 0),
+                policy.get('write_mode')))
+        # Most specific patterns first
+        self.policies.sort(key=lambda policy: len(policy.pattern), reverse=True)
         if self.debug:
             self.call = 0
             self.hit = 0
         self._storage = None
 
     @classmethod
-    def __cleanup(cls, expire):
-        now = time.time()
-        for storage in six.itervalues(cls.data):
-            for key, data in list(storage.items()):
-                if data[0] + expire < now:
-                    del storage[key]
-                else:
-                    break
+    def __check_pid(cls):
+        '''
+        Reset the lock, the write-behind thread and the values waiting to be
+        written inherited from the parent process after a fork. The parent
+        writes those values itself.
+        '''
+        if cls.pid != os.getpid():
+            cls.pid = os.getpid()
+            cls.lock = threading.RLock()
+            cls.flusher = None
+            cls.finalizer = None
+            cls.pending = {}
+            cls.writers = {}
+            for counters in six.itervalues(cls.counters):
+                for name in counters:
+                    counters[name] = 0
 
     def _get_storage_id(self):
-        fun = '{0}.storage_id'.format(self.driver)
+        fun = '{0}.get_storage_id'.format(self.driver)
         if fun in self.modules:
-            return self.modules[fun](self.kwargs)
+            return self.modules[fun](self._kwargs)
         else:
             return self.driver
 
@@ -311,47 +504,516 @@ class MemCache(Cache):
             storage_id = self._get_storage_id()
             if storage_id not in MemCache.data:
                 MemCache.data[storage_id] = OrderedDict()
+                MemCache.segments[storage_id] = {}
+                MemCache.counters[storage_id] = dict((name, 0) for name in STATS)
+            self._storage_id = storage_id
             self._storage = MemCache.data[storage_id]
         return self._storage
 
+    def _enter(self):
+        '''
+        Prepare the process wide state before an operation
+        '''
+        MemCache.__check_pid()
+        return self.storage
+
+    def _policy(self, bank, key):
+        '''
+        Return the policy of the ``<bank>/<key>`` path
+        '''
+        if self.policies:
+            path = '{0}/{1}'.format(bank, key)
+            for policy in self.policies:
+                if fnmatch.fnmatchcase(path, policy.pattern):
+                    return policy
+        return self.default_policy
+
+    def _segment(self, policy):
+        segments = MemCache.segments[self._storage_id]
+        if policy.pattern not in segments:
+            segments[policy.pattern] = _Segment()
+        return segments[policy.pattern]
+
+    def _count(self, name, value=1):
+        MemCache.counters[self._storage_id][name] += value
+
+    def _size(self, data):
+        try:
+            return len(self.serial.dumps(data))
+        except Exception:  # pylint: disable=broad-except
+            return 0
+
+    def _discard(self, bank, key, counter=None):
+        '''
+        Remove a value from memory, counting it as ``counter``
+        '''
+        if self.storage.pop((bank, key), None) is None:
+            return
+        segment = self._segment(self._policy(bank, key))
+        meta = segment.entries.pop((bank, key), None)
+        if meta is not None:
+            segment.bytes -= meta[1]
+        if counter is not None:
+            self._count(counter)
+
+    def _expire_segment(self, segment, policy, now):
+        for (bank, key), meta in list(segment.entries.items()):
+            if meta[0] + policy.expire < now:
+                self._discard(bank, key, 'expirations')
+
+    def _insert(self, bank, key, data, now):
+        '''
+        Keep a value in memory, evicting the least recently used values of
+        its policy if the policy is full
+        '''
+        self._discard(bank, key)
+        policy = self._policy(bank, key)
+        if not policy.expire:
+            return
+        size = self._size(data)
+        if policy.max_bytes and size > policy.max_bytes:
+            return
+        segment = self._segment(policy)
+
+        def full():
+            return ((policy.max_items and len(segment.entries) >= policy.max_items) or
+                    (policy.max_bytes and segment.bytes + size > policy.max_bytes))
+
+        if full() and self.cleanup:
+            self._expire_segment(segment, policy, now)
+        while segment.entries and full():
+            bank_, key_ = next(iter(segment.entries))
+            self._discard(bank_, key_, 'evictions')
+        self.storage[(bank, key)] = [now, data]
+        segment.entries[(bank, key)] = [now, size]
+        segment.bytes += size
+
+    def _lookup(self, bank, key, now):
+        '''
+        Return a ``(found, data)`` tuple for a value kept in memory
+        '''
+        pending = MemCache.pending.get(self._storage_id)
+        if pending and (bank, key) in pending:
+            return True, pending[(bank, key)]
+        record = self.storage.get((bank, key))
+        if record is None:
+            return False, None
+        policy = self._policy(bank, key)
+        segment = self._segment(policy)
+        meta = segment.entries.pop((bank, key))
+        if meta[0] + policy.expire < now:
+            segment.entries[(bank, key)] = meta
+            self._discard(bank, key, 'expirations')
+            return False, None
+        # update atime and move to the most recently used end
+        record[0] = now
+        segment.entries[(bank, key)] = meta
+        return True, record[1]
+
+    def _write(self, data, key):
+        '''
+        Write the same key of several banks to the cache driver
+        '''
+        fun = '{0}.store_many'.format(self.driver)
+        if fun in self.modules:
+            self.modules[fun](data, key, **self._kwargs)
+        else:
+            for bank, value in six.iteritems(data):
+                super(MemCache, self).store(bank, key, value)
+
+    def _deferred(self, bank, key):
+        '''
+        Return True if the value of ``<bank>/<key>`` is written behind
+        '''
+        write_mode = self._policy(bank, key).write_mode
+        if write_mode is None:
+            return self.write_behind
+        return write_mode == 'behind'
+
+    def _defer(self, bank, key, data):
+        '''
+        Queue a value to be written by the write-behind thread
+        '''
+        MemCache.pending.setdefault(self._storage_id, {})[(bank, key)] = data
+        MemCache.writers[self._storage_id] = self
+        self._count('deferred_writes')
+        if MemCache.flusher is None:
+            MemCache.flusher = threading.Thread(
+                target=MemCache._write_behind,
+                args=(self.write_behind_interval,),
+                name='MemCacheWriteBehind')
+            MemCache.flusher.daemon = True
+            MemCache.flusher.start()
+        if MemCache.finalizer is None:
+            # Run by multiprocessing when a salt process exits, including on
+            # SIGTERM, and at exit by the other processes
+            MemCache.finalizer = multiprocessing.util.Finalize(
+                None, MemCache.write_all_pending, exitpriority=10)
+
+    @classmethod
+    def _write_behind(cls, interval):
+        while True:
+            time.sleep(interval)
+            cls.write_all_pending()
+
+    @classmethod
+    def write_all_pending(cls):
+        '''
+        Write the values stored in write-behind mode of every storage to the
+        cache drivers
+        '''
+        with cls.lock:
+            for writer in list(cls.writers.values()):
+                writer.write_pending()
+
+    def write_pending(self):
+        '''
+        Write the values stored in write-behind mode to the cache driver
+        '''
+        with MemCache.lock:
+            self._enter()
+            pending = MemCache.pending.pop(self._storage_id, None)
+            if not pending:
+                return
+            by_key = {}
+            for (bank, key), data in six.iteritems(pending):
+                by_key.setdefault(key, {})[bank] = data
+            for key, data in six.iteritems(by_key):
+                try:
+                    self._write(data, key)
+                    self._count('flushed_writes', len(data))
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.error('Failed to write %d cached values of key %s: %s',
+                              len(data), key, exc)
+                    self._count('write_errors')
+                    # Retry them, unless they were stored again meanwhile
+                    retry = MemCache.pending.setdefault(self._storage_id, {})
+                    for bank, value in six.iteritems(data):
+                        retry.setdefault((bank, key), value)
+
+    def _save_stats(self, now):
+        '''
+        Save the counters of the process for the ``cache.memcache_stats``
+        runner
+        '''
+        if not self.save_stats or now - MemCache.stats_saved < STATS_INTERVAL:
+            return
+        MemCache.stats_saved = now
+        stats_dir = os.path.join(self.cachedir, 'memcache_stats')
+        try:
+            if not os.path.isdir(stats_dir):
+                os.makedirs(stats_dir)
+            with salt.utils.atomicfile.atomic_open(
+                    os.path.join(stats_dir, '{0}.p'.format(os.getpid())), 'wb') as fp_:
+                self.serial.dump(MemCache.stats(), fp_)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to save the memcache stats: %s', exc)
+
+    @classmethod
+    def stats(cls):
+        '''
+        Return the counters, item count and byte size of every storage kept
+        by the process
+        '''
+        ret = {}
+        for storage_id, counters in six.iteritems(cls.counters):
+            if isinstance(storage_id, tuple):
+                name = ':'.join(six.text_type(part) for part in storage_id)
+            else:
+                name = six.text_type(storage_id)
+            ret[name] = dict(counters)
+            ret[name]['items'] = len(cls.data.get(storage_id, {}))
+            ret[name]['bytes'] = sum(
+                segment.bytes for segment in six.itervalues(cls.segments.get(storage_id, {})))
+            ret[name]['pending'] = len(cls.pending.get(storage_id, {}))
+        return ret
+
     def fetch(self, bank, key):
-        if self.debug:
-            self.call += 1
-        now = time.time()
-        record = self.storage.pop((bank, key), None)
-        # Have a cached value for the key
-        if record is not None and record[0] + self.expire >= now:
+        self._enter()
+        with MemCache.lock:
             if self.debug:
-                self.hit += 1
-                log.debug(
-                    'MemCache stats (call/hit/rate): %s/%s/%s',
-                    self.call, self.hit, float(self.hit) / self.call
-                )
-            # update atime and return
-            record[0] = now
-            self.storage[(bank, key)] = record
-            return record[1]
-
-        # Have no value for the key or value is expired
-        data = super(MemCache, self).fetch(bank, key)
-        if len(self.storage) >= self.max:
-            if self.cleanup:
-                MemCache.__cleanup(self.expire)
-            if len(self.storage) >= self.max:
-                self.storage.popitem(last=False)
-        self.storage[(bank, key)] = [now, data]
-        return data
+                self.call += 1
+            now = time.time()
+            found, data = self._lookup(bank, key, now)
+            # Have a cached value for the key
+            if found:
+                self._count('hits')
+                if self.debug:
+                    self.hit += 1
+                    log.debug(
+                        'MemCache stats (call/hit/rate): %s/%s/%s',
+                        self.call, self.hit, float(self.hit) / self.call
+                    )
+                return data
+
+            # Have no value for the key or value is expired
+            self._count('misses')
+            data = super(MemCache, self).fetch(bank, key)
+            self._insert(bank, key, data, now)
+            self._save_stats(now)
+            return data
+
+    def fetch_many(self, banks, key):
+        self._enter()
+        with MemCache.lock:
+            now = time.time()
+            ret = {}
+            missing = []
+            for bank in banks:
+                found, data = self._lookup(bank, key, now)
+                if found:
+                    ret[bank] = data
+                else:
+                    missing.append(bank)
+            self._count('hits', len(ret))
+            if missing:
+                self._count('misses', len(missing))
+                fun = '{0}.fetch_many'.format(self.driver)
+                if fun in self.modules:
+                    fetched = self.modules[fun](missing, key, **self._kwargs)
+                else:
+                    fetched = dict(
+                        (bank, super(MemCache, self).fetch(bank, key))
+                        for bank in missing
+                    )
+                for bank, data in six.iteritems(fetched):
+                    self._insert(bank, key, data, now)
+                ret.update(fetched)
+            self._save_stats(now)
+            return ret
 
     def store(self, bank, key, data):
-        self.storage.pop((bank, key), None)
-        super(MemCache, self).store(bank, key, data)
-        if len(self.storage) >= self.max:
-            if self.cleanup:
-                MemCache.__cleanup(self.expire)
-            if len(self.storage) >= self.max:
-                self.storage.popitem(last=False)
-        self.storage[(bank, key)] = [time.time(), data]
+        self._enter()
+        with MemCache.lock:
+            now = time.time()
+            self._count('stores')
+            if self._deferred(bank, key):
+                self._insert(bank, key, data, now)
+                self._defer(bank, key, data)
+            else:
+                self._discard(bank, key)
+                super(MemCache, self).store(bank, key, data)
+                self._insert(bank, key, data, now)
+            self._save_stats(now)
+
+    def store_many(self, data, key):
+        self._enter()
+        with MemCache.lock:
+            now = time.time()
+            self._count('stores', len(data))
+            through = dict(
+                (bank, value) for bank, value in six.iteritems(data)
+                if not self._deferred(bank, key))
+            if through:
+                for bank in through:
+                    self._discard(bank, key)
+                self._write(through, key)
+            for bank, value in six.iteritems(data):
+                self._insert(bank, key, value, now)
+                if bank not in through:
+                    self._defer(bank, key, value)
+            self._save_stats(now)
 
     def flush(self, bank, key=None):
-        self.storage.pop((bank, key), None)
-        super(MemCache, self).flush(bank, key)
+        self._enter()
+        with MemCache.lock:
+            def flushed(bank_, key_):
+                if key is not None:
+                    return (bank_, key_) == (bank, key)
+                return bank_ == bank or bank_.startswith(bank + '/')
+
+            pending = MemCache.pending.get(self._storage_id) or {}
+            for bank_, key_ in list(pending):
+                if flushed(bank_, key_):
+                    del pending[(bank_, key_)]
+            for bank_, key_ in list(self.storage):
+                if flushed(bank_, key_):
+                    self._discard(bank_, key_)
+            return super(MemCache, self).flush(bank, key)
+
+    def list(self, bank):
+        self._enter()
+        with MemCache.lock:
+            self.write_pending()
+            return super(MemCache, self).list(bank)
+
+    def contains(self, bank, key=None):
+        self._enter()
+        with MemCache.lock:
+            self.write_pending()
+            return super(MemCache, self).contains(bank, key)
+
+    def list_with_values(self, bank, key):
+        self._enter()
+        with MemCache.lock:
+            self.write_pending()
+            return super(MemCache, self).list_with_values(bank, key)
+
+
+class CallCache(object):
+    '''
+    Cache the return of expensive calls in a bank of the salt cache, shared
+    by the processes using the same cache.
+
+    Identical calls made at once by several processes or threads only run
+    once: the first one holds a lock file in the ``cachedir`` while it runs,
+    the others wait for it and read its return from the cache. The lock file
+    is removed once the call is done, the callers still waiting on it read
+    the return it cached. Locking needs ``fcntl``, without it concurrent
+    calls all run.
+
+    The hits, misses and coalesced calls are counted per name, and the
+    counters saved in ``stats_dir`` every ten seconds, in a file per process.
+    '''
+    def __init__(self, opts, bank, stats_dir=None):
+        self.opts = opts
+        self.bank = bank
+        self.cache = factory(opts)
+        self.serial = Serial(opts)
+        cachedir = opts.get('cachedir', salt.syspaths.CACHE_DIR)
+        self.lock_dir = os.path.join(cachedir, 'locks', os.path.normpath(bank))
+        self.stats_dir = stats_dir
+        self.counters = {}
+        self.counters_lock = threading.Lock()
+        self.stats_saved = 0
+
+    @staticmethod
+    def digest(key):
+        '''
+        Return the cache key of the call described by key, any data
+        structure
+        '''
+        return hashlib.sha256(salt.utils.stringutils.to_bytes(
+            salt.utils.json.dumps(key, sort_keys=True, default=repr))).hexdigest()
+
+    def _count(self, name, counter):
+        with self.counters_lock:
+            counters = self.counters.setdefault(
+                name, {'hits': 0, 'misses': 0, 'coalesced': 0})
+            counters[counter] += 1
+        self._save_stats()
+
+    def _save_stats(self):
+        '''
+        Save the counters of the process in stats_dir
+        '''
+        now = time.time()
+        if self.stats_dir is None or now - self.stats_saved < STATS_INTERVAL:
+            return
+        self.stats_saved = now
+        try:
+            if not os.path.isdir(self.stats_dir):
+                os.makedirs(self.stats_dir)
+            with salt.utils.atomicfile.atomic_open(
+                    os.path.join(self.stats_dir, '{0}.p'.format(os.getpid())), 'wb') as fp_:
+                self.serial.dump(self.stats(), fp_)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to save the call cache stats: %s', exc)
+
+    def stats(self):
+        '''
+        Return the counters, by name
+        '''
+        with self.counters_lock:
+            return dict((name, dict(counters))
+                        for name, counters in six.iteritems(self.counters))
+
+    def _fetch(self, bank, key, expire):
+        '''
+        Return the data cached for key if it is younger than expire seconds,
+        or raise KeyError
+        '''
+        try:
+            entry = self.cache.fetch(bank, key)
+        except SaltCacheError as exc:
+            log.warning('Unable to read the call cache: %s', exc)
+            raise KeyError(key)
+        if not isinstance(entry, dict) or 'time' not in entry \
+                or time.time() - entry['time'] > expire:
+            raise KeyError(key)
+        return entry['data']
+
+    @contextlib.contextmanager
+    def _lock(self, key, timeout):
+        '''
+        Hold the lock of key, waiting at most timeout seconds for it. Yields
+        whether another caller held it.
+        '''
+        if not HAS_FCNTL:
+            yield False
+            return
+        try:
+            if not os.path.isdir(self.lock_dir):
+                os.makedirs(self.lock_dir)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                log.debug('Unable to create %s: %s', self.lock_dir, exc)
+                yield False
+                return
+        path = os.path.join(self.lock_dir, key)
+        with salt.utils.files.fopen(path, 'a') as fp_:
+            waited = False
+            deadline = time.time() + timeout
+            while True:
+                try:
+                    fcntl.flock(fp_.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except (IOError, OSError) as exc:
+                    if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                        raise
+                    waited = True
+                    if time.time() > deadline:
+                        log.warning('Timed out waiting for the call cache lock %s', key)
+                        yield waited
+                        return
+                    time.sleep(0.05)
+            try:
+                yield waited
+            finally:
+                self._remove_lock(path, fp_)
+                fcntl.flock(fp_.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _remove_lock(path, fp_):
+        '''
+        Remove the lock file held through fp_, unless it was already replaced
+        '''
+        try:
+            if os.stat(path).st_ino == os.fstat(fp_.fileno()).st_ino:
+                os.remove(path)
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                log.debug('Unable to remove the call cache lock %s: %s', path, exc)
+
+    def call(self, name, key, fun, expire, lock_timeout=30):
+        '''
+        Return the data cached for the call described by name and key if it
+        is younger than expire seconds, else call fun and cache its return.
+        The counters of name are updated.
+        '''
+        bank = '{0}/{1}'.format(self.bank, name)
+        digest = self.digest(key)
+        try:
+            data = self._fetch(bank, digest, expire)
+        except KeyError:
+            pass
+        else:
+            self._count(name, 'hits')
+            return data
+        with self._lock('{0}-{1}'.format(name, digest), lock_timeout) as waited:
+            if waited:
+                # Another caller may just have cached the data
+                try:
+                    data = self._fetch(bank, digest, expire)
+                except KeyError:
+                    pass
+                else:
+                    self._count(name, 'coalesced')
+                    return data
+            self._count(name, 'misses')
+            data = fun()
+            try:
+                self.cache.store(bank, digest, {'time': time.time(), 'data': data})
+            except SaltCacheError as exc:
+                log.warning('Unable to write the call cache: %s', exc)
+        return data
@@ -47,6 +47,7 @@ value to ``consul``:
 
 '''
 from __future__ import absolute_import, print_function, unicode_literals
+import base64
 import logging
 try:
     import consul
@@ -54,11 +55,17 @@ try:
 except ImportError:
     HAS_CONSUL = False
 
+import salt.utils.stringutils
 from salt.exceptions import SaltCacheError
+from salt.ext import six
+from salt.ext.six.moves import range
 
 log = logging.getLogger(__name__)
 api = None
 
+# Maximum number of operations in a Consul transaction
+_TXN_MAX_OPS = 64
+
 
 # Define the module's virtual name
 __virtualname__ = 'consul'
@@ -185,3 +192,99 @@ def contains(bank, key):
                 )
             )
         return value is not None
+
+
+def _get_values(bank, key):
+    '''
+    Read all the keys under a bank with a single recursive request. Returns a
+    dict mapping each sub-bank to the value of the key in it, or to None.
+    '''
+    try:
+        _, items = api.kv.get(bank + '/', recurse=True)
+    except Exception as exc:  # pylint: disable=broad-except
+        raise SaltCacheError(
+            'There was an error getting the key "{0}": {1}'.format(
+                bank, exc
+            )
+        )
+    ret = {}
+    for item in items or []:
+        parts = item['Key'][len(bank) + 1:].split('/')
+        entry = parts[0]
+        if not entry:
+            continue
+        if len(parts) == 2 and parts[1] == key and item['Value'] is not None:
+            ret[entry] = __context__['serial'].loads(item['Value'])
+        else:
+            ret.setdefault(entry, None)
+    return ret
+
+
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from several banks, reading up to ``_TXN_MAX_OPS``
+    keys per transaction when the python-consul client supports them.
+    '''
+    if not hasattr(api, 'txn') or len(banks) == 1:
+        return dict((bank, fetch(bank, key)) for bank in banks)
+    c_keys = dict(('{0}/{1}'.format(bank, key), bank) for bank in banks)
+    ordered = list(c_keys)
+    ret = dict((bank, {}) for bank in banks)
+    for idx in range(0, len(ordered), _TXN_MAX_OPS):
+        # Unlike get, get-tree does not fail the whole transaction when the
+        # key does not exist
+        ops = [{'KV': {'Verb': 'get-tree', 'Key': c_key}}
+               for c_key in ordered[idx:idx + _TXN_MAX_OPS]]
+        try:
+            result = api.txn.put(ops)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise SaltCacheError(
+                'There was an error reading the key {0} in {1} banks: {2}'.format(
+                    key, len(banks), exc
+                )
+            )
+        for item in (result or {}).get('Results') or []:
+            kv_ = item.get('KV') or {}
+            bank = c_keys.get(kv_.get('Key'))
+            if bank is not None and kv_.get('Value') is not None:
+                ret[bank] = __context__['serial'].loads(
+                    base64.b64decode(kv_['Value']))
+    return ret
+
+
+def store_many(data, key):
+    '''
+    Store the same key in several banks, using transactions of up to
+    ``_TXN_MAX_OPS`` keys when the python-consul client supports them.
+    '''
+    if not hasattr(api, 'txn'):
+        for bank, value in six.iteritems(data):
+            store(bank, key, value)
+        return
+    ops = []
+    for bank, value in six.iteritems(data):
+        c_data = __context__['serial'].dumps(value)
+        ops.append({'KV': {'Verb': 'set',
+                           'Key': '{0}/{1}'.format(bank, key),
+                           'Value': salt.utils.stringutils.to_unicode(
+                               base64.b64encode(c_data))}})
+    for idx in range(0, len(ops), _TXN_MAX_OPS):
+        try:
+            api.txn.put(ops[idx:idx + _TXN_MAX_OPS])
+        except Exception as exc:  # pylint: disable=broad-except
+            raise SaltCacheError(
+                'There was an error writing the key {0} in {1} banks: {2}'.format(
+                    key, len(data), exc
+                )
+            )
+
+
+def list_with_values(bank, key):
+    '''
+    Lists the sub-banks of a bank along with the value of a key in each of
+    them, with a single recursive request.
+    '''
+    return dict(
+        (entry, {} if value is None else value)
+        for entry, value in six.iteritems(_get_values(bank, key))
+    )
@@ -51,6 +51,7 @@ value to ``etcd``:
 from __future__ import absolute_import, print_function, unicode_literals
 import logging
 import base64
+from multiprocessing.pool import ThreadPool
 try:
     import etcd
     HAS_ETCD = True
@@ -58,9 +59,13 @@ except ImportError:
     HAS_ETCD = False
 
 from salt.exceptions import SaltCacheError
+from salt.ext import six
 
 _DEFAULT_PATH_PREFIX = "/salt_cache"
 
+# Number of keys fetch_many reads at the same time
+_FETCH_MANY_THREADS = 8
+
 if HAS_ETCD:
     # The client logging tries to decode('ascii') binary data
     # and is too verbose
@@ -225,3 +230,62 @@ def contains(bank, key):
                 etcd_key, exc
             )
         )
+
+
+def _read_values(bank, key):
+    '''
+    Read the sub-banks of a bank recursively in a single request. Returns a
+    dict mapping each sub-bank to the value of the key in it, or to None.
+    '''
+    path = '{0}/{1}'.format(path_prefix, bank)
+    try:
+        r = client.read(path, recursive=True)
+    except etcd.EtcdKeyNotFound:
+        return {}
+    except Exception as exc:  # pylint: disable=broad-except
+        raise SaltCacheError(
+            'There was an error getting the key "{0}": {1}'.format(
+                bank, exc
+            )
+        )
+    ret = {}
+    for leaf in r.leaves:
+        if leaf.key is None or not leaf.key.startswith(path + '/'):
+            continue
+        parts = leaf.key[len(path) + 1:].split('/')
+        entry = parts[0]
+        if len(parts) == 2 and parts[1] == key and not leaf.dir:
+            ret[entry] = __context__['serial'].loads(base64.b64decode(leaf.value))
+        else:
+            ret.setdefault(entry, None)
+    return ret
+
+
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from several banks. etcd v2 cannot read several keys
+    in one request, so the keys are read concurrently by up to
+    ``_FETCH_MANY_THREADS`` threads.
+    '''
+    _init_client()
+    if len(banks) == 1:
+        return {banks[0]: fetch(banks[0], key)}
+    pool = ThreadPool(min(len(banks), _FETCH_MANY_THREADS))
+    try:
+        values = pool.map(lambda bank: fetch(bank, key), banks)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(banks, values))
+
+
+def list_with_values(bank, key):
+    '''
+    Lists the sub-banks of a bank along with the value of a key in each of
+    them, with a single recursive request.
+    '''
+    _init_client()
+    return dict(
+        (entry, {} if value is None else value)
+        for entry, value in six.iteritems(_read_values(bank, key))
+    )
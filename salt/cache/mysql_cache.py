@@ -66,6 +66,7 @@ except ImportError:
         MySQLdb = None
 
 from salt.exceptions import SaltCacheError
+from salt.ext import six
 
 _DEFAULT_DATABASE_NAME = "salt_cache"
 _DEFAULT_CACHE_TABLE_NAME = "cache"
@@ -89,16 +90,16 @@ def __virtual__():
     return bool(MySQLdb), 'No python mysql client installed.' if MySQLdb is None else ''
 
 
-def run_query(conn, query, retries=3):
+def run_query(conn, query, retries=3, args=None):
     '''
     Get a cursor and run a query. Reconnect up to `retries` times if
-    needed.
+    needed. `args` are the parameters of a parametrized query.
     Returns: cursor, affected rows counter
     Raises: SaltCacheError, AttributeError, OperationalError
     '''
     try:
         cur = conn.cursor()
-        out = cur.execute(query)
+        out = cur.execute(query, args)
         return cur, out
     except (AttributeError, OperationalError) as e:
         if retries == 0:
@@ -111,7 +112,7 @@ def run_query(conn, query, retries=3):
             log.info("mysql_cache: recreating db connection due to: %r", e)
         global client
         client = MySQLdb.connect(**_mysql_kwargs)
-        return run_query(client, query, retries - 1)
+        return run_query(client, query, retries - 1, args)
     except Exception as e:  # pylint: disable=broad-except
         if len(query) > 150:
             query = query[:150] + "<...>"
@@ -249,3 +250,60 @@ def contains(bank, key):
     r = cur.fetchone()
     cur.close()
     return r[0] == 1
+
+
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from several banks with a single query.
+    '''
+    _init_client()
+    query = "SELECT bank, data FROM {0} WHERE etcd_key=%s AND bank IN ({1})".format(
+        _table_name, ', '.join(['%s'] * len(banks)))
+    cur, _ = run_query(client, query, args=[key] + list(banks))
+    ret = dict((bank, {}) for bank in banks)
+    for bank, data in cur.fetchall():
+        ret[bank] = __context__['serial'].loads(data)
+    cur.close()
+    return ret
+
+
+def store_many(data, key):
+    '''
+    Store the same key in several banks with a single query.
+    '''
+    _init_client()
+    query = "REPLACE INTO {0} (bank, etcd_key, data) VALUES {1}".format(
+        _table_name, ', '.join(['(%s, %s, %s)'] * len(data)))
+    args = []
+    for bank, value in six.iteritems(data):
+        args.extend((bank, key, __context__['serial'].dumps(value)))
+    cur, cnt = run_query(client, query, args=args)
+    cur.close()
+    if cnt < len(data):
+        raise SaltCacheError(
+            'Error storing {0} in {1} banks returned {2}'.format(key, len(data), cnt)
+        )
+
+
+def list_with_values(bank, key):
+    '''
+    Lists the sub-banks of a bank along with the value of a key in each of
+    them, with a single query.
+    '''
+    _init_client()
+    prefix = '{0}/'.format(bank)
+    like = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    query = "SELECT bank, IF(etcd_key=%s, data, NULL) FROM {0} " \
+        "WHERE bank LIKE %s".format(_table_name)
+    cur, _ = run_query(client, query, args=[key, like + '%'])
+    ret = {}
+    for sub_bank, data in cur.fetchall():
+        entry = sub_bank[len(prefix):]
+        if not entry or '/' in entry:
+            continue
+        if data is not None:
+            ret[entry] = __context__['serial'].loads(data)
+        else:
+            ret.setdefault(entry, {})
+    cur.close()
+    return ret
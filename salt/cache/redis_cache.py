@@ -157,6 +157,8 @@ except ImportError:
     HAS_REDIS_CLUSTER = False
 
 # Import salt
+import salt.utils.stringutils
+from salt.ext import six
 from salt.ext.six.moves import range
 from salt.exceptions import SaltCacheError
 
@@ -502,3 +504,69 @@ def contains(bank, key):
                                                                            rerr=rerr)
         log.error(mesg)
         raise SaltCacheError(mesg)
+
+
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from several banks, using a single pipeline.
+    '''
+    redis_server = _get_redis_server()
+    redis_pipe = redis_server.pipeline()
+    redis_keys = [_get_key_redis_key(bank, key) for bank in banks]
+    for redis_key in redis_keys:
+        redis_pipe.get(redis_key)
+    try:
+        redis_values = redis_pipe.execute()
+    except (RedisConnectionError, RedisResponseError) as rerr:
+        mesg = 'Cannot fetch the Redis cache key {rkey} from {count} banks: {rerr}'.format(
+            rkey=key,
+            count=len(redis_keys),
+            rerr=rerr
+        )
+        log.error(mesg)
+        raise SaltCacheError(mesg)
+    ret = {}
+    for bank, redis_value in zip(banks, redis_values):
+        if redis_value is None:
+            ret[bank] = {}
+        else:
+            ret[bank] = __context__['serial'].loads(redis_value)
+    return ret
+
+
+def store_many(data, key):
+    '''
+    Store the same key in several banks, using a single pipeline.
+    '''
+    redis_server = _get_redis_server()
+    redis_pipe = redis_server.pipeline()
+    try:
+        for bank, value in six.iteritems(data):
+            _build_bank_hier(bank, redis_pipe)
+            redis_pipe.set(_get_key_redis_key(bank, key),
+                           __context__['serial'].dumps(value))
+            redis_pipe.sadd(_get_bank_keys_redis_key(bank), key)
+        log.debug('Setting the value for %s under %d banks', key, len(data))
+        redis_pipe.execute()
+    except (RedisConnectionError, RedisResponseError) as rerr:
+        mesg = 'Cannot set the Redis cache key {rkey} in {count} banks: {rerr}'.format(
+            rkey=key,
+            count=len(data),
+            rerr=rerr
+        )
+        log.error(mesg)
+        raise SaltCacheError(mesg)
+
+
+def list_with_values(bank, key):
+    '''
+    Lists the sub-banks of a bank along with the value of a key in each of
+    them. This takes two requests, whatever the number of sub-banks.
+    '''
+    entries = [salt.utils.stringutils.to_unicode(entry) for entry in list_(bank)]
+    if not entries:
+        return {}
+    data = fetch_many(['{0}/{1}'.format(bank, entry) for entry in entries], key)
+    return dict(
+        (entry, data['{0}/{1}'.format(bank, entry)]) for entry in entries
+    )
@@ -5,16 +5,24 @@ Execute batch runs
 
 # Import python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import bisect
+import collections
+import heapq
 import math
 import time
 import copy
 from datetime import datetime, timedelta
 
 # Import salt libs
+import salt.utils.event
+import salt.utils.jid
 import salt.utils.stringutils
 import salt.client
 import salt.output
 import salt.exceptions
+import salt.ext.tornado.concurrent
+import salt.ext.tornado.gen
+import salt.ext.tornado.ioloop
 
 # Import 3rd-party libs
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
@@ -26,6 +34,236 @@ import logging
 log = logging.getLogger(__name__)
 
 
+def _batch_size(batch, count):
+    '''
+    Return the number of minions to run at a time for a batch of ``count``
+    minions, raising ValueError when the batch is invalid
+    '''
+    if isinstance(batch, six.string_types) and '%' in batch:
+        res = float(batch.strip('%')) / 100.0 * count
+        if res < 1:
+            return int(math.ceil(res))
+        return int(res)
+    return int(batch)
+
+
+class BatchEngine(object):
+    '''
+    Schedule the minions of a batch run as their returns come in
+
+    The engine does no I/O. A driver publishes the ``test.ping`` of the
+    target and the jobs and ``saltutil.find_job`` calls the engine hands out
+    under the jids it registers with it, feeds it every ``salt/job/`` event
+    and calls :py:meth:`schedule` after each one and once the
+    :py:meth:`deadline` passed. A minion is handed out as soon as it answered
+    the ping and a slot is free, instead of once the ping and the whole
+    previous sub-batch are done.
+
+    A minion which did not return within the timeout and did not send a job
+    heartbeat lately is asked whether it still runs the job, and counts as
+    timed out if it does not say so within the ``gather_job_timeout``.
+
+    With ``batch_adaptive`` the number of slots starts at one and grows by
+    one with every return which succeeded within twice the median time of
+    the successful returns so far, up to the batch size. A slower return
+    takes one slot away and a failure or timeout halves the slots while more
+    than one in twenty of the returns so far failed.
+    '''
+    def __init__(self, opts):
+        self.batch = opts['batch']
+        self.timeout = opts['timeout']
+        self.gather_job_timeout = opts['gather_job_timeout']
+        self.batch_wait = opts.get('batch_wait', 0)
+        self.adaptive = opts.get('batch_adaptive', False)
+        self.bnum = None
+        self.size = None
+        self.ping_jid = None
+        self.ping_until = None
+        self.ping_done = False
+        # minions targeted by the ping and those which answered it
+        self.expected = set()
+        self.pinged = set()
+        # minions which answered the ping, in the order they are run
+        self.ready = collections.deque()
+        self.queued = set()
+        # minion -> the jid, deadline and start time of the job it runs
+        self.running = {}
+        self.done = set()
+        self.failed = set()
+        # the jids of the jobs and of the find_job calls
+        self.jobs = set()
+        self.checks = set()
+        # the times the slots freed up within the batch_wait become usable
+        self.wait = collections.deque()
+        self._deadlines = []
+        self._latencies = []
+
+    def ping(self, jid):
+        '''
+        Register the jid of the ping of the target
+        '''
+        self.ping_jid = jid
+
+    def targeted(self, minions, now):
+        '''
+        Set the minions targeted by the ping and size the batch after them
+        '''
+        self.expected.update(minions)
+        self.ping_until = now + self.timeout
+        self.bnum = max(1, _batch_size(self.batch, len(self.expected)))
+        self.size = 1 if self.adaptive else self.bnum
+
+    def started(self, jid, minions):
+        '''
+        Register the jid of the job published to minions handed out by
+        :py:meth:`schedule`
+        '''
+        self.jobs.add(jid)
+        for minion in minions:
+            self.running[minion]['jid'] = jid
+
+    def checking(self, jid):
+        '''
+        Register the jid of a find_job call handed out by :py:meth:`schedule`
+        '''
+        self.checks.add(jid)
+
+    @property
+    def finished(self):
+        '''
+        Whether every minion which answered the ping returned or timed out
+        '''
+        return self.ping_done and not self.ready and not self.running
+
+    def handle_event(self, tag, data, now):
+        '''
+        Process an event of the job bus, return the minion when it is the
+        return of a job run by the batch
+        '''
+        parts = tag.split('/', 4)
+        if len(parts) < 5 or parts[0] != 'salt' or parts[1] != 'job':
+            return None
+        jid, kind = parts[2], parts[3]
+        minion = data.get('id', parts[4])
+        job = self.running.get(minion)
+        if kind == 'heartbeat':
+            if job is not None and job['jid'] == jid:
+                self._alive(minion, now + 2 * data.get('heartbeat', 0))
+        elif kind != 'ret':
+            pass
+        elif jid == self.ping_jid:
+            self.pinged.add(minion)
+            if minion not in self.queued:
+                self.expected.add(minion)
+                self.queued.add(minion)
+                self.ready.append(minion)
+        elif jid in self.checks:
+            # find_job returns the job data while the minion runs the job
+            if job is not None and isinstance(data.get('return'), dict) \
+                    and data['return']:
+                self._alive(minion, now + self.timeout)
+        elif job is not None and job['jid'] == jid and 'return' in data:
+            self.finish(
+                minion,
+                now,
+                data.get('success') is False or bool(data.get('retcode')))
+            return minion
+        return None
+
+    def schedule(self, now):
+        '''
+        Hand out the work which is due
+
+        Returns the list of minions to publish the job to, a dict of the jids
+        of jobs to the minions to ask whether they still run them, the list of
+        minions which timed out and the list of targeted minions which did not
+        answer the ping.
+        '''
+        down = []
+        if not self.ping_done and (self.expected <= self.pinged or now >= self.ping_until):
+            self.ping_done = True
+            down = sorted(self.expected - self.pinged)
+        check = {}
+        timed_out = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, minion = heapq.heappop(self._deadlines)
+            job = self.running.get(minion)
+            if job is None or job['deadline'] != deadline:
+                continue
+            if job['checking']:
+                self.finish(minion, now, True)
+                timed_out.append(minion)
+            else:
+                job['checking'] = True
+                self._set_deadline(minion, now + self.gather_job_timeout)
+                check.setdefault(job['jid'], []).append(minion)
+        while self.wait and self.wait[0] <= now:
+            self.wait.popleft()
+        run = []
+        while self.ready and len(self.running) + len(self.wait) < self.size:
+            minion = self.ready.popleft()
+            self.running[minion] = {'jid': None, 'start': now, 'checking': False}
+            self._set_deadline(minion, now + self.timeout)
+            run.append(minion)
+        return run, check, timed_out, down
+
+    def deadline(self):
+        '''
+        Return the time at which :py:meth:`schedule` has work to do even
+        without an event coming in, None when only events can bring some
+        '''
+        while self._deadlines:
+            deadline, minion = self._deadlines[0]
+            job = self.running.get(minion)
+            if job is not None and job['deadline'] == deadline:
+                break
+            heapq.heappop(self._deadlines)
+        times = []
+        if self._deadlines:
+            times.append(self._deadlines[0][0])
+        if self.wait and self.ready:
+            times.append(self.wait[0])
+        if not self.ping_done:
+            times.append(self.ping_until)
+        return min(times) if times else None
+
+    def finish(self, minion, now, failed=False):
+        '''
+        Free the slot of a minion which returned, timed out, or the job could
+        not be published to
+        '''
+        job = self.running.pop(minion)
+        self.done.add(minion)
+        if failed:
+            self.failed.add(minion)
+        if self.batch_wait:
+            self.wait.append(now + self.batch_wait)
+        if not self.adaptive:
+            return
+        latency = now - job['start']
+        if failed:
+            if len(self.failed) * 20 > len(self.done):
+                self.size = max(1, self.size // 2)
+            return
+        if self._latencies and latency > 2 * self._latencies[len(self._latencies) // 2]:
+            self.size = max(1, self.size - 1)
+        else:
+            self.size = min(self.bnum, self.size + 1)
+        bisect.insort(self._latencies, latency)
+
+    def _alive(self, minion, until):
+        job = self.running[minion]
+        if job['checking']:
+            job['checking'] = False
+            self._set_deadline(minion, until)
+        elif until > job['deadline']:
+            self._set_deadline(minion, until)
+
+    def _set_deadline(self, minion, deadline):
+        self.running[minion]['deadline'] = deadline
+        heapq.heappush(self._deadlines, (deadline, minion))
+
+
 class Batch(object):
     '''
     Manage the execution of batch runs
@@ -36,7 +274,11 @@ class Batch(object):
         self.pub_kwargs = eauth if eauth else {}
         self.quiet = quiet
         self.local = salt.client.get_local_client(opts['conf_file'])
-        self.minions, self.ping_gen, self.down_minions = self.__gather_minions()
+        if opts.get('batch_engine'):
+            # The batch engine pings the minions as part of the run
+            self.minions, self.ping_gen, self.down_minions = [], None, set()
+        else:
+            self.minions, self.ping_gen, self.down_minions = self.__gather_minions()
         self.options = parser
 
     def __gather_minions(self):
@@ -83,20 +325,15 @@ class Batch(object):
         '''
         Return the active number of minions to maintain
         '''
-        partition = lambda x: float(x) / 100.0 * len(self.minions)
         try:
-            if isinstance(self.opts['batch'], six.string_types) and '%' in self.opts['batch']:
-                res = partition(float(self.opts['batch'].strip('%')))
-                if res < 1:
-                    return int(math.ceil(res))
-                else:
-                    return int(res)
-            else:
-                return int(self.opts['batch'])
+            return _batch_size(self.opts['batch'], len(self.minions))
         except ValueError:
-            if not self.quiet:
-                salt.utils.stringutils.print_cli('Invalid batch data sent: {0}\nData must be in the '
-                          'form of %10, 10% or 3'.format(self.opts['batch']))
+            self.__invalid_batch()
+
+    def __invalid_batch(self):
+        if not self.quiet:
+            salt.utils.stringutils.print_cli('Invalid batch data sent: {0}\nData must be in the '
+                      'form of %10, 10% or 3'.format(self.opts['batch']))
 
     def __update_wait(self, wait):
         now = datetime.now()
@@ -110,6 +347,10 @@ class Batch(object):
         '''
         Execute the batch run
         '''
+        if self.opts.get('batch_engine'):
+            for ret in self.__run_engine():
+                yield ret
+            return
         args = [[],
                 self.opts['fun'],
                 self.opts['arg'],
@@ -293,3 +534,247 @@ class Batch(object):
                             active.remove(minion)
                             if bwait:
                                 wait.append(datetime.now() + timedelta(seconds=bwait))
+
+    def __run_engine(self):
+        '''
+        Execute the batch run with the batch engine, over one subscription to
+        the events of the jobs
+        '''
+        engine = BatchEngine(self.opts)
+        event = self.local.event
+        was_listening = event.cpub
+        if not event.connect_pub(timeout=self.opts['timeout']):
+            raise salt.exceptions.SaltClientError(
+                'Unable to connect to the event bus of the salt master')
+        try:
+            jid = salt.utils.jid.gen_jid(self.opts)
+            engine.ping(jid)
+            # The returns are read from the subscription to salt/job/ above,
+            # the jobs must not add their own pending tags to the event
+            ping = self.local.run_job(
+                self.opts['tgt'],
+                'test.ping',
+                [],
+                self.opts.get('selected_target_option') or self.opts.get('tgt_type', 'glob'),
+                timeout=self.opts['timeout'],
+                jid=jid,
+                listen=False,
+                **self.eauth)
+            if not ping:
+                return
+            try:
+                engine.targeted(ping['minions'], time.time())
+            except ValueError:
+                self.__invalid_batch()
+                return
+            show_jid = self.options and self.options.show_jid
+            returns = []
+            while True:
+                now = time.time()
+                run, check, timed_out, down = engine.schedule(now)
+                if not self.quiet:
+                    for minion in down:
+                        salt.utils.stringutils.print_cli('Minion {0} did not respond. No job will be sent.'.format(minion))
+                for job_jid, minions in six.iteritems(check):
+                    jid = salt.utils.jid.gen_jid(self.opts)
+                    engine.checking(jid)
+                    self.local.run_job(minions,
+                                       'saltutil.find_job',
+                                       [job_jid],
+                                       'list',
+                                       timeout=self.opts['gather_job_timeout'],
+                                       jid=jid,
+                                       listen=False,
+                                       **self.eauth)
+                returns.extend((minion, {'ret': {}}) for minion in timed_out)
+                if run:
+                    if not self.quiet:
+                        salt.utils.stringutils.print_cli('\nExecuting run on {0}\n'.format(sorted(run)))
+                    jid = salt.utils.jid.gen_jid(self.opts)
+                    engine.started(jid, run)
+                    pub = self.local.run_job(run,
+                                             self.opts['fun'],
+                                             self.opts['arg'],
+                                             'list',
+                                             ret=self.opts.get('return', ''),
+                                             timeout=self.opts['timeout'],
+                                             jid=jid,
+                                             listen=False,
+                                             **self.eauth)
+                    if not pub:
+                        for minion in run:
+                            engine.finish(minion, now, True)
+                            returns.append((minion, {'ret': {}}))
+                    elif show_jid:
+                        salt.utils.stringutils.print_cli('jid: {0}'.format(jid))
+                for minion, data in returns:
+                    ret, failhard = self.__engine_return(minion, data)
+                    yield ret
+                    if failhard:
+                        log.error(
+                            'Minion %s returned with non-zero exit code. '
+                            'Batch run stopped due to failhard', minion
+                        )
+                        return
+                returns = []
+                if engine.finished:
+                    break
+                deadline = engine.deadline()
+                wait = self.opts['timeout'] if deadline is None else deadline - time.time()
+                raw = event.get_event(wait=max(wait, 0.01),
+                                      tag='salt/job/',
+                                      full=True,
+                                      match_type='startswith')
+                if raw is None:
+                    continue
+                minion = engine.handle_event(raw['tag'], raw['data'], time.time())
+                if minion is None:
+                    continue
+                if self.opts.get('raw'):
+                    returns.append((minion, raw))
+                    continue
+                data = {'ret': raw['data']['return']}
+                for key in ('out', 'retcode', 'jid'):
+                    if key in raw['data']:
+                        data[key] = raw['data'][key]
+                returns.append((minion, data))
+        finally:
+            if not was_listening:
+                event.close_pub()
+
+    def __engine_return(self, minion, data):
+        '''
+        Display the return of a minion with the batch engine, return what run
+        yields for it and whether it stops the run for failhard
+        '''
+        retcode = data.get('retcode', 0)
+        if 'retcode' in data and isinstance(data['ret'], dict) and 'retcode' not in data['ret']:
+            data['ret']['retcode'] = retcode
+        failhard = bool(self.opts.get('failhard')) and retcode > 0
+        if self.opts.get('raw'):
+            return data, failhard
+        ret = {minion: data['ret']}
+        if not self.quiet:
+            data[minion] = data.pop('ret')
+            out = data.pop('out', None)
+            salt.output.display_output(data, out, self.opts)
+        return ret, failhard
+
+
+class BatchAsync(object):
+    '''
+    Run a batch with the batch engine on a tornado IOLoop, as the netapi does
+
+    :py:meth:`run` resolves to a dict of the minions to their returns, an
+    empty dict for the minions which timed out.
+    '''
+    def __init__(self, opts, eauth=None, io_loop=None):
+        self.opts = opts
+        self.eauth = eauth if eauth else {}
+        self.io_loop = io_loop or salt.ext.tornado.ioloop.IOLoop.current()
+        self.local = salt.client.get_local_client(mopts=opts)
+        self.engine = BatchEngine(opts)
+        self.event = None
+        self.ret = {}
+        self._done = salt.ext.tornado.concurrent.Future()
+        self._timer = None
+
+    @salt.ext.tornado.gen.coroutine
+    def run(self):
+        '''
+        Execute the batch run
+        '''
+        self.event = salt.utils.event.get_master_event(
+            self.opts, self.opts['sock_dir'], listen=True, io_loop=self.io_loop)
+        self.event.connect_pub()
+        # Connect before publishing, the handler would only connect later
+        yield self.event.subscriber.connect(timeout=self.opts['timeout'])
+        self.event.set_event_handler(self._handle_event)
+        try:
+            jid = salt.utils.jid.gen_jid(self.opts)
+            self.engine.ping(jid)
+            ping = yield self.local.run_job_async(
+                self.opts['tgt'],
+                'test.ping',
+                [],
+                self.opts.get('tgt_type', 'glob'),
+                timeout=self.opts['timeout'],
+                jid=jid,
+                listen=False,
+                io_loop=self.io_loop,
+                **self.eauth)
+            if not ping:
+                raise salt.ext.tornado.gen.Return({})
+            self.engine.targeted(ping['minions'], time.time())
+            self._schedule()
+            ret = yield self._done
+        finally:
+            if self._timer is not None:
+                self.io_loop.remove_timeout(self._timer)
+            self.event.destroy()
+        raise salt.ext.tornado.gen.Return(ret)
+
+    def _handle_event(self, raw):
+        mtag, data = salt.utils.event.SaltEvent.unpack(raw, self.event.serial)
+        minion = self.engine.handle_event(mtag, data, time.time())
+        if minion is not None:
+            self.ret[minion] = data['return']
+        if self.engine.bnum is not None:
+            self._schedule()
+
+    def _schedule(self):
+        if self._done.done():
+            return
+        run, check, timed_out, down = self.engine.schedule(time.time())
+        for minion in down:
+            log.debug('Minion %s did not respond. No job will be sent.', minion)
+        for minion in timed_out:
+            self.ret[minion] = {}
+        for job_jid, minions in six.iteritems(check):
+            jid = salt.utils.jid.gen_jid(self.opts)
+            self.engine.checking(jid)
+            self.io_loop.spawn_callback(
+                self._publish, minions, 'saltutil.find_job', [job_jid], jid,
+                self.opts['gather_job_timeout'])
+        if run:
+            jid = salt.utils.jid.gen_jid(self.opts)
+            self.engine.started(jid, run)
+            self.io_loop.spawn_callback(
+                self._publish, run, self.opts['fun'], self.opts['arg'], jid,
+                self.opts['timeout'])
+        if self._timer is not None:
+            self.io_loop.remove_timeout(self._timer)
+            self._timer = None
+        if self.engine.finished:
+            self._done.set_result(self.ret)
+            return
+        deadline = self.engine.deadline()
+        if deadline is not None:
+            self._timer = self.io_loop.call_later(
+                max(deadline - time.time(), 0), self._schedule)
+
+    @salt.ext.tornado.gen.coroutine
+    def _publish(self, minions, fun, arg, jid, timeout):
+        try:
+            pub = yield self.local.run_job_async(
+                minions,
+                fun,
+                arg,
+                'list',
+                ret=self.opts.get('return', ''),
+                timeout=timeout,
+                jid=jid,
+                listen=False,
+                io_loop=self.io_loop,
+                **self.eauth)
+        except salt.exceptions.SaltException as exc:
+            log.error('Failed to publish %s to %s: %s', fun, minions, exc)
+            pub = {}
+        if pub or fun == 'saltutil.find_job':
+            return
+        now = time.time()
+        for minion in minions:
+            if minion in self.engine.running:
+                self.engine.finish(minion, now, True)
+                self.ret[minion] = {}
+        self._schedule()
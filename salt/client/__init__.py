@@ -287,11 +287,47 @@ class LocalClient(object):
         if not listen:
             return pub_data
 
+        self._subscribe_job(pub_data['jid'])
+
+        return pub_data
+
+    def _subscribe_job(self, jid):
+        '''
+        Subscribe to the returns of a job, unless already subscribed to before
+        publishing it
+        '''
+        tag = 'salt/job/{0}'.format(jid)
+        if any(ptag == tag for ptag, _ in self.event.pending_tags):
+            return
         if self.opts.get('order_masters'):
-            self.event.subscribe('syndic/.*/{0}'.format(pub_data['jid']), 'regex')
+            self.event.subscribe('syndic/.*/{0}'.format(jid), 'regex')
+        self.event.subscribe(tag)
 
-        self.event.subscribe('salt/job/{0}'.format(pub_data['jid']))
+    def _subscribe_pub_jid(self, jid, listen):
+        '''
+        With ``event_subscription_filter`` set, the event publisher only sends
+        the events of the subscribed tags, so the returns of a job are
+        subscribed to before publishing it, with a jid generated here when
+        none is passed. The returns sent before the reply of the master are
+        not dropped this way. Returns the jid subscribed to, or None.
+        '''
+        if not listen or not self.opts.get('event_subscription_filter'):
+            return None
+        if not jid:
+            jid = salt.utils.jid.gen_jid(self.opts)
+        self._subscribe_job(jid)
+        return jid
 
+    def _check_pub_jid(self, sub_jid, pub_data):
+        '''
+        Drop the subscription made before publishing when the job was not
+        published with its jid
+        '''
+        if sub_jid is None:
+            return pub_data
+        jid = pub_data.get('jid') if isinstance(pub_data, dict) else None
+        if jid != sub_jid:
+            self._clean_up_subscriptions(sub_jid)
         return pub_data
 
     def run_job(
@@ -322,6 +358,8 @@ class LocalClient(object):
         '''
         arg = salt.utils.args.condition_input(arg, kwarg)
 
+        sub_jid = self._subscribe_pub_jid(jid, listen)
+        pub_data = None
         try:
             pub_data = self.pub(
                 tgt,
@@ -329,7 +367,7 @@ class LocalClient(object):
                 arg,
                 tgt_type,
                 ret,
-                jid=jid,
+                jid=sub_jid or jid,
                 timeout=self._get_timeout(timeout),
                 listen=listen,
                 **kwargs)
@@ -345,6 +383,9 @@ class LocalClient(object):
         except Exception as general_exception:  # pylint: disable=broad-except
             # Convert to generic client error and pass along message
             raise SaltClientError(general_exception)
+        finally:
+            # The subscription is dropped when the job was not published
+            pub_data = self._check_pub_jid(sub_jid, pub_data)
 
         return self._check_pub_data(pub_data, listen=listen)
 
@@ -382,6 +423,8 @@ class LocalClient(object):
         '''
         arg = salt.utils.args.condition_input(arg, kwarg)
 
+        sub_jid = self._subscribe_pub_jid(jid, listen)
+        pub_data = None
         try:
             pub_data = yield self.pub_async(
                   tgt,
@@ -389,7 +432,7 @@ class LocalClient(object):
                   arg,
                   tgt_type,
                   ret,
-                  jid=jid,
+                  jid=sub_jid or jid,
                   timeout=self._get_timeout(timeout),
                   io_loop=io_loop,
                   listen=listen,
@@ -406,6 +449,9 @@ class LocalClient(object):
         except Exception as general_exception:  # pylint: disable=broad-except
             # Convert to generic client error and pass along message
             raise SaltClientError(general_exception)
+        finally:
+            # The subscription is dropped when the job was not published
+            pub_data = self._check_pub_jid(sub_jid, pub_data)
 
         raise salt.ext.tornado.gen.Return(self._check_pub_data(pub_data, listen=listen))
 
@@ -1064,6 +1110,9 @@ class LocalClient(object):
 
         # timeouts per minion, id_ -> timeout time
         minion_timeouts = {}
+        # minions known to run the job from their heartbeats, id_ -> time
+        # until which they count as running it
+        minion_alive = {}
 
         found = set()
         missing = set()
@@ -1108,6 +1157,14 @@ class LocalClient(object):
                     if 'missing' in raw.get('data', {}):
                         missing.update(raw['data']['missing'])
                     continue
+                if 'heartbeat' in raw['data'] and 'return' not in raw['data']:
+                    # The minion is still running the job, it counts as such
+                    # until it misses two heartbeats
+                    id_ = raw['data']['id']
+                    minions.add(id_)
+                    minion_alive[id_] = time.time() + 2 * raw['data']['heartbeat']
+                    minion_timeouts[id_] = max(minion_timeouts.get(id_, 0), minion_alive[id_])
+                    continue
                 if 'return' not in raw['data']:
                     continue
                 if kwargs.get('raw', False):
@@ -1153,9 +1210,16 @@ class LocalClient(object):
             # if the jinfo has timed out and some minions are still running the job
             # re-do the ping
             if time.time() > timeout_at and minions_running:
-                # since this is a new ping, no one has responded yet
-                jinfo = self.gather_job_info(jid, list(minions - found), 'list', **kwargs)
-                minions_running = False
+                # only ping the minions which did not send a heartbeat for the
+                # job lately
+                now = time.time()
+                ping = [id_ for id_ in minions - found if minion_alive.get(id_, 0) < now]
+                if ping:
+                    # since this is a new ping, no one has responded yet
+                    jinfo = self.gather_job_info(jid, ping, 'list', **kwargs)
+                    minions_running = False
+                else:
+                    jinfo = {}
                 # if we weren't assigned any jid that means the master thinks
                 # we have nothing to send
                 if 'jid' not in jinfo:
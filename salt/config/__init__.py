@@ -182,9 +182,13 @@ VALID_OPTS = immutabletypes.freeze({
     # The caching mechanism to use for the PKI key store. Can substantially decrease master publish
     # times. Available types:
     # 'maint': Runs on a schedule as a part of the maintanence process.
+    # 'watch': Runs a process rewriting the cache as soon as a key directory changes.
     # '': Disable the key cache [default]
     'key_cache': six.string_types,
 
+    # The number of seconds between checks of the key directories by the key cache watcher
+    'key_cache_interval': float,
+
     # The user under which the daemon should run
     'user': six.string_types,
 
@@ -359,6 +363,11 @@ VALID_OPTS = immutabletypes.freeze({
     # Maximum number of concurrently active processes at any given point in time
     'process_count_max': int,
 
+    # The number of pre-forked processes which run the jobs of a minion, and
+    # the number of jobs after which such a process is replaced
+    'job_workers': int,
+    'job_worker_max_jobs': int,
+
     # Whether or not the salt minion should run scheduled mine updates
     'mine_enabled': bool,
 
@@ -377,6 +386,13 @@ VALID_OPTS = immutabletypes.freeze({
     # The chunk size to use when streaming files with the file server
     'file_buffer_size': int,
 
+    # The maximum size of the file data in one response to a multi-file fetch
+    'file_bulk_buffer_size': int,
+
+    # Fetch the files used by the last highstate at once, and check each file
+    # against the master only once during a highstate
+    'state_file_prefetch': bool,
+
     # The TCP port on which minion events should be published if ipc_mode is TCP
     'tcp_pub_port': int,
 
@@ -477,6 +493,26 @@ VALID_OPTS = immutabletypes.freeze({
     # Fire events as state chunks are processed by the state compiler
     'state_events': bool,
 
+    # Cache the high data compiled by highstate runs, keyed on the hashes of
+    # the rendered files, the pillar and the grains they read
+    'highstate_cache': bool,
+
+    # The renderers and salt functions an SLS file may use to be cached
+    'highstate_cache_renderers': list,
+    'highstate_cache_functions': list,
+
+    # The number of worker processes calling the states of a run whose
+    # requisites returned concurrently, 1 calls the states in sequence
+    'state_concurrency': int,
+
+    # The state functions of which only one is called at a time by the
+    # concurrent state workers
+    'state_concurrency_serial': list,
+
+    # Aggregate the states following a state of these state modules which
+    # only differ from it by the names they manage
+    'state_aggregate_adjacent': (bool, list),
+
     # The number of seconds a minion should wait before retry when attempting authentication
     'acceptance_wait_time': float,
 
@@ -561,6 +597,17 @@ VALID_OPTS = immutabletypes.freeze({
     # default match type for filtering events tags: startswith, endswith, find, regex, fnmatch
     'event_match_type': six.string_types,
 
+    # Register the tags event listeners wait on with the event publisher, which then only
+    # sends them the matching events
+    'event_subscription_filter': bool,
+
+    # The number of master event publisher processes, each one publishing the events whose tags
+    # hash to it
+    'event_publisher_shards': int,
+
+    # The number of leading components of the event tags hashed to pick their publisher shard
+    'event_publisher_shard_depth': int,
+
     # This pidfile to write out to when a daemon starts
     'pidfile': six.string_types,
 
@@ -605,6 +652,17 @@ VALID_OPTS = immutabletypes.freeze({
     # the number of connected minions increases.
     'worker_threads': int,
 
+    # The number of requests each MWorker processes at once, in a thread pool
+    'mworker_concurrency': int,
+
+    # Limits on the number of requests of a given command each MWorker
+    # processes at once, when mworker_concurrency is above 1
+    'mworker_cmd_concurrency': dict,
+
+    # Named pools of MWorkers, each with its own queue, handling the commands
+    # routed to them
+    'worker_pools': dict,
+
     # The port for the master to listen to returns on. The minion needs to connect to this port
     # to send returns.
     'ret_port': int,
@@ -657,6 +715,10 @@ VALID_OPTS = immutabletypes.freeze({
 
     # Update intervals
     'roots_update_interval': int,
+
+    # Serve the roots backend from an index of the file roots built by its
+    # updates
+    'roots_index': bool,
     'azurefs_update_interval': int,
     'gitfs_update_interval': int,
     'git_pillar_update_interval': int,
@@ -721,6 +783,23 @@ VALID_OPTS = immutabletypes.freeze({
     # Specify a list of external pillar systems to use
     'ext_pillar': list,
 
+    # The number of external pillars evaluated at once, in a pool of threads
+    'ext_pillar_concurrency': int,
+
+    # The default and per external pillar timeouts, in seconds, when the
+    # external pillars are evaluated in a pool of threads
+    'ext_pillar_timeout': (int, float),
+    'ext_pillar_timeouts': dict,
+
+    # The external pillars which read the pillar data of the sources above them
+    'ext_pillar_ordered': list,
+
+    # Add the time spent in each external pillar to the compiled pillar
+    'ext_pillar_timing': bool,
+
+    # Cache the data of external pillars, by external pillar name
+    'ext_pillar_cache': dict,
+
     # Reserved for future use to version the pillar structure
     'pillar_version': int,
 
@@ -736,6 +815,17 @@ VALID_OPTS = immutabletypes.freeze({
     # Pillar cache backend. Defaults to `disk` which stores caches in the master cache
     'pillar_cache_backend': six.string_types,
 
+    # Cache the rendered pillar SLS files in each master worker, keyed on the
+    # grains and pillar keys they read
+    'pillar_render_cache': bool,
+
+    # The maximum number of renders held by the rendered pillar SLS cache
+    'pillar_render_cache_size': int,
+
+    # The renderers and salt functions a pillar SLS may use to be cached
+    'pillar_render_cache_renderers': list,
+    'pillar_render_cache_functions': list,
+
     'pillar_safe_render_error': bool,
 
     # When creating a pillar, there are several strategies to choose from when
@@ -843,6 +933,14 @@ VALID_OPTS = immutabletypes.freeze({
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Resolve grain and pillar targets from an index of the minion data cache instead of
+    # reading the cached data of every minion
+    'minion_data_cache_index': bool,
+
+    # The number of seconds between the syncs of the target index with the minion data
+    # cache by the Maintenance process
+    'minion_data_cache_index_interval': int,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -917,6 +1015,10 @@ VALID_OPTS = immutabletypes.freeze({
     # Set a hard limit for the amount of memory modules can consume on a minion.
     'modules_max_memory': int,
 
+    # Persist which modules each loader found and the result of their
+    # __virtual__ functions, to skip importing them on the next start
+    'loader_index': bool,
+
     # Blacklist specific core grains to be filtered
     'grains_blacklist': list,
 
@@ -964,6 +1066,14 @@ VALID_OPTS = immutabletypes.freeze({
     # The number of seconds to wait when the client is requesting information about running jobs
     'gather_job_timeout': int,
 
+    # Run batches with the event driven batch engine instead of sub-batch by
+    # sub-batch
+    'batch_engine': bool,
+
+    # Let the batch engine size batches after the failures and the latency of
+    # the returns
+    'batch_adaptive': bool,
+
     # The number of seconds to wait before timing out an authentication request
     'auth_timeout': int,
 
@@ -1016,6 +1126,10 @@ VALID_OPTS = immutabletypes.freeze({
     # primarily as a mitigation technique against minion disconnects.
     'ping_interval': int,
 
+    # Instructs the minion to fire an event on the master every n seconds for each of its running
+    # jobs, so clients waiting on the jobs do not publish saltutil.find_job to it
+    'job_heartbeat_interval': int,
+
     # Instructs the salt CLI to print a summary of a minion responses before returning
     'cli_summary': bool,
 
@@ -1030,6 +1144,14 @@ VALID_OPTS = immutabletypes.freeze({
     # Use zmq.SUSCRIBE to limit listening sockets to only process messages bound for them
     'zmq_filtering': bool,
 
+    # The target types the master resolves to minion IDs when zmq_filtering
+    # is enabled, publishes to other target types are broadcast
+    'zmq_filtering_tgt_types': list,
+
+    # Broadcast publishes matching more than this number of minions instead
+    # of sending them to each minion. 0 means no limit.
+    'zmq_filtering_max_minions': int,
+
     # Connection caching. Can greatly speed up salt performance.
     'con_cache': bool,
     'rotate_aes_key': bool,
@@ -1096,6 +1218,17 @@ VALID_OPTS = immutabletypes.freeze({
     'memcache_full_cleanup': bool,
     # Enable collecting the memcache stats and log it on `debug` log level.
     'memcache_debug': bool,
+    # Set a memcache limit in bytes per cache storage, 0 means no limit.
+    'memcache_max_bytes': int,
+    # Per bank memcache expiration time and limits, keyed by <bank>/<key> glob.
+    'memcache_banks': dict,
+    # Write the stored data to the cache driver right away ('through') or in
+    # bulk from a background thread ('behind').
+    'memcache_write_mode': six.string_types,
+    # How often the stored data is written in 'behind' write mode, in seconds.
+    'memcache_write_behind_interval': float,
+    # Save the memcache counters for the cache.memcache_stats runner.
+    'memcache_stats': bool,
 
     # Thin and minimal Salt extra modules
     'thin_extra_mods': six.string_types,
@@ -1291,6 +1424,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
 
     # Update intervals
     'roots_update_interval': DEFAULT_INTERVAL,
+    'roots_index': False,
     'azurefs_update_interval': DEFAULT_INTERVAL,
     'gitfs_update_interval': DEFAULT_INTERVAL,
     'git_pillar_update_interval': DEFAULT_INTERVAL,
@@ -1353,6 +1487,8 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'autosign_timeout': 120,
     'multiprocessing': True,
     'process_count_max': -1,
+    'job_workers': 0,
+    'job_worker_max_jobs': 100,
     'mine_enabled': True,
     'mine_return_job': False,
     'mine_interval': 60,
@@ -1360,6 +1496,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'ipc_write_buffer': _DFLT_IPC_WBUFFER,
     'ipv6': None,
     'file_buffer_size': 262144,
+    'file_bulk_buffer_size': 8388608,
     'tcp_pub_port': 4510,
     'tcp_pull_port': 4511,
     'tcp_authentication_retries': 5,
@@ -1386,7 +1523,17 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'state_output_diff': False,
     'state_auto_order': True,
     'state_events': False,
+    'highstate_cache': False,
+    'highstate_cache_renderers': ['jinja', 'yaml', 'json', 'yamlex'],
+    'highstate_cache_functions': [
+        'grains.get', 'grains.item', 'grains.filter_by', 'grains.has_value',
+        'pillar.get', 'pillar.item',
+    ],
+    'state_concurrency': 1,
+    'state_concurrency_serial': ['pkg.*', 'pkgrepo.*', 'file.accumulated'],
     'state_aggregate': False,
+    'state_aggregate_adjacent': False,
+    'state_file_prefetch': False,
     'snapper_states': False,
     'snapper_states_config': 'root',
     'acceptance_wait_time': 10,
@@ -1436,6 +1583,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'tcp_keepalive_cnt': -1,
     'tcp_keepalive_intvl': -1,
     'modules_max_memory': -1,
+    'loader_index': False,
     'grains_refresh_every': 0,
     'minion_id_caching': True,
     'minion_id_lowercase': False,
@@ -1451,6 +1599,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'cluster_mode': False,
     'restart_on_error': False,
     'ping_interval': 0,
+    'job_heartbeat_interval': 0,
     'username': None,
     'password': None,
     'zmq_filtering': False,
@@ -1462,6 +1611,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'http_request_timeout': 1 * 60 * 60.0,  # 1 hour
     'http_max_body': 100 * 1024 * 1024 * 1024,  # 100GB
     'event_match_type': 'startswith',
+    'event_subscription_filter': False,
     'minion_restart_command': [],
     'pub_ret': True,
     'proxy_host': '',
@@ -1491,6 +1641,9 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'auth_mode': 1,
     'user': _MASTER_USER,
     'worker_threads': 5,
+    'mworker_concurrency': 1,
+    'mworker_cmd_concurrency': {},
+    'worker_pools': {},
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'master'),
     'sock_pool_size': 1,
     'ret_port': 4506,
@@ -1500,6 +1653,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'root_dir': salt.syspaths.ROOT_DIR,
     'pki_dir': os.path.join(salt.syspaths.CONFIG_DIR, 'pki', 'master'),
     'key_cache': '',
+    'key_cache_interval': 0.1,
     'cachedir': os.path.join(salt.syspaths.CACHE_DIR, 'master'),
     'file_roots': {
         'base': [salt.syspaths.BASE_FILE_ROOTS_DIR,
@@ -1534,6 +1688,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
 
     # Update intervals
     'roots_update_interval': DEFAULT_INTERVAL,
+    'roots_index': False,
     'azurefs_update_interval': DEFAULT_INTERVAL,
     'gitfs_update_interval': DEFAULT_INTERVAL,
     'git_pillar_update_interval': DEFAULT_INTERVAL,
@@ -1601,6 +1756,12 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'minionfs_whitelist': [],
     'minionfs_blacklist': [],
     'ext_pillar': [],
+    'ext_pillar_concurrency': 1,
+    'ext_pillar_timeout': 0,
+    'ext_pillar_timeouts': {},
+    'ext_pillar_ordered': [],
+    'ext_pillar_timing': False,
+    'ext_pillar_cache': {},
     'pillar_version': 2,
     'pillar_opts': False,
     'pillar_safe_render_error': True,
@@ -1610,6 +1771,13 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'pillar_cache': False,
     'pillar_cache_ttl': 3600,
     'pillar_cache_backend': 'disk',
+    'pillar_render_cache': False,
+    'pillar_render_cache_size': 1000,
+    'pillar_render_cache_renderers': ['jinja', 'yaml', 'json', 'yamlex', 'gpg'],
+    'pillar_render_cache_functions': [
+        'grains.get', 'grains.item', 'grains.filter_by', 'grains.has_value',
+        'pillar.get', 'pillar.item', 'config.get', 'config.option',
+    ],
     'ping_on_rotate': False,
     'peer': {},
     'preserve_minion_cache': False,
@@ -1637,6 +1805,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'file_recv': False,
     'file_recv_max_size': 100,
     'file_buffer_size': 1048576,
+    'file_bulk_buffer_size': 8388608,
     'file_ignore_regex': [],
     'file_ignore_glob': [],
     'fileserver_backend': ['roots'],
@@ -1664,6 +1833,8 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
     'minion_data_cache': True,
+    'minion_data_cache_index': False,
+    'minion_data_cache_index_interval': 60,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipc_write_buffer': _DFLT_IPC_WBUFFER,
@@ -1696,6 +1867,9 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'event_return_whitelist': [],
     'event_return_blacklist': [],
     'event_match_type': 'startswith',
+    'event_subscription_filter': False,
+    'event_publisher_shards': 1,
+    'event_publisher_shard_depth': 3,
     'runner_returns': True,
     'serial': 'msgpack',
     'test': False,
@@ -1746,6 +1920,8 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'keysize': 2048,
     'transport': 'zeromq',
     'gather_job_timeout': 10,
+    'batch_engine': False,
+    'batch_adaptive': False,
     'syndic_event_forward_timeout': 0.5,
     'syndic_jid_forward_cache_hwm': 100,
     'regen_thin': False,
@@ -1771,6 +1947,11 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'master_pubkey_signature': 'master_pubkey_signature',
     'master_use_pubkey_signature': False,
     'zmq_filtering': False,
+    'zmq_filtering_tgt_types': ['glob', 'pcre', 'list', 'grain', 'grain_pcre',
+                                'pillar', 'pillar_pcre', 'pillar_exact',
+                                'compound', 'compound_pillar_exact',
+                                'nodegroup', 'ipcidr'],
+    'zmq_filtering_max_minions': 0,
     'zmq_monitor': False,
     'con_cache': False,
     'rotate_aes_key': True,
@@ -1786,6 +1967,11 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'memcache_max_items': 1024,
     'memcache_full_cleanup': False,
     'memcache_debug': False,
+    'memcache_max_bytes': 0,
+    'memcache_banks': {},
+    'memcache_write_mode': 'through',
+    'memcache_write_behind_interval': 1.0,
+    'memcache_stats': False,
     'thin_extra_mods': '',
     'min_extra_mods': '',
     'ssl': None,
@@ -3842,6 +4028,60 @@ def _update_discovery_config(opts):
         opts['discovery'] = salt.utils.dictupdate.update(discovery_config, opts['discovery'], True, True)
 
 
+def _update_worker_pools(opts):
+    '''
+    Validate the worker pools of the master, adding the ``default`` pool
+    which handles the commands not routed to another pool.
+
+    :param opts:
+    :return:
+    '''
+    if not opts.get('worker_pools'):
+        opts['worker_pools'] = {}
+        return
+    transports = set(opts.get('transport_opts') or {})
+    transports.add(opts['transport'])
+    if transports != set(['zeromq']):
+        log.warning(
+            'Worker pools are only supported by the zeromq transport, '
+            'starting %s workers handling all the commands instead',
+            opts['worker_threads']
+        )
+        opts['worker_pools'] = {}
+        return
+    pool_options = ('worker_threads', 'commands', 'queue_size',
+                    'mworker_concurrency', 'mworker_cmd_concurrency')
+    pools = {}
+    routed = {}
+    for name in sorted(opts['worker_pools']):
+        pool = dict(opts['worker_pools'][name] or {})
+        if not re.match(r'^[\w-]+$', name):
+            raise salt.exceptions.SaltConfigurationError(
+                'Invalid worker pool name: {0}'.format(name))
+        for key in pool:
+            if key not in pool_options:
+                raise salt.exceptions.SaltConfigurationError(
+                    'Unknown option for worker pool {0}: {1}'.format(name, key))
+        pool['worker_threads'] = max(int(pool.get('worker_threads', 1)), 1)
+        commands = pool.get('commands') or []
+        if isinstance(commands, six.string_types):
+            commands = [commands]
+        pool['commands'] = []
+        for cmd in commands:
+            if cmd in routed:
+                log.warning(
+                    'The %s command is routed to both the %s and the %s '
+                    'worker pools, using %s', cmd, routed[cmd], name, routed[cmd]
+                )
+                continue
+            routed[cmd] = name
+            pool['commands'].append(cmd)
+        pools[name] = pool
+    pools.setdefault('default', {'worker_threads': opts['worker_threads'],
+                                 'commands': []})
+    opts['worker_pools'] = pools
+
+
 def master_config(path, env_var='SALT_MASTER_CONFIG', defaults=None, exit_on_config_errors=False):
     '''
     Reads in the master configuration file and sets up default options
@@ -4044,6 +4284,7 @@ def apply_master_config(overrides=None, defaults=None):
     # Check and update TLS/SSL configuration
     _update_ssl_config(opts)
     _update_discovery_config(opts)
+    _update_worker_pools(opts)
 
     return opts
 
@@ -222,6 +222,14 @@ def sign_message(privkey_path, message, passphrase=None):
     Use Crypto.Signature.PKCS1_v1_5 to sign a message. Returns the signature.
     '''
     key = get_rsa_key(privkey_path, passphrase)
+    return sign_message_with_key(key, message)
+
+
+def sign_message_with_key(key, message):
+    '''
+    Sign a message with a private key already loaded with ``get_rsa_key``.
+    Returns the signature.
+    '''
     log.debug('salt.crypt.sign_message: Signing message.')
     if HAS_M2:
         md = EVP.MessageDigest('sha1')
@@ -773,6 +781,7 @@ class AsyncAuth(object):
                 if salt.utils.crypt.pem_finger(m_pub_fn, sum_type=self.opts['hash_type']) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['worker_pools'] = payload.get('worker_pools', False)
         raise salt.ext.tornado.gen.Return(auth)
 
     def get_keys(self):
@@ -1355,6 +1364,7 @@ class SAuth(AsyncAuth):
                 if salt.utils.crypt.pem_finger(m_pub_fn, sum_type=self.opts['hash_type']) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['worker_pools'] = payload.get('worker_pools', False)
         return auth
 
 
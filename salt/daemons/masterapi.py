@@ -435,6 +435,7 @@ class RemoteFuncs(object):
         '''
         fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = fs_.serve_file
+        self._serve_files = fs_.serve_files
         self._file_find = fs_._find_file
         self._file_hash = fs_.file_hash
         self._file_list = fs_.file_list
@@ -601,8 +602,10 @@ class RemoteFuncs(object):
                 )
         minions = _res['minions']
         minion_side_acl = {}  # Cache minion-side ACL
+        cached_mine = self.cache.fetch_many(
+            ['minions/{0}'.format(minion) for minion in minions], 'mine')
         for minion in minions:
-            mine_data = self.cache.fetch('minions/{0}'.format(minion), 'mine')
+            mine_data = cached_mine.get('minions/{0}'.format(minion))
             if not isinstance(mine_data, dict):
                 continue
             for function in functions_allowed:
@@ -763,9 +766,11 @@ class RemoteFuncs(object):
                 pillar_override=load.get('pillar_override', {}))
         data = pillar.compile_pillar()
         if self.opts.get('minion_data_cache', False):
+            mdata = {'grains': load['grains'], 'pillar': data}
             self.cache.store('minions/{0}'.format(load['id']),
                              'data',
-                             {'grains': load['grains'], 'pillar': data})
+                             mdata)
+            self.ckminions.update_index(load['id'], mdata)
             if self.opts.get('minion_data_cache_events') is True:
                 self.event.fire_event({'comment': 'Minion data cache refresh'}, salt.utils.event.tagify(load['id'], 'refresh', 'minion'))
         return data
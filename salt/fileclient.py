@@ -11,6 +11,7 @@ import logging
 import os
 import string
 import shutil
+import threading
 import ftplib
 from salt.ext.tornado.httputil import parse_response_start_line, HTTPHeaders, HTTPInputError
 import salt.utils.atomicfile
@@ -47,6 +48,10 @@ from salt.ext.six.moves.urllib.parse import urlparse, urlunparse
 log = logging.getLogger(__name__)
 MAX_FILENAME_LENGTH = 255
 
+# The files cached from the master and checked against it within the
+# verified_files context of the thread
+_VERIFIED = threading.local()
+
 
 def get_file_client(opts, pillar=False):
     '''
@@ -63,6 +68,25 @@ def get_file_client(opts, pillar=False):
     }.get(client, RemoteClient)(opts)
 
 
+@contextlib.contextmanager
+def verified_files():
+    '''
+    Check the files cached from the master by the file clients of the thread
+    against the master only once within the context, such as a state run.
+    Yields the dict of the cached paths of the checked files, keyed on their
+    saltenv, path and cachedir.
+    '''
+    files = getattr(_VERIFIED, 'files', None)
+    if files is not None:
+        yield files
+        return
+    _VERIFIED.files = {}
+    try:
+        yield _VERIFIED.files
+    finally:
+        _VERIFIED.files = None
+
+
 def decode_dict_keys_to_str(src):
     '''
     Convert top level keys from bytes to strings if possible.
@@ -184,6 +208,14 @@ class Client(object):
         '''
         raise NotImplementedError
 
+    def get_files(self, paths, saltenv='base', cachedir=None):
+        '''
+        Copies a list of files from the local files or master to the minion
+        cache, and returns their cached paths
+        '''
+        return [self.get_file(path, '', True, saltenv, cachedir=cachedir)
+                for path in paths]
+
     def cache_file(self, path, saltenv='base', cachedir=None, source_hash=None):
         '''
         Pull a file down from the file server and store it in the minion
@@ -197,24 +229,29 @@ class Client(object):
         Download a list of files stored on the master and put them in the
         minion file cache
         '''
-        ret = []
         if isinstance(paths, six.string_types):
             paths = paths.split(',')
-        for path in paths:
-            ret.append(self.cache_file(path, saltenv, cachedir=cachedir))
+        ret = [None] * len(paths)
+        salt_paths = []
+        for ind, path in enumerate(paths):
+            if urlparse(path).scheme == 'salt':
+                salt_paths.append((ind, path))
+            else:
+                ret[ind] = self.cache_file(path, saltenv, cachedir=cachedir)
+        cached = self.get_files([path for _, path in salt_paths], saltenv,
+                                cachedir=cachedir)
+        for (ind, _), dest in zip(salt_paths, cached):
+            ret[ind] = dest
         return ret
 
     def cache_master(self, saltenv='base', cachedir=None):
         '''
         Download and cache all files on a master in a specified environment
         '''
-        ret = []
-        for path in self.file_list(saltenv):
-            ret.append(
-                self.cache_file(
-                    salt.utils.url.create(path), saltenv, cachedir=cachedir)
-            )
-        return ret
+        return self.get_files(
+            [salt.utils.url.create(path) for path in self.file_list(saltenv)],
+            saltenv,
+            cachedir=cachedir)
 
     def cache_dir(self, path, saltenv='base', include_empty=False,
                   include_pat=None, exclude_pat=None, cachedir=None):
@@ -235,15 +272,16 @@ class Client(object):
         )
         # go through the list of all files finding ones that are in
         # the target directory and caching them
+        urls = []
         for fn_ in self.file_list(saltenv):
             fn_ = salt.utils.data.decode(fn_)
             if fn_.strip() and fn_.startswith(path):
                 if salt.utils.stringutils.check_include_exclude(
                         fn_, include_pat, exclude_pat):
-                    fn_ = self.cache_file(
-                        salt.utils.url.create(fn_), saltenv, cachedir=cachedir)
-                    if fn_:
-                        ret.append(fn_)
+                    urls.append(salt.utils.url.create(fn_))
+        for fn_ in self.get_files(urls, saltenv, cachedir=cachedir):
+            if fn_:
+                ret.append(fn_)
 
         if include_empty:
             # Break up the path into a list containing the bottom-level
@@ -1062,6 +1100,113 @@ class RemoteClient(Client):
         if senv:
             saltenv = senv
 
+        verified = getattr(_VERIFIED, 'files', None)
+        if verified is None or dest:
+            return self._get_file(path, dest, makedirs, saltenv, gzip, cachedir)
+        key = (saltenv, path, cachedir)
+        if key in verified and os.path.isfile(verified[key]):
+            return verified[key]
+        ret = self._get_file(path, dest, makedirs, saltenv, gzip, cachedir)
+        if ret:
+            verified[key] = ret
+        return ret
+
+    def get_files(self, paths, saltenv='base', cachedir=None):
+        '''
+        Get a list of files from the salt-master into the minion cache. The
+        master is sent a manifest of the paths and of the hashes of the cached
+        copies, and returns the changed files in as few responses as
+        ``file_bulk_buffer_size`` allows, instead of several requests per
+        file. Returns the cached paths, with False for the missing files.
+        '''
+        ret = [None] * len(paths)
+        verified = getattr(_VERIFIED, 'files', None)
+        pending = {}
+        for ind, path in enumerate(paths):
+            path, senv = salt.utils.url.split_env(path)
+            env = senv or saltenv
+            key = (env, path, cachedir)
+            if verified is not None and key in verified \
+                    and os.path.isfile(verified[key]):
+                ret[ind] = verified[key]
+                continue
+            pending.setdefault(env, []).append((ind, path, self._check_proto(path)))
+
+        for env, files in six.iteritems(pending):
+            manifest = []
+            for _, _, rel_path in files:
+                with self._cache_loc(rel_path, env, cachedir=cachedir) as dest:
+                    hsum = self.hash_file(dest, env) if os.path.isfile(dest) else None
+                manifest.append([rel_path, hsum])
+            while files:
+                load = {'saltenv': env,
+                        'files': manifest,
+                        'cmd': '_serve_files'}
+                try:
+                    entries = decode_dict_keys_to_str(
+                        self.channel.send(load, raw=True))['files']
+                except (AttributeError, KeyError, TypeError):
+                    entries = None
+                if not entries or not isinstance(entries, list):
+                    # Masters from before the bulk protocol
+                    break
+                for (ind, path, rel_path), entry in zip(files, entries):
+                    ret[ind] = self._write_served_file(path, rel_path, entry, env,
+                                                       cachedir)
+                    if ret[ind] and verified is not None:
+                        verified[(env, path, cachedir)] = ret[ind]
+                files = files[len(entries):]
+                manifest = manifest[len(entries):]
+            for ind, path, _ in files:
+                ret[ind] = self.get_file(path, '', True, env, cachedir=cachedir)
+        return ret
+
+    def _write_served_file(self, path, rel_path, entry, saltenv, cachedir):
+        '''
+        Write a file returned by _serve_files to the minion cache and return
+        its cached path, or fall back to get_file
+        '''
+        entry = decode_dict_keys_to_str(entry)
+        data = entry.pop('data', None)
+        entry = salt.utils.data.decode(entry)
+        if entry.get('path') != rel_path or entry.get('large'):
+            return self.get_file(path, '', True, saltenv, cachedir=cachedir)
+        if not entry.get('hsum'):
+            log.debug(
+                'Could not find file \'%s\' in saltenv \'%s\'',
+                path, saltenv
+            )
+            return False
+        if not isinstance(entry['hsum'], dict):
+            return self.get_file(path, '', True, saltenv, cachedir=cachedir)
+        with self._cache_loc(rel_path, saltenv, cachedir=cachedir) as dest:
+            if data is None:
+                # The cached copy has the hash of the file on the master
+                return dest
+            if entry.get('gzip'):
+                data = salt.utils.gzip_util.uncompress(data)
+            if six.PY3 and isinstance(data, str):
+                data = data.encode()
+            # If a directory was formerly cached at this path, then remove it
+            # to avoid a traceback trying to write the file
+            if os.path.isdir(dest):
+                salt.utils.files.rm_rf(dest)
+            with salt.utils.atomicfile.atomic_open(dest, 'wb+') as fp_:
+                fp_.write(data)
+        hsum = salt.utils.hashutils.get_hash(dest, entry['hsum']['hash_type'])
+        if hsum != entry['hsum']['hsum']:
+            log.warning('Bad download of file %s, fetching it again', path)
+            return self.get_file(path, '', True, saltenv, cachedir=cachedir)
+        log.info(
+            'Fetching file from saltenv \'%s\', ** done ** \'%s\'',
+            saltenv, path
+        )
+        return dest
+
+    def _get_file(self, path, dest, makedirs, saltenv, gzip, cachedir):
+        '''
+        Get a single file from the salt-master, see get_file
+        '''
         if not salt.utils.platform.is_windows():
             hash_server, stat_server = self.hash_and_stat_file(path, saltenv)
             try:
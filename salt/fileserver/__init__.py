@@ -18,7 +18,9 @@ import time
 import salt.loader
 import salt.utils.data
 import salt.utils.files
+import salt.utils.gzip_util
 import salt.utils.path
+import salt.utils.stringutils
 import salt.utils.url
 import salt.utils.versions
 from salt.utils.args import get_function_argspec as _argspec
@@ -202,14 +204,15 @@ def check_env_cache(opts, env_cache):
     return None
 
 
-def generate_mtime_map(opts, path_map):
+def generate_mtime_map(opts, path_map, followlinks=False):
     '''
     Generate a dict of filename -> mtime
     '''
     file_map = {}
     for saltenv, path_list in six.iteritems(path_map):
         for path in path_list:
-            for directory, _, filenames in salt.utils.path.os_walk(path):
+            for directory, _, filenames in salt.utils.path.os_walk(
+                    path, followlinks=followlinks):
                 for item in filenames:
                     try:
                         file_path = os.path.join(directory, item)
@@ -650,6 +653,76 @@ class Fileserver(object):
             return self.servers[fstr](load, fnd)
         return ret
 
+    def serve_files(self, load):
+        '''
+        Serve up the files of a manifest of paths and the hashes of the
+        copies the client has, in the order of the manifest. The data of the
+        files whose hash differs is included up to ``file_bulk_buffer_size``
+        bytes per response, the client requests the files left out again.
+        The files which do not fit in one response are marked as large, to be
+        fetched in chunks with serve_file.
+        '''
+        ret = {'files': []}
+
+        if 'env' in load:
+            # "env" is not supported; Use "saltenv".
+            load.pop('env')
+
+        if not isinstance(load.get('files'), list) or 'saltenv' not in load:
+            return ret
+        saltenv = load['saltenv']
+        if not isinstance(saltenv, six.string_types):
+            saltenv = six.text_type(saltenv)
+        gzip = load.get('gzip', None)
+        max_size = self.opts.get('file_bulk_buffer_size', 8388608)
+        size = 0
+        for item in load['files']:
+            try:
+                path, client_hash = item
+            except (TypeError, ValueError):
+                path, client_hash = item, None
+            path = salt.utils.stringutils.to_unicode(path)
+            entry = {'path': path, 'hsum': '', 'dest': ''}
+            ret['files'].append(entry)
+            fnd = self.find_file(path, saltenv)
+            fstr = '{0}.file_hash'.format(fnd.get('back'))
+            if not fnd.get('back') or fstr not in self.servers:
+                continue
+            file_load = {'path': path, 'saltenv': saltenv, 'loc': 0}
+            entry['hsum'] = self.servers[fstr](dict(file_load), fnd)
+            entry['dest'] = fnd['rel']
+            if client_hash == entry['hsum']:
+                continue
+            fstr = '{0}.serve_file'.format(fnd['back'])
+            if fstr not in self.servers:
+                entry['large'] = True
+                continue
+            chunks = []
+            while True:
+                data = self.servers[fstr](dict(file_load), fnd)['data']
+                if not data:
+                    break
+                if isinstance(data, six.text_type):
+                    data = data.encode()
+                chunks.append(data)
+                file_load['loc'] += len(data)
+                if file_load['loc'] > max_size:
+                    break
+            if file_load['loc'] > max_size:
+                entry['large'] = True
+                continue
+            if size + file_load['loc'] > max_size and size:
+                # Let the client request this file and the next ones again
+                ret['files'].pop()
+                break
+            data = b''.join(chunks)
+            size += len(data)
+            if gzip:
+                data = salt.utils.gzip_util.compress(data, gzip)
+                entry['gzip'] = gzip
+            entry['data'] = data
+        return ret
+
     def __file_hash_and_stat(self, load):
         '''
         Common code for hashing and stating files
@@ -20,14 +20,19 @@ from __future__ import absolute_import, print_function, unicode_literals
 # Import python libs
 import os
 import errno
+import hashlib
 import logging
+import stat
 
 # Import salt libs
 import salt.fileserver
 import salt.utils.event
 import salt.utils.files
 import salt.utils.gzip_util
+import salt.utils.atomicfile
 import salt.utils.hashutils
+import salt.utils.json
+import salt.utils.msgpack
 import salt.utils.path
 import salt.utils.platform
 import salt.utils.stringutils
@@ -36,6 +41,144 @@ from salt.ext import six
 
 log = logging.getLogger(__name__)
 
+# The index of the file roots written by update() when roots_index is set,
+# as last loaded by this process, with the stat of the index file
+_INDEX = {'stamp': None, 'data': None}
+
+# The options the contents of the index depend on
+INDEX_OPTS = ('file_roots', 'hash_type', 'file_ignore_regex',
+              'file_ignore_glob', 'fileserver_ignoresymlinks',
+              'fileserver_followsymlinks')
+
+
+def _index_opts_digest():
+    '''
+    Return a digest of the options the index was built with
+    '''
+    index_opts = dict((key, __opts__.get(key)) for key in INDEX_OPTS)
+    return hashlib.sha256(salt.utils.stringutils.to_bytes(
+        salt.utils.json.dumps(index_opts, sort_keys=True, default=str))).hexdigest()
+
+
+def _get_index():
+    '''
+    Return the index of the file roots, or None when roots_index is not set,
+    or the index is not built yet or was built with other options. The index
+    is loaded again when update() rewrites it.
+    '''
+    if not __opts__.get('roots_index', False):
+        return None
+    index_path = os.path.join(__opts__['cachedir'], 'roots', 'index.p')
+    try:
+        index_stat = os.stat(index_path)
+    except OSError:
+        return None
+    stamp = (index_stat.st_mtime, index_stat.st_size, index_stat.st_ino)
+    if stamp != _INDEX['stamp']:
+        try:
+            with salt.utils.files.fopen(index_path, 'rb') as fp_:
+                data = salt.utils.msgpack.unpack(fp_, raw=False)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.warning('Unable to read the roots index %s: %s', index_path, exc)
+            data = None
+        _INDEX['stamp'] = stamp
+        _INDEX['data'] = data
+    data = _INDEX['data']
+    if not isinstance(data, dict) or data.get('opts') != _index_opts_digest():
+        return None
+    return data
+
+
+def _update_index():
+    '''
+    Refresh the index of each environment: the path, stat result and hash of
+    every file, and the file lists. Only the files whose mtime changed since
+    the last index are stat'ed and hashed, and the file lists are only walked
+    again when files were added or removed. The index is not rewritten when
+    nothing changed. Returns the mtime map of the files.
+    '''
+    old_index = _get_index() or {'envs': {}}
+    changed = not old_index['envs']
+    mtime_map = {}
+    envs = {}
+    for saltenv, roots in six.iteritems(__opts__['file_roots']):
+        old_env = old_index['envs'].get(saltenv, {})
+        old_files = old_env.get('files', {})
+        env_map = {}
+        files = {}
+        for root in roots:
+            root_map = salt.fileserver.generate_mtime_map(
+                __opts__, {saltenv: [root]},
+                followlinks=__opts__['fileserver_followsymlinks'])
+            env_map.update(root_map)
+            for full, mtime in six.iteritems(root_map):
+                rel = os.path.relpath(full, root)
+                if rel in files:
+                    # The file of the first root is served
+                    continue
+                old = old_files.get(rel)
+                if old and old[0] == full and old[3] == mtime:
+                    files[rel] = old
+                    continue
+                try:
+                    fstat = os.stat(full)
+                    if not stat.S_ISREG(fstat.st_mode):
+                        continue
+                    hsum = salt.utils.hashutils.get_hash(
+                        full, __opts__['hash_type'])
+                except (IOError, OSError):
+                    continue
+                files[rel] = [full, list(fstat), hsum, fstat.st_mtime]
+        mtime_map.update(env_map)
+        old_map = old_env.get('mtime_map')
+        if old_map is not None and sorted(old_map) == sorted(env_map):
+            lists = old_env['lists']
+        else:
+            lists = _list_roots(roots)
+        if old_map is None or salt.fileserver.diff_mtime_map(old_map, env_map):
+            changed = True
+        envs[saltenv] = {'files': files, 'lists': lists, 'mtime_map': env_map}
+
+    if not changed and sorted(envs) == sorted(old_index['envs']):
+        return mtime_map
+    index_path = os.path.join(__opts__['cachedir'], 'roots', 'index.p')
+    if not os.path.isdir(os.path.dirname(index_path)):
+        os.makedirs(os.path.dirname(index_path))
+    with salt.utils.atomicfile.atomic_open(index_path, 'wb') as fp_:
+        salt.utils.msgpack.pack({'opts': _index_opts_digest(), 'envs': envs},
+                                fp_, use_bin_type=True)
+    return mtime_map
+
+
+def _list_roots(roots):
+    '''
+    Walk the roots of an environment for its file lists
+    '''
+    ret = {
+        'files': set(),
+        'dirs': set(),
+        'empty_dirs': set(),
+        'links': {}
+    }
+    for path in roots:
+        for root, dirs, files in salt.utils.path.os_walk(
+                path,
+                followlinks=__opts__['fileserver_followsymlinks']):
+            _add_to(ret, ret['dirs'], path, root, dirs)
+            _add_to(ret, ret['files'], path, root, files)
+    for form in ('files', 'dirs', 'empty_dirs'):
+        ret[form] = sorted(ret[form])
+    return ret
+
+
+def _same_stat(fstat, entry):
+    '''
+    Return whether the stat result of a file matches its entry in the index,
+    on the inode, size and mtime
+    '''
+    return (fstat.st_ino, fstat.st_size, fstat.st_mtime) == \
+        (entry[1][1], entry[1][6], entry[3])
+
 
 def find_file(path, saltenv='base', **kwargs):
     '''
@@ -57,6 +200,23 @@ def find_file(path, saltenv='base', **kwargs):
         else:
             return fnd
 
+    index = _get_index()
+    if index is not None and 'index' not in kwargs and saltenv in index['envs']:
+        entry = index['envs'][saltenv]['files'].get(path)
+        if not entry:
+            return fnd
+        try:
+            fstat = os.stat(entry[0])
+        except OSError:
+            fstat = None
+        if fstat is not None and _same_stat(fstat, entry):
+            fnd['path'] = entry[0]
+            fnd['rel'] = path
+            fnd['stat'] = entry[1]
+            return fnd
+        # The file was changed or removed since the last update, look it up
+        # on disk
+
     def _add_file_stat(fnd):
         '''
         Stat the file and, assuming no errors were found, convert the stat
@@ -160,7 +320,10 @@ def update():
             'backend': 'roots'}
 
     # generate the new map
-    new_mtime_map = salt.fileserver.generate_mtime_map(__opts__, __opts__['file_roots'])
+    if __opts__.get('roots_index', False):
+        new_mtime_map = _update_index()
+    else:
+        new_mtime_map = salt.fileserver.generate_mtime_map(__opts__, __opts__['file_roots'])
 
     old_mtime_map = {}
     # if you have an old map, load that
@@ -230,6 +393,16 @@ def file_hash(load, fnd):
         saltenv = '__env__'
     ret = {}
 
+    index = _get_index()
+    if index is not None and path:
+        entry = index['envs'].get(saltenv, {}).get('files', {}).get(
+            os.path.normpath(fnd['rel']))
+        # The files found on disk as their index entry is stale are hashed
+        if entry and entry[0] == path and fnd.get('stat') == entry[1]:
+            ret['hash_type'] = __opts__['hash_type']
+            ret['hsum'] = entry[2]
+            return ret
+
     # if the file doesn't exist, we can't get a hash
     if not path or not os.path.isfile(path):
         return ret
@@ -293,6 +466,78 @@ def file_hash(load, fnd):
     return ret
 
 
+def _add_to(ret, tgt, fs_root, parent_dir, items):
+    '''
+    Add the files to the target set of the file lists ret
+    '''
+    def _translate_sep(path):
+        '''
+        Translate path separators for Windows masterless minions
+        '''
+        return path.replace('\\', '/') if os.path.sep == '\\' else path
+
+    for item in items:
+        abs_path = os.path.join(parent_dir, item)
+        log.trace('roots: Processing %s', abs_path)
+        is_link = salt.utils.path.islink(abs_path)
+        log.trace(
+            'roots: %s is %sa link',
+            abs_path, 'not ' if not is_link else ''
+        )
+        if is_link and __opts__['fileserver_ignoresymlinks']:
+            continue
+        rel_path = _translate_sep(os.path.relpath(abs_path, fs_root))
+        log.trace('roots: %s relative path is %s', abs_path, rel_path)
+        if salt.fileserver.is_file_ignored(__opts__, rel_path):
+            continue
+        tgt.add(rel_path)
+        try:
+            if not os.listdir(abs_path):
+                ret['empty_dirs'].add(rel_path)
+        except Exception:  # pylint: disable=broad-except
+            # Generic exception because running os.listdir() on a
+            # non-directory path raises an OSError on *NIX and a
+            # WindowsError on Windows.
+            pass
+        if is_link:
+            link_dest = salt.utils.path.readlink(abs_path)
+            log.trace(
+                'roots: %s symlink destination is %s',
+                abs_path, link_dest
+            )
+            if salt.utils.platform.is_windows() \
+                    and link_dest.startswith('\\\\'):
+                # Symlink points to a network path. Since you can't
+                # join UNC and non-UNC paths, just assume the original
+                # path.
+                log.trace(
+                    'roots: %s is a UNC path, using %s instead',
+                    link_dest, abs_path
+                )
+                link_dest = abs_path
+            if link_dest.startswith('..'):
+                joined = os.path.join(abs_path, link_dest)
+            else:
+                joined = os.path.join(
+                    os.path.dirname(abs_path), link_dest
+                )
+            rel_dest = _translate_sep(
+                os.path.relpath(
+                    os.path.realpath(os.path.normpath(joined)),
+                    os.path.realpath(fs_root)
+                )
+            )
+            log.trace(
+                'roots: %s relative path is %s',
+                abs_path, rel_dest
+            )
+            if not rel_dest.startswith('..'):
+                # Only count the link if it does not point
+                # outside of the root dir of the fileserver
+                # (i.e. the "path" variable)
+                ret['links'][rel_path] = link_dest
+
+
 def _file_lists(load, form):
     '''
     Return a dict containing the file lists for files, dirs, emtydirs and symlinks
@@ -309,6 +554,10 @@ def _file_lists(load, form):
         else:
             return []
 
+    index = _get_index()
+    if index is not None and saltenv in index['envs']:
+        return index['envs'][saltenv]['lists'].get(form, [])
+
     list_cachedir = os.path.join(__opts__['cachedir'], 'file_lists', 'roots')
     if not os.path.isdir(list_cachedir):
         try:
@@ -325,94 +574,7 @@ def _file_lists(load, form):
     if cache_match is not None:
         return cache_match
     if refresh_cache:
-        ret = {
-            'files': set(),
-            'dirs': set(),
-            'empty_dirs': set(),
-            'links': {}
-        }
-
-        def _add_to(tgt, fs_root, parent_dir, items):
-            '''
-            Add the files to the target set
-            '''
-            def _translate_sep(path):
-                '''
-                Translate path separators for Windows masterless minions
-                '''
-                return path.replace('\\', '/') if os.path.sep == '\\' else path
-
-            for item in items:
-                abs_path = os.path.join(parent_dir, item)
-                log.trace('roots: Processing %s', abs_path)
-                is_link = salt.utils.path.islink(abs_path)
-                log.trace(
-                    'roots: %s is %sa link',
-                    abs_path, 'not ' if not is_link else ''
-                )
-                if is_link and __opts__['fileserver_ignoresymlinks']:
-                    continue
-                rel_path = _translate_sep(os.path.relpath(abs_path, fs_root))
-                log.trace('roots: %s relative path is %s', abs_path, rel_path)
-                if salt.fileserver.is_file_ignored(__opts__, rel_path):
-                    continue
-                tgt.add(rel_path)
-                try:
-                    if not os.listdir(abs_path):
-                        ret['empty_dirs'].add(rel_path)
-                except Exception:  # pylint: disable=broad-except
-                    # Generic exception because running os.listdir() on a
-                    # non-directory path raises an OSError on *NIX and a
-                    # WindowsError on Windows.
-                    pass
-                if is_link:
-                    link_dest = salt.utils.path.readlink(abs_path)
-                    log.trace(
-                        'roots: %s symlink destination is %s',
-                        abs_path, link_dest
-                    )
-                    if salt.utils.platform.is_windows() \
-                            and link_dest.startswith('\\\\'):
-                        # Symlink points to a network path. Since you can't
-                        # join UNC and non-UNC paths, just assume the original
-                        # path.
-                        log.trace(
-                            'roots: %s is a UNC path, using %s instead',
-                            link_dest, abs_path
-                        )
-                        link_dest = abs_path
-                    if link_dest.startswith('..'):
-                        joined = os.path.join(abs_path, link_dest)
-                    else:
-                        joined = os.path.join(
-                            os.path.dirname(abs_path), link_dest
-                        )
-                    rel_dest = _translate_sep(
-                        os.path.relpath(
-                            os.path.realpath(os.path.normpath(joined)),
-                            os.path.realpath(fs_root)
-                        )
-                    )
-                    log.trace(
-                        'roots: %s relative path is %s',
-                        abs_path, rel_dest
-                    )
-                    if not rel_dest.startswith('..'):
-                        # Only count the link if it does not point
-                        # outside of the root dir of the fileserver
-                        # (i.e. the "path" variable)
-                        ret['links'][rel_path] = link_dest
-
-        for path in __opts__['file_roots'][saltenv]:
-            for root, dirs, files in salt.utils.path.os_walk(
-                    path,
-                    followlinks=__opts__['fileserver_followsymlinks']):
-                _add_to(ret['dirs'], path, root, dirs)
-                _add_to(ret['files'], path, root, files)
-
-        ret['files'] = sorted(ret['files'])
-        ret['dirs'] = sorted(ret['dirs'])
-        ret['empty_dirs'] = sorted(ret['empty_dirs'])
+        ret = _list_roots(__opts__['file_roots'][saltenv])
 
         if save_cache:
             try:
@@ -24,6 +24,7 @@ import salt.utils.data
 import salt.utils.event
 import salt.utils.files
 import salt.utils.json
+import salt.utils.key_cache
 import salt.utils.kinds
 import salt.utils.master
 import salt.utils.sdb
@@ -526,19 +527,20 @@ class Key(object):
         for dir_ in key_dirs:
             if dir_ is None:
                 continue
-            ret[os.path.basename(dir_)] = []
-            try:
-                for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(dir_)):
-                    if not fn_.startswith('.'):
-                        if os.path.isfile(os.path.join(dir_, fn_)):
-                            ret[os.path.basename(dir_)].append(
-                                salt.utils.stringutils.to_unicode(fn_)
-                            )
-            except (OSError, IOError):
-                # key dir kind is not created yet, just skip
-                continue
+            ret[os.path.basename(dir_)] = self._list_dir(dir_)
         return ret
 
+    def _list_dir(self, dir_):
+        '''
+        Return the sorted keys in a key directory, from the watched key cache
+        when it matches the directory
+        '''
+        if self.opts.get('key_cache') == 'watch':
+            keys = salt.utils.key_cache.read(self.opts, os.path.basename(dir_))
+            if keys is not None:
+                return keys
+        return salt.utils.key_cache.list_dir(dir_)
+
     def all_keys(self):
         '''
         Merge managed keys with local keys
@@ -554,29 +556,13 @@ class Key(object):
         acc, pre, rej, den = self._check_minions_directories()
         ret = {}
         if match.startswith('acc'):
-            ret[os.path.basename(acc)] = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(acc)):
-                if not fn_.startswith('.'):
-                    if os.path.isfile(os.path.join(acc, fn_)):
-                        ret[os.path.basename(acc)].append(fn_)
+            ret[os.path.basename(acc)] = self._list_dir(acc)
         elif match.startswith('pre') or match.startswith('un'):
-            ret[os.path.basename(pre)] = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(pre)):
-                if not fn_.startswith('.'):
-                    if os.path.isfile(os.path.join(pre, fn_)):
-                        ret[os.path.basename(pre)].append(fn_)
+            ret[os.path.basename(pre)] = self._list_dir(pre)
         elif match.startswith('rej'):
-            ret[os.path.basename(rej)] = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(rej)):
-                if not fn_.startswith('.'):
-                    if os.path.isfile(os.path.join(rej, fn_)):
-                        ret[os.path.basename(rej)].append(fn_)
+            ret[os.path.basename(rej)] = self._list_dir(rej)
         elif match.startswith('den') and den is not None:
-            ret[os.path.basename(den)] = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(den)):
-                if not fn_.startswith('.'):
-                    if os.path.isfile(os.path.join(den, fn_)):
-                        ret[os.path.basename(den)].append(fn_)
+            ret[os.path.basename(den)] = self._list_dir(den)
         elif match.startswith('all'):
             return self.all_keys()
         return ret
@@ -10,6 +10,8 @@ from __future__ import absolute_import, print_function, unicode_literals
 import os
 import re
 import sys
+import shutil
+import hashlib
 import time
 import logging
 import inspect
@@ -23,16 +25,20 @@ from zipimport import zipimporter
 # Import salt libs
 import salt.config
 import salt.defaults.exitcodes
+import salt.payload
 import salt.syspaths
 import salt.utils.args
+import salt.utils.atomicfile
 import salt.utils.context
 import salt.utils.data
 import salt.utils.dictupdate
 import salt.utils.event
 import salt.utils.files
+import salt.utils.json
 import salt.utils.lazy
 import salt.utils.odict
 import salt.utils.platform
+import salt.utils.rendercache
 import salt.utils.versions
 import salt.utils.stringutils
 from salt.exceptions import LoaderError
@@ -67,6 +73,36 @@ log = logging.getLogger(__name__)
 SALT_BASE_PATH = os.path.abspath(salt.syspaths.INSTALL_DIR)
 LOADED_BASE_NAME = 'salt.loaded'
 
+# The options the loader index is kept per, along with the grains. The names
+# the modules provide and the result of their __virtual__ function depend on
+# these, other options change between runs without affecting them.
+INDEX_OPTS = ('__role', 'id', 'proxy', 'file_client')
+
+# The stamp of the import environment by sys.path and PATH, see index_env
+_INDEX_ENV = {}
+
+
+def index_env():
+    '''
+    Return a stamp of the environment the modules are imported in: the
+    modification times of the directories of ``sys.path`` and of ``PATH``.
+    The modules which failed to load are only skipped while it is the same,
+    as installing a library or a command, which a failed ``__virtual__``
+    function may have been missing, changes the directory it is added to.
+    '''
+    dirs = tuple(sys.path) + tuple(os.environ.get('PATH', '').split(os.pathsep))
+    if dirs not in _INDEX_ENV:
+        _INDEX_ENV.clear()
+        mtimes = []
+        for path in dirs:
+            try:
+                mtimes.append(os.stat(path or os.curdir).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        _INDEX_ENV[dirs] = hashlib.sha256(salt.utils.stringutils.to_bytes(
+            repr(list(zip(dirs, mtimes))))).hexdigest()
+    return _INDEX_ENV[dirs]
+
 if USE_IMPORTLIB:
     # pylint: disable=no-member
     MODULE_KIND_SOURCE = 1
@@ -1129,6 +1165,17 @@ class FilterDictWrapper(MutableMapping):
                 yield key.replace(self.suffix, '')
 
 
+def clear_index(opts):
+    '''
+    Remove the loader indexes persisted in the cachedir, so that the next
+    loaders evaluate the __virtual__ function of every module again
+    '''
+    index_dir = os.path.join(opts['cachedir'], 'loader')
+    if os.path.isdir(index_dir):
+        log.debug('Removing the loader indexes in %s', index_dir)
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
 class LazyLoader(salt.utils.lazy.LazyDict):
     '''
     A pseduo-dictionary which has a set of keys which are the
@@ -1233,6 +1280,13 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         self._lock = threading.RLock()
         self._refresh_file_mapping()
 
+        # The persisted index of the modules, see _read_index
+        self.index = None
+        self.index_time_saved = 0.0
+        self._index_skipped = set()
+        if self.opts.get('loader_index', False) and self.virtual_enable:
+            self._read_index()
+
         super(LazyLoader, self).__init__()  # late init the lazy loader
         # create all of the import namespaces
         _generate_module('{0}.int'.format(self.loaded_base_name))
@@ -1268,7 +1322,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         # otherwise we assume its jinja template access
         if mod_name not in self.loaded_modules and not self.loaded:
             for name in self._iter_files(mod_name):
-                if name in self.loaded_files:
+                if name in self.loaded_files or self._index_skip(name, mod_name):
                     continue
                 # if we got what we wanted, we are done
                 if self._load_module(name) and mod_name in self.loaded_modules:
@@ -1471,13 +1525,15 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         '''
         Strip out of the opts any logger instance
         '''
-        if '__grains__' not in self.pack:
-            self.context_dict['grains'] = opts.get('grains', {})
-            self.pack['__grains__'] = salt.utils.context.NamespacedDictWrapper(self.context_dict, 'grains')
+        # Wrapping the grains and pillar does not read them for a render
+        with salt.utils.rendercache.paused():
+            if '__grains__' not in self.pack:
+                self.context_dict['grains'] = opts.get('grains', {})
+                self.pack['__grains__'] = salt.utils.context.NamespacedDictWrapper(self.context_dict, 'grains')
 
-        if '__pillar__' not in self.pack:
-            self.context_dict['pillar'] = opts.get('pillar', {})
-            self.pack['__pillar__'] = salt.utils.context.NamespacedDictWrapper(self.context_dict, 'pillar')
+            if '__pillar__' not in self.pack:
+                self.context_dict['pillar'] = opts.get('pillar', {})
+                self.pack['__pillar__'] = salt.utils.context.NamespacedDictWrapper(self.context_dict, 'pillar')
 
         mod_opts = {}
         for key, val in list(opts.items()):
@@ -1518,6 +1574,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 self._reload_submodules(submodule)
 
     def _load_module(self, name):
+        start = time.time()
         mod = None
         fpath, suffix = self.file_mapping[name][:2]
         self.loaded_files.add(name)
@@ -1693,6 +1750,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     # If a module has information about why it could not be loaded, record it
                     self.missing_modules[module_name] = virtual_err
                     self.missing_modules[name] = virtual_err
+                    self._update_index(name, None, virtual_err, start)
                     return False
         else:
             virtual_aliases = ()
@@ -1710,6 +1768,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     err_string = 'not a proxy_minion enabled module'
                     self.missing_modules[module_name] = err_string
                     self.missing_modules[name] = err_string
+                    self._update_index(name, None, err_string, start)
                     return False
 
         if getattr(mod, '__load__', False) is not False:
@@ -1767,6 +1826,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         for tgt_mod in mod_names:
             self.loaded_modules[tgt_mod] = mod_dict[tgt_mod]
+        self._update_index(name, mod_names, None, start)
         return True
 
     def _load(self, key):
@@ -1794,7 +1854,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
             def _inner_load(mod_name):
                 for name in self._iter_files(mod_name):
-                    if name in self.loaded_files:
+                    if name in self.loaded_files or self._index_skip(name, mod_name):
                         continue
                     # if we got what we wanted, we are done
                     if self._load_module(name) and key in self._dict:
@@ -1819,6 +1879,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                         self._refresh_file_mapping()
                         reloaded = True
                     continue
+            self._write_index()
 
         return ret
 
@@ -1830,15 +1891,165 @@ class LazyLoader(salt.utils.lazy.LazyDict):
             for name in self.file_mapping:
                 if name in self.loaded_files or name in self.missing_modules:
                     continue
+                if self._index_skip(name):
+                    continue
                 self._load_module(name)
 
             self.loaded = True
+            if self.index is not None:
+                log.debug(
+                    'The loader index skipped %d %s modules, saving %.3f '
+                    'seconds', len(self._index_skipped), self.tag,
+                    self.index_time_saved
+                )
+                self._write_index()
 
     def reload_modules(self):
         with self._lock:
             self.loaded_files = set()
             self._load_all()
 
+    def _index_path(self):
+        '''
+        Return the path of the index for this loader. Its name is a hash of
+        the tag, the module directories, the grains and the ``INDEX_OPTS``
+        options, so that a change to any of them uses a new index.
+        '''
+        try:
+            fingerprint = salt.utils.json.dumps(
+                [self.tag, self.module_dirs, self.virtual_funcs,
+                 self.opts.get('grains'),
+                 dict((key, self.opts.get(key)) for key in INDEX_OPTS)],
+                sort_keys=True,
+                default=lambda obj: type(obj).__name__,
+            )
+        except (TypeError, ValueError) as exc:
+            log.debug('Unable to index the %s modules: %s', self.tag, exc)
+            return None
+        return os.path.join(
+            self.opts['cachedir'],
+            'loader',
+            '{0}.p'.format(hashlib.sha256(
+                salt.utils.stringutils.to_bytes(fingerprint)).hexdigest())
+        )
+
+    def _read_index_file(self):
+        '''
+        Return the modules recorded in the index file
+        '''
+        if not os.path.isfile(self.index_path):
+            return {}
+        try:
+            with salt.utils.files.fopen(self.index_path, 'rb') as fp_:
+                return salt.utils.data.decode(
+                    salt.payload.Serial(self.opts).load(fp_))
+        except Exception as exc:  # pylint: disable=broad-except
+            log.debug('Unable to read the loader index %s: %s',
+                      self.index_path, exc)
+            return {}
+
+    def _read_index(self):
+        '''
+        Read the persisted index of the modules. For each name in the file
+        mapping it records the file, its modification time and size, the
+        names the module provides, or the reason why it was not loaded, and
+        the time it took to load it.
+        '''
+        if 'cachedir' not in self.opts:
+            return
+        self.index_path = self._index_path()
+        if self.index_path is None:
+            return
+        self.index = self._read_index_file()
+        self._index_dirty = False
+
+    def _write_index(self):
+        '''
+        Persist the index if modules were loaded since it was read
+        '''
+        if self.index is None or not self._index_dirty:
+            return
+        # Keep the modules recorded by the other processes using this index
+        index = self._read_index_file()
+        index.update(self.index)
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            with salt.utils.files.set_umask(0o077):
+                with salt.utils.atomicfile.atomic_open(self.index_path, 'wb') as fp_:
+                    salt.payload.Serial(self.opts).dump(index, fp_)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the loader index %s: %s',
+                      self.index_path, exc)
+        self._index_dirty = False
+
+    def _index_entry(self, name):
+        '''
+        Return the index entry of a module, if the module file did not change
+        since it was recorded
+        '''
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        fpath = self.file_mapping[name][0]
+        if entry['path'] != fpath:
+            return None
+        try:
+            fstat = os.stat(fpath)
+        except OSError:
+            return None
+        if entry['mtime'] != fstat.st_mtime or entry['size'] != fstat.st_size:
+            return None
+        if entry['names'] is None and entry.get('env') != index_env():
+            # Failed before a change to the import environment, try again
+            return None
+        return entry
+
+    def _index_skip(self, name, mod_name=None):
+        '''
+        Return True if the index shows that the module does not need to be
+        loaded, because it does not provide mod_name or because it failed to
+        load. A module which failed is recorded as missing, as loading it
+        would have done.
+        '''
+        if self.index is None:
+            return False
+        entry = self._index_entry(name)
+        if entry is None:
+            return False
+        if entry['names'] is None:
+            self.missing_modules[name] = entry['error']
+        elif mod_name is None or mod_name in entry['names']:
+            return False
+        if name not in self._index_skipped:
+            self._index_skipped.add(name)
+            self.index_time_saved += entry['time']
+        return True
+
+    def _update_index(self, name, mod_names, error, start):
+        '''
+        Record the outcome of loading a module in the index
+        '''
+        if self.index is None:
+            return
+        fpath = self.file_mapping[name][0]
+        try:
+            fstat = os.stat(fpath)
+        except OSError:
+            return
+        self.index[name] = {
+            'path': fpath,
+            'mtime': fstat.st_mtime,
+            'size': fstat.st_size,
+            'names': mod_names,
+            'error': None if error is None else six.text_type(error),
+            'time': time.time() - start,
+            'env': index_env(),
+        }
+        self._index_skipped.discard(name)
+        self._index_dirty = True
+
     def _apply_outputter(self, func, mod):
         '''
         Apply the __outputter__ variable to the functions
@@ -28,6 +28,7 @@ from salt.utils.zeromq import zmq, ZMQDefaultLoop, install_zmq, ZMQ_VERSION_INFO
 # pylint: enable=import-error,no-name-in-module,redefined-builtin
 
 import salt.ext.tornado.gen  # pylint: disable=F0401
+import salt.ext.tornado.locks  # pylint: disable=F0401
 
 # Import salt libs
 import salt.crypt
@@ -56,6 +57,7 @@ import salt.utils.files
 import salt.utils.gitfs
 import salt.utils.gzip_util
 import salt.utils.jid
+import salt.utils.key_cache
 import salt.utils.job
 import salt.utils.master
 import salt.utils.minions
@@ -90,6 +92,13 @@ try:
 except ImportError:
     HAS_HALITE = False
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    HAS_FUTURES = True
+except ImportError:
+    # The futures backport is not installed on Python 2
+    HAS_FUTURES = False
+
 from salt.ext.tornado.stack_context import StackContext
 from salt.utils.ctx import RequestContext
 
@@ -225,6 +234,7 @@ class Maintenance(salt.utils.process.SignalHandlingProcess):
         # Make Start Times
         last = int(time.time())
         last_git_pillar_update = last
+        last_target_index_sync = 0
 
         git_pillar_update_interval = self.opts.get('git_pillar_update_interval', 0)
         old_present = set()
@@ -241,6 +251,10 @@ class Maintenance(salt.utils.process.SignalHandlingProcess):
             self.handle_key_cache()
             self.handle_presence(old_present)
             self.handle_key_rotate(now)
+            if (now - last_target_index_sync) >= \
+                    self.opts.get('minion_data_cache_index_interval', 60):
+                last_target_index_sync = now
+                self.handle_target_index()
             salt.utils.verify.check_max_open_files(self.opts)
             last = now
             time.sleep(self.loop_interval)
@@ -270,6 +284,18 @@ class Maintenance(salt.utils.process.SignalHandlingProcess):
                 with salt.utils.atomicfile.atomic_open(os.path.join(self.opts['pki_dir'], acc, '.key_cache'), mode='wb') as cache_file:
                     self.serial.dump(keys, cache_file)
 
+    def handle_target_index(self):
+        '''
+        Reconcile the target index with the minion data cache, for the
+        minions cached by other writers
+        '''
+        if self.ckminions.index is None:
+            return
+        try:
+            self.ckminions.index.sync(self.ckminions.cache)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error('Unable to sync the target index: %s', exc)
+
     def handle_key_rotate(self, now):
         '''
         Rotate the AES key rotation
@@ -684,7 +710,11 @@ class Master(SMaster):
                 pub_channels.append(chan)
 
             log.info('Creating master event publisher process')
-            self.process_manager.add_process(salt.utils.event.EventPublisher, args=(self.opts,))
+            for shard in range(salt.utils.event._event_shards(self.opts)):
+                self.process_manager.add_process(
+                    salt.utils.event.EventPublisher,
+                    args=(self.opts,),
+                    kwargs={'shard': shard})
 
             if self.opts.get('reactor'):
                 if isinstance(self.opts['engines'], list):
@@ -706,6 +736,10 @@ class Master(SMaster):
             log.info('Creating master maintenance process')
             self.process_manager.add_process(Maintenance, args=(self.opts,))
 
+            if self.opts['key_cache'] == 'watch':
+                log.info('Creating master key cache watcher process')
+                self.process_manager.add_process(salt.utils.key_cache.KeyCacheWatcher, args=(self.opts,))
+
             if self.opts.get('event_return'):
                 log.info('Creating master event return process')
                 self.process_manager.add_process(salt.utils.event.EventReturn, args=(self.opts,))
@@ -923,17 +957,45 @@ class ReqServer(salt.utils.process.SignalHandlingProcess):
         # manager. We don't want the processes being started to inherit those
         # signal handlers
         with salt.utils.process.default_signals(signal.SIGINT, signal.SIGTERM):
-            for ind in range(int(self.opts['worker_threads'])):
-                name = 'MWorker-{0}'.format(ind)
+            if self.opts.get('worker_pools'):
+                self.__start_worker_pools(kwargs)
+            else:
+                for ind in range(int(self.opts['worker_threads'])):
+                    name = 'MWorker-{0}'.format(ind)
+                    self.process_manager.add_process(MWorker,
+                                                     args=(self.opts,
+                                                           self.master_key,
+                                                           self.key,
+                                                           req_channels,
+                                                           name),
+                                                     kwargs=kwargs,
+                                                     name=name)
+        self.process_manager.run()
+
+    def __start_worker_pools(self, kwargs):
+        '''
+        Start the MWorkers of each worker pool. Their request channels
+        connect to the queue of their pool.
+        '''
+        for pool, conf in sorted(six.iteritems(self.opts['worker_pools'])):
+            pool_opts = dict(self.opts, worker_pool=pool)
+            for key in ('mworker_concurrency', 'mworker_cmd_concurrency'):
+                if key in conf:
+                    pool_opts[key] = conf[key]
+            pool_channels = [salt.transport.server.ReqServerChannel.factory(opts)
+                             for _, opts in iter_transport_opts(pool_opts)]
+            log.info('Starting %s workers for the %s worker pool',
+                     conf['worker_threads'], pool)
+            for ind in range(conf['worker_threads']):
+                name = 'MWorker-{0}-{1}'.format(pool, ind)
                 self.process_manager.add_process(MWorker,
-                                                 args=(self.opts,
+                                                 args=(pool_opts,
                                                        self.master_key,
                                                        self.key,
-                                                       req_channels,
+                                                       pool_channels,
                                                        name),
                                                  kwargs=kwargs,
                                                  name=name)
-        self.process_manager.run()
 
     def run(self):
         '''
@@ -986,6 +1048,7 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
         self.k_mtime = 0
         self.stats = collections.defaultdict(lambda: {'mean': 0, 'runs': 0})
         self.stat_clock = time.time()
+        self.executor = None
 
     # We need __setstate__ and __getstate__ to also pickle 'SMaster.secrets'.
     # Otherwise, 'SMaster.secrets' won't be copied over to the spawned process
@@ -1061,20 +1124,40 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
         '''
         key = payload['enc']
         load = payload['load']
-        ret = {'aes': self._handle_aes,
-               'clear': self._handle_clear}[key](load)
+        if self.executor is not None and key == 'aes':
+            ret = yield self._handle_aes_concurrent(load)
+        else:
+            ret = {'aes': self._handle_aes,
+                   'clear': self._handle_clear}[key](load)
         raise salt.ext.tornado.gen.Return(ret)
 
     def _post_stats(self, start, cmd):
         '''
-        Calculate the master stats and fire events with stat info
+        Calculate the master stats and fire events with stat info. A failure
+        here is logged, it never fails the request.
         '''
+        try:
+            self._record_stats(start, cmd)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error('Failed to record the master stats of %s: %s', cmd, exc)
+
+    def _record_stats(self, start, cmd):
         end = time.time()
         duration = end - start
-        self.stats[cmd]['mean'] = (self.stats[cmd]['mean'] * (self.stats[cmd]['runs'] - 1) + duration) / self.stats[cmd]['runs']
+        # The run is counted along with its duration once it is done, the
+        # stats may be reset meanwhile by a concurrent request
+        stats = self.stats[cmd]
+        stats['runs'] += 1
+        stats['mean'] = (stats['mean'] * (stats['runs'] - 1) + duration) / stats['runs']
         if end - self.stat_clock > self.opts['master_stats_event_iter']:
             # Fire the event with the stats and wipe the tracker
-            self.aes_funcs.event.fire_event({'time': end - self.stat_clock, 'worker': self.name, 'stats': self.stats}, tagify(self.name, 'stats'))
+            data = {'time': end - self.stat_clock, 'worker': self.name, 'stats': self.stats}
+            if self.executor is not None:
+                data['queue'] = dict(self.queue_depth)
+            render_cache_stats = salt.pillar.render_cache_stats()
+            if render_cache_stats is not None:
+                data['pillar_render_cache'] = render_cache_stats
+            self.aes_funcs.event.fire_event(data, tagify(self.name, 'stats'))
             self.stats = collections.defaultdict(lambda: {'mean': 0, 'runs': 0})
             self.stat_clock = end
 
@@ -1092,7 +1175,6 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
             return False
         if self.opts['master_stats']:
             start = time.time()
-            self.stats[cmd]['runs'] += 1
         ret = getattr(self.clear_funcs, cmd)(load), {'fun': 'send_clear'}
         if self.opts['master_stats']:
             self._post_stats(start, cmd)
@@ -1115,7 +1197,6 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
             return False
         if self.opts['master_stats']:
             start = time.time()
-            self.stats[cmd]['runs'] += 1
 
         def run_func(data):
             return self.aes_funcs.run_func(data['cmd'], data)
@@ -1129,6 +1210,82 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
             self._post_stats(start, cmd)
         return ret
 
+    @salt.ext.tornado.gen.coroutine
+    def _handle_aes_concurrent(self, data):
+        '''
+        Process a command sent via an AES key in the thread pool, once the
+        worker and the command have a free slot
+
+        :param dict data: Decrypted payload
+        :return: The result of passing the load to a function in AESFuncs corresponding to
+                 the command specified in the load's 'cmd' key.
+        '''
+        if 'cmd' not in data:
+            log.error('Received malformed command %s', data)
+            raise salt.ext.tornado.gen.Return({})
+        cmd = data['cmd']
+        log.trace('AES payload received with command %s', data['cmd'])
+        if cmd.startswith('__'):
+            raise salt.ext.tornado.gen.Return(False)
+
+        depth = self.queue_depth[cmd]
+        depth['waiting'] += 1
+        depth['max_waiting'] = max(depth['max_waiting'], depth['waiting'])
+        # Take the command slot first, so that requests waiting for a busy
+        # command don't hold the slots other commands could run in
+        slots = [slot for slot in (self.cmd_slots.get(cmd), self.request_slots)
+                 if slot is not None]
+        for slot in slots:
+            yield slot.acquire()
+        depth['waiting'] -= 1
+        depth['running'] += 1
+
+        if self.opts['master_stats']:
+            start = time.time()
+        try:
+            ret = yield self.executor.submit(self._run_aes_func, data)
+        finally:
+            depth['running'] -= 1
+            for slot in slots:
+                slot.release()
+        if self.opts['master_stats']:
+            self._post_stats(start, cmd)
+        raise salt.ext.tornado.gen.Return(ret)
+
+    def _run_aes_func(self, data):
+        '''
+        Run an AESFuncs command in a thread of the pool. AESFuncs is not
+        thread safe, each thread has its own instance.
+        '''
+        aes_funcs = getattr(self._thread_state, 'aes_funcs', None)
+        if aes_funcs is None:
+            aes_funcs = self._thread_state.aes_funcs = AESFuncs(self.opts)
+        with RequestContext({'data': data, 'opts': self.opts}):
+            return aes_funcs.run_func(data['cmd'], data)
+
+    def _setup_concurrency(self):
+        '''
+        Set up the thread pool and the slots used to process several AES
+        requests at once, if ``mworker_concurrency`` is above 1
+        '''
+        concurrency = int(self.opts.get('mworker_concurrency', 1))
+        if concurrency <= 1:
+            return
+        if not HAS_FUTURES:
+            log.warning(
+                'mworker_concurrency requires the futures library, %s '
+                'processes one request at a time', self.name
+            )
+            return
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._thread_state = threading.local()
+        self.request_slots = salt.ext.tornado.locks.Semaphore(concurrency)
+        self.cmd_slots = {}
+        for cmd, limit in six.iteritems(self.opts.get('mworker_cmd_concurrency') or {}):
+            self.cmd_slots[cmd] = salt.ext.tornado.locks.Semaphore(max(int(limit), 1))
+        self.queue_depth = collections.defaultdict(
+            lambda: {'waiting': 0, 'running': 0, 'max_waiting': 0})
+
     def run(self):
         '''
         Start a Master Worker
@@ -1140,6 +1297,7 @@ class MWorker(salt.utils.process.SignalHandlingProcess):
            )
         self.aes_funcs = AESFuncs(self.opts)
         salt.utils.crypt.reinit_crypto()
+        self._setup_concurrency()
         self.__bind()
 
 
@@ -1183,6 +1341,7 @@ class AESFuncs(object):
         import salt.fileserver
         self.fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = self.fs_.serve_file
+        self._serve_files = self.fs_.serve_files
         self._file_find = self.fs_._find_file
         self._file_hash = self.fs_.file_hash
         self._file_hash_and_stat = self.fs_.file_hash_and_stat
@@ -1544,10 +1703,11 @@ class AESFuncs(object):
         data = pillar.compile_pillar()
         self.fs_.update_opts()
         if self.opts.get('minion_data_cache', False):
+            mdata = {'grains': load['grains'], 'pillar': data}
             self.masterapi.cache.store('minions/{0}'.format(load['id']),
                                        'data',
-                                       {'grains': load['grains'],
-                                        'pillar': data})
+                                       mdata)
+            self.ckminions.update_index(load['id'], mdata)
             if self.opts.get('minion_data_cache_events') is True:
                 self.event.fire_event({'Minion data cache refresh': load['id']}, tagify(load['id'], 'refresh', 'minion'))
         return data
@@ -2139,7 +2299,7 @@ class ClearFuncs(object):
 
         # Send it!
         self._send_ssh_pub(payload, ssh_minions=ssh_minions)
-        self._send_pub(payload)
+        self._send_pub(payload, minions)
 
         return {
             'enc': 'clear',
@@ -2193,13 +2353,14 @@ class ClearFuncs(object):
             return {'error': msg}
         return jid
 
-    def _send_pub(self, load):
+    def _send_pub(self, load, minions=None):
         '''
-        Take a load and send it across the network to connected minions
+        Take a load and send it across the network to connected minions,
+        passing along the minions its target was resolved to
         '''
         for transport, opts in iter_transport_opts(self.opts):
             chan = salt.transport.server.PubServerChannel.factory(opts)
-            chan.publish(load)
+            chan.publish(load, minions=minions)
 
     @property
     def ssh_client(self):
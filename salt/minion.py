@@ -68,6 +68,7 @@ import salt.beacons
 import salt.engines
 import salt.payload
 import salt.pillar
+import salt.state
 import salt.syspaths
 import salt.utils.args
 import salt.utils.context
@@ -1097,6 +1098,173 @@ class MinionManager(MinionBase):
             minion.destroy()
 
 
+class JobWorker(salt.utils.process.SignalHandlingProcess):
+    '''
+    A process forked from the minion which loads the modules once and runs the
+    jobs it receives over a pipe, one at a time
+    '''
+    def __init__(self, minion, conn, parent_conn, **kwargs):
+        super(JobWorker, self).__init__(**kwargs)
+        self.minion = minion
+        self.conn = conn
+        self.parent_conn = parent_conn
+
+    def run(self):
+        # Only the minion holds the other end, so that recv fails if it exits
+        self.parent_conn.close()
+        minion = self.minion
+        minion.gen_modules()
+        minion.in_job_worker = True
+        while True:
+            try:
+                job = self.conn.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            data, minion.connected = job
+            try:
+                minion._target(minion, minion.opts, data, minion.connected)
+            except Exception:  # pylint: disable=broad-except
+                log.exception('%s failed to run job %s', self.name, data['jid'])
+            finally:
+                # The proc file of the job is not removed when the job was not
+                # returned, and this process keeps running
+                fn_ = os.path.join(minion.proc_dir, data['jid'])
+                try:
+                    os.remove(fn_)
+                except (OSError, IOError):
+                    pass
+            self.conn.send(data['jid'])
+
+
+class JobWorkerPool(object):
+    '''
+    The pool of JobWorker processes of a minion, forked as jobs arrive up to
+    ``job_workers`` processes.
+
+    Each job is sent to an idle worker, or is left to a new process when all of
+    them are busy. A worker is replaced after ``job_worker_max_jobs`` jobs, and
+    after refresh is called or the master changes.
+    '''
+    def __init__(self, minion):
+        self.minion = minion
+        self.size = minion.opts['job_workers']
+        process_count_max = minion.opts.get('process_count_max', -1)
+        if 0 < process_count_max < self.size:
+            log.warning(
+                'Limiting job_workers to the process_count_max of %s',
+                process_count_max
+            )
+            self.size = process_count_max
+        self.max_jobs = minion.opts.get('job_worker_max_jobs', 0)
+        # The workers forked before the last refresh are replaced once idle
+        self.generation = 0
+        self.workers = {}
+        self._master_uri = minion.opts.get('master_uri')
+        self._count = 0
+
+    def refresh(self):
+        '''
+        Replace the workers, which were forked with the previous modules and
+        pillar of the minion
+        '''
+        self.generation += 1
+        for worker in list(self.workers.values()):
+            if not worker['busy']:
+                self._stop(worker)
+
+    def dispatch(self, data):
+        '''
+        Send a job to an idle worker, forking one if the pool is not full.
+        Returns False if the job could not be sent.
+        '''
+        if self.minion.opts.get('master_uri') != self._master_uri:
+            self._master_uri = self.minion.opts.get('master_uri')
+            self.refresh()
+        for worker in list(self.workers.values()):
+            if not worker['busy']:
+                break
+        else:
+            if len(self.workers) >= self.size:
+                log.debug('All the job workers are busy')
+                return False
+            worker = self._spawn()
+        try:
+            worker['conn'].send((data, self.minion.connected))
+        except (IOError, OSError) as exc:
+            log.warning(
+                'Unable to send job %s to %s: %s',
+                data['jid'], worker['process'].name, exc
+            )
+            self._stop(worker)
+            return False
+        worker['busy'] = True
+        worker['jobs'] += 1
+        log.debug('Sent job %s to %s', data['jid'], worker['process'].name)
+        return True
+
+    def stop(self):
+        '''
+        Stop all the workers, once their current job is done
+        '''
+        for worker in list(self.workers.values()):
+            self._stop(worker)
+
+    def _spawn(self):
+        self._count += 1
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = JobWorker(
+            self.minion,
+            child_conn,
+            parent_conn,
+            name='JobWorker-{0}'.format(self._count),
+        )
+        process._after_fork_methods.append((salt.utils.crypt.reinit_crypto, [], {}))
+        with default_signals(signal.SIGINT, signal.SIGTERM):
+            process.start()
+        child_conn.close()
+        self.minion.subprocess_list.add(process)
+        worker = {'process': process,
+                  'conn': parent_conn,
+                  'generation': self.generation,
+                  'jobs': 0,
+                  'busy': False}
+        self.workers[parent_conn.fileno()] = worker
+        self.minion.io_loop.add_handler(
+            parent_conn.fileno(),
+            self._handle_done,
+            salt.ext.tornado.ioloop.IOLoop.READ,
+        )
+        return worker
+
+    def _stop(self, worker):
+        fd_ = worker['conn'].fileno()
+        self.minion.io_loop.remove_handler(fd_)
+        self.workers.pop(fd_, None)
+        try:
+            worker['conn'].send(None)
+        except (IOError, OSError):
+            # The worker exited already
+            pass
+        worker['conn'].close()
+
+    def _handle_done(self, fd_, events):
+        worker = self.workers.get(fd_)
+        if worker is None:
+            return
+        try:
+            worker['conn'].recv()
+        except (EOFError, IOError, OSError):
+            log.warning('%s exited', worker['process'].name)
+            self._stop(worker)
+            return
+        worker['busy'] = False
+        if worker['generation'] != self.generation or \
+                0 < self.max_jobs <= worker['jobs']:
+            self._stop(worker)
+
+
 class Minion(MinionBase):
     '''
     This class instantiates a minion, runs connections for a minion,
@@ -1122,6 +1290,17 @@ class Minion(MinionBase):
         self.ready = False
         self.jid_queue = [] if jid_queue is None else jid_queue
         self.periodic_callbacks = {}
+        # The jobs seen running by the previous fire_job_heartbeats call
+        self._heartbeat_jids = set()
+        self.job_workers = None
+        if self.opts.get('job_workers', 0) > 0:
+            if not self.opts.get('multiprocessing', True) or salt.utils.platform.is_windows():
+                log.warning(
+                    'Ignoring job_workers, which requires multiprocessing '
+                    'and is not available on Windows'
+                )
+            else:
+                self.job_workers = JobWorkerPool(self)
 
         if io_loop is None:
             install_zmq()
@@ -1512,6 +1691,8 @@ class Minion(MinionBase):
                 self.functions, self.returners, self.function_errors, self.executors = self._load_modules()
                 self.schedule.functions = self.functions
                 self.schedule.returners = self.returners
+                if self.job_workers is not None:
+                    self.job_workers.refresh()
 
         process_count_max = self.opts.get('process_count_max')
         if process_count_max > 0:
@@ -1521,6 +1702,9 @@ class Minion(MinionBase):
                 yield salt.ext.tornado.gen.sleep(10)
                 process_count = len(salt.utils.minion.running(self.opts))
 
+        if self.job_workers is not None and self.job_workers.dispatch(data):
+            return
+
         # We stash an instance references to allow for the socket
         # communication in Windows. You can't pickle functions, and thus
         # python needs to be able to reconstruct the reference on the other
@@ -1611,11 +1795,13 @@ class Minion(MinionBase):
         This method should be used as a threading target, start the actual
         minion side execution.
         '''
-        minion_instance.gen_modules()
+        # A job worker keeps the modules it loaded when it started, and runs
+        # several jobs
+        if not getattr(minion_instance, 'in_job_worker', False):
+            minion_instance.gen_modules()
+            salt.utils.process.appendproctitle('{0}._thread_return {1}'.format(cls.__name__, data['jid']))
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
 
-        salt.utils.process.appendproctitle('{0}._thread_return {1}'.format(cls.__name__, data['jid']))
-
         sdata = {'pid': os.getpid()}
         sdata.update(data)
         log.info('Starting a new job %s with PID %s', data['jid'], sdata['pid'])
@@ -1826,11 +2012,13 @@ class Minion(MinionBase):
         This method should be used as a threading target, start the actual
         minion side execution.
         '''
-        minion_instance.gen_modules()
+        # A job worker keeps the modules it loaded when it started, and runs
+        # several jobs
+        if not getattr(minion_instance, 'in_job_worker', False):
+            minion_instance.gen_modules()
+            salt.utils.process.appendproctitle('{0}._thread_multi_return {1}'.format(cls.__name__, data['jid']))
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
 
-        salt.utils.process.appendproctitle('{0}._thread_multi_return {1}'.format(cls.__name__, data['jid']))
-
         sdata = {'pid': os.getpid()}
         sdata.update(data)
         log.info('Starting a new job with PID %s', sdata['pid'])
@@ -2176,10 +2364,13 @@ class Minion(MinionBase):
         Refresh the functions and returners.
         '''
         log.debug('Refreshing modules. Notify=%s', notify)
+        salt.loader.clear_index(self.opts)
         self.functions, self.returners, _, self.executors = self._load_modules(force_refresh, notify=notify)
 
         self.schedule.functions = self.functions
         self.schedule.returners = self.returners
+        if self.job_workers is not None:
+            self.job_workers.refresh()
 
     def beacons_refresh(self):
         '''
@@ -2222,6 +2413,9 @@ class Minion(MinionBase):
                           'One or more masters may be down!')
             finally:
                 async_pillar.destroy()
+            salt.state.clear_highstate_cache(self.opts)
+            if self.job_workers is not None:
+                self.job_workers.refresh()
         self.matchers_refresh()
         self.beacons_refresh()
         evt = salt.utils.event.get_event('minion', opts=self.opts)
@@ -2561,6 +2755,33 @@ class Minion(MinionBase):
                 log.debug('Firing beacons to master')
                 self._fire_master(events=data['beacons'])
 
+    def fire_job_heartbeats(self):
+        '''
+        Fire an event on the master for each job running since the previous
+        call, so clients waiting on the job know this minion still runs it
+        without publishing saltutil.find_job
+        '''
+        jids = set()
+        events = []
+        for data in salt.utils.minion.running(self.opts):
+            jid = data.get('jid')
+            if not jid:
+                continue
+            jids.add(jid)
+            if jid not in self._heartbeat_jids:
+                # Just started, the job may be done before the next call
+                continue
+            events.append({
+                'tag': salt.utils.event.tagify([jid, 'heartbeat', self.opts['id']], 'job'),
+                'data': {'id': self.opts['id'],
+                         'jid': jid,
+                         'fun': data.get('fun'),
+                         'pid': data.get('pid'),
+                         'heartbeat': self.opts['job_heartbeat_interval']}})
+        self._heartbeat_jids = jids
+        if events:
+            self._fire_master(events=events, sync=False)
+
     def cleanup_subprocesses(self):
         '''
         Clean up subprocesses and spawned threads.
@@ -2753,6 +2974,11 @@ class Minion(MinionBase):
             self.remove_periodic_callback('ping')
             self.add_periodic_callback('ping', ping_master, ping_interval)
 
+        if self.opts['job_heartbeat_interval'] > 0 and self.connected:
+            self.remove_periodic_callback('job_heartbeat')
+            self.add_periodic_callback('job_heartbeat', self.fire_job_heartbeats,
+                                       self.opts['job_heartbeat_interval'])
+
         # add handler to subscriber
         if hasattr(self, 'pub_channel') and self.pub_channel is not None:
             self.pub_channel.on_recv(self._handle_payload)
@@ -2828,6 +3054,8 @@ class Minion(MinionBase):
         if hasattr(self, 'periodic_callbacks'):
             for cb in six.itervalues(self.periodic_callbacks):
                 cb.stop()
+        if getattr(self, 'job_workers', None) is not None:
+            self.job_workers.stop()
 
     # pylint: disable=W1701
     def __del__(self):
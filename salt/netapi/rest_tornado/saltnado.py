@@ -240,6 +240,7 @@ def _json_dumps(obj, **kwargs):
 # # all of these require coordinating minion stuff
 #  - "local" (done)
 #  - "local_async" (done)
+#  - "local_batch" (done)
 
 # # master side
 #  - "runner" (done)
@@ -432,6 +433,8 @@ class BaseSaltAPIHandler(salt.ext.tornado.web.RequestHandler):  # pylint: disabl
                 'local': local_client.run_job_async,
                 # not the actual client we'll use.. but its what we'll use to get args
                 'local_async': local_client.run_job_async,
+                # driven by salt.cli.batch.BatchAsync
+                'local_batch': None,
                 'runner': salt.runner.RunnerClient(opts=self.application.opts).cmd_async,
                 'runner_async': None,  # empty, since we use the same client as `runner`
                 }
@@ -1117,6 +1120,35 @@ class SaltAPIHandler(BaseSaltAPIHandler):  # pylint: disable=W0223
 
         raise salt.ext.tornado.gen.Return(pub_data)
 
+    @salt.ext.tornado.gen.coroutine
+    def _disbatch_local_batch(self, chunk):
+        '''
+        Disbatch local client batch commands with the batch engine
+        '''
+        # Late import - not used anywhere else in this file
+        import salt.cli.batch
+
+        opts = copy(self.application.opts)
+        opts.update({
+            'tgt': chunk['tgt'],
+            'fun': chunk['fun'],
+            'arg': salt.utils.args.condition_input(chunk.get('arg', []),
+                                                   chunk.get('kwarg')),
+            'tgt_type': chunk.get('tgt_type', 'glob'),
+            'return': chunk.get('ret', ''),
+            'batch': chunk.get('batch', '10%'),
+        })
+        for key in ('timeout', 'gather_job_timeout', 'batch_wait'):
+            if key in chunk:
+                opts[key] = int(chunk[key])
+        eauth = dict((key, chunk[key])
+                     for key in ('eauth', 'username', 'password', 'token')
+                     if key in chunk)
+        batch = salt.cli.batch.BatchAsync(
+            opts, eauth=eauth, io_loop=salt.ext.tornado.ioloop.IOLoop.current())
+        ret = yield batch.run()
+        raise salt.ext.tornado.gen.Return(ret)
+
     @salt.ext.tornado.gen.coroutine
     def _disbatch_runner(self, chunk):
         '''
@@ -12,10 +12,13 @@ import collections
 import logging
 import salt.ext.tornado.gen
 import sys
+import threading
+import time
 import traceback
 import inspect
 
 # Import salt libs
+import salt.cache
 import salt.loader
 import salt.fileclient
 import salt.minion
@@ -25,6 +28,7 @@ import salt.utils.cache
 import salt.utils.crypt
 import salt.utils.data
 import salt.utils.dictupdate
+import salt.utils.rendercache
 import salt.utils.url
 from salt.exceptions import SaltClientError
 from salt.template import compile_template
@@ -38,8 +42,22 @@ from salt.utils.dictupdate import merge
 # Import 3rd-party libs
 from salt.ext import six
 
+try:
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError
+    HAS_FUTURES = True
+except ImportError:
+    # The futures backport is not installed on Python 2
+    HAS_FUTURES = False
+
 log = logging.getLogger(__name__)
 
+# The cache of rendered pillar SLS files shared by the Pillar objects of a
+# master process
+_RENDER_CACHE = None
+
+# The cache of the external pillar data shared by the master processes
+_EXT_PILLAR_CACHE = None
+
 
 def get_pillar(opts, grains, minion_id, saltenv=None, ext=None, funcs=None,
                pillar_override=None, pillarenv=None, extra_minion_data=None):
@@ -270,6 +288,32 @@ class RemotePillar(RemotePillarMixin):
     # pylint: enable=W1701
 
 
+def render_cache_stats():
+    '''
+    Return the hits, misses, hit rate and render time saved of the rendered
+    pillar SLS cache of this process, or None if it is not used.
+    '''
+    if _RENDER_CACHE is None:
+        return None
+    return _RENDER_CACHE.get_stats()
+
+
+def _render_cache(opts, functions):
+    '''
+    Return the rendered pillar SLS cache when it applies to these opts
+    '''
+    global _RENDER_CACHE  # pylint: disable=global-statement
+    # The grains read by the execution modules are only tracked when the
+    # Pillar loads its own modules on the master
+    if not opts.get('pillar_render_cache') or functions is not None \
+            or opts.get('__role') != 'master':
+        return None
+    if _RENDER_CACHE is None:
+        _RENDER_CACHE = salt.utils.rendercache.RenderCache(
+            opts.get('pillar_render_cache_size', 1000))
+    return _RENDER_CACHE
+
+
 class PillarCache(object):
     '''
     Return a cached pillar if it exists, otherwise cache it.
@@ -376,6 +420,17 @@ class Pillar(object):
         self.client = salt.fileclient.get_file_client(self.opts, True)
         self.avail = self.__gather_avail()
 
+        self.render_cache = _render_cache(opts, functions)
+        if self.render_cache is not None:
+            # Record the grains and pillar keys read by the renders
+            grains = self.opts['grains'] = salt.utils.rendercache.TrackedDict(
+                'grains', self.opts['grains'])
+            if isinstance(self.opts.get('pillar'), dict):
+                self.opts['pillar'] = salt.utils.rendercache.TrackedDict(
+                    'pillar', self.opts['pillar'])
+                if opts.get('file_client', '') == 'local':
+                    opts['pillar'] = self.opts['pillar']
+
         if opts.get('file_client', '') == 'local':
             opts['grains'] = grains
 
@@ -401,6 +456,7 @@ class Pillar(object):
             self.merge_strategy = opts['pillar_source_merging_strategy']
 
         self.ext_pillars = salt.loader.pillars(ext_pillar_opts, self.functions)
+        self.ext_pillar_timing = []
         self.ignored_pillars = {}
         self.pillar_override = pillar_override or {}
         if not isinstance(self.pillar_override, dict):
@@ -504,6 +560,41 @@ class Pillar(object):
             envs.update(list(self.opts['pillar_roots']))
         return envs
 
+    def _compile_template(self, template, saltenv, sls='', **defaults):
+        '''
+        Render a pillar SLS or top file, through the rendered pillar SLS cache
+        when it is enabled
+        '''
+        def _compile():
+            return compile_template(template,
+                                    self.rend,
+                                    self.opts['renderer'],
+                                    self.opts['renderer_blacklist'],
+                                    self.opts['renderer_whitelist'],
+                                    saltenv,
+                                    sls,
+                                    _pillar_rend=True,
+                                    **defaults)
+
+        if self.render_cache is None or not template or not os.path.isfile(template):
+            return _compile()
+        key = (template, saltenv, sls, self.opts['renderer'],
+               salt.utils.rendercache.data_digest(defaults))
+        sources = {
+            'grains': self.opts['grains'],
+            'pillar': self.opts.get('pillar', {}),
+            'opts': dict((opt, self.opts.get(opt))
+                         for opt in ('id', 'saltenv', 'pillarenv')),
+        }
+        return self.render_cache.render(
+            key,
+            template,
+            sources,
+            _compile,
+            self.opts['renderer'],
+            self.opts['pillar_render_cache_renderers'],
+            self.opts['pillar_render_cache_functions'])
+
     def get_tops(self):
         '''
         Gather the top files
@@ -534,15 +625,7 @@ class Pillar(object):
             for saltenv in saltenvs:
                 top = self.client.cache_file(self.opts['state_top'], saltenv)
                 if top:
-                    tops[saltenv].append(compile_template(
-                        top,
-                        self.rend,
-                        self.opts['renderer'],
-                        self.opts['renderer_blacklist'],
-                        self.opts['renderer_whitelist'],
-                        saltenv=saltenv,
-                        _pillar_rend=True,
-                    ))
+                    tops[saltenv].append(self._compile_template(top, saltenv))
         except Exception as exc:  # pylint: disable=broad-except
             errors.append(
                     ('Rendering Primary Top file failed, render error:\n{0}'
@@ -569,17 +652,12 @@ class Pillar(object):
                         continue
                     try:
                         tops[saltenv].append(
-                                compile_template(
+                                self._compile_template(
                                     self.client.get_state(
                                         sls,
                                         saltenv
                                         ).get('dest', False),
-                                    self.rend,
-                                    self.opts['renderer'],
-                                    self.opts['renderer_blacklist'],
-                                    self.opts['renderer_whitelist'],
-                                    saltenv=saltenv,
-                                    _pillar_rend=True,
+                                    saltenv,
                                     )
                                 )
                     except Exception as exc:  # pylint: disable=broad-except
@@ -734,15 +812,7 @@ class Pillar(object):
                 return None, mods, errors
         state = None
         try:
-            state = compile_template(fn_,
-                                     self.rend,
-                                     self.opts['renderer'],
-                                     self.opts['renderer_blacklist'],
-                                     self.opts['renderer_whitelist'],
-                                     saltenv,
-                                     sls,
-                                     _pillar_rend=True,
-                                     **defaults)
+            state = self._compile_template(fn_, saltenv, sls, **defaults)
         except Exception as exc:  # pylint: disable=broad-except
             msg = 'Rendering SLS \'{0}\' failed, render error:\n{1}'.format(
                 sls, exc
@@ -889,6 +959,40 @@ class Pillar(object):
         '''
         Builds actual pillar data structure and updates the ``pillar`` variable
         '''
+        cache_conf = (self.opts.get('ext_pillar_cache') or {}).get(key)
+        if not cache_conf:
+            return self._call_external_pillar(pillar, val, key)
+        if not isinstance(cache_conf, dict):
+            cache_conf = {}
+        global _EXT_PILLAR_CACHE  # pylint: disable=global-statement
+        if _EXT_PILLAR_CACHE is None:
+            _EXT_PILLAR_CACHE = salt.cache.CallCache(
+                self.opts,
+                'ext_pillar',
+                stats_dir=os.path.join(self.opts['cachedir'], 'ext_pillar_cache_stats'))
+        inputs = []
+        for name in cache_conf.get('key', ['minion_id']):
+            if name == 'minion_id':
+                inputs.append(self.minion_id)
+            elif name.startswith('grains:'):
+                inputs.append(salt.utils.data.traverse_dict_and_list(
+                    self.opts['grains'], name[7:]))
+            elif name.startswith('pillar:'):
+                inputs.append(salt.utils.data.traverse_dict_and_list(
+                    pillar, name[7:]))
+            else:
+                inputs.append(self.opts.get(name))
+        return _EXT_PILLAR_CACHE.call(
+            key,
+            [val, inputs],
+            lambda: self._call_external_pillar(pillar, val, key),
+            cache_conf.get('ttl', 300),
+            lock_timeout=cache_conf.get('lock_timeout', 30))
+
+    def _call_external_pillar(self, pillar, val, key):
+        '''
+        Call an external pillar
+        '''
         ext = None
         args = salt.utils.args.get_function_argspec(self.ext_pillars[key]).args
 
@@ -962,6 +1066,16 @@ class Pillar(object):
                 self.opts.get('renderer', 'yaml'),
                 self.opts.get('pillar_merge_lists', False))
 
+        concurrency = int(self.opts.get('ext_pillar_concurrency', 1))
+        if concurrency > 1 and not HAS_FUTURES:
+            log.warning(
+                'ext_pillar_concurrency requires the futures library, the '
+                'external pillars are evaluated one at a time'
+            )
+            concurrency = 1
+        if concurrency > 1:
+            return self._ext_pillar_concurrent(pillar, errors, concurrency)
+
         for run in self.opts['ext_pillar']:
             if not isinstance(run, dict):
                 errors.append('The "ext_pillar" option is malformed')
@@ -976,11 +1090,14 @@ class Pillar(object):
                         key
                     )
                     continue
+                start = time.time()
                 try:
                     ext = self._external_pillar_data(pillar,
                                                      val,
                                                      key)
+                    self._ext_pillar_time(key, time.time() - start)
                 except Exception as exc:  # pylint: disable=broad-except
+                    self._ext_pillar_time(key, time.time() - start, 'failed')
                     errors.append(
                         'Failed to load ext_pillar {0}: {1}'.format(
                             key,
@@ -1001,6 +1118,142 @@ class Pillar(object):
                 ext = None
         return pillar, errors
 
+    def _ext_pillar_time(self, key, duration, error=None):
+        '''
+        Record the time spent evaluating an external pillar
+        '''
+        timing = {'name': key, 'time': round(duration, 3)}
+        if error:
+            timing['error'] = error
+        self.ext_pillar_timing.append(timing)
+        log.debug('ext_pillar %s evaluated in %.3fs', key, duration)
+
+    def _ext_pillar_timeout(self, key):
+        '''
+        Return the timeout of an external pillar, in seconds, or None
+        '''
+        timeouts = self.opts.get('ext_pillar_timeouts') or {}
+        timeout = timeouts.get(key, self.opts.get('ext_pillar_timeout', 0))
+        return timeout or None
+
+    def _ext_pillar_concurrent(self, pillar, errors, concurrency):
+        '''
+        Evaluate the external pillars in a pool of threads and merge their
+        data in the configured order. The sources listed in
+        ``ext_pillar_ordered`` are only evaluated once the sources above them
+        are, with the pillar data merged so far.
+        '''
+        runs = []
+        for run in self.opts['ext_pillar']:
+            if not isinstance(run, dict):
+                errors.append('The "ext_pillar" option is malformed')
+                log.critical(errors[-1])
+                return {}, errors
+            if next(six.iterkeys(run)) in self.opts.get('exclude_ext_pillar', []):
+                continue
+            for key, val in six.iteritems(run):
+                if key not in self.ext_pillars:
+                    log.critical(
+                        'Specified ext_pillar interface %s is unavailable',
+                        key
+                    )
+                    continue
+                runs.append((key, val))
+
+        ordered = self.opts.get('ext_pillar_ordered') or []
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        # The timeouts of the sources which timed out and keep their thread
+        hung = []
+        try:
+            pending = []
+            for key, val in runs:
+                if key in ordered and pending:
+                    pillar = self._merge_ext_pillars(pillar, pending, errors, hung)
+                    pending = []
+                # Each source gets its own copy, as it may alter it
+                started = {'event': threading.Event(), 'time': None}
+                pending.append((key, started, executor.submit(
+                    self._timed_external_pillar_data,
+                    copy.deepcopy(pillar), val, key, started)))
+            pillar = self._merge_ext_pillars(pillar, pending, errors, hung)
+        finally:
+            # Do not wait for the sources which timed out
+            executor.shutdown(wait=False)
+        return pillar, errors
+
+    def _timed_external_pillar_data(self, pillar, val, key, started):
+        '''
+        Return the data of an external pillar and the time spent getting it.
+        The time it starts is recorded in ``started`` for the caller.
+        '''
+        started['time'] = time.time()
+        started['event'].set()
+        ext = self._external_pillar_data(pillar, val, key)
+        return ext, time.time() - started['time']
+
+    def _merge_ext_pillars(self, pillar, pending, errors, hung):
+        '''
+        Wait for the external pillars evaluated in the thread pool and merge
+        their data into the pillar, in order. The timeouts of the sources
+        which time out are added to hung.
+        '''
+        for key, started, future in pending:
+            timeout = self._ext_pillar_timeout(key)
+            # Only the time the source runs counts against its timeout, not
+            # the time it waits for a thread of the pool. The sources ahead of
+            # it returned or timed out by now, and the ones which timed out may
+            # keep their thread forever, so it gets its timeout, or the longest
+            # timeout of those, to start.
+            start_timeout = timeout
+            if start_timeout is None and hung:
+                start_timeout = max(hung)
+            if not started['event'].wait(start_timeout) and future.cancel():
+                self._ext_pillar_time(key, start_timeout, 'timeout')
+                errors.append(
+                    'ext_pillar {0} timed out after {1} seconds waiting for '
+                    'a thread'.format(key, start_timeout)
+                )
+                log.error(errors[-1])
+                continue
+            started['event'].wait()
+            if timeout is not None:
+                timeout = max(started['time'] + timeout - time.time(), 0)
+            try:
+                ext, duration = future.result(timeout=timeout)
+            except TimeoutError:
+                future.cancel()
+                hung.append(self._ext_pillar_timeout(key))
+                self._ext_pillar_time(key, time.time() - started['time'], 'timeout')
+                errors.append(
+                    'ext_pillar {0} timed out after {1} seconds'.format(
+                        key, self._ext_pillar_timeout(key)
+                    )
+                )
+                log.error(errors[-1])
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                self._ext_pillar_time(key, time.time() - started['time'], 'failed')
+                errors.append(
+                    'Failed to load ext_pillar {0}: {1}'.format(
+                        key,
+                        exc.__str__(),
+                    )
+                )
+                log.error(
+                    'Exception caught loading ext_pillar \'%s\':\n%s',
+                    key, ''.join(traceback.format_tb(sys.exc_info()[2]))
+                )
+                continue
+            self._ext_pillar_time(key, duration)
+            if ext:
+                pillar = merge(
+                    pillar,
+                    ext,
+                    self.merge_strategy,
+                    self.opts.get('renderer', 'yaml'),
+                    self.opts.get('pillar_merge_lists', False))
+        return pillar
+
     def compile_pillar(self, ext=True):
         '''
         Render the pillar data and return
@@ -1009,6 +1262,11 @@ class Pillar(object):
         if ext:
             if self.opts.get('ext_pillar_first', False):
                 self.opts['pillar'], errors = self.ext_pillar(self.pillar_override)
+                if self.render_cache is not None:
+                    # Keep recording the pillar keys read by the renders, the
+                    # ext_pillar data differs between minions
+                    self.opts['pillar'] = salt.utils.rendercache.TrackedDict(
+                        'pillar', self.opts['pillar'])
                 self.rend = salt.loader.render(self.opts, self.functions)
                 matches = self.top_matches(top, reload=True)
                 pillar, errors = self.render_pillar(matches, errors=errors)
@@ -1043,6 +1301,8 @@ class Pillar(object):
             for error in errors:
                 log.critical('Pillar render error: %s', error)
             pillar['_errors'] = errors
+        if self.opts.get('ext_pillar_timing', False) and self.ext_pillar_timing:
+            pillar['_ext_pillar_timing'] = self.ext_pillar_timing
 
         if self.pillar_override:
             pillar = merge(
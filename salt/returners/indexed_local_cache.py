@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+'''
+Return data to the local job cache, keeping an index of the cached jobs
+
+.. versionadded:: Sodium
+
+This returner stores loads and returns exactly like :mod:`local_cache
+<salt.returners.local_cache>` does, so the on-disk layout under
+``<cachedir>/jobs`` is unchanged. In addition every job is recorded in an
+embedded sqlite3 index (``<cachedir>/jobs_index.db`` by default) holding the
+jid, function, creation time and the formatted job information. Listing the
+most recent jobs, listing jobs by function and expiring old jobs are answered
+from the index instead of walking every hashed jid directory, which keeps
+``jobs.list_jobs``, ``jobs.list_jobs_filter`` and the maintenance loop fast
+on masters with millions of cached jobs.
+
+To use it, set the following in the master config:
+
+.. code-block:: yaml
+
+    master_job_cache: indexed_local_cache
+
+The location of the index can be changed with:
+
+.. code-block:: yaml
+
+    indexed_local_cache.database: /var/cache/salt/master/jobs_index.db
+    indexed_local_cache.timeout: 30
+
+An existing ``local_cache`` job cache is indexed automatically the first time
+the maintenance process runs ``clean_old_jobs``. The index can also be rebuilt
+at any time from the on-disk layout with:
+
+.. code-block:: bash
+
+    salt-run jobs.reindex
+'''
+from __future__ import absolute_import, print_function, unicode_literals
+
+# Import python libs
+import logging
+import os
+import shutil
+import threading
+import time
+
+# Import salt libs
+import salt.minion
+import salt.payload
+import salt.utils.files
+import salt.utils.jid
+import salt.utils.stringutils
+
+# Import 3rd-party libs
+from salt.ext import six
+
+# Better safe than sorry here. Even though sqlite3 is included in python
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+log = logging.getLogger(__name__)
+
+__virtualname__ = 'indexed_local_cache'
+
+# The returner that actually stores the job data on disk
+BACKEND = 'local_cache'
+
+# Schema of the index. The ``load`` column holds the formatted job instance
+# and is NULL until save_load has been called for the jid, the same way
+# local_cache only lists jids which have a .load.p file.
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    'jid TEXT PRIMARY KEY, '
+    'fun TEXT, '
+    'stamp REAL NOT NULL, '
+    'load BLOB)',
+    'CREATE INDEX IF NOT EXISTS jobs_fun ON jobs (fun, jid)',
+    'CREATE INDEX IF NOT EXISTS jobs_stamp ON jobs (stamp)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+)
+
+# Number of rows written to the index per transaction by the maintenance
+# functions, so that the MWorkers storing new jobs never wait on the write lock
+# for long
+BATCH_SIZE = 1000
+
+# cache of the master minion for this returner
+MMINION = None
+
+# The connection to the index of this process and thread, the database is
+# opened and the schema is created once instead of on every call
+_CONN = threading.local()
+
+
+def __virtual__():
+    if not HAS_SQLITE3:
+        return False, 'Could not import indexed_local_cache returner; sqlite3 is not installed.'
+    return __virtualname__
+
+
+def _mminion():
+    '''
+    Create a single mminion for this module to use, instead of reloading all the time
+    '''
+    global MMINION
+
+    if MMINION is None:
+        MMINION = salt.minion.MasterMinion(__opts__)
+
+    return MMINION
+
+
+def _backend(fun):
+    '''
+    Return the given function of the returner storing the job data
+    '''
+    return _mminion().returners['{0}.{1}'.format(BACKEND, fun)]
+
+
+def _job_dir():
+    '''
+    Return root of the jobs cache directory
+    '''
+    return os.path.join(__opts__['cachedir'], 'jobs')
+
+
+def _db_path():
+    '''
+    Return the path of the index database
+    '''
+    return __opts__.get(
+        '{0}.database'.format(__virtualname__),
+        os.path.join(__opts__['cachedir'], 'jobs_index.db'))
+
+
+def _get_conn():
+    '''
+    Return the connection to the index, creating the schema if needed
+    '''
+    key = (os.getpid(), _db_path())
+    if getattr(_CONN, 'key', None) != key:
+        conn = sqlite3.connect(
+            key[1],
+            timeout=float(__opts__.get('{0}.timeout'.format(__virtualname__), 30)))
+        # The master writes to the index from every MWorker, WAL lets the
+        # readers go on while one of them is writing.
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        # The pid is part of the key, a forked MWorker opens its own
+        # connection instead of sharing the one of its parent.
+        _CONN.key = key
+        _CONN.conn = conn
+    return _CONN.conn
+
+
+def _close_conn(conn):
+    '''
+    Commit the work done on the index connection, the connection itself is
+    kept open for the next call
+    '''
+    conn.commit()
+
+
+def _drop_conn():
+    '''
+    Close the index connection of this process and thread
+    '''
+    key = getattr(_CONN, 'key', None)
+    if key is not None and key[0] == os.getpid():
+        _CONN.conn.close()
+    _CONN.key = _CONN.conn = None
+
+
+def _index_jid(conn, jid, stamp=None):
+    '''
+    Make sure the jid is present in the index
+    '''
+    conn.execute(
+        'INSERT OR IGNORE INTO jobs (jid, stamp) VALUES (?, ?)',
+        (jid, stamp or time.time()))
+
+
+def _index_load(conn, jid, load, stamp=None):
+    '''
+    Record the formatted job information of a jid in the index
+    '''
+    serial = salt.payload.Serial(__opts__)
+    job = salt.utils.jid.format_job_instance(load)
+    _index_jid(conn, jid, stamp)
+    conn.execute(
+        'UPDATE jobs SET fun = ?, load = ? WHERE jid = ?',
+        (job['Function'], sqlite3.Binary(serial.dumps(job)), jid))
+
+
+def _unpack(row):
+    '''
+    Turn a (jid, load) row into the jid and the formatted job information
+    '''
+    serial = salt.payload.Serial(__opts__)
+    return row[0], serial.loads(bytes(row[1]))
+
+
+def prep_jid(nocache=False, passed_jid=None):
+    '''
+    Return a job id, prepare the job id directory and index the jid
+    '''
+    jid = _backend('prep_jid')(nocache=nocache, passed_jid=passed_jid)
+    conn = _get_conn()
+    try:
+        _index_jid(conn, jid)
+    finally:
+        _close_conn(conn)
+    return jid
+
+
+def returner(load):
+    '''
+    Return data to the local job cache
+    '''
+    # if a minion is returning a standalone job, get a jobid here so that it
+    # ends up in the index too
+    if load['jid'] == 'req':
+        load['jid'] = prep_jid(nocache=load.get('nocache', False))
+    return _backend('returner')(load)
+
+
+def save_load(jid, clear_load, minions=None):
+    '''
+    Save the load to the specified jid and record it in the index
+    '''
+    _backend('save_load')(jid, clear_load, minions=minions)
+    conn = _get_conn()
+    try:
+        _index_load(conn, jid, clear_load)
+    finally:
+        _close_conn(conn)
+
+
+def save_minions(jid, minions, syndic_id=None):
+    '''
+    Save/update the serialized list of minions for a given job
+    '''
+    return _backend('save_minions')(jid, minions, syndic_id=syndic_id)
+
+
+def get_load(jid):
+    '''
+    Return the load data that marks a specified jid
+    '''
+    return _backend('get_load')(jid)
+
+
+def get_jid(jid):
+    '''
+    Return the information returned when the specified job id was executed
+    '''
+    return _backend('get_jid')(jid)
+
+
+def get_jids():
+    '''
+    Return a dict mapping all job ids to job information
+    '''
+    ret = {}
+    conn = _get_conn()
+    try:
+        rows = conn.execute(
+            'SELECT jid, load FROM jobs WHERE load IS NOT NULL').fetchall()
+    finally:
+        _close_conn(conn)
+    for row in rows:
+        jid, job = _unpack(row)
+        job['StartTime'] = salt.utils.jid.jid_to_time(jid)
+        ret[jid] = job
+
+        if __opts__.get('job_cache_store_endtime'):
+            endtime = get_endtime(jid)
+            if endtime:
+                ret[jid]['EndTime'] = endtime
+
+    return ret
+
+
+def get_jids_filter(count, filter_find_job=True):
+    '''
+    Return a list of all jobs information filtered by the given criteria.
+    :param int count: show not more than the count of most recent jobs
+    :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
+    '''
+    sql = 'SELECT jid, load FROM jobs WHERE load IS NOT NULL'
+    args = []
+    if filter_find_job:
+        sql += ' AND fun != ?'
+        args.append('saltutil.find_job')
+    sql += ' ORDER BY jid DESC LIMIT ?'
+    args.append(int(count))
+    conn = _get_conn()
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        _close_conn(conn)
+    ret = []
+    for row in reversed(rows):
+        jid, job = _unpack(row)
+        job.update({'JID': jid,
+                    'StartTime': salt.utils.jid.jid_to_time(jid)})
+        ret.append(job)
+    return ret
+
+
+def get_jids_by_fun(fun, count=None):
+    '''
+    Return a list of the information of the most recent jobs running the
+    given function, oldest first.
+
+    :param str fun: the function name, e.g. ``state.apply``
+    :param int count: show not more than the count of most recent jobs
+    '''
+    sql = 'SELECT jid, load FROM jobs WHERE fun = ? ORDER BY jid DESC'
+    args = [fun]
+    if count is not None:
+        sql += ' LIMIT ?'
+        args.append(int(count))
+    conn = _get_conn()
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        _close_conn(conn)
+    ret = []
+    for row in reversed(rows):
+        jid, job = _unpack(row)
+        job.update({'JID': jid,
+                    'StartTime': salt.utils.jid.jid_to_time(jid)})
+        if __opts__.get('job_cache_store_endtime'):
+            endtime = get_endtime(jid)
+            if endtime:
+                job['EndTime'] = endtime
+        ret.append(job)
+    return ret
+
+
+def _remove_jid(jid):
+    '''
+    Remove the cache directory of a jid, and its parent if it is left empty
+    '''
+    jid_dir = salt.utils.jid.jid_dir(jid, _job_dir(), __opts__['hash_type'])
+    if os.path.isdir(jid_dir):
+        try:
+            shutil.rmtree(jid_dir)
+        except OSError as err:
+            log.error('Unable to remove %s: %s', jid_dir, err)
+            return False
+    try:
+        os.rmdir(os.path.dirname(jid_dir))
+    except OSError:
+        # Other jids still live in this directory
+        pass
+    return True
+
+
+def clean_old_jobs():
+    '''
+    Clean out the old jobs from the job cache
+    '''
+    if __opts__['keep_jobs'] == 0:
+        return
+    if not _is_indexed():
+        # First run against a cache written by local_cache, index it so that
+        # the expiry below covers the jobs which are already on disk.
+        reindex()
+    cutoff = time.time() - __opts__['keep_jobs'] * 3600.0
+    removed = []
+    scrubbed = 0
+    conn = _get_conn()
+    try:
+        jids = [row[0] for row in conn.execute(
+            'SELECT jid FROM jobs WHERE stamp < ?', (cutoff,))]
+        removed = [(jid,) for jid in jids if _remove_jid(jid)]
+        for idx in range(0, len(removed), BATCH_SIZE):
+            conn.executemany('DELETE FROM jobs WHERE jid = ?',
+                             removed[idx:idx + BATCH_SIZE])
+            conn.commit()
+        scrubbed = _scrub(conn, cutoff)
+    finally:
+        _close_conn(conn)
+    if removed:
+        log.debug('Removed %d expired jobs from the job cache', len(removed))
+    if scrubbed:
+        log.debug('Scrubbed %d stray or corrupted jid directories from the '
+                  'job cache', scrubbed)
+
+
+def _scrub(conn, cutoff):
+    '''
+    Remove the jid directories older than the cutoff which are not in the
+    index, or are corrupted and have no jid file, from one top level directory
+    of the job cache. Every call moves on to the next top level directory, so
+    the whole cache is scrubbed over time the way local_cache does it, without
+    walking all of it at once.
+
+    Returns the number of removed jid directories.
+    '''
+    job_dir = _job_dir()
+    try:
+        tops = sorted(os.listdir(job_dir))
+    except OSError:
+        return 0
+    if not tops:
+        return 0
+    row = conn.execute(
+        'SELECT value FROM meta WHERE key = ?', ('scrubbed',)).fetchone()
+    last = row[0] if row else ''
+    top = next((name for name in tops if name > last), tops[0])
+    t_path = os.path.join(job_dir, top)
+    count = 0
+    try:
+        finals = os.listdir(t_path)
+    except OSError:
+        finals = []
+    for final in finals:
+        f_path = os.path.join(t_path, final)
+        jid_file = os.path.join(f_path, 'jid')
+        try:
+            if os.path.isfile(jid_file):
+                if os.stat(jid_file).st_ctime >= cutoff:
+                    continue
+                with salt.utils.files.fopen(jid_file, 'rb') as rfh:
+                    jid = salt.utils.stringutils.to_unicode(rfh.read())
+                if conn.execute('SELECT 1 FROM jobs WHERE jid = ?',
+                                (jid,)).fetchone():
+                    # Expired from the index by clean_old_jobs
+                    continue
+            elif os.stat(f_path).st_ctime >= cutoff:
+                # The jid file of a new job may not be written yet
+                continue
+            shutil.rmtree(f_path)
+            count += 1
+        except (IOError, OSError) as err:
+            log.error('Unable to scrub %s: %s', f_path, err)
+    try:
+        os.rmdir(t_path)
+    except OSError:
+        # Other jids still live in this directory
+        pass
+    conn.execute(
+        'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+        ('scrubbed', top))
+    return count
+
+
+def _is_indexed():
+    '''
+    Return True if the on-disk job cache has been indexed
+    '''
+    conn = _get_conn()
+    try:
+        row = conn.execute(
+            'SELECT value FROM meta WHERE key = ?', ('indexed',)).fetchone()
+    finally:
+        _close_conn(conn)
+    return row is not None
+
+
+def reindex():
+    '''
+    Rebuild the index from the jobs stored in the local_cache layout. This is
+    used to migrate an existing ``local_cache`` job cache to this returner.
+
+    The jobs are written to the index in batches and the jobs which are no
+    longer on disk are removed afterwards, so the master keeps storing new
+    jobs while the cache is indexed.
+
+    Returns the number of indexed jobs.
+    '''
+    serial = salt.payload.Serial(__opts__)
+    job_dir = _job_dir()
+    started = time.time()
+    count = 0
+    conn = _get_conn()
+    try:
+        # The jids found on disk, kept in a temporary table of this connection
+        # which does not lock the index
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen (jid TEXT PRIMARY KEY)')
+        conn.execute('DELETE FROM temp.seen')
+        if os.path.isdir(job_dir):
+            for top in os.listdir(job_dir):
+                t_path = os.path.join(job_dir, top)
+                if not os.path.isdir(t_path):
+                    continue
+                for final in os.listdir(t_path):
+                    f_path = os.path.join(t_path, final)
+                    jid_file = os.path.join(f_path, 'jid')
+                    if not os.path.isfile(jid_file):
+                        continue
+                    with salt.utils.files.fopen(jid_file, 'rb') as rfh:
+                        jid = salt.utils.stringutils.to_unicode(rfh.read())
+                    # Keep the expiry semantics of local_cache, which uses
+                    # the ctime of the jid file
+                    stamp = os.stat(jid_file).st_ctime
+                    load_path = os.path.join(f_path, '.load.p')
+                    load = None
+                    if os.path.isfile(load_path):
+                        try:
+                            with salt.utils.files.fopen(load_path, 'rb') as rfh:
+                                load = serial.load(rfh)
+                        except Exception:  # pylint: disable=broad-except
+                            log.exception('Failed to deserialize %s', load_path)
+                    if load:
+                        _index_load(conn, jid, load, stamp=stamp)
+                    else:
+                        _index_jid(conn, jid, stamp=stamp)
+                    conn.execute(
+                        'INSERT OR IGNORE INTO temp.seen (jid) VALUES (?)',
+                        (jid,))
+                    count += 1
+                    if count % BATCH_SIZE == 0:
+                        conn.commit()
+        conn.commit()
+        # Jobs stored while the cache was walked are kept
+        stale = [row for row in conn.execute(
+            'SELECT jid FROM jobs WHERE stamp < ? '
+            'AND jid NOT IN (SELECT jid FROM temp.seen)', (started,))]
+        for idx in range(0, len(stale), BATCH_SIZE):
+            conn.executemany('DELETE FROM jobs WHERE jid = ?',
+                             stale[idx:idx + BATCH_SIZE])
+            conn.commit()
+        conn.execute('DELETE FROM temp.seen')
+        conn.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            ('indexed', six.text_type(time.time())))
+    finally:
+        _close_conn(conn)
+    log.info('Indexed %d jobs from %s', count, job_dir)
+    return count
+
+
+def update_endtime(jid, time):  # pylint: disable=redefined-outer-name
+    '''
+    Update (or store) the end time for a given job
+    '''
+    return _backend('update_endtime')(jid, time)
+
+
+def get_endtime(jid):
+    '''
+    Retrieve the stored endtime for a given job
+
+    Returns False if no endtime is present
+    '''
+    return _backend('get_endtime')(jid)
@@ -13,8 +13,11 @@ import salt.config
 from salt.ext import six
 import salt.log
 import salt.utils.args
+import salt.utils.files
 import salt.utils.gitfs
 import salt.utils.master
+import salt.utils.process
+import salt.utils.target_index
 import salt.payload
 import salt.cache
 import salt.fileserver.gitfs
@@ -466,3 +469,124 @@ def flush(bank, key=None, cachedir=None):
     except TypeError:
         cache = salt.cache.Cache(__opts__)
     return cache.flush(bank, key)
+
+
+def target_index():
+    '''
+    .. versionadded:: Sodium
+
+    Return the hit and miss counters and the size of the target index used to
+    resolve grain and pillar targets when ``minion_data_cache_index`` is
+    enabled.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run cache.target_index
+    '''
+    if not __opts__.get('minion_data_cache_index', False):
+        return {}
+    return salt.utils.target_index.TargetIndex(__opts__).stats()
+
+
+def memcache_stats(per_process=False):
+    '''
+    .. versionadded:: Sodium
+
+    Return the counters of the in-memory minion data cache of the master
+    processes, summed per cache storage: hits, misses, evictions,
+    expirations, stores, deferred and flushed writes, along with the current
+    item count, byte size and number of writes pending.
+
+    The counters are saved by the master processes every ten seconds when
+    ``memcache_stats`` is enabled.
+
+    per_process : False
+        Return the counters of every master process, keyed by PID, instead of
+        summing them
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run cache.memcache_stats
+        salt-run cache.memcache_stats per_process=True
+    '''
+    if not __opts__.get('memcache_stats', False):
+        return {}
+    return _process_stats(
+        os.path.join(__opts__['cachedir'], 'memcache_stats'), per_process)
+
+
+def ext_pillar_cache_stats(per_process=False):
+    '''
+    .. versionadded:: Sodium
+
+    Return the hits, misses and coalesced calls of the external pillars
+    cached with ``ext_pillar_cache``, per external pillar, summed over the
+    master processes. Coalesced calls waited for an identical call made by
+    another process and read its data from the cache.
+
+    The counters are saved by the master processes every ten seconds.
+
+    per_process : False
+        Return the counters of every master process, keyed by PID, instead of
+        summing them
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run cache.ext_pillar_cache_stats
+    '''
+    ret = _process_stats(
+        os.path.join(__opts__['cachedir'], 'ext_pillar_cache_stats'), per_process)
+    if not per_process:
+        for counters in six.itervalues(ret):
+            calls = sum(counters.get(name, 0)
+                        for name in ('hits', 'misses', 'coalesced'))
+            counters['hit_rate'] = (
+                float(counters.get('hits', 0) + counters.get('coalesced', 0)) / calls
+                if calls else 0.0
+            )
+    return ret
+
+
+def _process_stats(stats_dir, per_process):
+    '''
+    Read the counters saved by the master processes in stats_dir, summed by
+    name or keyed by PID
+    '''
+    try:
+        stats_files = os.listdir(stats_dir)
+    except OSError:
+        return {}
+    serial = salt.payload.Serial(__opts__)
+    ret = {}
+    for fn_ in stats_files:
+        pid, ext = os.path.splitext(fn_)
+        if ext != '.p' or not pid.isdigit():
+            continue
+        path = os.path.join(stats_dir, fn_)
+        if not salt.utils.process.os_is_running(int(pid)):
+            # Counters of a process which is gone
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with salt.utils.files.fopen(path, 'rb') as fp_:
+                stats = serial.load(fp_)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.debug('Unable to read %s: %s', path, exc)
+            continue
+        if per_process:
+            ret[int(pid)] = stats
+            continue
+        for storage, counters in six.iteritems(stats):
+            total = ret.setdefault(storage, {})
+            for name, value in six.iteritems(counters):
+                total[name] = total.get(name, 0) + value
+    return ret
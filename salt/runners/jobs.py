@@ -255,6 +255,11 @@ def list_jobs(ext_source=None,
 
                 salt-run jobs.list_jobs search_function='test.*,pkg.install'
 
+        .. versionchanged:: Sodium
+            When the job cache returner can look up the jobs of a function,
+            like ``indexed_local_cache``, the jobs of functions given without
+            globs are looked up instead of listing all the jobs.
+
     search_target
         Can be passed as a string or a list. Returns jobs which match the
         specified minion name. Globbing is allowed. Example:
@@ -305,7 +310,19 @@ def list_jobs(ext_source=None,
         )
     mminion = salt.minion.MasterMinion(__opts__)
 
-    ret = mminion.returners['{0}.get_jids'.format(returner)]()
+    ret = None
+    fun = '{0}.get_jids_by_fun'.format(returner)
+    if search_function and fun in mminion.returners:
+        functions = salt.utils.args.split_input(search_function)
+        if not any(char in key for key in functions for char in '*?['):
+            # Let the returner look the jobs of the functions up instead of
+            # loading all of them
+            ret = {}
+            for key in functions:
+                for job in mminion.returners[fun](key):
+                    ret[job.pop('JID')] = job
+    if ret is None:
+        ret = mminion.returners['{0}.get_jids'.format(returner)]()
 
     mret = {}
     for item in ret:
@@ -534,6 +551,39 @@ def last_run(ext_source=None,
         return False
 
 
+def reindex(ext_source=None):
+    '''
+    .. versionadded:: Sodium
+
+    Rebuild the index of the job cache from the jobs stored on disk, for job
+    cache returners which maintain one (such as ``indexed_local_cache``).
+    This is also how an existing ``local_cache`` job cache is migrated to
+    ``indexed_local_cache``. Returns the number of indexed jobs.
+
+    ext_source
+        The external job cache to use. Default: `None`.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run jobs.reindex
+    '''
+    returner = _get_returner((
+        __opts__['ext_job_cache'],
+        ext_source,
+        __opts__['master_job_cache']
+    ))
+    mminion = salt.minion.MasterMinion(__opts__)
+
+    fun = '{0}.reindex'.format(returner)
+    if fun not in mminion.returners:
+        raise NotImplementedError(
+            '\'{0}\' returner function not implemented yet.'.format(fun)
+        )
+    return mminion.returners[fun]()
+
+
 def _get_returner(returner_types):
     '''
     Helper to iterate over returner_types and pick the first one
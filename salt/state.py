@@ -32,6 +32,7 @@ import salt.minion
 import salt.pillar
 import salt.fileclient
 import salt.utils.args
+import salt.utils.atomicfile
 import salt.utils.crypt
 import salt.utils.data
 import salt.utils.decorators.state
@@ -43,7 +44,9 @@ import salt.utils.immutabletypes as immutabletypes
 import salt.utils.msgpack
 import salt.utils.platform
 import salt.utils.process
+import salt.utils.rendercache
 import salt.utils.url
+import salt.version
 import salt.syspaths as syspaths
 import salt.transport.client
 from salt.serializers.msgpack import serialize as msgpack_serialize, deserialize as msgpack_deserialize
@@ -60,6 +63,11 @@ import salt.utils.yamlloader as yamlloader
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
 from salt.ext import six
 from salt.ext.six.moves import map, range, reload_module
+try:
+    from multiprocessing.connection import wait as wait_sentinels
+except ImportError:
+    # The processes have no sentinels on Python 2
+    wait_sentinels = None
 # pylint: enable=import-error,no-name-in-module,redefined-builtin
 
 log = logging.getLogger(__name__)
@@ -126,8 +134,43 @@ STATE_RUNTIME_KEYWORDS = frozenset([
     '__prereq__',
     ])
 
+# The requisites which depend on the changes of the states they match
+CHANGES_REQUISITE_KEYWORDS = frozenset([
+    'onchanges',
+    'onchanges_any',
+    'onfail',
+    'onfail_any',
+    'prereq',
+    'watch',
+    'watch_any',
+    'listen',
+    ])
+
+# The arguments merged by the aggregation of adjacent states, the other
+# arguments of the states have to be the same
+ADJACENT_AGGREGATE_ARGS = frozenset([
+    'name',
+    'names',
+    'pkgs',
+    'sources',
+    'version',
+    'order',
+    '__id__',
+    '__sls__',
+    ])
+
 STATE_INTERNAL_KEYWORDS = STATE_REQUISITE_KEYWORDS.union(STATE_REQUISITE_IN_KEYWORDS).union(STATE_RUNTIME_KEYWORDS)
 
+# The options which change the rendered high data, besides the grains and
+# pillar, kept in the compiled highstate cache key
+HIGHSTATE_CACHE_OPTS = ('id', 'saltenv', 'pillarenv', 'test', 'renderer',
+                        'renderer_blacklist', 'renderer_whitelist',
+                        'state_auto_order', 'jinja_env', 'jinja_sls_env',
+                        'jinja_lstrip_blocks', 'jinja_trim_blocks')
+
+# The number of compiled highstates kept in the cache
+HIGHSTATE_CACHE_ENTRIES = 8
+
 
 def _odict_hashable(self):
     return id(self)
@@ -136,6 +179,16 @@ def _odict_hashable(self):
 OrderedDict.__hash__ = _odict_hashable
 
 
+def clear_highstate_cache(opts):
+    '''
+    Remove the compiled highstate cache of the minion
+    '''
+    try:
+        os.remove(os.path.join(opts['cachedir'], 'highstate_cache.p'))
+    except OSError:
+        pass
+
+
 def split_low_tag(tag):
     '''
     Take a low tag and split it back into the low dict that it came from
@@ -281,6 +334,213 @@ def find_sls_ids(sls, high):
     return ret
 
 
+def _is_glob(pattern):
+    '''
+    Return whether fnmatch gives the pattern a special meaning
+    '''
+    return any(char in pattern for char in '*?[')
+
+
+class HighIndex(object):
+    '''
+    Index of high data by sls and by the values of the single argument
+    dictionaries of each state, answering find_name and find_sls_ids without
+    scanning the whole high data. The arguments added to the high data after
+    building the index must be passed to add.
+    '''
+    def __init__(self, high):
+        self.high = high
+        self.pos = None
+        self.args = None
+        self.sls = None
+
+    def _build(self):
+        self.pos = {}
+        self.args = {}
+        for nid, item in six.iteritems(self.high):
+            self.pos[nid] = len(self.pos)
+            if not isinstance(item, dict):
+                continue
+            for state, run in six.iteritems(item):
+                self.add(nid, state, run)
+
+    def add(self, nid, state, run):
+        '''
+        Index the arguments of a state of the high data
+        '''
+        if self.args is None or not isinstance(run, list):
+            return
+        for arg in run:
+            if not isinstance(arg, dict) or len(arg) != 1:
+                continue
+            try:
+                self.args.setdefault((state, arg[next(iter(arg))]), []).append(nid)
+            except TypeError:
+                # Unhashable values are never names
+                continue
+
+    def _sls_ids(self, sls):
+        if self.sls is None:
+            self.sls = {}
+            for nid, item in six.iteritems(self.high):
+                try:
+                    self.sls.setdefault(item['__sls__'], []).append(nid)
+                except (TypeError, KeyError):
+                    if nid != '__exclude__':
+                        log.error(
+                            'Invalid non-dict item \'%s\' in high data. Value: %r',
+                            nid, item
+                        )
+        return self.sls.get(sls, [])
+
+    def find_name(self, name, state):
+        '''
+        Return what find_name returns for the indexed high data
+        '''
+        if name in self.high:
+            return [(name, state)]
+        if state == 'sls':
+            return [(nid, next(iter(self.high[nid])))
+                    for nid in self._sls_ids(name)]
+        if self.args is None:
+            self._build()
+        try:
+            nids = self.args.get((state, name), [])
+        except TypeError:
+            return find_name(name, state, self.high)
+        ext_id = []
+        # The arguments indexed may have been replaced since
+        for nid in sorted(set(nids), key=self.pos.get):
+            run = self.high[nid].get(state)
+            if not isinstance(run, list):
+                continue
+            for arg in run:
+                if isinstance(arg, dict) and len(arg) == 1 \
+                        and arg[next(iter(arg))] == name:
+                    ext_id.append((nid, state))
+        return ext_id
+
+    def find_sls_ids(self, sls):
+        '''
+        Return what find_sls_ids returns for the indexed high data
+        '''
+        try:
+            nids = self._sls_ids(sls)
+        except TypeError:
+            return find_sls_ids(sls, self.high)
+        return [(nid, st_) for nid in nids for st_ in self.high[nid]
+                if not st_.startswith('__')]
+
+
+class ChunkIndex(object):
+    '''
+    Index of low chunks by id, name and sls, to find the chunks matched by a
+    requisite without scanning all the chunks
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.size = len(chunks)
+        self.ids = {}
+        self.names = {}
+        self.sls = {}
+        self.positions = {}
+        self.watched_vals = None
+        self.valid = True
+        for ind, chunk in enumerate(chunks):
+            self.positions[id(chunk)] = ind
+        for ind, chunk in enumerate(chunks):
+            try:
+                # fnmatch compares the normalized case of its arguments
+                self.ids.setdefault(os.path.normcase(chunk['__id__']), []).append(ind)
+                self.names.setdefault(os.path.normcase(chunk['name']), []).append(ind)
+                self.sls.setdefault(os.path.normcase(chunk['__sls__']), []).append(ind)
+            except (TypeError, AttributeError, KeyError):
+                # Let the scans raise the errors they do on such chunks
+                self.valid = False
+                break
+
+    def current(self, chunks):
+        '''
+        Return whether the index was built for chunks
+        '''
+        return self.chunks is chunks and self.size == len(chunks)
+
+    def match(self, req_key, req_val):
+        '''
+        Return the chunks matched by a requisite, in the order of the chunks,
+        or None when the chunks have to be scanned
+        '''
+        if not self.valid or not isinstance(req_val, six.string_types) \
+                or _is_glob(req_val):
+            return None
+        req_val = os.path.normcase(req_val)
+        if req_key == 'sls':
+            inds = self.sls.get(req_val, [])
+        else:
+            inds = sorted(set(self.ids.get(req_val, [])) |
+                          set(self.names.get(req_val, [])))
+        chunks = [self.chunks[ind] for ind in inds]
+        if req_key not in ('id', 'sls'):
+            chunks = [chunk for chunk in chunks if chunk['state'] == req_key]
+        return chunks
+
+    def find(self, value):
+        '''
+        Return the first chunk with the id or the name value, or None
+        '''
+        try:
+            if not self.valid:
+                raise TypeError
+            key = os.path.normcase(value)
+            inds = sorted(set(self.ids.get(key, [])) | set(self.names.get(key, [])))
+        except (TypeError, AttributeError):
+            inds = range(len(self.chunks))
+        for ind in inds:
+            chunk = self.chunks[ind]
+            if chunk['__id__'] == value or chunk['name'] == value:
+                return chunk
+        return None
+
+    def position(self, chunk):
+        '''
+        Return the position of chunk in the chunks, or None
+        '''
+        return self.positions.get(id(chunk))
+
+    def watched(self, chunk):
+        '''
+        Return whether a requisite depending on the changes of the chunks it
+        matches may match chunk
+        '''
+        if self.watched_vals is None:
+            vals = set()
+            globs = []
+            for low in self.chunks:
+                for requisite in CHANGES_REQUISITE_KEYWORDS:
+                    for req in low.get(requisite) or []:
+                        if isinstance(req, six.string_types):
+                            req = {'id': req}
+                        if not isinstance(req, dict):
+                            continue
+                        for req_val in six.itervalues(req):
+                            if not isinstance(req_val, six.string_types):
+                                globs.append('*')
+                            elif _is_glob(req_val):
+                                globs.append(req_val)
+                            else:
+                                vals.add(os.path.normcase(req_val))
+            self.watched_vals = (vals, globs)
+        vals, globs = self.watched_vals
+        for value in (chunk.get('__id__'), chunk.get('name'), chunk.get('__sls__')):
+            if not isinstance(value, six.string_types):
+                return True
+            if os.path.normcase(value) in vals:
+                return True
+            if any(fnmatch.fnmatch(value, glob) for glob in globs):
+                return True
+        return False
+
+
 def format_log(ret):
     '''
     Format the state into a log message
@@ -757,6 +1017,9 @@ class State(object):
         self.instance_id = six.text_type(id(self))
         self.inject_globals = {}
         self.mocked = mocked
+        self.hold_events = False
+        self.chunk_index = None
+        self.parallel_procs = 0
 
     def _gather_pillar(self):
         '''
@@ -830,7 +1093,7 @@ class State(object):
         if agg_opt is True:
             agg_opt = [low['state']]
         elif not isinstance(agg_opt, list):
-            return low
+            agg_opt = []
         if low['state'] in agg_opt and not low.get('__agg__'):
             agg_fun = '{0}.mod_aggregate'.format(low['state'])
             if agg_fun in self.states:
@@ -839,6 +1102,46 @@ class State(object):
                     low['__agg__'] = True
                 except TypeError:
                     log.error('Failed to execute aggregate for state %s', low['state'])
+        elif 'aggregate' not in low and not low.get('__agg__'):
+            low = self._mod_aggregate_adjacent(low, running, chunks)
+        return low
+
+    def _mod_aggregate_adjacent(self, low, running, chunks):
+        '''
+        Aggregate the chunks following low which only differ from it by the
+        names they manage, and which no requisite depends on the changes of
+        '''
+        adj_opt = self.functions['config.option']('state_aggregate_adjacent')
+        if adj_opt is True:
+            adj_opt = [low['state']]
+        elif not isinstance(adj_opt, list):
+            return low
+        agg_fun = '{0}.mod_aggregate'.format(low['state'])
+        if low['state'] not in adj_opt or agg_fun not in self.states:
+            return low
+        index = self.get_chunk_index(chunks)
+        pos = index.position(low)
+        if pos is None or index.watched(low):
+            return low
+
+        def _args(chunk):
+            return dict((key, val) for key, val in six.iteritems(chunk)
+                        if key not in ADJACENT_AGGREGATE_ARGS)
+
+        args = _args(low)
+        adjacent = [low]
+        for chunk in chunks[pos + 1:]:
+            if chunk.get('__agg__') or _gen_tag(chunk) in running \
+                    or _args(chunk) != args or index.watched(chunk):
+                break
+            adjacent.append(chunk)
+        if len(adjacent) == 1:
+            return low
+        try:
+            low = self.states[agg_fun](low, adjacent, running)
+            low['__agg__'] = True
+        except TypeError:
+            log.error('Failed to execute aggregate for state %s', low['state'])
         return low
 
     def _run_check(self, low_data):
@@ -1056,6 +1359,7 @@ class State(object):
                 log.error('Error encountered during module reload. Modules were not reloaded.')
             except TypeError:
                 log.error('Error encountered during module reload. Modules were not reloaded.')
+        salt.loader.clear_index(self.opts)
         self.load_modules()
         if not self.opts.get('local', False) and self.opts.get('multiprocessing', True):
             self.functions['saltutil.refresh_modules']()
@@ -1465,6 +1769,7 @@ class State(object):
         if '__extend__' not in high:
             return high, errors
         ext = high.pop('__extend__')
+        index = None
         for ext_chunk in ext:
             for name, body in six.iteritems(ext_chunk):
                 if name not in high:
@@ -1472,7 +1777,9 @@ class State(object):
                         x for x in body if not x.startswith('__')
                     )
                     # Check for a matching 'name' override in high data
-                    ids = find_name(name, state_type, high)
+                    if index is None:
+                        index = HighIndex(high)
+                    ids = index.find_name(name, state_type)
                     if len(ids) != 1:
                         errors.append(
                             'Cannot extend ID \'{0}\' in \'{1}:{2}\'. It is not '
@@ -1494,6 +1801,8 @@ class State(object):
                         continue
                     if state not in high[name]:
                         high[name][state] = run
+                        if index is not None:
+                            index.add(name, state, run)
                         continue
                     # high[name][state] is extended by run, both are lists
                     for arg in run:
@@ -1523,6 +1832,8 @@ class State(object):
                                     high[name][state][hind] = arg
                         if not update:
                             high[name][state].append(arg)
+                        if index is not None:
+                            index.add(name, state, [arg])
         return high, errors
 
     def apply_exclude(self, high):
@@ -1573,6 +1884,7 @@ class State(object):
         req_in_all = req_in.union({'require', 'watch', 'onfail', 'onfail_stop', 'onchanges'})
         extend = {}
         errors = []
+        index = HighIndex(high)
         for id_, body in six.iteritems(high):
             if not isinstance(body, dict):
                 continue
@@ -1664,7 +1976,7 @@ class State(object):
                                 pname = ind[pstate]
                                 if pstate == 'sls':
                                     # Expand hinges here
-                                    hinges = find_sls_ids(pname, high)
+                                    hinges = index.find_sls_ids(pname)
                                 else:
                                     hinges.append((pname, pstate))
                                 if '.' in pstate:
@@ -1694,7 +2006,7 @@ class State(object):
                                                 )
                                     if key == 'prereq':
                                         # Add prerequired to prereqs
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = index.find_name(name, _state)
                                         for ext_id, _req_state in ext_ids:
                                             if ext_id not in extend:
                                                 extend[ext_id] = OrderedDict()
@@ -1707,7 +2019,7 @@ class State(object):
                                     if key == 'use_in':
                                         # Add the running states args to the
                                         # use_in states
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = index.find_name(name, _state)
                                         for ext_id, _req_state in ext_ids:
                                             if not ext_id:
                                                 continue
@@ -1734,7 +2046,7 @@ class State(object):
                                     if key == 'use':
                                         # Add the use state's args to the
                                         # running state
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = index.find_name(name, _state)
                                         for ext_id, _req_state in ext_ids:
                                             if not ext_id:
                                                 continue
@@ -1846,6 +2158,7 @@ class State(object):
                 target=self._call_parallel_target,
                 args=(name, cdata, low))
         proc.start()
+        self.parallel_procs += 1
         ret = {'name': name,
                 'result': None,
                 'changes': {},
@@ -2257,6 +2570,11 @@ class State(object):
                         self.__run_num += 1
                         chunks.remove(low)
                         break
+        if self.opts.get('state_concurrency', 1) > 1:
+            plan = self._concurrent_plan(chunks)
+            if plan is not None:
+                running = self._call_chunks_concurrent(chunks, *plan)
+                return dict(list(disabled.items()) + list(running.items()))
         running = {}
         for low in chunks:
             if '__FAILHARD__' in running:
@@ -2279,6 +2597,247 @@ class State(object):
         ret = dict(list(disabled.items()) + list(running.items()))
         return ret
 
+    def _concurrent_plan(self, chunks):
+        '''
+        Return the tags of the chunks each chunk requires and the order the
+        chunks are called in by call_chunks, or None when the chunks use
+        requisites or options which need them to be called in sequence
+        '''
+        if not self.jid:
+            log.debug('Calling the states in sequence, the run has no jid')
+            return None
+        for agg_opt in ('state_aggregate', 'state_aggregate_adjacent'):
+            if self.functions['config.option'](agg_opt):
+                log.debug('Calling the states in sequence, %s is set', agg_opt)
+                return None
+        requisites = ['require',
+                      'require_any',
+                      'watch',
+                      'watch_any',
+                      'onfail',
+                      'onfail_any',
+                      'onchanges',
+                      'onchanges_any']
+        deps = {}
+        index = self.get_chunk_index(chunks)
+        for low in chunks:
+            tag = _gen_tag(low)
+            reason = None
+            if tag in deps:
+                reason = 'it is defined twice'
+            elif 'prereq' in low or 'prerequired' in low:
+                reason = 'it has prereq requisites'
+            elif 'aggregate' in low:
+                reason = 'it is aggregated'
+            elif not self.opts.get('test', False) and \
+                    low.get('failhard', self.opts['failhard']):
+                reason = 'failhard is set'
+            if reason:
+                log.debug('Calling the states in sequence, as %s for %s',
+                          reason, tag)
+                return None
+            self._watch_as_require(low)
+            deps[tag] = []
+            for requisite in requisites:
+                for req in low.get(requisite) or []:
+                    if isinstance(req, six.string_types):
+                        req = {'id': req}
+                    req = trim_req(req)
+                    req_key = next(iter(req))
+                    req_val = req[req_key]
+                    found = False
+                    matches = index.match(req_key, req_val)
+                    if matches is not None:
+                        found = bool(matches)
+                        deps[tag].extend(_gen_tag(chunk) for chunk in matches)
+                    elif isinstance(req_val, six.string_types):
+                        for chunk in chunks:
+                            if req_key == 'sls':
+                                if not fnmatch.fnmatch(chunk['__sls__'], req_val):
+                                    continue
+                            elif not (req_key == 'id' or chunk['state'] == req_key):
+                                continue
+                            elif not isinstance(chunk['name'], six.string_types):
+                                # Let check_requisite report the bad name
+                                found = False
+                                break
+                            elif not (fnmatch.fnmatch(chunk['name'], req_val) or
+                                      fnmatch.fnmatch(chunk['__id__'], req_val)):
+                                continue
+                            found = True
+                            deps[tag].append(_gen_tag(chunk))
+                    if not found:
+                        # Let call_chunk report the missing requisite
+                        log.debug('Calling the states in sequence, as the '
+                                  '%s requisite %s of %s is not found',
+                                  requisite, req, tag)
+                        return None
+
+        # call_chunk calls the requisites of a chunk in the order they are
+        # listed before calling it
+        order = []
+        done = set()
+        for tag in deps:
+            if tag in done:
+                continue
+            path = [tag]
+            stack = [iter(deps[tag])]
+            while stack:
+                dep = next(stack[-1], None)
+                if dep is None:
+                    stack.pop()
+                    done.add(path[-1])
+                    order.append(path.pop())
+                elif dep in path:
+                    log.debug('Calling the states in sequence, as %s has a '
+                              'recursive requisite', dep)
+                    return None
+                elif dep not in done:
+                    path.append(dep)
+                    stack.append(iter(deps[dep]))
+        return deps, order
+
+    def _call_chunks_concurrent(self, chunks, deps, order):
+        '''
+        Call the chunks in worker processes, starting each one as soon as its
+        requisites returned. The returns and their run numbers are the ones of
+        call_chunks, the events are fired in the same order.
+        '''
+        lows = dict((_gen_tag(low), low) for low in chunks)
+        concurrency = self.opts['state_concurrency']
+        serial = self.opts.get('state_concurrency_serial') or []
+        troot = os.path.join(self.opts['cachedir'], self.jid)
+        pending = list(order)
+        workers = {}
+        running = {}
+        run_nums = {}
+        ret = {}
+        while pending or workers:
+            progress = False
+            for tag in list(workers):
+                proc = workers[tag][0]
+                if proc.is_alive():
+                    continue
+                proc.join()
+                del workers[tag]
+                progress = True
+                running[tag], run_nums[tag] = self._read_chunk_worker(
+                    lows[tag], os.path.join(troot, salt.utils.hashutils.sha1_digest(tag)))
+                self.check_refresh(lows[tag], running[tag])
+
+            busy = set(group for _, group in six.itervalues(workers))
+            for tag in list(pending):
+                if len(workers) >= concurrency:
+                    break
+                low = lows[tag]
+                if any(dep not in running for dep in deps[tag]):
+                    continue
+                group = next((pat for pat in serial if fnmatch.fnmatch(
+                    '{0[state]}.{0[fun]}'.format(low), pat)), None)
+                if group is not None and group in busy:
+                    continue
+                pending.remove(tag)
+                progress = True
+                if self.check_pause(low) == 'kill':
+                    pending = []
+                    break
+                self._mod_init(low)
+                status = self.check_requisite(low, running, chunks, pre=True)[0]
+                if status not in ('met', 'change'):
+                    # The state is not called, its return is made here
+                    running[tag], run_nums[tag] = self._call_chunk_isolated(
+                        low, running, chunks)
+                    continue
+                if not os.path.isdir(troot):
+                    try:
+                        os.makedirs(troot)
+                    except OSError:
+                        pass
+                proc = salt.utils.process.Process(
+                    target=self._call_chunk_worker,
+                    args=(low, running, chunks,
+                          os.path.join(troot, salt.utils.hashutils.sha1_digest(tag))))
+                proc.start()
+                workers[tag] = (proc, group)
+                busy.add(group)
+
+            while order and order[0] in running:
+                tag = order.pop(0)
+                ret[tag] = running[tag]
+                ret[tag]['__run_num__'] = self.__run_num + run_nums[tag][0]
+                self.__run_num += run_nums[tag][1]
+                self.event(ret[tag], len(chunks), fire_event=lows[tag].get('fire_event'))
+            if progress:
+                continue
+            if workers and wait_sentinels is not None:
+                # Wake up as soon as a worker exits
+                wait_sentinels([proc.sentinel for proc, _ in six.itervalues(workers)])
+            else:
+                time.sleep(0.01)
+        # The chunks after a kill are not called
+        for tag in order:
+            if tag in running:
+                ret[tag] = running[tag]
+                ret[tag]['__run_num__'] = self.__run_num + run_nums[tag][0]
+                self.__run_num += run_nums[tag][1]
+        return ret
+
+    def _call_chunk_isolated(self, low, running, chunks):
+        '''
+        Call a chunk whose requisites all returned without changing the run
+        number and firing events. Returns its return and a tuple of the
+        offset of its run number and the count of run numbers it used.
+        '''
+        run_num = self.__run_num
+        self.hold_events = True
+        try:
+            ret = self.call_chunk(low, dict(running), chunks)[_gen_tag(low)]
+        finally:
+            self.hold_events = False
+            used = self.__run_num - run_num
+            self.__run_num = run_num
+        return ret, (ret.get('__run_num__', run_num) - run_num, used)
+
+    def _call_chunk_worker(self, low, running, chunks, tfile):
+        '''
+        The target of the worker processes calling the chunks concurrently
+        '''
+        # The worker already runs in its own process
+        low = dict(low)
+        low.pop('parallel', None)
+        try:
+            ret, run_nums = self._call_chunk_isolated(low, running, chunks)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.debug('An exception occurred in this state: %s', exc,
+                      exc_info_on_loglevel=logging.DEBUG)
+            ret = {'result': False,
+                   'name': low['name'],
+                   'changes': {},
+                   'comment': 'An exception occurred in this state: {0}'.format(
+                       traceback.format_exc()),
+                   '__id__': low['__id__'],
+                   '__sls__': low.get('__sls__')}
+            run_nums = (0, 1)
+        with salt.utils.files.fopen(tfile, 'wb+') as fp_:
+            fp_.write(msgpack_serialize({'ret': ret, 'run_nums': run_nums}))
+
+    def _read_chunk_worker(self, low, tfile):
+        '''
+        Return the return and run numbers written by a chunk worker
+        '''
+        try:
+            with salt.utils.files.fopen(tfile, 'rb') as fp_:
+                data = msgpack_deserialize(fp_.read())
+            os.remove(tfile)
+            return data['ret'], tuple(data['run_nums'])
+        except (OSError, IOError, KeyError, TypeError):
+            return {'result': False,
+                    'name': low['name'],
+                    'changes': {},
+                    'comment': 'State worker process failed to return',
+                    '__id__': low['__id__'],
+                    '__sls__': low.get('__sls__')}, (0, 1)
+
     def check_failhard(self, low, running):
         '''
         Check if the low data chunk should send a failhard signal
@@ -2341,6 +2900,9 @@ class State(object):
         '''
         Check the running dict for processes and resolve them
         '''
+        if not self.parallel_procs:
+            # Nothing to look for in the running dict
+            return True
         retset = set()
         for tag in running:
             proc = running[tag].get('proc')
@@ -2365,17 +2927,26 @@ class State(object):
                                'changes': {}}
                     running[tag].update(ret)
                     running[tag].pop('proc')
+                    self.parallel_procs -= 1
                 else:
                     retset.add(False)
         return False not in retset
 
-    def check_requisite(self, low, running, chunks, pre=False):
+    def get_chunk_index(self, chunks):
         '''
-        Look into the running data to check the status of all requisite
-        states
+        Return the ChunkIndex of the chunks, built once for each list of
+        chunks called
+        '''
+        if self.chunk_index is None or not self.chunk_index.current(chunks):
+            self.chunk_index = ChunkIndex(chunks)
+        return self.chunk_index
+
+    def _watch_as_require(self, low):
+        '''
+        Make the watch requisites of a state without a mod_watch function
+        require requisites. Returns whether watch requisites are left.
         '''
         present = False
-        # If mod_watch is not available make it a require
         if 'watch' in low:
             if '{0}.mod_watch'.format(low['state']) not in self.states:
                 if 'require' in low:
@@ -2392,6 +2963,14 @@ class State(object):
                     low['require_any'] = low.pop('watch_any')
             else:
                 present = True
+        return present
+
+    def check_requisite(self, low, running, chunks, pre=False):
+        '''
+        Look into the running data to check the status of all requisite
+        states
+        '''
+        present = self._watch_as_require(low)
         if 'require' in low:
             present = True
         if 'require_any' in low:
@@ -2423,6 +3002,7 @@ class State(object):
                 'onchanges_any': []}
         if pre:
             reqs['prerequired'] = []
+        index = self.get_chunk_index(chunks)
         for r_state in reqs:
             if r_state in low and low[r_state] is not None:
                 for req in low[r_state]:
@@ -2430,9 +3010,16 @@ class State(object):
                         req = {'id': req}
                     req = trim_req(req)
                     found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
+                    req_key = next(iter(req))
+                    req_val = req[req_key]
+                    matches = index.match(req_key, req_val)
+                    if matches is not None:
+                        found = bool(matches)
+                        reqs[r_state].extend(matches)
+                        chunks_scan = ()
+                    else:
+                        chunks_scan = chunks
+                    for chunk in chunks_scan:
                         if req_val is None:
                             continue
                         if req_key == 'sls':
@@ -2556,6 +3143,8 @@ class State(object):
         chunk is evaluated an event will be set up to the master with the
         results.
         '''
+        if self.hold_events:
+            return
         if not self.opts.get('local') and (self.opts.get('state_events', True) or fire_event):
             if not self.opts.get('master_uri'):
                 ev_func = lambda ret, tag, preload=None: salt.utils.event.get_master_event(
@@ -2618,26 +3207,28 @@ class State(object):
                     found = False
                     req_key = next(iter(req))
                     req_val = req[req_key]
-                    for chunk in chunks:
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                reqs.append(chunk)
-                                found = True
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if req_key == 'id' or chunk['state'] == req_key:
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                elif requisite == 'prerequired':
-                                    chunk['__prerequired__'] = True
-                                reqs.append(chunk)
-                                found = True
+                    matches = self.get_chunk_index(chunks).match(req_key, req_val)
+                    if matches is None:
+                        matches = []
+                        for chunk in chunks:
+                            if req_val is None:
+                                continue
+                            if req_key == 'sls':
+                                # Allow requisite tracking of entire sls files
+                                if fnmatch.fnmatch(chunk['__sls__'], req_val):
+                                    matches.append(chunk)
+                                continue
+                            if (fnmatch.fnmatch(chunk['name'], req_val) or
+                                fnmatch.fnmatch(chunk['__id__'], req_val)):
+                                if req_key == 'id' or chunk['state'] == req_key:
+                                    matches.append(chunk)
+                    for chunk in matches:
+                        if requisite == 'prereq':
+                            chunk['__prereq__'] = True
+                        elif requisite == 'prerequired' and req_key != 'sls':
+                            chunk['__prerequired__'] = True
+                        reqs.append(chunk)
+                        found = True
                     if not found:
                         lost[requisite].append(req)
             if lost['require'] or lost['watch'] or lost['prereq'] \
@@ -2823,22 +3414,38 @@ class State(object):
                 for l_in in chunk['listen_in']:
                     for key, val in six.iteritems(l_in):
                         listeners.append({(key, val, 'lookup'): [{chunk['state']: chunk['__id__']}]})
+        # Index the chunks on (state, id), (state, name) and (state, state),
+        # a listen requisite matches a chunk on any of them
+        cindex = {}
+        try:
+            for cref, data in six.iteritems(crefs):
+                for val in set(cref):
+                    cindex.setdefault((cref[0], val), []).append(data)
+        except TypeError:
+            cindex = None
+
+        def _listened(state, val):
+            if cindex is not None:
+                try:
+                    return cindex.get((state, val), [])
+                except TypeError:
+                    pass
+            return [data for cref, data in six.iteritems(crefs)
+                    if state == cref[0] and val in cref]
+
+        index = self.get_chunk_index(chunks)
         mod_watchers = []
         errors = {}
         for l_dict in listeners:
             for key, val in six.iteritems(l_dict):
                 for listen_to in val:
                     if not isinstance(listen_to, dict):
-                        found = False
-                        for chunk in chunks:
-                            if chunk['__id__'] == listen_to or \
-                               chunk['name'] == listen_to:
-                                listen_to = {chunk['state']: chunk['__id__']}
-                                found = True
-                        if not found:
+                        chunk = index.find(listen_to)
+                        if chunk is None:
                             continue
+                        listen_to = {chunk['state']: chunk['__id__']}
                     for lkey, lval in six.iteritems(listen_to):
-                        if not any(lkey == cref[0] and lval in cref for cref in crefs):
+                        if not _listened(lkey, lval):
                             rerror = {_l_tag(lkey, lval):
                                       {
                                           'comment': 'Referenced state {0}: {1} does not exist'.format(lkey, lval),
@@ -2848,14 +3455,12 @@ class State(object):
                                       }}
                             errors.update(rerror)
                             continue
-                        to_tags = [
-                            _gen_tag(data) for cref, data in six.iteritems(crefs) if lkey == cref[0] and lval in cref
-                        ]
+                        to_tags = [_gen_tag(data) for data in _listened(lkey, lval)]
                         for to_tag in to_tags:
                             if to_tag not in running:
                                 continue
                             if running[to_tag]['changes']:
-                                if not any(key[0] == cref[0] and key[1] in cref for cref in crefs):
+                                if not _listened(key[0], key[1]):
                                     rerror = {_l_tag(key[0], key[1]):
                                                  {'comment': 'Referenced state {0}: {1} does not exist'.format(key[0], key[1]),
                                                   'name': 'listen_{0}:{1}'.format(key[0], key[1]),
@@ -2864,7 +3469,7 @@ class State(object):
                                     errors.update(rerror)
                                     continue
 
-                                new_chunks = [data for cref, data in six.iteritems(crefs) if key[0] == cref[0] and key[1] in cref]
+                                new_chunks = _listened(key[0], key[1])
                                 for chunk in new_chunks:
                                     low = chunk.copy()
                                     low['sfun'] = chunk['fun']
@@ -3590,6 +4195,7 @@ class BaseHighState(object):
                 'fileserver'.format(sls, saltenv)
             )
         else:
+            salt.utils.rendercache.record_file(fn_)
             try:
                 state = compile_template(fn_,
                                          self.state.rend,
@@ -3896,6 +4502,148 @@ class BaseHighState(object):
         Gather the state files and render them into a single unified salt
         high data structure.
         '''
+        if self.opts.get('highstate_cache', False) and isinstance(
+                self.state.opts.get('grains'), salt.utils.rendercache.TrackedDict):
+            return self._render_highstate_cached(matches)
+        return self._render_highstate(matches)
+
+    def _highstate_cache_key(self, matches):
+        '''
+        Return the digest of the inputs of a highstate render which are known
+        before rendering it
+        '''
+        return salt.utils.rendercache.data_digest([
+            salt.version.__version__,
+            matches,
+            self.avail,
+            dict((opt, self.state.opts.get(opt)) for opt in HIGHSTATE_CACHE_OPTS),
+            self.state.opts.get('pillar'),
+        ])
+
+    def _highstate_file_hashes(self, paths):
+        '''
+        Return the current hashes of rendered files. The files cached from
+        the fileserver are refreshed first, with one bulk request per saltenv,
+        and all of them are then hashed locally.
+        '''
+        files_dir = os.path.join(self.opts['cachedir'], 'files')
+        cached = {}
+        for path in paths:
+            rel = os.path.relpath(path, files_dir)
+            if rel.startswith(os.pardir) or os.sep not in rel:
+                continue
+            saltenv, rel = rel.split(os.sep, 1)
+            cached.setdefault(saltenv, []).append(
+                (path, salt.utils.url.create(rel.replace(os.sep, '/'))))
+        ret = {}
+        for saltenv, files in six.iteritems(cached):
+            dests = self.client.get_files([url for _, url in files], saltenv)
+            for (path, _), dest in zip(files, dests):
+                if not dest:
+                    # Removed from the fileserver
+                    ret[path] = None
+        for path in paths:
+            if path not in ret:
+                ret[path] = salt.utils.rendercache.file_digest(path)
+        return ret
+
+    def _read_highstate_cache(self):
+        cfn = os.path.join(self.opts['cachedir'], 'highstate_cache.p')
+        try:
+            with salt.utils.files.fopen(cfn, 'rb') as fp_:
+                # Keep the order of the high data, it sets the state order
+                entries = salt.utils.msgpack.unpack(
+                    fp_, raw=False, object_pairs_hook=OrderedDict)
+        except (IOError, OSError):
+            return []
+        except Exception as exc:  # pylint: disable=broad-except
+            log.warning('Unable to read the compiled highstate cache: %s', exc)
+            return []
+        return entries if isinstance(entries, list) else []
+
+    def _write_highstate_cache(self, entries):
+        cfn = os.path.join(self.opts['cachedir'], 'highstate_cache.p')
+        try:
+            with salt.utils.files.set_umask(0o077):
+                with salt.utils.atomicfile.atomic_open(cfn, 'wb') as fp_:
+                    salt.utils.msgpack.pack(entries, fp_, use_bin_type=True)
+        except Exception as exc:  # pylint: disable=broad-except
+            # The high data of the pydsl renderer cannot be serialized
+            log.warning('Unable to write the compiled highstate cache: %s', exc)
+
+    def _highstate_cacheable(self, files):
+        '''
+        Return the reason why a highstate rendered from files cannot be
+        cached, or None
+        '''
+        renderers = self.opts.get('highstate_cache_renderers', [])
+        functions = self.opts.get('highstate_cache_functions', [])
+        for path in files:
+            pipe = salt.utils.rendercache.render_pipe(
+                path, self.state.opts['renderer'])
+            if not set(pipe).issubset(renderers):
+                return 'renderer pipe {0} of {1}'.format('|'.join(pipe), path)
+            reason, reads_opts = salt.utils.rendercache.check_source(
+                path, functions)
+            if reason:
+                return reason
+            if reads_opts:
+                # The opts read are not recorded, the key would miss them
+                return '{0} reads the opts'.format(path)
+        return None
+
+    def _render_highstate_cached(self, matches):
+        '''
+        Return the high data rendered for the matches from the compiled
+        highstate cache when the rendered files and the grains and pillar
+        they read did not change, render it otherwise
+        '''
+        key = self._highstate_cache_key(matches)
+        sources = {'grains': self.state.opts['grains']}
+        entries = self._read_highstate_cache()
+        for entry in entries:
+            if entry.get('key') != key:
+                continue
+            grains = dict(((name, gkey), digest)
+                          for name, gkey, digest in entry['grains'])
+            if not salt.utils.rendercache.inputs_match(grains, sources):
+                continue
+            if self._highstate_file_hashes(list(entry['files'])) != entry['files']:
+                continue
+            log.debug('Using the compiled highstate cache, saved %.3fs',
+                      entry['time'])
+            return entry['high'], []
+
+        start = time.time()
+        with salt.utils.rendercache.InputRecorder() as recorder:
+            high, errors = self._render_highstate(matches)
+        render_time = time.time() - start
+        if errors:
+            return high, errors
+        reason = self._highstate_cacheable(recorder.files)
+        if reason:
+            log.debug('Not caching the compiled highstate: %s', reason)
+            return high, errors
+        entry = {
+            'key': key,
+            'grains': [[name, gkey, digest] for (name, gkey), digest in
+                       six.iteritems(salt.utils.rendercache.input_digests(
+                           [(name, gkey) for name, gkey in recorder.keys
+                            if name == 'grains'],
+                           sources))],
+            'files': self._highstate_file_hashes(list(recorder.files)),
+            'high': high,
+            'time': render_time,
+        }
+        entries = [old for old in entries if old.get('key') != key]
+        entries.insert(0, entry)
+        self._write_highstate_cache(entries[:HIGHSTATE_CACHE_ENTRIES])
+        return high, errors
+
+    def _render_highstate(self, matches):
+        '''
+        Render the state files matched into the high data
+        '''
         highstate = self.building_highstate
         all_errors = []
         mods = set()
@@ -4011,6 +4759,66 @@ class BaseHighState(object):
         '''
         Run the sequence to execute the salt highstate for this minion
         '''
+        if not self.opts.get('state_file_prefetch'):
+            return self._call_highstate(exclude, cache, cache_name, force,
+                                        whitelist, orchestration_jid)
+        with salt.fileclient.verified_files() as files:
+            self._prefetch_highstate_files()
+            try:
+                return self._call_highstate(exclude, cache, cache_name, force,
+                                            whitelist, orchestration_jid)
+            finally:
+                self._write_highstate_files(files)
+
+    def _prefetch_highstate_files(self):
+        '''
+        Fetch the files the last highstate used from the master with the
+        multi-file protocol, they are not checked against the master again
+        during the run
+        '''
+        mfn = os.path.join(self.opts['cachedir'], 'highstate_files.p')
+        try:
+            with salt.utils.files.fopen(mfn, 'rb') as fp_:
+                manifest = salt.utils.msgpack.unpack(fp_, raw=False)
+        except (IOError, OSError):
+            return
+        except Exception as exc:  # pylint: disable=broad-except
+            log.warning('Unable to read the highstate file manifest: %s', exc)
+            return
+        paths = {}
+        for item in manifest if isinstance(manifest, list) else []:
+            try:
+                saltenv, path = item
+            except (TypeError, ValueError):
+                continue
+            paths.setdefault(saltenv, []).append(path)
+        for saltenv in sorted(paths):
+            log.debug('Prefetching %d files of saltenv \'%s\'',
+                      len(paths[saltenv]), saltenv)
+            self.client.get_files(paths[saltenv], saltenv)
+
+    def _write_highstate_files(self, files):
+        '''
+        Write the manifest of the files cached from the master by the
+        highstate, to prefetch them on the next run
+        '''
+        manifest = sorted([saltenv, path]
+                          for saltenv, path, cachedir in files
+                          if cachedir is None)
+        mfn = os.path.join(self.opts['cachedir'], 'highstate_files.p')
+        try:
+            with salt.utils.files.set_umask(0o077):
+                with salt.utils.atomicfile.atomic_open(mfn, 'wb') as fp_:
+                    salt.utils.msgpack.pack(manifest, fp_, use_bin_type=True)
+        except (IOError, OSError) as exc:
+            log.warning('Unable to write the highstate file manifest: %s', exc)
+
+    def _call_highstate(self, exclude, cache, cache_name, force, whitelist,
+                        orchestration_jid):
+        '''
+        Run the sequence to execute the salt highstate for this minion, see
+        call_highstate
+        '''
         # Check that top file exists
         tag_name = 'no_|-states_|-states_|-None'
         ret = {tag_name: {
@@ -4192,6 +5000,13 @@ class HighState(BaseHighState):
         self.opts = opts
         self.client = salt.fileclient.get_file_client(self.opts)
         BaseHighState.__init__(self, opts)
+        if self.opts.get('highstate_cache', False) and \
+                isinstance(self.opts.get('grains'), dict) and \
+                not isinstance(self.opts['grains'], salt.utils.rendercache.TrackedDict):
+            # Record the grains read by the renders, for the compiled
+            # highstate cache
+            self.opts['grains'] = salt.utils.rendercache.TrackedDict(
+                'grains', self.opts['grains'])
         self.state = State(self.opts,
                            pillar_override,
                            jid,
@@ -7,9 +7,12 @@ IPC transport classes
 from __future__ import absolute_import, print_function, unicode_literals
 import sys
 import errno
+import fnmatch
 import logging
+import re
 import socket
 import time
+import datetime
 
 # Import Tornado libs
 import salt.ext.tornado
@@ -81,6 +84,41 @@ class FutureWithTimeout(salt.ext.tornado.concurrent.Future):
             self.set_exception(exc)
 
 
+def _tag_matcher(tags):
+    '''
+    Return a function which checks whether an event tag matches one of the
+    ``[tag, match_type]`` pairs a subscriber registered, with the match types
+    of ``SaltEvent.get_event``, or None if every tag matches
+    '''
+    if tags is None:
+        return None
+    prefixes, suffixes, finds, regexes, globs = [], [], [], [], []
+    for tag, match_type in tags:
+        if match_type == 'startswith':
+            prefixes.append(tag)
+        elif match_type == 'endswith':
+            suffixes.append(tag)
+        elif match_type == 'find':
+            finds.append(tag)
+        elif match_type == 'regex':
+            regexes.append(re.compile('^' + tag))
+        elif match_type == 'fnmatch':
+            globs.append(tag)
+        else:
+            return None
+    if '' in prefixes or '' in suffixes or '' in finds:
+        return None
+    prefixes = tuple(prefixes)
+    suffixes = tuple(suffixes)
+
+    def match(tag):
+        return (tag.startswith(prefixes) or tag.endswith(suffixes) or
+                any(find in tag for find in finds) or
+                any(regex.search(tag) for regex in regexes) or
+                any(fnmatch.fnmatch(tag, glob) for glob in globs))
+    return match
+
+
 class IPCServer(object):
     '''
     A Tornado IPC server very similar to Tornado's TCPServer class
@@ -419,6 +457,39 @@ class IPCMessageClient(IPCClient):
         yield self.stream.write(pack)
 
 
+class IPCMessageShardClient(object):
+    '''
+    Salt IPC message client for the IPC servers of a sharded publisher
+
+    Each message is sent to the server of the shard passed with it, so the
+    messages sent to one shard keep their order.
+    '''
+    def __init__(self, socket_paths, io_loop=None):
+        self.socket_paths = socket_paths
+        self.clients = [IPCMessageClient(socket_path, io_loop=io_loop)
+                        for socket_path in socket_paths]
+
+    def connected(self):
+        return all(client.connected() for client in self.clients)
+
+    @salt.ext.tornado.gen.coroutine
+    def connect(self, timeout=None):
+        '''
+        Connect to the IPC socket of every shard
+        '''
+        yield [client.connect(timeout=timeout) for client in self.clients]
+
+    def send(self, msg, shard=0, timeout=None, tries=None):
+        '''
+        Send a message to the IPC socket of a shard
+        '''
+        return self.clients[shard].send(msg, timeout=timeout, tries=tries)
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+
 class IPCMessageServer(IPCServer):
     '''
     Salt IPC message server
@@ -481,6 +552,7 @@ class IPCMessagePublisher(object):
         self.io_loop = io_loop or IOLoop.current()
         self._closing = False
         self.streams = set()
+        self.filters = {}
 
     def start(self):
         '''
@@ -520,9 +592,50 @@ class IPCMessagePublisher(object):
                 stream.close()
             self.streams.discard(stream)
 
-    def publish(self, msg):
+    @salt.ext.tornado.gen.coroutine
+    def _read_filter(self, stream):
+        '''
+        Read the tags a subscriber registers with ``subscribe`` and keep the
+        filter of its stream
+        '''
+        # msgpack deprecated `encoding` starting with version 0.5.2
+        if salt.utils.msgpack.version >= (0, 5, 2):
+            # Under Py2 we still want raw to be set to True
+            msgpack_kwargs = {'raw': six.PY2}
+        else:
+            if six.PY2:
+                msgpack_kwargs = {'encoding': None}
+            else:
+                msgpack_kwargs = {'encoding': 'utf-8'}
+        unpacker = salt.utils.msgpack.Unpacker(**msgpack_kwargs)
+        while not stream.closed():
+            try:
+                wire_bytes = yield stream.read_bytes(4096, partial=True)
+            except StreamClosedError:
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                log.error('Exception occurred while reading subscriptions: %s', exc)
+                break
+            unpacker.feed(wire_bytes)
+            for framed_msg in unpacker:
+                try:
+                    matcher = _tag_matcher(framed_msg['body'])
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.error('Invalid subscription on IPC %s: %s',
+                              self.socket_path, exc)
+                    matcher = None
+                if matcher is None:
+                    self.filters.pop(stream, None)
+                else:
+                    self.filters[stream] = matcher
+
+    def publish(self, msg, tag=None):
         '''
         Send message to all connected sockets
+
+        When the tag of the message is passed, subscribers which registered
+        tags with ``IPCMessageSubscriber.subscribe`` only get the message if
+        the tag matches one of them.
         '''
         if not self.streams:
             return
@@ -530,6 +643,8 @@ class IPCMessagePublisher(object):
         pack = salt.transport.frame.frame_msg_ipc(msg, raw_body=True)
 
         for stream in self.streams:
+            if tag is not None and stream in self.filters and not self.filters[stream](tag):
+                continue
             self.io_loop.spawn_callback(self._write, stream, pack)
 
     def handle_connection(self, connection, address):
@@ -548,8 +663,10 @@ class IPCMessagePublisher(object):
 
             def discard_after_closed():
                 self.streams.discard(stream)
+                self.filters.pop(stream, None)
 
             stream.set_close_callback(discard_after_closed)
+            self.io_loop.spawn_callback(self._read_filter, stream)
         except Exception as exc:  # pylint: disable=broad-except
             log.error('IPC streaming error: %s', exc)
 
@@ -565,6 +682,7 @@ class IPCMessagePublisher(object):
         for stream in self.streams:
             stream.close()
         self.streams.clear()
+        self.filters.clear()
         if hasattr(self.sock, 'close'):
             self.sock.close()
 
@@ -692,6 +810,18 @@ class IPCMessageSubscriber(IPCClient):
             return self._saved_data.pop(0)
         return self.io_loop.run_sync(lambda: self._read(timeout))
 
+    @salt.ext.tornado.gen.coroutine
+    def subscribe(self, tags):
+        '''
+        Register the tags to receive with the publisher
+
+        The socket must already be connected.
+        :param list tags: ``[tag, match_type]`` pairs, replacing the ones
+                          registered before, or None to receive all messages
+        '''
+        pack = salt.transport.frame.frame_msg_ipc(tags, raw_body=True)
+        yield self.stream.write(pack)
+
     @salt.ext.tornado.gen.coroutine
     def read_async(self, callback):
         '''
@@ -732,3 +862,123 @@ class IPCMessageSubscriber(IPCClient):
         if IPCMessageSubscriber in globals():
             self.close()
     # pylint: enable=W1701
+
+
+class IPCMessageShardSubscriber(object):
+    '''
+    Salt IPC message subscriber reading from all the IPC publishers of a
+    sharded publisher
+
+    It has the interface of ``IPCMessageSubscriber``. The messages of one
+    shard are returned in order, the shards are read concurrently.
+    '''
+    def __init__(self, socket_paths, io_loop=None):
+        self.io_loop = io_loop or salt.ext.tornado.ioloop.IOLoop.current()
+        self.socket_paths = socket_paths
+        self.subscribers = [IPCMessageSubscriber(socket_path, io_loop=self.io_loop)
+                            for socket_path in socket_paths]
+        # The pending read of each subscriber and the messages read along
+        # with the one returned
+        self._reads = {}
+        self._any_read = salt.ext.tornado.concurrent.Future()
+        self._saved_data = []
+
+    def connected(self):
+        return all(subscriber.connected() for subscriber in self.subscribers)
+
+    @salt.ext.tornado.gen.coroutine
+    def connect(self, timeout=None):
+        '''
+        Connect to the IPC socket of every shard
+        '''
+        yield [subscriber.connect(timeout=timeout) for subscriber in self.subscribers]
+
+    @salt.ext.tornado.gen.coroutine
+    def subscribe(self, tags):
+        '''
+        Register the tags to receive with the publisher of every shard
+        '''
+        yield [subscriber.subscribe(tags) for subscriber in self.subscribers]
+
+    def _read_done(self, _):
+        if not self._any_read.done():
+            self._any_read.set_result(None)
+
+    @salt.ext.tornado.gen.coroutine
+    def _read(self, timeout):
+        timeout_at = None if timeout is None else time.time() + timeout
+        ret = None
+        while True:
+            self._any_read = salt.ext.tornado.concurrent.Future()
+            for subscriber in self.subscribers:
+                if subscriber not in self._reads:
+                    future = subscriber._read(
+                        None if timeout_at is None else max(timeout_at - time.time(), 0))
+                    future.add_done_callback(self._read_done)
+                    self._reads[subscriber] = future
+                elif self._reads[subscriber].done():
+                    self._read_done(None)
+            # Reads left from an earlier call may have a longer timeout
+            # than this one, wait on the first to finish
+            try:
+                if timeout_at is None:
+                    yield self._any_read
+                else:
+                    yield salt.ext.tornado.gen.with_timeout(
+                        datetime.timedelta(seconds=max(timeout_at - time.time(), 0)),
+                        self._any_read)
+            except salt.ext.tornado.gen.TimeoutError:
+                break
+            for subscriber in self.subscribers:
+                future = self._reads.get(subscriber)
+                if future is None or not future.done():
+                    continue
+                del self._reads[subscriber]
+                msg = future.result()
+                if msg is None:
+                    continue
+                if ret is None:
+                    ret = msg
+                else:
+                    self._saved_data.append(msg)
+            if ret is not None or (timeout_at is not None and time.time() >= timeout_at):
+                break
+        raise salt.ext.tornado.gen.Return(ret)
+
+    def read_sync(self, timeout=None):
+        '''
+        Read a message from the IPC socket of any shard
+
+        The sockets must already be connected.
+        The associated IO Loop must NOT be running.
+        :param int timeout: Timeout when receiving message
+        :return: message data if successful. None if timed out. Will raise an
+                 exception for all other error conditions.
+        '''
+        if self._saved_data:
+            return self._saved_data.pop(0)
+        for subscriber in self.subscribers:
+            if subscriber._saved_data:
+                return subscriber._saved_data.pop(0)
+        return self.io_loop.run_sync(lambda: self._read(timeout))
+
+    @salt.ext.tornado.gen.coroutine
+    def read_async(self, callback):
+        '''
+        Asynchronously read messages from every shard and invoke a callback
+        when they are ready.
+
+        :param callback: A callback with the received data
+        '''
+        yield [subscriber.read_async(callback) for subscriber in self.subscribers]
+
+    def close(self):
+        '''
+        Close the subscriber of every shard
+        '''
+        for subscriber in self.subscribers:
+            subscriber.close()
+        for future in self._reads.values():
+            # Retrieve the exception of the reads cut short by the close
+            future.add_done_callback(lambda future: future.exception())
+        self._reads = {}
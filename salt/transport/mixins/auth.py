@@ -66,6 +66,64 @@ class AESPubClientMixin(object):
         raise salt.ext.tornado.gen.Return(payload)
 
 
+class AESPubServerMixin(object):
+    '''
+    Mixin to house the master-side publish crypto
+
+    The crypticle of the current AES key, the signing key and the last
+    publish are shared by all the publisher channels of a process, so a job
+    published over several transports is only encrypted and signed once.
+    '''
+    _pub_cache = {}
+
+    def _pub_crypticle(self):
+        '''
+        Return the crypticle of the current AES key, it is replaced when the
+        key is rotated
+        '''
+        key_string = salt.master.SMaster.secrets['aes']['secret'].value
+        crypticle = self._pub_cache.get('crypticle')
+        if crypticle is None or crypticle.key_string != key_string:
+            crypticle = salt.crypt.Crypticle(self.opts, key_string)
+            self._pub_cache.pop('publish', None)
+            self._pub_cache['crypticle'] = crypticle
+        return crypticle
+
+    def _pub_sign_key(self):
+        '''
+        Return the master private key used to sign the publishes
+        '''
+        master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
+        cached = self._pub_cache.get('sign_key')
+        if cached is None or cached[0] != master_pem_path:
+            cached = (master_pem_path, salt.crypt.get_rsa_key(master_pem_path, None))
+            self._pub_cache['sign_key'] = cached
+        return cached[1]
+
+    def _encrypt_publish(self, load):
+        '''
+        Return the serialized, encrypted and, with ``sign_pub_messages``,
+        signed payload of a publish. Publishing the same load again with the
+        same AES key returns the payload built the first time.
+        '''
+        crypticle = self._pub_crypticle()
+        packed = self.serial.dumps(load)
+        cache_key = (packed, bool(self.opts['sign_pub_messages']))
+        cached = self._pub_cache.get('publish')
+        if cached is not None and cached[0] == cache_key:
+            log.trace('Reusing the encrypted payload of the last publish')
+            return cached[1]
+        payload = {'enc': 'aes'}
+        payload['load'] = crypticle.encrypt(crypticle.PICKLE_PAD + packed)
+        if self.opts['sign_pub_messages']:
+            log.debug("Signing data packet")
+            payload['sig'] = salt.crypt.sign_message_with_key(
+                self._pub_sign_key(), payload['load'])
+        payload = self.serial.dumps(payload)
+        self._pub_cache['publish'] = (cache_key, payload)
+        return payload
+
+
 # TODO: rename?
 class AESReqServerMixin(object):
     '''
@@ -444,6 +502,10 @@ class AESReqServerMixin(object):
         ret = {'enc': 'pub',
                'pub_key': self.master_key.get_pub_str(),
                'publish_port': self.opts['publish_port']}
+        if self.opts.get('worker_pools'):
+            # Tell the minion to add the cleartext routing field to its
+            # AES requests
+            ret['worker_pools'] = True
 
         # sign the master's pubkey (if enabled) before it is
         # sent to the minion that was just authenticated
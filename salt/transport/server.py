@@ -91,9 +91,12 @@ class PubServerChannel(object):
         do the actual publishing
         '''
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions
+
+        :param list minions: The IDs of the minions the target of "load" was
+            already resolved to, if any
         '''
         raise NotImplementedError()
 
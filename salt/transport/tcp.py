@@ -1444,7 +1444,7 @@ class PubServer(salt.ext.tornado.tcpserver.TCPServer, object):
         log.trace('TCP PubServer finished publishing payload')
 
 
-class TCPPubServerChannel(salt.transport.server.PubServerChannel):
+class TCPPubServerChannel(salt.transport.mixins.auth.AESPubServerMixin, salt.transport.server.PubServerChannel):
     # TODO: opts!
     # Based on default used in salt.ext.tornado.netutil.bind_sockets()
     backlog = 128
@@ -1523,18 +1523,10 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         process_manager.add_process(self._publish_daemon, kwargs=kwargs)
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions
         '''
-        payload = {'enc': 'aes'}
-
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
-        payload['load'] = crypticle.dumps(load)
-        if self.opts['sign_pub_messages']:
-            master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
-            log.debug("Signing data packet")
-            payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
         # Use the Salt IPC server
         if self.opts.get('ipc_mode', '') == 'tcp':
             pull_uri = int(self.opts.get('tcp_master_publish_pull', 4514))
@@ -1548,15 +1540,18 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         )
         pub_sock.connect()
 
-        int_payload = {'payload': self.serial.dumps(payload)}
+        int_payload = {'payload': self._encrypt_publish(load)}
 
         # add some targeting stuff for lists only (for now)
         if load['tgt_type'] == 'list' and not self.opts.get("order_masters", False):
             if isinstance(load['tgt'], six.string_types):
                 # Fetch a list of minions that match
-                _res = self.ckminions.check_minions(load['tgt'],
-                                                    tgt_type=load['tgt_type'])
-                match_ids = _res['minions']
+                if minions is not None:
+                    match_ids = minions
+                else:
+                    _res = self.ckminions.check_minions(load['tgt'],
+                                                        tgt_type=load['tgt_type'])
+                    match_ids = _res['minions']
 
                 log.debug("Publish Side Match: %s", match_ids)
                 # Send list of miions thru so zmq can target them
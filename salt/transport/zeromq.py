@@ -8,6 +8,7 @@ from __future__ import absolute_import, print_function, unicode_literals
 import os
 import sys
 import copy
+import collections
 import errno
 import signal
 import socket
@@ -34,6 +35,7 @@ import salt.transport.client
 import salt.transport.server
 import salt.transport.mixins.auth
 from salt.ext import six
+from salt.defaults import DEFAULT_TARGET_DELIM
 from salt.exceptions import SaltReqTimeoutError, SaltException
 from salt._compat import ipaddress
 
@@ -276,11 +278,25 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
         # if we've reached here something is very abnormal
         raise SaltException('ReqChannel: missing master_uri/master_ip in self.opts')
 
-    def _package_load(self, load):
-        return {
+    def _load_cmd(self, load):
+        '''
+        Return the command of a load, if any, when the master routes the
+        requests to worker pools
+        '''
+        if isinstance(load, dict) and (self.auth.creds or {}).get('worker_pools'):
+            return load.get('cmd')
+        return None
+
+    def _package_load(self, load, cmd=None):
+        ret = {
             'enc': self.crypt,
             'load': load,
         }
+        if cmd is not None:
+            # Lets the master route the request to a worker pool without
+            # decrypting the load
+            ret['cmd'] = cmd
+        return ret
 
     @salt.ext.tornado.gen.coroutine
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
@@ -289,7 +305,7 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
             yield self.auth.authenticate()
         # Return control to the caller. When send() completes, resume by populating ret with the Future.result
         ret = yield self.message_client.send(
-            self._package_load(self.auth.crypticle.dumps(load)),
+            self._package_load(self.auth.crypticle.dumps(load), self._load_cmd(load)),
             timeout=timeout,
             tries=tries,
         )
@@ -298,7 +314,7 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
             # Reauth in the case our key is deleted on the master side.
             yield self.auth.authenticate()
             ret = yield self.message_client.send(
-                self._package_load(self.auth.crypticle.dumps(load)),
+                self._package_load(self.auth.crypticle.dumps(load), self._load_cmd(load)),
                 timeout=timeout,
                 tries=tries,
             )
@@ -333,7 +349,7 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
         def _do_transfer():
             # Yield control to the caller. When send() completes, resume by populating data with the Future.result
             data = yield self.message_client.send(
-                self._package_load(self.auth.crypticle.dumps(load)),
+                self._package_load(self.auth.crypticle.dumps(load), self._load_cmd(load)),
                 timeout=timeout,
                 tries=tries,
             )
@@ -584,6 +600,19 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
         return self.stream.on_recv(wrap_callback)
 
 
+class _EnvelopeStream(object):
+    '''
+    Send the replies of a request received on a DEALER socket with the
+    routing envelope of the request
+    '''
+    def __init__(self, stream, envelope):
+        self.stream = stream
+        self.envelope = envelope
+
+    def send(self, msg):
+        self.stream.send_multipart(self.envelope + [msg])
+
+
 class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
                              salt.transport.server.ReqServerChannel):
 
@@ -606,16 +635,15 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             self.clients.setsockopt(zmq.IPV4ONLY, 0)
         self.clients.setsockopt(zmq.BACKLOG, self.opts.get('zmq_backlog', 1000))
         self._start_zmq_monitor()
-        self.workers = self.context.socket(zmq.DEALER)
 
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        if self.opts.get('worker_pools'):
+            log.info('Setting up the master communication server')
+            self.clients.bind(self.uri)
+            self._zmq_pool_device()
+            return
+
+        self.workers = self.context.socket(zmq.DEALER)
+        self.w_uri = self._worker_uri()
 
         log.info('Setting up the master communication server')
         self.clients.bind(self.uri)
@@ -633,6 +661,108 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             except (KeyboardInterrupt, SystemExit):
                 break
 
+    def _worker_uri(self, pool=None):
+        '''
+        Return the URI of the queue the workers of a pool, or all the workers
+        if there are no pools, receive their requests from
+        '''
+        if self.opts.get('ipc_mode', '') == 'tcp':
+            port = int(self.opts.get('tcp_master_workers', 4515))
+            if pool is not None:
+                port += 1 + sorted(self.opts['worker_pools']).index(pool)
+            return 'tcp://127.0.0.1:{0}'.format(port)
+        if pool is None:
+            name = 'workers.ipc'
+        else:
+            name = 'workers-{0}.ipc'.format(pool)
+        return 'ipc://{0}'.format(os.path.join(self.opts['sock_dir'], name))
+
+    def _request_cmd(self, body):
+        '''
+        Return the command of a request, or None if it can't be read. AES
+        requests are not decrypted, their command is read from the cleartext
+        ``cmd`` routing field added by the minions.
+        '''
+        try:
+            payload = self.serial.loads(body)
+            if payload['enc'] == 'aes':
+                # Only used for routing, the workers read the command from
+                # the decrypted load
+                return payload.get('cmd')
+            return payload['load'].get('cmd')
+        except Exception:  # pylint: disable=broad-except
+            # Let the default pool reply to bad requests
+            return None
+
+    def _zmq_pool_device(self):
+        '''
+        Route the requests of the minions to the queues of the worker pools
+        by command, and the replies of the workers back to the minions
+        '''
+        self.serial = salt.payload.Serial(self.opts)
+        routes = {}
+        self.pool_workers = {}
+        backlogs = {}
+        poller = zmq.Poller()
+        poller.register(self.clients, zmq.POLLIN)
+        for pool, conf in six.iteritems(self.opts['worker_pools']):
+            for cmd in conf['commands']:
+                routes[cmd] = pool
+            workers = self.context.socket(zmq.DEALER)
+            if 'queue_size' in conf:
+                workers.setsockopt(zmq.SNDHWM, int(conf['queue_size']))
+            workers.bind(self._worker_uri(pool))
+            poller.register(workers, zmq.POLLIN)
+            self.pool_workers[pool] = workers
+            backlogs[pool] = collections.deque()
+        log.info('Routing requests to the worker pools: %s',
+                 ', '.join(sorted(self.pool_workers)))
+
+        while True:
+            if self.clients.closed:
+                break
+            try:
+                socks = dict(poller.poll())
+                if socks.get(self.clients) == zmq.POLLIN:
+                    frames = self.clients.recv_multipart()
+                    pool = routes.get(self._request_cmd(frames[-1]), 'default')
+                    backlogs[pool].append(frames)
+                    self._flush_pool_backlog(poller, pool, backlogs[pool])
+                for pool, workers in six.iteritems(self.pool_workers):
+                    events = socks.get(workers, 0)
+                    if events & zmq.POLLOUT:
+                        self._flush_pool_backlog(poller, pool, backlogs[pool])
+                    if events & zmq.POLLIN:
+                        self.clients.send_multipart(workers.recv_multipart())
+            except zmq.ZMQError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                six.reraise(*sys.exc_info())
+            except (KeyboardInterrupt, SystemExit):
+                break
+
+    def _flush_pool_backlog(self, poller, pool, backlog):
+        '''
+        Send the requests waiting in the backlog of a pool to its queue, in
+        order, until the queue is full or has no workers connected. The
+        queue is then polled for room to send the rest.
+        '''
+        workers = self.pool_workers[pool]
+        while backlog:
+            try:
+                workers.send_multipart(backlog[0], zmq.NOBLOCK)
+            except zmq.ZMQError as exc:
+                if exc.errno != zmq.EAGAIN:
+                    raise
+                break
+            backlog.popleft()
+        if backlog:
+            log.debug('%d requests are waiting for the %s worker pool',
+                      len(backlog), pool)
+            poller.modify(workers, zmq.POLLIN | zmq.POLLOUT)
+        else:
+            poller.modify(workers, zmq.POLLIN)
+
     def close(self):
         '''
         Cleanly shutdown the router socket
@@ -652,6 +782,9 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             self.clients.close()
         if hasattr(self, 'workers') and self.workers.closed is False:
             self.workers.close()
+        for workers in six.itervalues(getattr(self, 'pool_workers', {})):
+            if workers.closed is False:
+                workers.close()
         if hasattr(self, 'stream'):
             self.stream.close()
         if hasattr(self, '_socket') and self._socket.closed is False:
@@ -697,24 +830,38 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         self.io_loop = io_loop
 
         self.context = zmq.Context(1)
-        self._socket = self.context.socket(zmq.REP)
+        if int(self.opts.get('mworker_concurrency', 1)) > 1:
+            # A REP socket only receives the next request once the last one
+            # was replied to, a DEALER lets the worker take several at once
+            self._socket = self.context.socket(zmq.DEALER)
+        else:
+            self._socket = self.context.socket(zmq.REP)
         self._start_zmq_monitor()
 
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        self.w_uri = self._worker_uri(self.opts.get('worker_pool'))
         log.info('Worker binding to socket %s', self.w_uri)
         self._socket.connect(self.w_uri)
 
         salt.transport.mixins.auth.AESReqServerMixin.post_fork(self, payload_handler, io_loop)
 
         self.stream = zmq.eventloop.zmqstream.ZMQStream(self._socket, io_loop=self.io_loop)
-        self.stream.on_recv_stream(self.handle_message)
+        if self._socket.socket_type == zmq.DEALER:
+            self.stream.on_recv_stream(self.handle_routed_message)
+        else:
+            self.stream.on_recv_stream(self.handle_message)
+
+    def handle_routed_message(self, stream, payload):
+        '''
+        Handle incoming messages on a DEALER socket. Unlike a REP socket it
+        doesn't strip the routing envelope, the reply is sent back with it.
+
+        :stream ZMQStream stream: A ZeroMQ stream.
+        :param list payload: The frames of the message
+        '''
+        delim = payload.index(b'')
+        return self.handle_message(
+            _EnvelopeStream(stream, payload[:delim + 1]),
+            payload[delim + 1:])
 
     @salt.ext.tornado.gen.coroutine
     def handle_message(self, stream, payload):
@@ -841,7 +988,8 @@ def _set_tcp_keepalive(zmq_socket, opts):
             )
 
 
-class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
+class ZeroMQPubServerChannel(salt.transport.mixins.auth.AESPubServerMixin,
+                             salt.transport.server.PubServerChannel):
     '''
     Encapsulate synchronous operations for a publisher channel
     '''
@@ -1020,37 +1168,90 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
             self._sock_data.sock.close()
             delattr(self._sock_data, 'sock')
 
-    def publish(self, load):
+    def _negated_target(self, load):
+        '''
+        Return True if the compound or nodegroup target of "load" contains a
+        ``not``. The master side match is greedy, it includes minions without
+        cached data, so negating it can leave out minions which are targeted.
+        '''
+        def _words(tgt):
+            if isinstance(tgt, six.string_types):
+                return tgt.split()
+            return list(tgt or [])
+
+        tgt = load['tgt']
+        if load['tgt_type'] == 'nodegroup':
+            tgt = salt.utils.minions.nodegroup_comp(tgt, self.opts['nodegroups'])
+        words = []
+        for word in _words(tgt):
+            target_info = salt.utils.minions.parse_target(word)
+            if target_info and target_info['engine'] == 'N':
+                words.extend(_words(salt.utils.minions.nodegroup_comp(
+                    target_info['pattern'], self.opts['nodegroups'])))
+            else:
+                words.append(word)
+        return 'not' in words
+
+    def _publish_topics(self, load, minions=None):
+        '''
+        Resolve the target of "load" to the IDs of the minions the publish is
+        sent to, unless the caller already resolved it to ``minions``. Returns
+        None if the publish has to be broadcast instead.
+        '''
+        tgt_type = load['tgt_type']
+        if tgt_type not in self.opts['zmq_filtering_tgt_types']:
+            return None
+        if tgt_type not in ('glob', 'pcre', 'list') \
+                and not self.opts.get('minion_data_cache', False):
+            # Without cached grains and pillar every minion matches
+            return None
+        if tgt_type in ('compound', 'compound_pillar_exact', 'nodegroup') \
+                and self._negated_target(load):
+            return None
+        if minions is not None:
+            match_ids = minions
+        else:
+            match_ids = self.ckminions.check_minions(
+                load['tgt'],
+                tgt_type=tgt_type,
+                delimiter=load.get('delimiter', DEFAULT_TARGET_DELIM))['minions']
+        if not match_ids and tgt_type not in ('glob', 'pcre', 'list'):
+            # The match failed or the cache is empty, let the minions match
+            return None
+        max_minions = self.opts['zmq_filtering_max_minions']
+        if max_minions and len(match_ids) > max_minions:
+            log.debug(
+                'Publish matched %d minions, more than '
+                'zmq_filtering_max_minions, broadcasting it',
+                len(match_ids)
+            )
+            return None
+        return match_ids
+
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions. This send the load to the publisher daemon
         process with does the actual sending to minions.
 
         :param dict load: A load to be sent across the wire to minions
+        :param list minions: The IDs of the minions the target of "load" was
+            already resolved to, spares resolving it again for zmq_filtering
         '''
-        payload = {'enc': 'aes'}
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
-        payload['load'] = crypticle.dumps(load)
-        if self.opts['sign_pub_messages']:
-            master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
-            log.debug("Signing data packet")
-            payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
-        int_payload = {'payload': self.serial.dumps(payload)}
+        int_payload = {'payload': self._encrypt_publish(load)}
 
         # add some targeting stuff for lists only (for now)
         if load['tgt_type'] == 'list':
             int_payload['topic_lst'] = load['tgt']
 
         # If zmq_filtering is enabled, target matching has to happen master side
-        match_targets = ["pcre", "glob", "list"]
-        if self.opts['zmq_filtering'] and load['tgt_type'] in match_targets:
-            # Fetch a list of minions that match
-            _res = self.ckminions.check_minions(load['tgt'],
-                                                tgt_type=load['tgt_type'])
-            match_ids = _res['minions']
-
-            log.debug("Publish Side Match: %s", match_ids)
-            # Send list of miions thru so zmq can target them
-            int_payload['topic_lst'] = match_ids
+        if self.opts['zmq_filtering']:
+            match_ids = self._publish_topics(load, minions)
+            if match_ids is None:
+                int_payload.pop('topic_lst', None)
+            else:
+                log.debug("Publish Side Match: %s", match_ids)
+                # Send list of miions thru so zmq can target them
+                int_payload['topic_lst'] = match_ids
         payload = self.serial.dumps(int_payload)
         log.debug(
             'Sending payload to publish daemon. jid=%s size=%d',
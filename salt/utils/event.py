@@ -55,10 +55,12 @@ from __future__ import absolute_import, unicode_literals, print_function
 # Import python libs
 import os
 import time
+import zlib
 import fnmatch
 import hashlib
 import logging
 import datetime
+import functools
 
 try:
     from collections.abc import MutableMapping
@@ -200,6 +202,62 @@ def tagify(suffix='', prefix='', base=SALT):
     return TAGPARTER.join([part for part in parts if part])
 
 
+def _event_shards(opts):
+    '''
+    Return the number of shards of the master event publisher, which are only
+    run with unix domain sockets
+    '''
+    if opts['ipc_mode'] == 'tcp':
+        return 1
+    return max(int(opts['event_publisher_shards']), 1)
+
+
+def _master_event_uris(opts, sock_dir=None):
+    '''
+    Return the pub and pull socket URIs of each shard of the master event
+    publisher, the first shard keeping the URIs of an unsharded publisher
+    '''
+    if opts['ipc_mode'] == 'tcp':
+        return [(int(opts['tcp_master_pub_port']), int(opts['tcp_master_pull_port']))]
+    sock_dir = sock_dir or opts['sock_dir']
+    uris = []
+    for shard in range(_event_shards(opts)):
+        suffix = '_{0}'.format(shard) if shard else ''
+        uris.append((
+            os.path.join(sock_dir, 'master_event_pub{0}.ipc'.format(suffix)),
+            os.path.join(sock_dir, 'master_event_pull{0}.ipc'.format(suffix))))
+    return uris
+
+
+def _tag_shard(tag, shards, depth):
+    '''
+    Return the shard of the master event publisher the events of a tag go
+    through, from the hash of the first depth components of the tag, so the
+    events of a tag, and with the default depth of a job, keep their order
+    '''
+    tag = salt.utils.stringutils.to_str(tag)
+    if depth > 0:
+        tag = TAGPARTER.join(tag.split(TAGPARTER)[:depth])
+    return (zlib.crc32(salt.utils.stringutils.to_bytes(tag)) & 0xffffffff) % shards
+
+
+def _package_tag(package):
+    '''
+    Return the tag of a packed event, which leads the package up to TAGEND,
+    without unpacking its data, or None if it has no tag
+    '''
+    if isinstance(package, six.binary_type):
+        idx = package.find(salt.utils.stringutils.to_bytes(TAGEND))
+    else:
+        idx = package.find(TAGEND)
+    if idx < 0:
+        return None
+    try:
+        return salt.utils.stringutils.to_str(package[:idx])
+    except UnicodeDecodeError:
+        return None
+
+
 class SaltEvent(object):
     '''
     Warning! Use the get_event function or the code will not be
@@ -252,6 +310,10 @@ class SaltEvent(object):
         self.puburi, self.pulluri = self.__load_uri(sock_dir, node)
         self.pending_tags = []
         self.pending_events = []
+        # The tag get_event waits on and the tags registered with the
+        # publisher, see _subscribe_pub
+        self._pub_wait = None
+        self._pub_tags = None
         self.__load_cache_regex()
         if listen and not self.cpub:
             # Only connect to the publisher at initialization time if
@@ -278,18 +340,13 @@ class SaltEvent(object):
         use for firing and listening to events
         '''
         if node == 'master':
-            if self.opts['ipc_mode'] == 'tcp':
-                puburi = int(self.opts['tcp_master_pub_port'])
-                pulluri = int(self.opts['tcp_master_pull_port'])
+            uris = _master_event_uris(self.opts, sock_dir)
+            if len(uris) == 1:
+                puburi, pulluri = uris[0]
             else:
-                puburi = os.path.join(
-                    sock_dir,
-                    'master_event_pub.ipc'
-                )
-                pulluri = os.path.join(
-                    sock_dir,
-                    'master_event_pull.ipc'
-                )
+                # A list of the URIs of each shard
+                puburi = [uri[0] for uri in uris]
+                pulluri = [uri[1] for uri in uris]
         else:
             if self.opts['ipc_mode'] == 'tcp':
                 puburi = int(self.opts['tcp_pub_port'])
@@ -325,6 +382,7 @@ class SaltEvent(object):
             return
         match_func = self._get_match_func(match_type)
         self.pending_tags.append([tag, match_func])
+        self._subscribe_pub()
 
     def unsubscribe(self, tag, match_type=None):
         '''
@@ -335,6 +393,7 @@ class SaltEvent(object):
         match_func = self._get_match_func(match_type)
 
         self.pending_tags.remove([tag, match_func])
+        self._subscribe_pub()
 
         old_events = self.pending_events
         self.pending_events = []
@@ -352,28 +411,55 @@ class SaltEvent(object):
         if self._run_io_loop_sync:
             with salt.utils.asynchronous.current_ioloop(self.io_loop):
                 if self.subscriber is None:
-                    self.subscriber = salt.transport.ipc.IPCMessageSubscriber(
-                        self.puburi,
-                        io_loop=self.io_loop
-                    )
+                    self.subscriber = self._get_subscriber()
                 try:
                     self.io_loop.run_sync(
                         lambda: self.subscriber.connect(timeout=timeout))
                     self.cpub = True
                 except Exception:  # pylint: disable=broad-except
                     pass
+            if self.cpub:
+                self._pub_tags = None
+                self._subscribe_pub()
         else:
             if self.subscriber is None:
-                self.subscriber = salt.transport.ipc.IPCMessageSubscriber(
-                    self.puburi,
-                    io_loop=self.io_loop
-                )
+                self.subscriber = self._get_subscriber()
 
             # For the asynchronous case, the connect will be defered to when
             # set_event_handler() is invoked.
             self.cpub = True
         return self.cpub
 
+    def _get_subscriber(self):
+        '''
+        Return the subscriber to the pub socket, or to the pub socket of every
+        shard of the publisher
+        '''
+        if isinstance(self.puburi, list):
+            return salt.transport.ipc.IPCMessageShardSubscriber(
+                self.puburi,
+                io_loop=self.io_loop
+            )
+        return salt.transport.ipc.IPCMessageSubscriber(
+            self.puburi,
+            io_loop=self.io_loop
+        )
+
+    def _get_pusher(self):
+        '''
+        Return the client of the pull socket, or of the pull socket of every
+        shard of the publisher
+        '''
+        if isinstance(self.pulluri, list):
+            return salt.transport.ipc.IPCMessageShardClient(
+                self.pulluri,
+                io_loop=self.io_loop
+            )
+        return salt.transport.ipc.IPCMessageClient(
+            self.pulluri,
+            io_loop=self.io_loop
+        )
+
     def close_pub(self):
         '''
         Close the publish connection (if established)
@@ -384,8 +470,39 @@ class SaltEvent(object):
         self.subscriber.close()
         self.subscriber = None
         self.pending_events = []
+        self._pub_tags = None
         self.cpub = False
 
+    def _subscribe_pub(self):
+        '''
+        Register the subscribed tags and the tag get_event waits on with the
+        publisher, so it only sends the events matching them
+
+        Only done with ``event_subscription_filter`` set and a synchronous
+        connection, asynchronous handlers get every event.
+        '''
+        if not self.opts.get('event_subscription_filter') or \
+                not self._run_io_loop_sync or not self.cpub:
+            return
+        tags = []
+        for ptag, pmatch_func in self.pending_tags + [self._pub_wait or ['', None]]:
+            if pmatch_func is None:
+                if ptag == '':
+                    # Nothing is waited on yet, keep getting every event
+                    tags = None
+                    break
+                continue
+            tags.append([ptag, pmatch_func.__name__[len('_match_tag_'):]])
+        if tags == self._pub_tags:
+            return
+        try:
+            with salt.utils.asynchronous.current_ioloop(self.io_loop):
+                self.io_loop.run_sync(lambda: self.subscriber.subscribe(tags))
+        except Exception as exc:  # pylint: disable=broad-except
+            log.debug('Failed to register event subscriptions: %s', exc)
+            return
+        self._pub_tags = tags
+
     def connect_pull(self, timeout=1):
         '''
         Establish a connection with the event pull socket
@@ -397,10 +514,7 @@ class SaltEvent(object):
         if self._run_io_loop_sync:
             with salt.utils.asynchronous.current_ioloop(self.io_loop):
                 if self.pusher is None:
-                    self.pusher = salt.transport.ipc.IPCMessageClient(
-                        self.pulluri,
-                        io_loop=self.io_loop
-                    )
+                    self.pusher = self._get_pusher()
                 try:
                     self.io_loop.run_sync(
                         lambda: self.pusher.connect(timeout=timeout))
@@ -409,10 +523,7 @@ class SaltEvent(object):
                     pass
         else:
             if self.pusher is None:
-                self.pusher = salt.transport.ipc.IPCMessageClient(
-                    self.pulluri,
-                    io_loop=self.io_loop
-                )
+                self.pusher = self._get_pusher()
             # For the asynchronous case, the connect will be deferred to when
             # fire_event() is invoked.
             self.cpush = True
@@ -530,6 +641,8 @@ class SaltEvent(object):
             # If no_block is False and wait is 0, that
             # means an infinite timeout.
             wait = None
+        self._pub_wait = [tag, match_func]
+        self._subscribe_pub()
         while (run_once is False and not wait) or time.time() <= timeout_at:
             if no_block is True:
                 if run_once is True:
@@ -656,9 +769,11 @@ class SaltEvent(object):
         '''
         assert self._run_io_loop_sync
 
+        self._pub_wait = None
         if not self.cpub:
             if not self.connect_pub():
                 return None
+        self._subscribe_pub()
         raw = self.subscriber.read_sync(timeout=0)
         if raw is None:
             return None
@@ -672,9 +787,11 @@ class SaltEvent(object):
         '''
         assert self._run_io_loop_sync
 
+        self._pub_wait = None
         if not self.cpub:
             if not self.connect_pub():
                 return None
+        self._subscribe_pub()
         raw = self.subscriber.read_sync(timeout=None)
         if raw is None:
             return None
@@ -739,15 +856,21 @@ class SaltEvent(object):
             salt.utils.stringutils.to_bytes(tagend),
             serialized_data])
         msg = salt.utils.stringutils.to_bytes(event, 'utf-8')
+        if isinstance(self.pulluri, list):
+            send = functools.partial(
+                self.pusher.send, msg,
+                _tag_shard(tag, len(self.pulluri), self.opts['event_publisher_shard_depth']))
+        else:
+            send = functools.partial(self.pusher.send, msg)
         if self._run_io_loop_sync:
             with salt.utils.asynchronous.current_ioloop(self.io_loop):
                 try:
-                    self.io_loop.run_sync(lambda: self.pusher.send(msg))
+                    self.io_loop.run_sync(send)
                 except Exception as ex:  # pylint: disable=broad-except
                     log.debug(ex)
                     raise
         else:
-            self.io_loop.spawn_callback(self.pusher.send, msg)
+            self.io_loop.spawn_callback(send)
         return True
 
     def fire_master(self, data, tag, timeout=1000):
@@ -1042,7 +1165,8 @@ class AsyncEventPublisher(object):
         Get something from epull, publish it out epub, and return the package (or None)
         '''
         try:
-            self.publisher.publish(package)
+            tag = _package_tag(package) if self.publisher.filters else None
+            self.publisher.publish(package, tag=tag)
             return package
         # Add an extra fallback in case a forked process leeks through
         except Exception:  # pylint: disable=broad-except
@@ -1069,11 +1193,15 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
     '''
     The interface that takes master events and republishes them out to anyone
     who wants to listen
+
+    With ``event_publisher_shards`` set, the master runs one publisher for
+    each shard, handling the events whose tags hash to it.
     '''
-    def __init__(self, opts, **kwargs):
+    def __init__(self, opts, shard=0, **kwargs):
         super(EventPublisher, self).__init__(**kwargs)
         self.opts = salt.config.DEFAULT_MASTER_OPTS.copy()
         self.opts.update(opts)
+        self.shard = shard
         self._closing = False
 
     # __setstate__ and __getstate__ are only used on Windows.
@@ -1082,6 +1210,7 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
     def __setstate__(self, state):
         self.__init__(
             state['opts'],
+            shard=state['shard'],
             log_queue=state['log_queue'],
             log_queue_level=state['log_queue_level']
         )
@@ -1089,6 +1218,7 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
     def __getstate__(self):
         return {
             'opts': self.opts,
+            'shard': self.shard,
             'log_queue': self.log_queue,
             'log_queue_level': self.log_queue_level
         }
@@ -1097,21 +1227,14 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
         '''
         Bind the pub and pull sockets for events
         '''
-        salt.utils.process.appendproctitle(self.__class__.__name__)
+        if self.shard:
+            salt.utils.process.appendproctitle(
+                '{0}-{1}'.format(self.__class__.__name__, self.shard))
+        else:
+            salt.utils.process.appendproctitle(self.__class__.__name__)
         self.io_loop = salt.ext.tornado.ioloop.IOLoop()
         with salt.utils.asynchronous.current_ioloop(self.io_loop):
-            if self.opts['ipc_mode'] == 'tcp':
-                epub_uri = int(self.opts['tcp_master_pub_port'])
-                epull_uri = int(self.opts['tcp_master_pull_port'])
-            else:
-                epub_uri = os.path.join(
-                    self.opts['sock_dir'],
-                    'master_event_pub.ipc'
-                )
-                epull_uri = os.path.join(
-                    self.opts['sock_dir'],
-                    'master_event_pull.ipc'
-                )
+            epub_uri, epull_uri = _master_event_uris(self.opts)[self.shard]
 
             self.publisher = salt.transport.ipc.IPCMessagePublisher(
                 self.opts,
@@ -1132,8 +1255,7 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
                 if (self.opts['ipc_mode'] != 'tcp' and (
                         self.opts['publisher_acl'] or
                         self.opts['external_auth'])):
-                    os.chmod(os.path.join(
-                        self.opts['sock_dir'], 'master_event_pub.ipc'), 0o666)
+                    os.chmod(epub_uri, 0o666)
 
             # Make sure the IO loop and respective sockets are closed and
             # destroyed
@@ -1146,7 +1268,8 @@ class EventPublisher(salt.utils.process.SignalHandlingProcess):
         Get something from epull, publish it out epub, and return the package (or None)
         '''
         try:
-            self.publisher.publish(package)
+            tag = _package_tag(package) if self.publisher.filters else None
+            self.publisher.publish(package, tag=tag)
             return package
         # Add an extra fallback in case a forked process leeks through
         except Exception:  # pylint: disable=broad-except
@@ -11,6 +11,8 @@ import shutil
 
 # Import salt libs
 import salt.fileclient
+import salt.loader
+import salt.state
 import salt.utils.files
 import salt.utils.hashutils
 import salt.utils.path
@@ -151,4 +153,9 @@ def sync(opts,
                         shutil.rmtree(emptydir, ignore_errors=True)
         except Exception as exc:  # pylint: disable=broad-except
             log.error('Failed to sync %s module: %s', form, exc)
+    if touched:
+        # The synced modules may change what the other modules provide
+        salt.loader.clear_index(opts)
+        # and the states rendered
+        salt.state.clear_highstate_cache(opts)
     return ret, touched
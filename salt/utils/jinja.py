@@ -31,6 +31,7 @@ import salt.fileclient
 import salt.utils.data
 import salt.utils.files
 import salt.utils.json
+import salt.utils.rendercache
 import salt.utils.stringutils
 import salt.utils.url
 import salt.utils.yaml
@@ -177,6 +178,7 @@ class SaltCacheLoader(BaseLoader):
                 with salt.utils.files.fopen(filepath, 'rb') as ifile:
                     contents = ifile.read().decode(self.encoding)
                     mtime = os.path.getmtime(filepath)
+                    salt.utils.rendercache.record_file(filepath)
 
                     def uptodate():
                         try:
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+'''
+Watched cache of the minion key directories on the master
+
+.. versionadded:: Sodium
+
+With ``key_cache: watch`` the master runs a :py:class:`KeyCacheWatcher`
+process which watches the key directories under ``pki_dir`` (with inotify
+when pyinotify is installed, and by polling the directory stamps in any case)
+and rewrites a small msgpack file holding the sorted key list of a directory
+as soon as it changes.
+
+Readers in the MWorkers and in :py:class:`salt.key.Key` load the file at most
+once per rewrite, keeping the last version in memory, and only trust it while
+the stamp of the key directory recorded in it matches the directory on disk.
+A targeting call therefore costs two ``stat()`` calls instead of a
+``listdir()`` plus one ``stat()`` per accepted key, and a key accepted with
+``salt-key -a`` is visible as soon as the directory changes, even when the
+watcher is not running.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import logging
+import os
+import time
+
+# Import salt libs
+import salt.payload
+import salt.utils.atomicfile
+import salt.utils.data
+import salt.utils.files
+import salt.utils.process
+import salt.utils.stringutils
+
+# Import third party libs
+try:
+    import pyinotify
+    HAS_PYINOTIFY = True
+except ImportError:
+    HAS_PYINOTIFY = False
+
+log = logging.getLogger(__name__)
+
+# The key directories of the master
+KEY_DIRS = ('minions', 'minions_pre', 'minions_rejected', 'minions_denied')
+
+# Directory mtimes younger than this may be shared with a later change
+# happening within the same timestamp tick, so such directories are listed
+# again on the next pass of the watcher.
+RACY_SECONDS = 2
+
+# {<cache file>: ((ino, mtime, size), {'stamp': ..., 'keys': [...]})}
+_LOADED = {}
+
+
+def cache_path(opts, key_dir):
+    '''
+    Return the path of the key cache file of a key directory
+    '''
+    return os.path.join(opts['pki_dir'], '.{0}.key_cache'.format(key_dir))
+
+
+def dir_stamp(path):
+    '''
+    Return the stamp identifying the current content of a directory, or None
+    if it does not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_ino, stat.st_mtime]
+
+
+def list_dir(path):
+    '''
+    Return the sorted list of keys in a key directory
+    '''
+    keys = []
+    try:
+        for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(path)):
+            if not fn_.startswith('.') and os.path.isfile(os.path.join(path, fn_)):
+                keys.append(salt.utils.stringutils.to_unicode(fn_))
+    except (OSError, IOError):
+        # key dir kind is not created yet
+        pass
+    return keys
+
+
+def write(opts, key_dir, serial=None):
+    '''
+    List a key directory and write its key cache file. Returns the stamp of
+    the listed directory.
+    '''
+    if serial is None:
+        serial = salt.payload.Serial(opts)
+    path = os.path.join(opts['pki_dir'], key_dir)
+    # Take the stamp first, a change made while listing makes it stale
+    stamp = dir_stamp(path)
+    data = {'stamp': stamp, 'keys': list_dir(path)}
+    with salt.utils.atomicfile.atomic_open(cache_path(opts, key_dir), 'wb') as fp_:
+        serial.dump(data, fp_)
+    return stamp
+
+
+def read(opts, key_dir, serial=None):
+    '''
+    Return the list of keys of a key directory from its key cache file, or
+    None if there is no cache file or it does not match the directory anymore.
+    '''
+    fn_ = cache_path(opts, key_dir)
+    try:
+        stat = os.stat(fn_)
+    except OSError:
+        return None
+    stamp = dir_stamp(os.path.join(opts['pki_dir'], key_dir))
+    signature = (stat.st_ino, stat.st_mtime, stat.st_size)
+    loaded = _LOADED.get(fn_)
+    if loaded is None or loaded[0] != signature:
+        if serial is None:
+            serial = salt.payload.Serial(opts)
+        try:
+            with salt.utils.files.fopen(fn_, 'rb') as fp_:
+                loaded = (signature, serial.load(fp_))
+        except Exception as exc:  # pylint: disable=broad-except
+            log.debug('Unable to read key cache %s: %s', fn_, exc)
+            return None
+        _LOADED[fn_] = loaded
+    data = loaded[1]
+    if not isinstance(data, dict) or data.get('stamp') != stamp:
+        return None
+    return list(data['keys'])
+
+
+class KeyCacheWatcher(salt.utils.process.SignalHandlingProcess):
+    '''
+    Keep the key cache files of the master up to date
+    '''
+    def __init__(self, opts, **kwargs):
+        super(KeyCacheWatcher, self).__init__(**kwargs)
+        self.opts = opts
+        self.interval = float(opts.get('key_cache_interval', 0.1))
+
+    # __setstate__ and __getstate__ are only used on Windows.
+    # We do this so that __init__ will be invoked on Windows in the child
+    # process so that a register_after_fork() equivalent will work on Windows.
+    def __setstate__(self, state):
+        self.__init__(
+            state['opts'],
+            log_queue=state['log_queue'],
+            log_queue_level=state['log_queue_level']
+        )
+
+    def __getstate__(self):
+        return {
+            'opts': self.opts,
+            'log_queue': self.log_queue,
+            'log_queue_level': self.log_queue_level
+        }
+
+    def _notifier(self, dirty):
+        '''
+        Return an inotify notifier flagging changed key directories as dirty,
+        or None if inotify is not available
+        '''
+        if not HAS_PYINOTIFY:
+            return None
+        paths = dict(
+            (os.path.join(self.opts['pki_dir'], key_dir), key_dir)
+            for key_dir in KEY_DIRS
+        )
+
+        def _changed(event):
+            key_dir = paths.get(event.path)
+            if key_dir is not None:
+                dirty.add(key_dir)
+
+        wm = pyinotify.WatchManager()
+        mask = (pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+                pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO)
+        for path in paths:
+            if os.path.isdir(path):
+                wm.add_watch(path, mask)
+        return pyinotify.Notifier(wm, default_proc_fun=_changed)
+
+    def run(self):
+        '''
+        Rewrite the key cache of a key directory whenever it changes
+        '''
+        salt.utils.process.appendproctitle(self.__class__.__name__)
+        serial = salt.payload.Serial(self.opts)
+        dirty = set(KEY_DIRS)
+        stamps = {}
+        notifier = self._notifier(dirty)
+        log.debug('Watching the key directories in %s', self.opts['pki_dir'])
+        while True:
+            for key_dir in list(dirty):
+                dirty.discard(key_dir)
+                try:
+                    stamps[key_dir] = write(self.opts, key_dir, serial)
+                except (OSError, IOError) as exc:
+                    log.error('Unable to write the key cache of %s: %s', key_dir, exc)
+                    continue
+                if stamps[key_dir] and time.time() - stamps[key_dir][1] < RACY_SECONDS:
+                    dirty.add(key_dir)
+            if notifier is not None:
+                if notifier.check_events(timeout=int(self.interval * 1000)):
+                    notifier.read_events()
+                    notifier.process_events()
+            else:
+                time.sleep(self.interval)
+            # inotify does not see directories created after the start, so
+            # the stamps are always checked as well
+            for key_dir in KEY_DIRS:
+                if dir_stamp(os.path.join(self.opts['pki_dir'], key_dir)) != stamps.get(key_dir):
+                    dirty.add(key_dir)
@@ -191,6 +191,19 @@ class MasterPillarUtil(object):
             grains_fallback, pillar_fallback
         )
 
+    def _fetch_cached(self, minion_ids, key):
+        # Return a dict of the data cached under the given key for the minions
+        # with a valid id, fetched from the cache in one go
+        banks = dict(
+            ('minions/{0}'.format(minion_id), minion_id)
+            for minion_id in minion_ids
+            if salt.utils.verify.valid_id(self.opts, minion_id)
+        )
+        return dict(
+            (banks[bank], mdata)
+            for bank, mdata in six.iteritems(self.cache.fetch_many(banks, key))
+        )
+
     def _get_cached_mine_data(self, *minion_ids):
         # Return one dict with the cached mine data of the targeted minions
         mine_data = dict([(minion_id, {}) for minion_id in minion_ids])
@@ -201,10 +214,8 @@ class MasterPillarUtil(object):
             return mine_data
         if not minion_ids:
             minion_ids = self.cache.list('minions')
-        for minion_id in minion_ids:
-            if not salt.utils.verify.valid_id(self.opts, minion_id):
-                continue
-            mdata = self.cache.fetch('minions/{0}'.format(minion_id), 'mine')
+        cdata = self._fetch_cached(minion_ids, 'mine')
+        for minion_id, mdata in six.iteritems(cdata):
             if isinstance(mdata, dict):
                 mine_data[minion_id] = mdata
         return mine_data
@@ -220,10 +231,8 @@ class MasterPillarUtil(object):
             return grains, pillars
         if not minion_ids:
             minion_ids = self.cache.list('minions')
-        for minion_id in minion_ids:
-            if not salt.utils.verify.valid_id(self.opts, minion_id):
-                continue
-            mdata = self.cache.fetch('minions/{0}'.format(minion_id), 'data')
+        cdata = self._fetch_cached(minion_ids, 'data')
+        for minion_id, mdata in six.iteritems(cdata):
             if not isinstance(mdata, dict):
                 log.warning(
                     'cache.fetch should always return a dict. ReturnedType: %s, MinionId: %s',
@@ -444,6 +453,7 @@ class MasterPillarUtil(object):
             # to read in the pillar/grains data since they are both stored
             # in the same file, 'data.p'
             grains, pillars = self._get_cached_minion_data(*minion_ids)
+        ckminions = salt.utils.minions.CkMinions(self.opts)
         try:
             c_minions = self.cache.list('minions')
             for minion_id in minion_ids:
@@ -461,10 +471,13 @@ class MasterPillarUtil(object):
                     (clear_grains and not minion_pillar)):
                     # Not saving pillar or grains, so just delete the cache file
                     self.cache.flush(bank, 'data')
+                    ckminions.update_index(minion_id, None)
                 elif clear_pillar and minion_grains:
                     self.cache.store(bank, 'data', {'grains': minion_grains})
+                    ckminions.update_index(minion_id, {'grains': minion_grains})
                 elif clear_grains and minion_pillar:
                     self.cache.store(bank, 'data', {'pillar': minion_pillar})
+                    ckminions.update_index(minion_id, {'pillar': minion_pillar})
                 if clear_mine:
                     # Delete the whole mine file
                     self.cache.flush(bank, 'mine')
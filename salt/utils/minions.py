@@ -16,8 +16,10 @@ import salt.payload
 import salt.roster
 import salt.utils.data
 import salt.utils.files
+import salt.utils.key_cache
 import salt.utils.network
 import salt.utils.stringutils
+import salt.utils.target_index
 import salt.utils.versions
 from salt.defaults import DEFAULT_TARGET_DELIM
 from salt.exceptions import CommandExecutionError, SaltCacheError
@@ -203,6 +205,11 @@ class CkMinions(object):
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
         self.cache = salt.cache.factory(opts)
+        if self.opts.get('minion_data_cache_index', False) \
+                and salt.utils.target_index.HAS_SQLITE3:
+            self.index = salt.utils.target_index.TargetIndex(opts)
+        else:
+            self.index = None
         # TODO: this is actually an *auth* check
         if self.opts.get('transport', 'zeromq') in ('zeromq', 'tcp'):
             self.acc = 'minions'
@@ -254,7 +261,8 @@ class CkMinions(object):
         except OSError:
             pass
         try:
-            if self.opts['key_cache'] and os.path.exists(pki_cache_fn):
+            if self.opts['key_cache'] and self.opts['key_cache'] != 'watch' \
+                    and os.path.exists(pki_cache_fn):
                 log.debug('Returning cached minion list')
                 if six.PY2:
                     with salt.utils.files.fopen(pki_cache_fn) as fn_:
@@ -263,10 +271,7 @@ class CkMinions(object):
                     with salt.utils.files.fopen(pki_cache_fn, mode='rb') as fn_:
                         return self.serial.load(fn_)
             else:
-                for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                    if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                        minions.append(fn_)
-            return minions
+                return self._accepted_minions()
         except OSError as exc:
             log.error(
                 'Encountered OSError while evaluating minions in PKI dir: %s',
@@ -274,6 +279,21 @@ class CkMinions(object):
             )
             return minions
 
+    def _accepted_minions(self):
+        '''
+        Return the accepted minions, from the watched key cache when it
+        matches the PKI dir
+        '''
+        if self.opts.get('key_cache') == 'watch':
+            minions = salt.utils.key_cache.read(self.opts, self.acc, self.serial)
+            if minions is not None:
+                return minions
+        minions = []
+        for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
+            if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
+                minions.append(fn_)
+        return minions
+
     def _check_cache_minions(self,
                              expr,
                              delimiter,
@@ -293,10 +313,7 @@ class CkMinions(object):
             return self.cache.list('minions')
 
         if greedy:
-            minions = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                    minions.append(fn_)
+            minions = self._accepted_minions()
         elif cache_enabled:
             minions = list_cached_minions()
         else:
@@ -311,11 +328,25 @@ class CkMinions(object):
             if not cminions:
                 return {'minions': minions,
                         'missing': []}
+            if self.index is not None:
+                matched = self._check_index_minions(expr,
+                                                    delimiter,
+                                                    search_type,
+                                                    regex_match,
+                                                    exact_match)
+                if matched is not None:
+                    if greedy:
+                        indexed = self.index.minions()
+                        minions = [m for m in minions
+                                   if m in matched or m not in indexed]
+                    else:
+                        minions = [m for m in minions if m in matched]
+                    return {'minions': minions,
+                            'missing': []}
             minions = set(minions)
-            for id_ in cminions:
-                if greedy and id_ not in minions:
-                    continue
-                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            cdata = self._cached_minion_data(
+                [id_ for id_ in cminions if not greedy or id_ in minions])
+            for id_, mdata in six.iteritems(cdata):
                 if mdata is None:
                     if not greedy:
                         minions.remove(id_)
@@ -331,6 +362,65 @@ class CkMinions(object):
         return {'minions': minions,
                 'missing': []}
 
+    def _cached_minion_data(self, minion_ids, skip_errors=False):
+        '''
+        Fetch the cached data of several minions from the minion data cache
+        at once. Returns a dict mapping the minion IDs to their data.
+
+        With ``skip_errors``, a cache error makes the minions be fetched one
+        by one, leaving out those which cannot be read.
+        '''
+        banks = dict(('minions/{0}'.format(id_), id_) for id_ in minion_ids)
+        try:
+            data = self.cache.fetch_many(banks, 'data')
+        except SaltCacheError:
+            if not skip_errors:
+                raise
+            data = {}
+            for bank in banks:
+                try:
+                    data[bank] = self.cache.fetch(bank, 'data')
+                except SaltCacheError:
+                    continue
+        return dict((banks[bank], mdata) for bank, mdata in six.iteritems(data))
+
+    def _check_index_minions(self,
+                             expr,
+                             delimiter,
+                             search_type,
+                             regex_match=False,
+                             exact_match=False):
+        '''
+        Look up the minions matching a grain or pillar expression in the
+        target index. Returns None if the index can't be used, in which case
+        the cache has to be scanned.
+        '''
+        try:
+            return self.index.match(search_type,
+                                    expr,
+                                    delimiter,
+                                    regex_match=regex_match,
+                                    exact_match=exact_match)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.warning(
+                'Unable to use the target index, scanning the minion data '
+                'cache instead: %s', exc
+            )
+            return None
+
+    def update_index(self, minion_id, data):
+        '''
+        Update the target index after the grains and pillar of a minion were
+        written to (or, with ``data=None``, flushed from) the minion data
+        cache
+        '''
+        if self.index is None:
+            return
+        try:
+            self.index.update(minion_id, data)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error('Unable to update the target index for %s: %s', minion_id, exc)
+
     def _check_grain_minions(self, expr, delimiter, greedy):
         '''
         Return the minions found by looking via grains
@@ -411,8 +501,7 @@ class CkMinions(object):
             proto = 'ipv{0}'.format(tgt.version)
 
             minions = set(minions)
-            for id_ in cminions:
-                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            for id_, mdata in six.iteritems(self._cached_minion_data(cminions)):
                 if mdata is None:
                     if not greedy:
                         minions.remove(id_)
@@ -663,15 +752,12 @@ class CkMinions(object):
                 addrs.update(set(salt.utils.network.ip_addrs6(include_loopback=False)))
             if subset:
                 search = subset
-            for id_ in search:
-                try:
-                    mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
-                except SaltCacheError:
-                    # If a SaltCacheError is explicitly raised during the fetch operation,
-                    # permission was denied to open the cached data.p file. Continue on as
-                    # in the releases <= 2016.3. (An explicit error raise was added in PR
-                    # #35388. See issue #36867 for more information.
-                    continue
+            # If a SaltCacheError is explicitly raised during the fetch operation,
+            # permission was denied to open the cached data.p file. Continue on as
+            # in the releases <= 2016.3. (An explicit error raise was added in PR
+            # #35388. See issue #36867 for more information.
+            cdata = self._cached_minion_data(search, skip_errors=True)
+            for id_, mdata in six.iteritems(cdata):
                 if mdata is None:
                     continue
                 grains = mdata.get('grains', {})
@@ -695,11 +781,7 @@ class CkMinions(object):
         '''
         Return a list of all minions that have auth'd
         '''
-        mlist = []
-        for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-            if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                mlist.append(fn_)
-        return {'minions': mlist, 'missing': []}
+        return {'minions': self._accepted_minions(), 'missing': []}
 
     def check_minions(self,
                       expr,
@@ -6,9 +6,13 @@ Functions which implement running reactor jobs
 
 # Import python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import datetime
 import fnmatch
 import glob
 import logging
+import os
+import re
+import time
 
 # Import salt libs
 import salt.client
@@ -20,6 +24,7 @@ import salt.utils.data
 import salt.utils.event
 import salt.utils.files
 import salt.utils.process
+import salt.utils.templates
 import salt.utils.yaml
 import salt.wheel
 import salt.defaults.exitcodes
@@ -38,6 +43,73 @@ REACTOR_INTERNAL_KEYWORDS = frozenset([
     'state',
 ])
 
+_WILDCARD_RE = re.compile(r'[*?[]')
+
+
+class ReactorMatcher(object):
+    '''
+    Match event tags against the globs of a reactor map
+
+    Globs without wildcards are looked up in a dict. The others are stored in
+    a prefix trie on the text before their first wildcard, so a tag is only
+    matched against the globs whose prefix it starts with, except for the
+    globs starting with a wildcard which are matched against every tag.
+    '''
+    def __init__(self, react_map):
+        self.exact = {}
+        self.trie = {}
+        self.residual = []
+        for idx, ropt in enumerate(react_map):
+            if not isinstance(ropt, dict):
+                continue
+            if len(ropt) != 1:
+                continue
+            key = next(six.iterkeys(ropt))
+            val = ropt[key]
+            if isinstance(val, six.string_types):
+                val = [val]
+            elif not isinstance(val, list):
+                continue
+            if not isinstance(key, six.string_types):
+                continue
+            pattern = os.path.normcase(key)
+            wildcard = _WILDCARD_RE.search(pattern)
+            if wildcard is None:
+                self.exact.setdefault(pattern, []).append((idx, val))
+                continue
+            entry = (idx, re.compile(fnmatch.translate(pattern)).match, val)
+            if not wildcard.start():
+                self.residual.append(entry)
+                continue
+            node = self.trie
+            for char in pattern[:wildcard.start()]:
+                node = node.setdefault(char, {})
+            # The globs with this prefix are stored under the None key
+            node.setdefault(None, []).append(entry)
+
+    def match(self, tag):
+        '''
+        Return the reactors of the globs matching tag, in the order of the map
+        '''
+        tag = os.path.normcase(tag)
+        found = list(self.exact.get(tag, ()))
+        for idx, match, val in self.residual:
+            if match(tag):
+                found.append((idx, val))
+        node = self.trie
+        for char in tag:
+            node = node.get(char)
+            if node is None:
+                break
+            for idx, match, val in node.get(None, ()):
+                if match(tag):
+                    found.append((idx, val))
+        found.sort(key=lambda item: item[0])
+        reactors = []
+        for _, val in found:
+            reactors.extend(val)
+        return reactors
+
 
 class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
     '''
@@ -56,6 +128,9 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
         local_minion_opts['file_client'] = 'local'
         self.minion = salt.minion.MasterMinion(local_minion_opts)
         salt.state.Compiler.__init__(self, opts, self.minion.rend)
+        self._matcher = None
+        self._matcher_key = None
+        self._reset_stats()
 
     # We need __setstate__ and __getstate__ to avoid pickling errors since
     # 'self.rend' (from salt.state.Compiler) contains a function reference
@@ -111,30 +186,37 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
         process
         '''
         log.debug('Gathering reactors for tag %s', tag)
-        reactors = []
-        if isinstance(self.opts['reactor'], six.string_types):
+        return self._get_matcher().match(tag)
+
+    def _get_matcher(self):
+        '''
+        Return the matcher of the reactor map, compiled again when the map
+        file changed or reactors were added or deleted
+        '''
+        reactor = self.opts['reactor']
+        if isinstance(reactor, six.string_types):
             try:
-                with salt.utils.files.fopen(self.opts['reactor']) as fp_:
-                    react_map = salt.utils.yaml.safe_load(fp_)
+                key = (reactor, os.path.getmtime(reactor))
+            except OSError:
+                key = None
+        else:
+            key = (id(reactor), len(reactor))
+        if key is not None and key == self._matcher_key:
+            return self._matcher
+        react_map = []
+        if isinstance(reactor, six.string_types):
+            try:
+                with salt.utils.files.fopen(reactor) as fp_:
+                    react_map = salt.utils.yaml.safe_load(fp_) or []
             except (OSError, IOError):
-                log.error('Failed to read reactor map: "%s"', self.opts['reactor'])
+                log.error('Failed to read reactor map: "%s"', reactor)
             except Exception:  # pylint: disable=broad-except
-                log.error('Failed to parse YAML in reactor map: "%s"', self.opts['reactor'])
+                log.error('Failed to parse YAML in reactor map: "%s"', reactor)
         else:
-            react_map = self.opts['reactor']
-        for ropt in react_map:
-            if not isinstance(ropt, dict):
-                continue
-            if len(ropt) != 1:
-                continue
-            key = next(six.iterkeys(ropt))
-            val = ropt[key]
-            if fnmatch.fnmatch(tag, key):
-                if isinstance(val, six.string_types):
-                    reactors.append(val)
-                elif isinstance(val, list):
-                    reactors.extend(val)
-        return reactors
+            react_map = reactor
+        self._matcher = ReactorMatcher(react_map)
+        self._matcher_key = key
+        return self._matcher
 
     def list_all(self):
         '''
@@ -168,6 +250,7 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
                 return {'status': False, 'comment': 'Reactor already exists.'}
 
         self.minion.opts['reactor'].append({tag: reaction})
+        self._matcher_key = None
         return {'status': True, 'comment': 'Reactor added.'}
 
     def delete_reactor(self, tag):
@@ -179,6 +262,7 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
             _tag = next(six.iterkeys(reactor))
             if _tag == tag:
                 self.minion.opts['reactor'].remove(reactor)
+                self._matcher_key = None
                 return {'status': True, 'comment': 'Reactor deleted.'}
 
         return {'status': False, 'comment': 'Reactor does not exists.'}
@@ -219,6 +303,46 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
         self.resolve_aliases(chunks)
         return chunks
 
+    def _reset_stats(self):
+        self.stats = {'events': 0,
+                      'matched': 0,
+                      'render': {'mean': 0, 'max': 0, 'runs': 0},
+                      'lag': {'mean': 0, 'max': 0, 'runs': 0}}
+        self.stat_clock = time.time()
+
+    def _record_stat(self, name, value):
+        stat = self.stats[name]
+        stat['runs'] += 1
+        stat['mean'] += (value - stat['mean']) / stat['runs']
+        stat['max'] = max(stat['max'], value)
+
+    @staticmethod
+    def _dispatch_lag(data):
+        '''
+        Return the seconds since the event was fired, or None if the event
+        does not say when
+        '''
+        try:
+            fired = datetime.datetime.strptime(data['_stamp'], '%Y-%m-%dT%H:%M:%S.%f')
+        except (KeyError, TypeError, ValueError):
+            return None
+        return (datetime.datetime.utcnow() - fired).total_seconds()
+
+    def _post_stats(self, event):
+        '''
+        Fire an event with the reactor stats every master_stats_event_iter
+        seconds
+        '''
+        now = time.time()
+        if now - self.stat_clock <= self.opts['master_stats_event_iter']:
+            return
+        data = {'time': now - self.stat_clock, 'worker': 'Reactor', 'stats': self.stats}
+        template_cache_stats = salt.utils.templates.jinja_template_cache_stats()
+        if template_cache_stats is not None:
+            data['template_cache'] = template_cache_stats
+        event.fire_event(data, salt.utils.event.tagify('Reactor', 'stats'))
+        self._reset_stats()
+
     def call_reactions(self, chunks):
         '''
         Execute the reaction state
@@ -240,6 +364,9 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
                 opts=self.opts,
                 listen=True) as event:
             self.wrap = ReactWrap(self.opts)
+            # The reaction files are rendered again for every event
+            salt.utils.templates.cache_jinja_templates()
+            master_stats = self.opts.get('master_stats')
 
             for data in event.iter_events(full=True):
                 # skip all events fired by ourselves
@@ -262,9 +389,19 @@ class Reactor(salt.utils.process.SignalHandlingProcess, salt.state.Compiler):
                                           'salt/reactors/manage/list-results')
                 else:
                     reactors = self.list_reactors(data['tag'])
+                    if master_stats:
+                        self.stats['events'] += 1
+                        self._post_stats(event)
                     if not reactors:
                         continue
+                    start = time.time()
                     chunks = self.reactions(data['tag'], data['data'], reactors)
+                    if master_stats:
+                        self.stats['matched'] += 1
+                        self._record_stat('render', time.time() - start)
+                        lag = self._dispatch_lag(data['data'])
+                        if lag is not None:
+                            self._record_stat('lag', lag)
                     if chunks:
                         try:
                             self.call_reactions(chunks)
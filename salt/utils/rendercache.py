@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+'''
+Cache the data rendered from sls templates.
+
+A render is keyed on the template file and on the inputs actually read while
+rendering it: the keys of the grains and pillar dictionaries looked up by the
+template, and the files loaded through the template engine. Two renders of the
+same template with the same inputs share one cache entry, whatever the rest of
+the grains or pillar data looks like, and changing the template or one of the
+files it imports invalidates exactly the entries built from it.
+
+Inputs are recorded by wrapping the dictionaries handed to the renderers in
+:py:class:`TrackedDict` objects, which report the keys read from them to the
+:py:class:`InputRecorder` objects active in the current thread.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import contextlib
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+# Import salt libs
+import salt.template
+import salt.utils.files
+import salt.utils.json
+import salt.utils.stringutils
+from salt.utils.odict import OrderedDict
+
+# Import 3rd-party libs
+from salt.ext import six
+
+log = logging.getLogger(__name__)
+
+# Returned by RenderCache.get when no entry matches
+MISSING = object()
+
+# The key recorded when a whole tracked dictionary is read
+ALL = None
+
+_LOCAL = threading.local()
+_DIGESTS = {}
+_CHECKS = {}
+_DIGESTS_LOCK = threading.Lock()
+
+# The calls to the salt functions in a template, ``salt['mod.fun']`` or
+# ``salt.mod.fun``
+_SALT_CALL_RE = re.compile(
+    r'''\bsalt\s*(?:\[\s*(?P<quote>['"])(?P<item>[\w.]+)(?P=quote)\s*\]'''
+    r'''|\.\s*(?P<attr>\w+\s*\.\s*\w+)|(?P<dynamic>\[))'''
+)
+_OPTS_RE = re.compile(r'\bopts\b')
+
+
+def _frames():
+    try:
+        return _LOCAL.frames
+    except AttributeError:
+        _LOCAL.frames = []
+        return _LOCAL.frames
+
+
+@contextlib.contextmanager
+def paused():
+    '''
+    Stop recording the inputs read in the current thread, for the reads made
+    by the rendering machinery rather than by the templates
+    '''
+    frames = _frames()
+    _LOCAL.frames = []
+    try:
+        yield
+    finally:
+        _LOCAL.frames = frames
+
+
+def record_key(name, key):
+    '''
+    Record that the key of the tracked dictionary name has been read
+    '''
+    for frame in _frames():
+        frame.keys.add((name, key))
+
+
+def record_file(path):
+    '''
+    Record that the template engine loaded the file at path
+    '''
+    frames = _frames()
+    if not frames:
+        return
+    digest = file_digest(path)
+    for frame in frames:
+        frame.files[path] = digest
+
+
+def file_digest(path):
+    '''
+    Return the sha256 digest of the file at path, or None if it cannot be
+    read. Digests are memoized on the mtime and size of the file.
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _DIGESTS_LOCK:
+        cached = _DIGESTS.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    try:
+        with salt.utils.files.fopen(path, 'rb') as ifile:
+            for chunk in iter(lambda: ifile.read(65536), b''):
+                digest.update(chunk)
+    except (IOError, OSError):
+        return None
+    digest = digest.hexdigest()
+    with _DIGESTS_LOCK:
+        _DIGESTS[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+def data_digest(data):
+    '''
+    Return a digest of a data structure, equal for equal data
+    '''
+    try:
+        dump = salt.utils.json.dumps(data, sort_keys=True, default=repr)
+    except (TypeError, ValueError):
+        dump = repr(data)
+    return hashlib.sha256(salt.utils.stringutils.to_bytes(dump)).hexdigest()
+
+
+def render_pipe(path, default):
+    '''
+    Return the names of the renderers in the pipe used to render the template
+    at path, from its shebang line or the default pipe.
+    '''
+    pipestr = default
+    try:
+        with salt.utils.files.fopen(path, 'r') as ifile:
+            line = salt.utils.stringutils.to_unicode(ifile.readline())
+    except (IOError, OSError):
+        line = ''
+    if line.startswith('#!') and not line.startswith('#!/'):
+        pipestr = line.strip()[2:]
+    if not pipestr:
+        return []
+    pipestr = salt.template.OLD_STYLE_RENDERERS.get(pipestr, pipestr)
+    return [part.strip().split(' ', 1)[0] for part in pipestr.split('|')]
+
+
+def check_source(path, functions):
+    '''
+    Check the template at path for the salt functions it calls.
+
+    Returns a tuple of the reason why its render cannot be cached, or None,
+    and whether it reads the ``opts`` dictionary.
+    '''
+    try:
+        with salt.utils.files.fopen(path, 'r') as ifile:
+            source = salt.utils.stringutils.to_unicode(ifile.read())
+    except (IOError, OSError) as exc:
+        return 'cannot read {0}: {1}'.format(path, exc), False
+    reads_opts = bool(_OPTS_RE.search(source))
+    for match in _SALT_CALL_RE.finditer(source):
+        if match.group('dynamic'):
+            return 'dynamic salt function call in {0}'.format(path), reads_opts
+        fun = match.group('item') or re.sub(r'\s', '', match.group('attr'))
+        if fun not in functions:
+            return 'salt function {0} called in {1}'.format(fun, path), reads_opts
+        if fun.startswith('config.'):
+            reads_opts = True
+    return None, reads_opts
+
+
+def _check_source(path, functions):
+    '''
+    Memoized check_source, on the digest of the file
+    '''
+    memo_key = (path, file_digest(path), tuple(sorted(functions)))
+    with _DIGESTS_LOCK:
+        result = _CHECKS.get(memo_key)
+    if result is None:
+        result = check_source(path, functions)
+        with _DIGESTS_LOCK:
+            _CHECKS[memo_key] = result
+    return result
+
+
+class InputRecorder(object):
+    '''
+    Record the inputs read in the current thread while the recorder is
+    active: the keys read from tracked dictionaries and the files loaded by
+    the template engine. Recorders nest, an input is recorded by every active
+    recorder.
+    '''
+    def __init__(self):
+        self.keys = set()
+        self.files = {}
+
+    def __enter__(self):
+        _frames().append(self)
+        return self
+
+    def __exit__(self, *args):
+        _frames().remove(self)
+
+
+class TrackedDict(dict):
+    '''
+    A dictionary which records the keys read from it in the active
+    InputRecorders. Reading all of it, by iterating over it for instance,
+    records the ALL key.
+    '''
+    def __init__(self, name, *args, **kwargs):
+        super(TrackedDict, self).__init__(*args, **kwargs)
+        self.tracked_name = name
+
+    def __getitem__(self, key):
+        record_key(self.tracked_name, key)
+        return super(TrackedDict, self).__getitem__(key)
+
+    def __contains__(self, key):
+        record_key(self.tracked_name, key)
+        return super(TrackedDict, self).__contains__(key)
+
+    def get(self, key, default=None):
+        record_key(self.tracked_name, key)
+        return super(TrackedDict, self).get(key, default)
+
+    def has_key(self, key):
+        return key in self
+
+    def _record_all(self):
+        record_key(self.tracked_name, ALL)
+
+    def __iter__(self):
+        self._record_all()
+        return super(TrackedDict, self).__iter__()
+
+    def __len__(self):
+        self._record_all()
+        return super(TrackedDict, self).__len__()
+
+    def __eq__(self, other):
+        self._record_all()
+        return super(TrackedDict, self).__eq__(other)
+
+    def __ne__(self, other):
+        self._record_all()
+        return super(TrackedDict, self).__ne__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._record_all()
+        return super(TrackedDict, self).__repr__()
+
+    __str__ = __repr__
+
+    def keys(self):
+        self._record_all()
+        return super(TrackedDict, self).keys()
+
+    def values(self):
+        self._record_all()
+        return super(TrackedDict, self).values()
+
+    def items(self):
+        self._record_all()
+        return super(TrackedDict, self).items()
+
+    if six.PY2:
+        def iterkeys(self):
+            self._record_all()
+            return super(TrackedDict, self).iterkeys()
+
+        def itervalues(self):
+            self._record_all()
+            return super(TrackedDict, self).itervalues()
+
+        def iteritems(self):
+            self._record_all()
+            return super(TrackedDict, self).iteritems()
+
+    def copy(self):
+        self._record_all()
+        return TrackedDict(self.tracked_name, super(TrackedDict, self).items())
+
+
+def input_digests(keys, sources):
+    '''
+    Return the digests of the inputs recorded as (name, key) in keys, read
+    from the dictionaries in sources
+    '''
+    return dict(((name, key), _input_digest(sources, name, key))
+                for name, key in keys)
+
+
+def inputs_match(digests, sources):
+    '''
+    Return whether the inputs in sources have the digests returned by
+    input_digests
+    '''
+    return all(_input_digest(sources, name, key) == digest
+               for (name, key), digest in six.iteritems(digests))
+
+
+def _input_digest(sources, name, key):
+    '''
+    Return the digest of the input recorded as (name, key), read from the
+    sources without recording it again.
+    '''
+    source = sources.get(name)
+    if source is None:
+        return None
+    if key is ALL:
+        return data_digest(dict(dict.items(source)))
+    value = dict.get(source, key, MISSING)
+    if value is MISSING:
+        return 'missing'
+    return data_digest(value)
+
+
+class RenderCache(object):
+    '''
+    A least recently used cache of rendered templates.
+
+    Entries are grouped by template key, each group holding the renders of
+    the template for different inputs, and the whole cache holds at most size
+    renders.
+    '''
+    def __init__(self, size=1000):
+        self.size = size
+        self.count = 0
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'uncacheable': 0,
+                      'entries': 0, 'time_saved': 0.0}
+        self._lock = threading.Lock()
+
+    def get(self, key, sources):
+        '''
+        Return a copy of the data rendered from the template key with the
+        same inputs as the ones in sources, or MISSING
+        '''
+        with self._lock:
+            variants = list(self.entries.get(key, ()))
+        for variant in variants:
+            if not inputs_match(variant['keys'], sources):
+                continue
+            if any(file_digest(path) != digest
+                   for path, digest in six.iteritems(variant['files'])):
+                continue
+            with self._lock:
+                if key in self.entries:
+                    self.entries[key] = self.entries.pop(key)
+                self.stats['hits'] += 1
+                self.stats['time_saved'] += variant['time']
+            log.debug('Render cache hit for %s, saved %.3fs', key[0], variant['time'])
+            return copy.deepcopy(variant['data'])
+        with self._lock:
+            self.stats['misses'] += 1
+        return MISSING
+
+    def put(self, key, recorder, sources, data, render_time):
+        '''
+        Store a copy of the data rendered from the template key with the
+        inputs recorded by recorder
+        '''
+        variant = {
+            'keys': input_digests(recorder.keys, sources),
+            'files': dict(recorder.files),
+            'data': copy.deepcopy(data),
+            'time': render_time,
+        }
+        with self._lock:
+            variants = self.entries.pop(key, [])
+            # Drop the renders made with other versions of the files
+            kept = [old for old in variants
+                    if all(variant['files'].get(path, digest) == digest
+                           for path, digest in six.iteritems(old['files']))]
+            self.count -= len(variants) - len(kept)
+            kept.append(variant)
+            self.count += 1
+            self.entries[key] = kept
+            while self.count > self.size and self.entries:
+                old_key = next(iter(self.entries))
+                old = self.entries[old_key]
+                old.pop(0)
+                self.count -= 1
+                if not old:
+                    del self.entries[old_key]
+            self.stats['entries'] = self.count
+
+    def render(self, key, path, sources, func, default_pipe, renderers, functions):
+        '''
+        Return the data rendered by calling func for the template at path,
+        from the cache if a render of key had the same inputs.
+
+        The render is only cached when its pipe uses the renderers listed in
+        renderers, and when the template and the files it loads only call the
+        salt functions listed in functions. Templates reading the opts
+        dictionary depend on all of sources['opts'].
+        '''
+        if not set(render_pipe(path, default_pipe)).issubset(renderers):
+            self.uncacheable(key, 'renderer pipe not in the cacheable renderers')
+            return func()
+        reason, reads_opts = _check_source(path, functions)
+        if reason:
+            self.uncacheable(key, reason)
+            return func()
+        data = self.get(key, sources)
+        if data is not MISSING:
+            return data
+        start = time.time()
+        with InputRecorder() as recorder:
+            data = func()
+        render_time = time.time() - start
+        recorder.files[path] = file_digest(path)
+        for fpath in recorder.files:
+            if fpath == path:
+                continue
+            reason, freads_opts = _check_source(fpath, functions)
+            if reason:
+                self.uncacheable(key, reason)
+                return data
+            reads_opts = reads_opts or freads_opts
+        if reads_opts:
+            recorder.keys.add(('opts', ALL))
+        self.put(key, recorder, sources, data, render_time)
+        return data
+
+    def uncacheable(self, key, reason):
+        '''
+        Count a render which cannot be cached
+        '''
+        with self._lock:
+            self.stats['uncacheable'] += 1
+        log.debug('Not caching the render of %s: %s', key[0], reason)
+
+    def get_stats(self):
+        '''
+        Return the cache statistics with the hit rate
+        '''
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+'''
+Inverted index of the minion data cache used to resolve grain and pillar
+targets without deserializing the cached data of every minion.
+
+.. versionadded:: Sodium
+
+The index maps ``(search type, key path, value)`` to the minions holding that
+value, for instance ``('grains', 'os', 'ubuntu') -> {'web1', 'web2'}``. It
+lives in a sqlite3 database in the master cachedir so that it is shared by all
+of the MWorkers, and it is updated incrementally whenever the master writes
+the grains and pillar of a minion to the minion data cache.
+
+Enable it in the master config with:
+
+.. code-block:: yaml
+
+    minion_data_cache_index: True
+
+Minions written to the minion data cache without going through the master,
+for instance by another master sharing the cache, are picked up by
+:py:meth:`TargetIndex.sync`, which the Maintenance process runs every
+``minion_data_cache_index_interval`` seconds. It compares the last update
+time the cache driver reports for their data with the time they were
+indexed, or indexes every cached minion again with cache drivers which
+cannot report it. Lookups only check when the index was last synced, and
+fall back to scanning the cache when it was not synced recently.
+
+Matching follows :py:func:`salt.utils.data.subdict_match`, but like the rest
+of :py:class:`salt.utils.minions.CkMinions` it errs on the side of returning
+too many minions. Expressions the index cannot answer (wildcard keys, numeric
+list indexes, non-default delimiters containing the path separator) return
+``None`` and the caller falls back to scanning the cache.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import fnmatch
+import logging
+import os
+import re
+import time
+
+# Import salt libs
+import salt.utils.stringutils
+from salt.ext import six
+
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+log = logging.getLogger(__name__)
+
+# The data types of the minion data cache which are indexed
+SEARCH_TYPES = ('grains', 'pillar')
+
+# Separator of the key path components in the index
+PATH_SEP = '\x1f'
+
+# A row holding a (lowercased) value found at the key path
+KIND_VALUE = 0
+# A row holding a key of the dict found at the key path
+KIND_KEY = 1
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    'search_type TEXT NOT NULL, '
+    'path TEXT NOT NULL, '
+    'kind INTEGER NOT NULL, '
+    'value TEXT NOT NULL, '
+    'minion TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS entries_lookup '
+    'ON entries (search_type, path, kind, value)',
+    'CREATE INDEX IF NOT EXISTS entries_minion ON entries (minion)',
+    # has_data is 0 for minions present in the cache without grains and
+    # pillar, so that they are not fetched again on every sync. stamp is the
+    # time the minion was indexed.
+    'CREATE TABLE IF NOT EXISTS minions ('
+    'minion TEXT PRIMARY KEY, has_data INTEGER NOT NULL, '
+    'stamp REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    # The time of the last sync
+    'CREATE TABLE IF NOT EXISTS meta ('
+    'name TEXT PRIMARY KEY, value REAL NOT NULL)',
+)
+
+STATS = ('hits', 'misses', 'updates', 'catchups')
+
+# The hit and miss counters are kept in memory and written to the index along
+# with the next update, or after this many seconds
+STATS_INTERVAL = 60
+
+# The index is used while it was synced within this many sync intervals
+SYNC_GRACE = 3
+
+
+def _to_text(value):
+    '''
+    Return the text form of a value the way subdict_match compares it
+    '''
+    try:
+        return six.text_type(value)
+    except UnicodeDecodeError:
+        return salt.utils.stringutils.to_unicode(value)
+
+
+def flatten(data, path=()):
+    '''
+    Generate the ``(path, kind, value)`` rows of the index for a grains or
+    pillar dict. ``path`` is a tuple of keys. Members of lists are indexed at
+    the path of the list, the same way ``subdict_match`` matches a single
+    list member.
+    '''
+    if isinstance(data, dict):
+        for key, val in six.iteritems(data):
+            key = _to_text(key)
+            if path:
+                yield path, KIND_KEY, key
+            for row in flatten(val, path + (key,)):
+                yield row
+    elif isinstance(data, (list, tuple)):
+        for member in data:
+            if isinstance(member, dict):
+                for row in flatten(member, path):
+                    yield row
+            elif not isinstance(member, (list, tuple)) and path:
+                yield path, KIND_VALUE, _to_text(member).lower()
+    elif path:
+        yield path, KIND_VALUE, _to_text(data).lower()
+
+
+class TargetIndex(object):
+    '''
+    Shared, incrementally maintained index of the minion data cache
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.path = os.path.join(opts['cachedir'], 'target_index.db')
+        self._pending = {}
+        self._flushed = time.time()
+
+    def _conn(self):
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    @staticmethod
+    def _count(conn, name, value=1):
+        conn.execute('INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)', (name,))
+        conn.execute('UPDATE stats SET value = value + ? WHERE name = ?', (value, name))
+
+    def _count_later(self, name):
+        '''
+        Count a lookup in memory, so that reading the index does not take its
+        write lock
+        '''
+        self._pending[name] = self._pending.get(name, 0) + 1
+        if time.time() - self._flushed >= STATS_INTERVAL:
+            conn = self._conn()
+            try:
+                self._flush_stats(conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _flush_stats(self, conn):
+        '''
+        Write the counters kept in memory to the index
+        '''
+        for name, value in six.iteritems(self._pending):
+            self._count(conn, name, value)
+        self._pending = {}
+        self._flushed = time.time()
+
+    @staticmethod
+    def _replace(conn, minion_id, data):
+        conn.execute('DELETE FROM entries WHERE minion = ?', (minion_id,))
+        rows = []
+        has_data = 0
+        if isinstance(data, dict):
+            for search_type in SEARCH_TYPES:
+                if search_type not in data:
+                    continue
+                has_data = 1
+                for path, kind, value in flatten(data[search_type] or {}):
+                    rows.append((search_type, PATH_SEP.join(path), kind, value, minion_id))
+        conn.executemany(
+            'INSERT INTO entries (search_type, path, kind, value, minion) '
+            'VALUES (?, ?, ?, ?, ?)', rows)
+        conn.execute(
+            'INSERT OR REPLACE INTO minions (minion, has_data, stamp) '
+            'VALUES (?, ?, ?)', (minion_id, has_data, time.time()))
+
+    def update(self, minion_id, data):
+        '''
+        Replace the indexed data of a minion with the data just written to
+        the minion data cache.
+        '''
+        conn = self._conn()
+        try:
+            self._replace(conn, minion_id, data)
+            self._count(conn, 'updates')
+            self._flush_stats(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def remove(self, minion_id):
+        '''
+        Remove a minion from the index
+        '''
+        conn = self._conn()
+        try:
+            conn.execute('DELETE FROM entries WHERE minion = ?', (minion_id,))
+            conn.execute('DELETE FROM minions WHERE minion = ?', (minion_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def sync(self, cache):
+        '''
+        Reconcile the indexed minions with the minions present in the cache.
+        Minions missing from the index, such as minions cached before the
+        index was enabled or by another master, and minions whose cached data
+        was updated after they were indexed are fetched and indexed; minions
+        flushed from the cache are dropped. With cache drivers which cannot
+        tell when the data of a minion was updated, every cached minion is
+        indexed again.
+
+        This walks the whole cache, the Maintenance process runs it every
+        ``minion_data_cache_index_interval`` seconds.
+        '''
+        started = time.time()
+        cached = set(cache.list('minions'))
+        conn = self._conn()
+        try:
+            indexed = dict(conn.execute('SELECT minion, stamp FROM minions'))
+            stale = cached.difference(indexed)
+            for minion_id in cached.intersection(indexed):
+                try:
+                    updated = cache.updated('minions/{0}'.format(minion_id), 'data')
+                except KeyError:
+                    # The driver has no updated function
+                    stale = cached
+                    break
+                # The drivers report whole seconds, the data may have been
+                # written up to a second after the reported time
+                if updated is not None and updated + 1 > indexed[minion_id]:
+                    stale.add(minion_id)
+            removed = set(indexed).difference(cached)
+            for minion_id in removed:
+                conn.execute('DELETE FROM entries WHERE minion = ?', (minion_id,))
+                conn.execute('DELETE FROM minions WHERE minion = ?', (minion_id,))
+            if stale:
+                data = cache.fetch_many(
+                    ['minions/{0}'.format(minion_id) for minion_id in stale], 'data')
+                for minion_id in stale:
+                    self._replace(conn, minion_id,
+                                  data.get('minions/{0}'.format(minion_id)))
+                self._count(conn, 'catchups', len(stale))
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                ('synced', started))
+            self._flush_stats(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def synced(self, conn=None):
+        '''
+        Return the time the index was last synced, or None
+        '''
+        close = conn is None
+        if close:
+            conn = self._conn()
+        try:
+            row = conn.execute(
+                'SELECT value FROM meta WHERE name = ?', ('synced',)).fetchone()
+        finally:
+            if close:
+                conn.close()
+        return row[0] if row else None
+
+    def minions(self):
+        '''
+        Return the set of indexed minions which have grains or pillar data
+        '''
+        conn = self._conn()
+        try:
+            return set(row[0] for row in conn.execute(
+                'SELECT minion FROM minions WHERE has_data = 1'))
+        finally:
+            conn.close()
+
+    def stats(self):
+        '''
+        Return the hit/miss counters of the index along with its size
+        '''
+        conn = self._conn()
+        try:
+            ret = dict((name, 0) for name in STATS)
+            ret.update(conn.execute('SELECT name, value FROM stats'))
+            ret['minions'] = conn.execute('SELECT COUNT(*) FROM minions').fetchone()[0]
+            ret['entries'] = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        finally:
+            conn.close()
+        for name, value in six.iteritems(self._pending):
+            ret[name] += value
+        return ret
+
+    def miss(self):
+        '''
+        Record a lookup which had to fall back to scanning the cache
+        '''
+        self._count_later('misses')
+
+    @staticmethod
+    def _splits(expr, delimiter):
+        '''
+        Return the (key path, pattern) pairs subdict_match would try, or None
+        if the expression cannot be answered from the index
+        '''
+        splits = expr.split(delimiter)
+        if len(splits) == 1:
+            return []
+        ret = []
+        for idx in range(len(splits) - 1, 0, -1):
+            path = splits[:idx]
+            pattern = delimiter.join(splits[idx:])
+            if path[0] == '*' or pattern.startswith('*' + delimiter):
+                # Wildcard keys search the whole subtree
+                return None
+            if any(part.isdigit() for part in path):
+                # Might be an index into a list
+                return None
+            if any(PATH_SEP in part for part in path):
+                return None
+            ret.append((PATH_SEP.join(path), pattern))
+        return ret
+
+    def _values(self, conn, search_type, path, pattern, regex_match, exact_match):
+        '''
+        Return the indexed values at a path which match the pattern
+        '''
+        lpattern = pattern.lower()
+        if exact_match:
+            return [lpattern]
+        if regex_match:
+            try:
+                regex = re.compile(lpattern)
+            except re.error:
+                log.error('Invalid regex \'%s\' in match', pattern)
+                return []
+            match = regex.match
+        elif not any(char in lpattern for char in '*?['):
+            return [lpattern]
+        else:
+            def match(value):
+                return fnmatch.fnmatch(value, lpattern)
+        return [
+            row[0] for row in conn.execute(
+                'SELECT DISTINCT value FROM entries '
+                'WHERE search_type = ? AND path = ? AND kind = ?',
+                (search_type, path, KIND_VALUE))
+            if match(row[0])
+        ]
+
+    def match(self,
+              search_type,
+              expr,
+              delimiter,
+              regex_match=False,
+              exact_match=False):
+        '''
+        Return the set of minions whose cached ``search_type`` data matches
+        the expression, or None if the index cannot answer it.
+        '''
+        splits = self._splits(expr, delimiter)
+        if splits is None:
+            self.miss()
+            return None
+        minions = set()
+        conn = self._conn()
+        try:
+            synced = self.synced(conn)
+            max_age = SYNC_GRACE * self.opts.get('minion_data_cache_index_interval', 60)
+            if synced is None or time.time() - synced > max_age:
+                # The index may miss the minions cached by other writers
+                log.debug('The target index was not synced in the last %ss',
+                          max_age)
+                self.miss()
+                return None
+            for path, pattern in splits:
+                values = self._values(
+                    conn, search_type, path, pattern, regex_match, exact_match)
+                for value in values:
+                    minions.update(row[0] for row in conn.execute(
+                        'SELECT minion FROM entries WHERE search_type = ? '
+                        'AND path = ? AND kind = ? AND value = ?',
+                        (search_type, path, KIND_VALUE, value)))
+                if pattern == '*':
+                    # Only checking that the key exists
+                    minions.update(row[0] for row in conn.execute(
+                        'SELECT minion FROM entries WHERE search_type = ? '
+                        'AND path = ? AND kind = ?',
+                        (search_type, path, KIND_KEY)))
+                else:
+                    # The pattern names a key of the dict found at the path
+                    minions.update(row[0] for row in conn.execute(
+                        'SELECT minion FROM entries WHERE search_type = ? '
+                        'AND path = ? AND kind = ? AND value = ?',
+                        (search_type, path, KIND_KEY, pattern)))
+        finally:
+            conn.close()
+        self._count_later('hits')
+        return minions
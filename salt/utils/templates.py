@@ -53,6 +53,10 @@ TEMPLATE_DIRNAME = os.path.join(saltpath[0], 'templates')
 SLS_ENCODING = 'utf-8'  # this one has no BOM.
 SLS_ENCODER = codecs.getencoder(SLS_ENCODING)
 
+# The compiled code of the jinja templates rendered from files in this
+# process, when enabled by cache_jinja_templates()
+_JINJA_CODE_CACHE = None
+
 
 class AliasedLoader(object):
     '''
@@ -95,6 +99,56 @@ class AliasedModule(object):
         return getattr(self.wrapped, name)
 
 
+def cache_jinja_templates():
+    '''
+    Cache the compiled code of the jinja templates rendered from files in this
+    process. The code of a template is compiled again when the mtime or the
+    contents of its file changed.
+    '''
+    global _JINJA_CODE_CACHE  # pylint: disable=global-statement
+    if _JINJA_CODE_CACHE is None:
+        _JINJA_CODE_CACHE = {'templates': {}, 'hits': 0, 'misses': 0}
+
+
+def jinja_template_cache_stats():
+    '''
+    Return the hits, misses and number of templates of the compiled jinja
+    template cache of this process, or None if it is not used.
+    '''
+    if _JINJA_CODE_CACHE is None:
+        return None
+    return {'hits': _JINJA_CODE_CACHE['hits'],
+            'misses': _JINJA_CODE_CACHE['misses'],
+            'templates': len(_JINJA_CODE_CACHE['templates'])}
+
+
+def _jinja_template(jinja_env, env_args, tmplstr, tmplpath):
+    '''
+    Return the jinja template of tmplstr, with its code from the compiled
+    template cache when it is enabled and tmplstr is read from tmplpath
+    '''
+    if _JINJA_CODE_CACHE is None or not tmplpath:
+        return jinja_env.from_string(tmplstr)
+    try:
+        mtime = os.path.getmtime(tmplpath)
+    except OSError:
+        return jinja_env.from_string(tmplstr)
+    # The code depends on the syntax options of the environment
+    key = (tmplpath, tuple(sorted(
+        (name, repr(value)) for name, value in six.iteritems(env_args)
+        if name != 'loader')))
+    cached = _JINJA_CODE_CACHE['templates'].get(key)
+    if cached is not None and cached[0] == mtime and cached[1] == tmplstr:
+        _JINJA_CODE_CACHE['hits'] += 1
+        code = cached[2]
+    else:
+        _JINJA_CODE_CACHE['misses'] += 1
+        code = jinja_env.compile(tmplstr)
+        _JINJA_CODE_CACHE['templates'][key] = (mtime, tmplstr, code)
+    return jinja_env.template_class.from_code(
+        jinja_env, code, jinja_env.make_globals(None))
+
+
 def wrap_tmpl_func(render_str):
 
     def render_tmpl(tmplsrc,
@@ -389,7 +443,7 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
             decoded_context[key] = salt.utils.data.decode(value)
 
     try:
-        template = jinja_env.from_string(tmplstr)
+        template = _jinja_template(jinja_env, env_args, tmplstr, tmplpath)
         template.globals.update(decoded_context)
         output = template.render(**decoded_context)
     except jinja2.exceptions.UndefinedError as exc:
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Time the scheduling of the batch engine for batches over many minions.
+
+The script feeds the engine the ping returns of ``--minions`` simulated
+minions, then runs the batch with every minion returning a random time
+between one and ``--latency`` seconds after the job was published to it,
+one in a hundred with a failure, on a simulated clock. It prints the time
+the engine took per minion, which is all the master spends on the batch
+beside reading the events.
+
+    python tests/batchbench.py --minions 20000 --batch 10%
+'''
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import heapq
+import optparse
+import random
+import time
+
+# Import salt libs
+from salt.cli.batch import BatchEngine
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-m',
+        '--minions',
+        dest='minions',
+        default=20000,
+        type='int',
+        help='The number of minions targeted')
+    parser.add_option(
+        '-b',
+        '--batch',
+        dest='batch',
+        default='10%',
+        help='The batch size')
+    parser.add_option(
+        '-l',
+        '--latency',
+        dest='latency',
+        default=30,
+        type='float',
+        help='The maximum time a minion takes to run the job in seconds')
+    parser.add_option(
+        '--adaptive',
+        dest='adaptive',
+        default=False,
+        action='store_true',
+        help='Size the batch after the failures and latency of the returns')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def run(options):
+    '''
+    Run the simulated batch and time the engine
+    '''
+    random.seed(0)
+    minions = ['minion{0}'.format(idx) for idx in range(options['minions'])]
+    engine = BatchEngine({'batch': options['batch'],
+                          'timeout': options['latency'] * 2,
+                          'gather_job_timeout': 10,
+                          'batch_adaptive': options['adaptive']})
+    start = time.time()
+    engine.ping('ping')
+    engine.targeted(minions, 0)
+    for minion in minions:
+        engine.handle_event('salt/job/ping/ret/' + minion, {'id': minion, 'return': True}, 0)
+    # The simulated returns, (time, minion, retcode)
+    returns = []
+    now = 0
+    jobs = 0
+    while not engine.finished:
+        run_, _, _, _ = engine.schedule(now)
+        if run_:
+            jobs += 1
+            jid = 'job{0}'.format(jobs)
+            engine.started(jid, run_)
+            for minion in run_:
+                heapq.heappush(returns, (now + random.uniform(1, options['latency']),
+                                         minion, jid, int(random.random() < 0.01)))
+        if not returns:
+            continue
+        now, minion, jid, retcode = heapq.heappop(returns)
+        engine.handle_event('salt/job/{0}/ret/{1}'.format(jid, minion),
+                            {'id': minion, 'return': True, 'retcode': retcode},
+                            now)
+    duration = time.time() - start
+    print('{0:>8}{1:>10}{2:>10}{3:>12}{4:>14}'.format(
+        'minions', 'batch', 'jobs', 'run time', 'per minion'))
+    print('{0:>8}{1:>10}{2:>10}{3:>11.0f}s{4:>12.1f}us'.format(
+        options['minions'], options['batch'], jobs, now,
+        duration / options['minions'] * 1000000))
+
+
+if __name__ == '__main__':
+    run(parse())
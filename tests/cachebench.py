@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark the single key and bulk operations of the minion data cache.
+
+The script stores synthetic grains and pillar data for the requested number
+of minions, then times reading them back one minion at a time and with the
+bulk ``fetch_many`` and ``list_with_values`` operations, against the localfs
+driver and against the redis driver talking to an in-process redis stand-in
+which adds a fixed latency to every round trip.
+
+    python tests/cachebench.py --minions 5000 --latency 0.2
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import optparse
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.cache
+import salt.cache.localfs as localfs
+import salt.cache.redis_cache as redis_cache
+import salt.payload
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+
+class _RedisPipeline(object):
+    '''
+    Pipeline of the redis stand-in, the queued commands cost one round trip
+    '''
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((name, args))
+        return queue
+
+    def execute(self):
+        self.server.round_trip()
+        commands, self.commands = self.commands, []
+        return [getattr(self.server, '_' + name)(*args) for name, args in commands]
+
+
+class _RedisServer(object):
+    '''
+    In-process stand-in for a StrictRedis client, every command is a round
+    trip
+    '''
+    def __init__(self, latency):
+        self.latency = latency
+        self.round_trips = 0
+        self.data = {}
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def pipeline(self):
+        return _RedisPipeline(self)
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.round_trip()
+            return getattr(self, '_' + name)(*args)
+        return command
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _set(self, key, value):
+        self.data[key] = value
+
+    def _sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def _smembers(self, key):
+        return set(self.data.get(key, ()))
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-m',
+        '--minions',
+        dest='minions',
+        default=1000,
+        type='int',
+        help='The number of minions to store data for')
+    parser.add_option(
+        '-l',
+        '--latency',
+        dest='latency',
+        default=0.2,
+        type='float',
+        help='The latency of a round trip to the redis stand-in, in milliseconds')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def minion_data(idx):
+    '''
+    Return synthetic cached data of a minion
+    '''
+    return {'grains': {'id': 'minion{0}'.format(idx),
+                       'os': 'Ubuntu' if idx % 2 else 'CentOS',
+                       'num_cpus': idx % 16,
+                       'ipv4': ['10.0.{0}.{1}'.format(idx // 256, idx % 256)],
+                       'roles': ['web', 'db'][idx % 2:]},
+            'pillar': {'env': 'prod', 'app': {'name': 'shop', 'port': 8080}}}
+
+
+def timed(label, fun, *args):
+    '''
+    Run a function and print how long it took
+    '''
+    start = time.time()
+    ret = fun(*args)
+    print('{0:<55} {1:10.3f}s'.format(label, time.time() - start))
+    return ret
+
+
+def bench(name, cache, minions):
+    '''
+    Time the single key and bulk operations of a cache
+    '''
+    banks = ['minions/minion{0}'.format(idx) for idx in range(minions)]
+
+    def fetch_each():
+        return dict((bank, cache.fetch(bank, 'data')) for bank in banks)
+
+    timed('{0}: store {1} minions one by one'.format(name, minions),
+          lambda: [cache.store(bank, 'data', minion_data(idx))
+                   for idx, bank in enumerate(banks)])
+    timed('{0}: store_many {1} minions'.format(name, minions),
+          cache.store_many,
+          dict((bank, minion_data(idx)) for idx, bank in enumerate(banks)),
+          'data')
+    single = timed('{0}: fetch {1} minions one by one'.format(name, minions),
+                   fetch_each)
+    bulk = timed('{0}: fetch_many {1} minions'.format(name, minions),
+                 cache.fetch_many, banks, 'data')
+    listed = timed('{0}: list_with_values minions'.format(name),
+                   cache.list_with_values, 'minions', 'data')
+    assert single == bulk
+    assert len(listed) == minions
+
+
+def run(options):
+    '''
+    Time the cache operations against both drivers
+    '''
+    cachedir = tempfile.mkdtemp(prefix='cachebench-')
+    opts = {'cachedir': cachedir, 'serial': 'msgpack'}
+    context = {'serial': salt.payload.Serial(opts)}
+    server = _RedisServer(options['latency'] / 1000.0)
+    for module in (localfs, redis_cache):
+        module.__opts__ = opts
+        module.__context__ = context
+    redis_cache.REDIS_SERVER = server
+    try:
+        for driver, module, kwargs in (('localfs', localfs, {'cachedir': cachedir}),
+                                       ('redis', redis_cache, {})):
+            cache = salt.cache.Cache(dict(opts, cache=driver))
+            # Bypass the loader, the redis driver needs the redis library
+            cache._modules = {'{0}.list'.format(driver): module.list_}
+            for fun in ('store', 'fetch', 'fetch_many', 'store_many', 'list_with_values'):
+                if hasattr(module, fun):
+                    cache._modules['{0}.{1}'.format(driver, fun)] = getattr(module, fun)
+            cache._kwargs = kwargs
+            bench(driver, cache, options['minions'])
+        print('{0:<55} {1:10d}'.format('redis round trips', server.round_trips))
+    finally:
+        shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    run(parse())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark the throughput and delivery latency of the master event bus with
+increasing numbers of event publisher shards.
+
+For each number of ``--shards`` the script starts the event publisher
+processes over IPC sockets in a temporary directory, ``--listeners``
+processes reading the bus like LocalClient calls do, and ``--senders``
+processes firing ``--events`` events in total with tags spread over the
+shards. It prints the events delivered to each listener per second and the
+median and 99th percentile delay from firing an event to a listener getting
+it.
+
+    python tests/eventbench.py --shards 1,2,4 --events 20000
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import multiprocessing
+import optparse
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.utils.event
+from salt.utils.process import clean_proc
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '--shards',
+        dest='shards',
+        default='1,2,4',
+        help='Comma separated numbers of event publisher shards to time')
+    parser.add_option(
+        '-e',
+        '--events',
+        dest='events',
+        default=20000,
+        type='int',
+        help='The number of events fired')
+    parser.add_option(
+        '--senders',
+        dest='senders',
+        default=4,
+        type='int',
+        help='The number of processes firing events')
+    parser.add_option(
+        '--listeners',
+        dest='listeners',
+        default=4,
+        type='int',
+        help='The number of processes reading the events')
+    parser.add_option(
+        '--size',
+        dest='size',
+        default=512,
+        type='int',
+        help='The size of the data of each event in bytes')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def listen(opts, events, ready, results):
+    '''
+    Read the events and put the delays of their delivery on the results
+    '''
+    event = salt.utils.event.MasterEvent(opts['sock_dir'], opts=opts, listen=True)
+    ready.set()
+    delays = []
+    last = None
+    while len(delays) < events:
+        ret = event.get_event(wait=10, tag='eventbench/')
+        if ret is None:
+            break
+        last = time.time()
+        delays.append(last - ret['sent'])
+    event.destroy()
+    results.put((delays, last))
+
+
+def send(opts, sender, events, size):
+    '''
+    Fire the events of a sender
+    '''
+    event = salt.utils.event.MasterEvent(opts['sock_dir'], opts=opts, listen=False)
+    payload = 'x' * size
+    for ind in range(events):
+        event.fire_event({'sent': time.time(), 'payload': payload},
+                         'eventbench/{0}/{1}/fired'.format(sender, ind % 64))
+    event.destroy()
+
+
+def _percentile(delays, percent):
+    return delays[min(int(len(delays) * percent / 100.0), len(delays) - 1)]
+
+
+def run(options):
+    '''
+    Time the event bus for each number of shards
+    '''
+    print('{0:>8}{1:>14}{2:>10}{3:>10}'.format('shards', 'events/s', 'p50', 'p99'))
+    events = options['events'] // options['senders'] * options['senders']
+    for shards in [int(shards) for shards in options['shards'].split(',')]:
+        sock_dir = tempfile.mkdtemp(prefix='eventbench-')
+        opts = {'sock_dir': sock_dir, 'event_publisher_shards': shards}
+        publishers = [salt.utils.event.EventPublisher(opts, shard=shard)
+                      for shard in range(shards)]
+        listeners = []
+        senders = []
+        try:
+            for proc in publishers:
+                proc.start()
+            time.sleep(1)
+            results = multiprocessing.Queue()
+            for _ in range(options['listeners']):
+                ready = multiprocessing.Event()
+                proc = multiprocessing.Process(
+                    target=listen, args=(opts, events, ready, results))
+                proc.start()
+                ready.wait()
+                listeners.append(proc)
+            # Let the publishers take the listener connections
+            time.sleep(0.5)
+            start = time.time()
+            for sender in range(options['senders']):
+                proc = multiprocessing.Process(
+                    target=send,
+                    args=(opts, sender, events // options['senders'], options['size']))
+                proc.start()
+                senders.append(proc)
+            delays = []
+            last = start
+            for _ in listeners:
+                ret, ret_last = results.get()
+                assert len(ret) == events, 'A listener missed events'
+                delays.extend(ret)
+                last = max(last, ret_last)
+            delays.sort()
+            print('{0:>8}{1:>14.0f}{2:>8.1f}ms{3:>8.1f}ms'.format(
+                shards, events / (last - start),
+                _percentile(delays, 50) * 1000, _percentile(delays, 99) * 1000))
+        finally:
+            for proc in senders + listeners + publishers:
+                clean_proc(proc)
+            shutil.rmtree(sock_dir)
+
+
+if __name__ == '__main__':
+    run(parse())
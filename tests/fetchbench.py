@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark caching a directory of the file server per file and with the
+multi-file fetch protocol.
+
+The script writes ``--files`` synthetic templates to a temporary file root,
+then times ``cp.cache_dir`` style caching of the directory with one
+``get_file`` call per file, as before the bulk protocol, and with
+``get_files``, once on a cold cache, once with nothing changed and once with
+one file in a hundred changed. The file client talks to the roots backend
+through a channel which adds a fixed latency to every request, standing in
+for the round trips to the master.
+
+    python tests/fetchbench.py --files 3000 --latency 0.5
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.config
+import salt.fileclient
+import salt.fileserver
+import salt.utils.files
+import salt.utils.url
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+
+class _LatencyChan(salt.fileserver.FSChan):
+    '''
+    FSChan which sleeps for the latency on every request
+    '''
+    def __init__(self, opts, latency):
+        super(_LatencyChan, self).__init__(opts)
+        self.latency = latency
+        self.requests = 0
+
+    def send(self, load, tries=None, timeout=None, raw=False):
+        self.requests += 1
+        time.sleep(self.latency)
+        return super(_LatencyChan, self).send(load, tries, timeout, raw)
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-f',
+        '--files',
+        dest='files',
+        default=3000,
+        type='int',
+        help='The number of files in the cached directory')
+    parser.add_option(
+        '-s',
+        '--size',
+        dest='size',
+        default=2048,
+        type='int',
+        help='The size of each file in bytes')
+    parser.add_option(
+        '-l',
+        '--latency',
+        dest='latency',
+        default=0.5,
+        type='float',
+        help='The latency of each request to the master in milliseconds')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def _write(path, ind, size, rev=0):
+    line = '{{# template {0} revision {1} #}}\n'.format(ind, rev)
+    with salt.utils.files.fopen(path, 'w') as fp_:
+        fp_.write((line * (size // len(line) + 1))[:size])
+
+
+def run(options):
+    '''
+    Time caching the directory per file and in bulk
+    '''
+    root_dir = tempfile.mkdtemp(prefix='fetchbench-')
+    file_root = os.path.join(root_dir, 'file_root')
+    paths = []
+    for ind in range(options['files']):
+        path = 'templates/app{0}/file{1}.jinja'.format(ind // 100, ind)
+        fpath = os.path.join(file_root, path)
+        if not os.path.isdir(os.path.dirname(fpath)):
+            os.makedirs(os.path.dirname(fpath))
+        _write(fpath, ind, options['size'])
+        paths.append(path)
+    opts = salt.config.minion_config(None)
+    opts.update({'file_client': 'local',
+                 'file_roots': {'base': [file_root]},
+                 'fileserver_backend': ['roots']})
+    urls = [salt.utils.url.create(path) for path in paths]
+    try:
+        print('{0:>8}{1:>10}{2:>12}{3:>10}'.format(
+            'fetch', 'cache', 'requests', 'time'))
+        for mode in ('per-file', 'bulk'):
+            opts['cachedir'] = os.path.join(root_dir, 'cache-' + mode)
+            client = salt.fileclient.FSClient(opts)
+            client.channel = _LatencyChan(opts, options['latency'] / 1000.0)
+            for cache in ('cold', 'warm', 'changed'):
+                if cache == 'changed':
+                    for ind in range(0, options['files'], 100):
+                        _write(os.path.join(file_root, paths[ind]), ind,
+                               options['size'], rev=mode)
+                client.channel.requests = 0
+                start = time.time()
+                if mode == 'bulk':
+                    ret = client.get_files(urls, 'base')
+                else:
+                    ret = [client.get_file(url, '', True, 'base') for url in urls]
+                duration = time.time() - start
+                assert all(ret), 'Not all the files were cached'
+                print('{0:>8}{1:>10}{2:>12}{3:>9.2f}s'.format(
+                    mode, cache, client.channel.requests, duration))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    run(parse())
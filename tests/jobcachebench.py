@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark the local_cache and indexed_local_cache job cache returners against
+a synthetic job cache.
+
+The script writes the requested number of jobs in the local_cache on-disk
+layout to a temporary cache directory, then times listing and expiring the
+jobs with both returners, including the migration of the existing cache to
+the index.
+
+    python tests/jobcachebench.py --jobs 1000000
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import datetime
+import optparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.payload
+import salt.utils.files
+import salt.utils.jid
+import salt.utils.stringutils
+import salt.returners.local_cache as local_cache
+import salt.returners.indexed_local_cache as indexed_local_cache
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+FUNS = [
+    'test.ping',
+    'state.apply',
+    'cmd.run',
+    'grains.items',
+    'saltutil.find_job',
+]
+
+
+class _MasterMinion(object):
+    '''
+    Stand-in for the MasterMinion indexed_local_cache loads local_cache from
+    '''
+    def __init__(self):
+        self.returners = {}
+        for fun in dir(local_cache):
+            if not fun.startswith('_'):
+                self.returners['local_cache.{0}'.format(fun)] = getattr(local_cache, fun)
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        default=100000,
+        type='int',
+        help='The number of synthetic jobs to write to the job cache')
+    parser.add_option(
+        '-c',
+        '--count',
+        dest='count',
+        default=50,
+        type='int',
+        help='The number of jobs to list with get_jids_filter')
+    parser.add_option(
+        '--cachedir',
+        dest='cachedir',
+        default=None,
+        help=('Cache directory to use, an existing synthetic cache in it is '
+              'reused. Defaults to a temporary directory which is removed '
+              'afterwards'))
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def populate(opts, jobs):
+    '''
+    Write synthetic jobs in the local_cache layout
+    '''
+    serial = salt.payload.Serial(opts)
+    job_dir = os.path.join(opts['cachedir'], 'jobs')
+    start = time.time() - 3600
+    now = datetime.datetime.now()
+    for idx in range(jobs):
+        jid = '{0:%Y%m%d%H%M%S%f}'.format(now - datetime.timedelta(seconds=idx))
+        jid_dir = salt.utils.jid.jid_dir(jid, job_dir, opts['hash_type'])
+        if os.path.isdir(jid_dir):
+            continue
+        os.makedirs(jid_dir)
+        with salt.utils.files.fopen(os.path.join(jid_dir, 'jid'), 'wb') as fp_:
+            fp_.write(salt.utils.stringutils.to_bytes(jid))
+        load = {'jid': jid,
+                'fun': random.choice(FUNS),
+                'arg': [],
+                'tgt': '*',
+                'tgt_type': 'glob',
+                'user': 'root'}
+        with salt.utils.files.fopen(os.path.join(jid_dir, '.load.p'), 'wb') as fp_:
+            serial.dump(load, fp_)
+        os.utime(os.path.join(jid_dir, 'jid'), (start, start))
+
+
+def timed(label, fun, *args):
+    '''
+    Run a function and print how long it took
+    '''
+    start = time.time()
+    ret = fun(*args)
+    print('{0:<55} {1:10.3f}s'.format(label, time.time() - start))
+    return ret
+
+
+def run(options):
+    '''
+    Populate the job cache and time both returners
+    '''
+    cachedir = options['cachedir'] or tempfile.mkdtemp(prefix='jobcachebench-')
+    opts = {'cachedir': cachedir,
+            'hash_type': 'sha256',
+            'keep_jobs': 24,
+            'serial': 'msgpack'}
+    local_cache.__opts__ = opts
+    indexed_local_cache.__opts__ = opts
+    indexed_local_cache.MMINION = _MasterMinion()
+    try:
+        if not os.path.isdir(os.path.join(cachedir, 'jobs')):
+            timed('populate {0} jobs'.format(options['jobs']),
+                  populate, opts, options['jobs'])
+        timed('local_cache.get_jids_filter({0})'.format(options['count']),
+              local_cache.get_jids_filter, options['count'])
+        timed('local_cache.clean_old_jobs (nothing expired)',
+              local_cache.clean_old_jobs)
+        indexed = timed('indexed_local_cache.reindex (migration)',
+                        indexed_local_cache.reindex)
+        print('{0:<55} {1:10d}'.format('indexed jobs', indexed))
+        timed('indexed_local_cache.get_jids_filter({0})'.format(options['count']),
+              indexed_local_cache.get_jids_filter, options['count'])
+        timed('indexed_local_cache.get_jids_by_fun',
+              indexed_local_cache.get_jids_by_fun, 'state.apply', options['count'])
+        timed('indexed_local_cache.clean_old_jobs (nothing expired)',
+              indexed_local_cache.clean_old_jobs)
+    finally:
+        if options['cachedir'] is None:
+            shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    run(parse())
@@ -144,6 +144,13 @@ def parse():
         default=0.0,
         type='float',
         help='Seconds to wait between minion starts')
+    parser.add_option(
+        '--zmq-filtering',
+        dest='zmq_filtering',
+        default=False,
+        action='store_true',
+        help=('Enable zmq_filtering on the minions, and on the master with -M, '
+              'so that publishes are only sent to the targeted minions'))
     parser.add_option(
         '-c', '--config-dir', default='',
         help=('Pass in a configuration directory containing base configuration.')
@@ -328,6 +335,9 @@ class MinionSwarm(Swarm):
         elif self.opts['transport'] == 'tcp':
             data['transport'] = 'tcp'
 
+        if self.opts['zmq_filtering']:
+            data['zmq_filtering'] = True
+
         if self.opts['root_dir']:
             data['root_dir'] = self.opts['root_dir']
 
@@ -409,6 +419,8 @@ class MasterSwarm(Swarm):
             'log_file': os.path.join(self.conf, 'master.log'),
             'open_mode': True  # TODO Pre-seed keys
         })
+        if self.opts['zmq_filtering']:
+            data['zmq_filtering'] = True
 
         os.makedirs(self.conf)
         path = os.path.join(self.conf, 'master')
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Time matching event tags against a reactor map and rendering reaction
+templates.
+
+The script builds a reactor map of ``--globs`` globs over beacon, minion and
+custom event tags, then times matching ``--events`` beacon event tags with
+fnmatch against every glob, as before the compiled matcher, and with the
+matcher. It then times rendering a reaction template ``--events`` times with
+jinja, compiling it on every render and with the compiled template cache.
+
+    python tests/reactorbench.py --globs 200 --events 20000
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import fnmatch
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.utils.files
+import salt.utils.reactor
+import salt.utils.templates
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+REACTION = '''\
+{% if data['change'] == 'IN_MODIFY' %}
+restart_{{ data['id'] }}:
+  local.service.restart:
+    - tgt: {{ data['id'] }}
+    - args:
+      - name: {{ data['path'].split('/')[-1] }}
+{% for idx in range(5) %}
+notify_{{ idx }}:
+  runner.event.send:
+    - args:
+      - tag: custom/notify/{{ idx }}
+      - data:
+          path: {{ data['path'] }}
+{% endfor %}
+{% endif %}
+'''
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-g',
+        '--globs',
+        dest='globs',
+        default=200,
+        type='int',
+        help='The number of globs in the reactor map')
+    parser.add_option(
+        '-e',
+        '--events',
+        dest='events',
+        default=20000,
+        type='int',
+        help='The number of events matched and reactions rendered')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def gen_map(globs):
+    '''
+    Return a reactor map of globs globs
+    '''
+    react_map = []
+    for idx in range(globs):
+        kind = idx % 4
+        if kind == 0:
+            glob = 'salt/beacon/web{0}*/inotify/*'.format(idx)
+        elif kind == 1:
+            glob = 'salt/minion/db{0}/start'.format(idx)
+        elif kind == 2:
+            glob = 'custom/app{0}/*/deploy'.format(idx)
+        else:
+            glob = 'salt/job/*/ret/app{0}'.format(idx)
+        react_map.append({glob: ['/srv/reactor/reaction{0}.sls'.format(idx)]})
+    return react_map
+
+
+def run(options):
+    '''
+    Time matching and rendering
+    '''
+    react_map = gen_map(options['globs'])
+    tags = ['salt/beacon/web{0}/inotify//etc/app{1}.conf'.format(
+        idx % options['globs'], idx % 100) for idx in range(options['events'])]
+    print('{0:>10}{1:>14}{2:>12}'.format('step', 'mode', 'events/s'))
+    start = time.time()
+    for tag in tags:
+        reactors = []
+        for ropt in react_map:
+            key = next(iter(ropt))
+            if fnmatch.fnmatch(tag, key):
+                reactors.extend(ropt[key])
+    print('{0:>10}{1:>14}{2:>12.0f}'.format('match', 'fnmatch', len(tags) / (time.time() - start)))
+    matcher = salt.utils.reactor.ReactorMatcher(react_map)
+    start = time.time()
+    for tag in tags:
+        matcher.match(tag)
+    print('{0:>10}{1:>14}{2:>12.0f}'.format('match', 'matcher', len(tags) / (time.time() - start)))
+
+    root_dir = tempfile.mkdtemp(prefix='reactorbench-')
+    tmplpath = os.path.join(root_dir, 'reaction.sls')
+    with salt.utils.files.fopen(tmplpath, 'w') as fp_:
+        fp_.write(REACTION)
+    try:
+        for mode in ('compile', 'cached'):
+            if mode == 'cached':
+                salt.utils.templates.cache_jinja_templates()
+            start = time.time()
+            for tag in tags:
+                context = {'opts': {}, 'saltenv': None, 'tag': tag,
+                           'data': {'id': 'web1', 'change': 'IN_MODIFY', 'path': tag}}
+                salt.utils.templates.render_jinja_tmpl(REACTION, context, tmplpath)
+            print('{0:>10}{1:>14}{2:>12.0f}'.format('render', mode, len(tags) / (time.time() - start)))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    run(parse())
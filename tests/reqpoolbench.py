@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Measure the latency of minion authentication while a flood of job returns
+reaches the master, with and without worker pools.
+
+The script starts the master's request router (the MWorkerQueue process) and
+stand-in workers which spend a fixed time on each request, then sends
+``--returns`` encrypted ``_return`` requests at once while a probe sends a
+clear ``_auth`` request every ``--interval`` seconds and records its round
+trip time. It runs once with the workers in a single pool and once with
+separate auth, returns and default pools of the same total size.
+
+    python tests/reqpoolbench.py --returns 10000 --return-time 2
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import ctypes
+import multiprocessing
+import optparse
+import shutil
+import tempfile
+import threading
+import time
+
+# Import salt libs
+import salt.config
+import salt.crypt
+import salt.master
+import salt.payload
+import salt.transport.zeromq
+import salt.utils.stringutils
+from salt.utils.zeromq import zmq
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+from tests.support.helpers import get_unused_localhost_port
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-r',
+        '--returns',
+        dest='returns',
+        default=10000,
+        type='int',
+        help='The number of job returns sent at once')
+    parser.add_option(
+        '--return-time',
+        dest='return_time',
+        default=2.0,
+        type='float',
+        help='Milliseconds a worker spends on each return')
+    parser.add_option(
+        '--auth-time',
+        dest='auth_time',
+        default=1.0,
+        type='float',
+        help='Milliseconds a worker spends on each auth request')
+    parser.add_option(
+        '-w',
+        '--workers',
+        dest='workers',
+        default=8,
+        type='int',
+        help=('The total number of workers. With pools, one handles auth, '
+              'one the other commands, and the rest the returns'))
+    parser.add_option(
+        '--interval',
+        dest='interval',
+        default=0.05,
+        type='float',
+        help='Seconds between two auth requests of the probe')
+    options, _args = parser.parse_args()
+    return options
+
+
+def _worker(opts, uri, service_times):
+    '''
+    Stand-in MWorker replying to each request after its service time
+    '''
+    context = zmq.Context()
+    sock = context.socket(zmq.REP)
+    sock.connect(uri)
+    serial = salt.payload.Serial(opts)
+    crypticle = salt.crypt.Crypticle(
+        opts, salt.master.SMaster.secrets['aes']['secret'].value)
+    while True:
+        payload = serial.loads(sock.recv())
+        load = payload['load']
+        if payload['enc'] == 'aes':
+            load = crypticle.loads(load)
+        time.sleep(service_times.get(load.get('cmd'), 0))
+        sock.send(b'ok')
+
+
+def _flood(opts, num, done):
+    '''
+    Send num encrypted returns at once and wait for all the replies
+    '''
+    context = zmq.Context()
+    sock = context.socket(zmq.DEALER)
+    sock.setsockopt(zmq.SNDHWM, 0)
+    sock.setsockopt(zmq.RCVHWM, 0)
+    sock.connect('tcp://127.0.0.1:{0}'.format(opts['ret_port']))
+    serial = salt.payload.Serial(opts)
+    crypticle = salt.crypt.Crypticle(
+        opts, salt.master.SMaster.secrets['aes']['secret'].value)
+    for ind in range(num):
+        load = {'cmd': '_return', 'id': 'minion-{0}'.format(ind),
+                'jid': '20191016000000000000', 'fun': 'test.ping',
+                'return': True}
+        sock.send_multipart([b'', serial.dumps({'enc': 'aes',
+                                                'load': crypticle.dumps(load)})])
+    for _ in range(num):
+        sock.recv_multipart()
+    done.set()
+    sock.close()
+    context.term()
+
+
+def _probe(opts, interval, stop, latencies):
+    '''
+    Send an auth request every interval seconds and record the round trip
+    '''
+    context = zmq.Context()
+    sock = context.socket(zmq.REQ)
+    sock.connect('tcp://127.0.0.1:{0}'.format(opts['ret_port']))
+    serial = salt.payload.Serial(opts)
+    body = serial.dumps({'enc': 'clear', 'load': {'cmd': '_auth', 'id': 'probe'}})
+    while not stop.is_set():
+        start = time.time()
+        sock.send(body)
+        sock.recv()
+        latencies.append((start, time.time() - start))
+        time.sleep(interval)
+    sock.close()
+    context.term()
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100.0), len(values) - 1)]
+
+
+def run(options, pools):
+    '''
+    Run the benchmark with the given worker pools, returns the auth latencies
+    before and during the flood
+    '''
+    sock_dir = tempfile.mkdtemp(prefix='reqpoolbench')
+    opts = salt.config.master_config(None)
+    opts.update({'sock_dir': sock_dir,
+                 'ret_port': get_unused_localhost_port(),
+                 'worker_pools': pools})
+    salt.config._update_worker_pools(opts)
+    channel = salt.transport.zeromq.ZeroMQReqServerChannel(opts)
+    service_times = {'_return': options.return_time / 1000.0,
+                     '_auth': options.auth_time / 1000.0}
+    procs = [multiprocessing.Process(target=channel.zmq_device)]
+    if opts['worker_pools']:
+        for pool, conf in opts['worker_pools'].items():
+            for _ in range(conf['worker_threads']):
+                procs.append(multiprocessing.Process(
+                    target=_worker,
+                    args=(opts, channel._worker_uri(pool), service_times)))
+    else:
+        for _ in range(options.workers):
+            procs.append(multiprocessing.Process(
+                target=_worker,
+                args=(opts, channel._worker_uri(), service_times)))
+    for proc in procs:
+        proc.start()
+    try:
+        time.sleep(1)
+        stop = threading.Event()
+        done = threading.Event()
+        latencies = []
+        probe = threading.Thread(target=_probe,
+                                 args=(opts, options.interval, stop, latencies))
+        probe.start()
+        time.sleep(1)
+        flood_start = time.time()
+        flood = threading.Thread(target=_flood, args=(opts, options.returns, done))
+        flood.start()
+        done.wait()
+        flood_time = time.time() - flood_start
+        stop.set()
+        probe.join()
+        flood.join()
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.join()
+        shutil.rmtree(sock_dir, ignore_errors=True)
+    before = [lat for start, lat in latencies if start < flood_start]
+    during = [lat for start, lat in latencies if start >= flood_start]
+    return before, during, flood_time
+
+
+def main():
+    options = parse()
+    salt.master.SMaster.secrets['aes'] = {
+        'secret': multiprocessing.Array(
+            ctypes.c_char,
+            salt.utils.stringutils.to_bytes(salt.crypt.Crypticle.generate_key_string()),
+        ),
+    }
+    pools = {'auth': {'worker_threads': 1, 'commands': ['_auth']},
+             'returns': {'worker_threads': max(options.workers - 2, 1),
+                         'commands': ['_return', '_syndic_return'],
+                         # Queue the whole flood, as the single queue does
+                         'queue_size': 0},
+             'default': {'worker_threads': 1}}
+    print('{0} returns, {1} workers, {2}ms per return'.format(
+        options.returns, options.workers, options.return_time))
+    print('{0:<12}{1:>12}{2:>12}{3:>12}{4:>12}{5:>12}'.format(
+        'workers', 'auth p50', 'auth p99', 'auth max', 'idle p99', 'flood (s)'))
+    for name, conf in (('single', {}), ('pools', pools)):
+        before, during, flood_time = run(options, conf)
+        print('{0:<12}{1:>10.1f}ms{2:>10.1f}ms{3:>10.1f}ms{4:>10.1f}ms{5:>12.2f}'.format(
+            name,
+            _percentile(during, 50) * 1000,
+            _percentile(during, 99) * 1000,
+            max(during or [0]) * 1000,
+            _percentile(before, 99) * 1000,
+            flood_time))
+
+
+if __name__ == '__main__':
+    main()
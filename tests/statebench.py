@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Time the compilation and requisite resolution of synthetic highstates of
+increasing size.
+
+The script generates high data of ``--sizes`` states spread over SLS files of
+``--per-sls`` states, each state requiring the previous one of its SLS, every
+tenth one requiring a whole SLS, and every twentieth one using ``watch_in``
+and ``listen``, then times ``State.call_high`` with mocked state calls. With
+the requisite indexes the time per state stays about flat as the highstate
+grows.
+
+    python tests/statebench.py --sizes 1250,2500,5000,10000
+'''
+# pylint: disable=resource-leakage
+# Import Python Libs
+from __future__ import absolute_import, print_function
+import optparse
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.config
+import salt.state
+from salt.utils.odict import OrderedDict
+
+# Import third party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+
+def parse():
+    '''
+    Parse the cli options
+    '''
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '-s',
+        '--sizes',
+        dest='sizes',
+        default='625,1250,2500,5000',
+        help='Comma separated numbers of states of the highstates timed')
+    parser.add_option(
+        '--per-sls',
+        dest='per_sls',
+        default=50,
+        type='int',
+        help='The number of states in each SLS file')
+    options, _ = parser.parse_args()
+    return options.__dict__
+
+
+def gen_high(size, per_sls):
+    '''
+    Return synthetic high data of size states
+    '''
+    high = OrderedDict()
+    for idx in range(size):
+        sls, pos = divmod(idx, per_sls)
+        args = ['succeed_without_changes', {'name': '/srv/app/file{0}'.format(idx)}]
+        if pos:
+            args.append({'require': [{'test': 'state{0}'.format(idx - 1)}]})
+        if sls and idx % 10 == 0:
+            args.append({'require': [{'sls': 'sls{0}'.format(sls - 1)}]})
+        if idx % 20 == 5 and idx + per_sls < size:
+            args.append({'watch_in': [{'test': 'state{0}'.format(idx + per_sls)}]})
+            args.append({'listen': [{'test': 'state{0}'.format(idx - 1)}]})
+        high['state{0}'.format(idx)] = OrderedDict([
+            ('test', args),
+            ('__sls__', 'sls{0}'.format(sls)),
+            ('__env__', 'base'),
+        ])
+    return high
+
+
+def run(options):
+    '''
+    Time call_high for each size
+    '''
+    cachedir = tempfile.mkdtemp(prefix='statebench-')
+    opts = salt.config.minion_config(None)
+    opts.update({'cachedir': cachedir,
+                 'file_client': 'local',
+                 'grains': {},
+                 'state_events': False})
+    try:
+        print('{0:>8}{1:>12}{2:>16}'.format('states', 'call_high', 'per state'))
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            high = gen_high(size, options['per_sls'])
+            state = salt.state.State(opts, jid='20191016000000000000', mocked=True,
+                                     initial_pillar={'statebench': True})
+            start = time.time()
+            ret = state.call_high(high)
+            duration = time.time() - start
+            assert isinstance(ret, dict), ret
+            print('{0:>8}{1:>11.2f}s{2:>14.1f}us'.format(
+                size, duration, duration / size * 1000000))
+    finally:
+        shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    run(parse())
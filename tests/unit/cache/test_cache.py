@@ -5,15 +5,23 @@ unit tests for salt.cache
 
 # Import Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import threading
+import time
 
 # Import Salt Testing libs
 # import integration
-from tests.support.unit import TestCase
-from tests.support.mock import patch
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase, skipIf
+from tests.support.mock import MagicMock, patch
 
 # Import Salt libs
+import salt.config
 import salt.payload
 import salt.cache
+from salt.exceptions import SaltCacheError
 
 
 class CacheFunctionsTest(TestCase):
@@ -37,6 +45,64 @@ class CacheFunctionsTest(TestCase):
         self.assertIsInstance(ret, salt.cache.MemCache)
 
 
+class CacheBulkTest(TestCase):
+    '''
+    Validate the bulk methods of the Cache class
+    '''
+    def setUp(self):
+        self.opts = {'cache': 'fake_driver'}
+        self.data = {('minions/web1', 'data'): {'grains': {'os': 'Ubuntu'}},
+                     ('minions/web2', 'data'): {'grains': {'os': 'CentOS'}}}
+        self.modules = {
+            'fake_driver.fetch': MagicMock(
+                side_effect=lambda bank, key: self.data.get((bank, key), {})),
+            'fake_driver.store': MagicMock(
+                side_effect=lambda bank, key, data: self.data.update({(bank, key): data})),
+            'fake_driver.list': MagicMock(return_value=['web1', 'web2', 'web3']),
+        }
+
+    def _cache(self):
+        with patch('salt.loader.cache', return_value=self.modules):
+            cache = salt.cache.Cache(self.opts)
+            cache.modules  # pylint: disable=pointless-statement
+        return cache
+
+    def test_fetch_many_fallback(self):
+        ret = self._cache().fetch_many(['minions/web1', 'minions/web3'], 'data')
+        self.assertEqual(ret, {'minions/web1': {'grains': {'os': 'Ubuntu'}},
+                               'minions/web3': {}})
+        self.assertEqual(self.modules['fake_driver.fetch'].call_count, 2)
+
+    def test_fetch_many_native(self):
+        self.modules['fake_driver.fetch_many'] = MagicMock(return_value={'minions/web1': {}})
+        ret = self._cache().fetch_many(iter(['minions/web1']), 'data')
+        self.assertEqual(ret, {'minions/web1': {}})
+        self.modules['fake_driver.fetch_many'].assert_called_once_with(['minions/web1'], 'data')
+        self.modules['fake_driver.fetch'].assert_not_called()
+
+    def test_store_many(self):
+        cache = self._cache()
+        cache.store_many({'minions/web1': 1, 'minions/web2': 2}, 'mine')
+        self.assertEqual(self.data[('minions/web1', 'mine')], 1)
+        self.assertEqual(self.data[('minions/web2', 'mine')], 2)
+
+        self.modules['fake_driver.store_many'] = MagicMock()
+        cache.store_many({'minions/web1': 3}, 'mine')
+        self.modules['fake_driver.store_many'].assert_called_once_with({'minions/web1': 3}, 'mine')
+        self.assertEqual(self.modules['fake_driver.store'].call_count, 2)
+
+    def test_list_with_values(self):
+        self.assertEqual(self._cache().list_with_values('minions', 'data'), {
+            'web1': {'grains': {'os': 'Ubuntu'}},
+            'web2': {'grains': {'os': 'CentOS'}},
+            'web3': {}})
+        self.modules['fake_driver.list'].assert_called_once_with('minions')
+
+        self.modules['fake_driver.list_with_values'] = MagicMock(return_value={})
+        self.assertEqual(self._cache().list_with_values('minions', 'data'), {})
+        self.modules['fake_driver.list_with_values'].assert_called_once_with('minions', 'data')
+
+
 class MemCacheTest(TestCase):
     '''
     Validate Cache class methods
@@ -212,3 +278,203 @@ class MemCacheTest(TestCase):
         # Check debug data
         self.assertEqual(self.cache.call, 6)
         self.assertEqual(self.cache.hit, 3)
+
+
+class MemCachePolicyTest(TestCase):
+    '''
+    Validate the per bank policies, size accounting and write modes of MemCache
+    '''
+    def setUp(self):
+        salt.cache.MemCache.data = {}
+        salt.cache.MemCache.segments = {}
+        salt.cache.MemCache.counters = {}
+        salt.cache.MemCache.pending = {}
+        salt.cache.MemCache.writers = {}
+        self.opts = {'cache': 'fake_driver',
+                     'memcache_expire_seconds': 10,
+                     'memcache_max_items': 100,
+                     'memcache_banks': {
+                         'minions/*/data': {'expire': 3600, 'max_items': 2},
+                         'minions/*/mine': {'expire': 0}}}
+        self.stored = {}
+        self.down = False
+        self.modules = {
+            'fake_driver.fetch': MagicMock(
+                side_effect=lambda bank, key: self.stored.get((bank, key), {})),
+            'fake_driver.store': MagicMock(side_effect=self._store),
+            'fake_driver.flush': MagicMock(),
+        }
+
+    def _store(self, bank, key, data):
+        if self.down:
+            raise SaltCacheError('down')
+        self.stored[(bank, key)] = data
+
+    def _cache(self):
+        with patch('salt.loader.cache', return_value=self.modules):
+            cache = salt.cache.factory(self.opts)
+            cache.modules  # pylint: disable=pointless-statement
+        return cache
+
+    def test_policies(self):
+        cache = self._cache()
+        self.assertIsInstance(cache, salt.cache.MemCache)
+        with patch('time.time', return_value=0):
+            for minion in ('web1', 'web2', 'web1', 'web3'):
+                cache.fetch('minions/{0}'.format(minion), 'data')
+            cache.fetch('minions/web1', 'mine')
+            cache.fetch('minions/web1', 'mine')
+            cache.fetch('bank', 'key')
+        # web2 was the least recently used minion data
+        self.assertEqual(sorted(salt.cache.MemCache.data['fake_driver']), [
+            ('bank', 'key'), ('minions/web1', 'data'), ('minions/web3', 'data')])
+        # minion data expires after an hour, other keys after 10 seconds
+        with patch('time.time', return_value=60):
+            cache.fetch('minions/web1', 'data')
+            cache.fetch('bank', 'key')
+        stats = salt.cache.MemCache.stats()['fake_driver']
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 7)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['expirations'], 1)
+        self.assertEqual(stats['items'], 3)
+
+    def test_max_bytes(self):
+        self.opts['memcache_banks'] = {}
+        self.opts['memcache_max_bytes'] = 250
+        for idx in range(3):
+            self.stored[('bank', 'key{0}'.format(idx))] = 'x' * 100
+        cache = self._cache()
+        for idx in range(3):
+            cache.fetch('bank', 'key{0}'.format(idx))
+        self.assertEqual(sorted(salt.cache.MemCache.data['fake_driver']),
+                         [('bank', 'key1'), ('bank', 'key2')])
+        stats = salt.cache.MemCache.stats()['fake_driver']
+        self.assertEqual(stats['evictions'], 1)
+        self.assertTrue(200 <= stats['bytes'] <= 250)
+
+    def test_write_behind(self):
+        self.opts['memcache_write_mode'] = 'behind'
+        self.opts['memcache_write_behind_interval'] = 3600
+        self.modules['fake_driver.store_many'] = MagicMock()
+        cache = self._cache()
+        with patch('threading.Thread'):
+            cache.store('minions/web1', 'data', {'id': 'web1'})
+            cache.store('minions/web2', 'data', {'id': 'web2'})
+            # The mine is not kept in memory but still served until written
+            cache.store('minions/web1', 'mine', {'foo': 'bar'})
+        self.modules['fake_driver.store'].assert_not_called()
+        self.assertEqual(cache.fetch('minions/web1', 'mine'), {'foo': 'bar'})
+        self.modules['fake_driver.fetch'].assert_not_called()
+
+        cache.flush('minions/web2')
+        cache.write_pending()
+        self.modules['fake_driver.store_many'].assert_any_call(
+            {'minions/web1': {'id': 'web1'}}, 'data')
+        self.modules['fake_driver.store_many'].assert_any_call(
+            {'minions/web1': {'foo': 'bar'}}, 'mine')
+        self.assertEqual(self.modules['fake_driver.store_many'].call_count, 2)
+        self.assertEqual(salt.cache.MemCache.stats()['fake_driver']['flushed_writes'], 2)
+
+    def test_write_behind_per_bank(self):
+        self.opts['memcache_banks']['minions/*/mine']['write_mode'] = 'behind'
+        cache = self._cache()
+        with patch('threading.Thread'):
+            cache.store_many({'minions/web1': {'id': 'web1'}}, 'data')
+            cache.store_many({'minions/web1': {'foo': 'bar'}}, 'mine')
+        self.assertEqual(self.stored, {('minions/web1', 'data'): {'id': 'web1'}})
+        self.assertEqual(salt.cache.MemCache.pending['fake_driver'],
+                         {('minions/web1', 'mine'): {'foo': 'bar'}})
+
+        # Written when the process exits
+        salt.cache.MemCache.finalizer()
+        self.assertEqual(self.stored[('minions/web1', 'mine')], {'foo': 'bar'})
+
+    def test_write_behind_after_fork(self):
+        self.opts['memcache_write_mode'] = 'behind'
+        cache = self._cache()
+        with patch('threading.Thread'):
+            cache.store('bank', 'key', 'data')
+        # A forked child does not write the values pending in its parent
+        with patch('os.getpid', return_value=-1):
+            cache.write_pending()
+            self.assertEqual(salt.cache.MemCache.pending, {})
+        self.assertEqual(self.stored, {})
+
+    def test_write_behind_error_is_retried(self):
+        self.opts['memcache_write_mode'] = 'behind'
+        self.down = True
+        cache = self._cache()
+        with patch('threading.Thread'):
+            cache.store('bank', 'key', 'data')
+        cache.write_pending()
+        self.assertEqual(salt.cache.MemCache.pending['fake_driver'],
+                         {('bank', 'key'): 'data'})
+        self.down = False
+        cache.write_pending()
+        self.assertEqual(self.stored[('bank', 'key')], 'data')
+        self.assertEqual(salt.cache.MemCache.pending, {})
+
+
+class CallCacheTest(TestCase):
+    '''
+    Validate the CallCache class
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, self.cachedir, ignore_errors=True)
+        self.opts = salt.config.DEFAULT_MASTER_OPTS.copy()
+        self.opts.update({'cachedir': self.cachedir,
+                          'extension_modules': os.path.join(self.cachedir, 'extmods')})
+        self.stats_dir = os.path.join(self.cachedir, 'stats')
+        self.calls = []
+
+    def _fun(self, ret, delay=0):
+        def _call():
+            time.sleep(delay)
+            self.calls.append(ret)
+            return ret
+        return _call
+
+    def test_call(self):
+        cache = salt.cache.CallCache(self.opts, 'calls', stats_dir=self.stats_dir)
+        self.assertEqual(cache.call('http', ['url', 'web'], self._fun({'a': 1}), 60), {'a': 1})
+        self.assertEqual(cache.call('http', ['url', 'web'], self._fun({'a': 2}), 60), {'a': 1})
+        self.assertEqual(cache.call('http', ['url', 'db'], self._fun({'a': 3}), 60), {'a': 3})
+        # The cache is shared with the other processes
+        other = salt.cache.CallCache(self.opts, 'calls')
+        self.assertEqual(other.call('http', ['url', 'web'], self._fun({'a': 4}), 60), {'a': 1})
+        # Expired data is refreshed
+        self.assertEqual(cache.call('http', ['url', 'web'], self._fun({'a': 5}), 0), {'a': 5})
+        self.assertEqual(self.calls, [{'a': 1}, {'a': 3}, {'a': 5}])
+        self.assertEqual(cache.stats(), {'http': {'hits': 1, 'misses': 3, 'coalesced': 0}})
+        self.assertEqual(os.listdir(self.stats_dir), ['{0}.p'.format(os.getpid())])
+
+    @skipIf(not salt.cache.HAS_FCNTL, 'fcntl is not available')
+    def test_call_coalesced(self):
+        cache = salt.cache.CallCache(self.opts, 'calls')
+        rets = []
+        threads = [threading.Thread(target=lambda: rets.append(
+            cache.call('http', ['url'], self._fun({'a': 1}, delay=0.5), 60)))
+            for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(rets, [{'a': 1}] * 3)
+        self.assertEqual(self.calls, [{'a': 1}])
+        self.assertEqual(cache.stats(), {'http': {'hits': 0, 'misses': 1, 'coalesced': 2}})
+        # The lock files don't pile up
+        self.assertEqual(os.listdir(cache.lock_dir), [])
+
+    def test_call_error(self):
+        cache = salt.cache.CallCache(self.opts, 'calls')
+
+        def _fail():
+            raise ValueError('backend down')
+
+        self.assertRaises(ValueError, cache.call, 'http', ['url'], _fail, 60)
+        if salt.cache.HAS_FCNTL:
+            self.assertEqual(os.listdir(cache.lock_dir), [])
+        # Failures are not cached
+        self.assertEqual(cache.call('http', ['url'], self._fun({'a': 1}), 60), {'a': 1})
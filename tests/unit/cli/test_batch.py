@@ -7,7 +7,9 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 # Import Salt Libs
-from salt.cli.batch import Batch
+import salt.ext.tornado.gen
+import salt.ext.tornado.testing
+from salt.cli.batch import Batch, BatchAsync, BatchEngine
 
 # Import Salt Testing Libs
 from tests.support.unit import TestCase
@@ -72,3 +74,244 @@ class BatchTestCase(TestCase):
         '''
         ret = Batch.get_bnum(self.batch)
         self.assertEqual(ret, None)
+
+
+class BatchEngineTestCase(TestCase):
+    '''
+    Unit Tests for the batch engine
+    '''
+    def _engine(self, minions, batch=2, **opts):
+        engine_opts = {'batch': batch, 'timeout': 5, 'gather_job_timeout': 3}
+        engine_opts.update(opts)
+        engine = BatchEngine(engine_opts)
+        engine.ping('ping')
+        engine.targeted(minions, 0)
+        return engine
+
+    @staticmethod
+    def _ret(engine, jid, minion, now, retcode=0):
+        return engine.handle_event('salt/job/{0}/ret/{1}'.format(jid, minion),
+                                   {'id': minion, 'return': True, 'retcode': retcode},
+                                   now)
+
+    def test_schedule_on_return(self):
+        '''
+        Test that minions run as soon as they answered the ping and a slot is
+        free
+        '''
+        engine = self._engine(['foo', 'bar', 'baz'])
+        self._ret(engine, 'ping', 'foo', 0.1)
+        run, check, timed_out, down = engine.schedule(0.1)
+        self.assertEqual((run, check, timed_out, down), (['foo'], {}, [], []))
+        engine.started('job1', run)
+        self._ret(engine, 'ping', 'bar', 0.2)
+        self._ret(engine, 'ping', 'baz', 0.2)
+        self.assertEqual(engine.schedule(0.2)[0], ['bar'])
+        engine.started('job2', ['bar'])
+        # The returns of other jobs are no returns of the batch
+        self.assertIsNone(self._ret(engine, 'job2', 'foo', 0.3))
+        self.assertEqual(self._ret(engine, 'job1', 'foo', 0.3), 'foo')
+        self.assertEqual(engine.schedule(0.3)[0], ['baz'])
+        engine.started('job3', ['baz'])
+        self._ret(engine, 'job2', 'bar', 0.4)
+        self._ret(engine, 'job3', 'baz', 0.4)
+        self.assertEqual(engine.schedule(0.4), ([], {}, [], []))
+        self.assertTrue(engine.finished)
+
+    def test_ping_timeout(self):
+        '''
+        Test that the minions which did not answer the ping are reported and
+        that minions answering unexpectedly are run
+        '''
+        engine = self._engine(['foo', 'bar'])
+        self._ret(engine, 'ping', 'foo', 1)
+        self._ret(engine, 'ping', 'qux', 1)
+        self.assertEqual(engine.schedule(1), (['foo', 'qux'], {}, [], []))
+        self.assertEqual(engine.deadline(), 5)
+        engine.started('job', ['foo', 'qux'])
+        self._ret(engine, 'job', 'foo', 2)
+        self._ret(engine, 'job', 'qux', 2)
+        self.assertFalse(engine.finished)
+        self.assertEqual(engine.schedule(5), ([], {}, [], ['bar']))
+        self.assertTrue(engine.finished)
+
+    def test_job_timeout(self):
+        '''
+        Test that heartbeats and find_job returns keep a minion running the
+        job and that it times out without them
+        '''
+        engine = self._engine(['foo'])
+        self._ret(engine, 'ping', 'foo', 0)
+        engine.started('job', engine.schedule(0)[0])
+        self.assertEqual(engine.deadline(), 5)
+        engine.handle_event('salt/job/job/heartbeat/foo',
+                            {'id': 'foo', 'jid': 'job', 'heartbeat': 4}, 4)
+        self.assertEqual(engine.deadline(), 12)
+        self.assertEqual(engine.schedule(12), ([], {'job': ['foo']}, [], []))
+        engine.checking('check')
+        self.assertEqual(engine.deadline(), 15)
+        engine.handle_event('salt/job/check/ret/foo',
+                            {'id': 'foo', 'return': {'jid': 'job'}}, 13)
+        self.assertEqual(engine.deadline(), 18)
+        self.assertEqual(engine.schedule(18), ([], {'job': ['foo']}, [], []))
+        engine.handle_event('salt/job/check/ret/foo',
+                            {'id': 'foo', 'return': {}}, 19)
+        self.assertEqual(engine.schedule(21), ([], {}, ['foo'], []))
+        self.assertTrue(engine.finished)
+        self.assertEqual(engine.failed, set(['foo']))
+
+    def test_percentage(self):
+        '''
+        Test that a percentage batch is sized after the targeted minions
+        '''
+        engine = self._engine(['minion{0}'.format(idx) for idx in range(20)], batch='10%')
+        self.assertEqual(engine.bnum, 2)
+        engine = self._engine(['foo'], batch='10%')
+        self.assertEqual(engine.bnum, 1)
+
+    def test_adaptive(self):
+        '''
+        Test that adaptive batches grow with fast successes and shrink with
+        slow returns and failures
+        '''
+        minions = ['minion{0}'.format(idx) for idx in range(10)]
+        engine = self._engine(minions, batch=4, batch_adaptive=True)
+        for minion in minions:
+            self._ret(engine, 'ping', minion, 0)
+
+        def step(now, minion, retcode=0):
+            self._ret(engine, 'job', minion, now, retcode)
+            run = engine.schedule(now)[0]
+            engine.started('job', run)
+            return run
+
+        self.assertEqual(step(0, 'none'), ['minion0'])
+        self.assertEqual(step(1, 'minion0'), ['minion1', 'minion2'])
+        self.assertEqual(step(2, 'minion1'), ['minion3', 'minion4'])
+        self.assertEqual(engine.size, 3)
+        self.assertEqual(step(3, 'minion2', retcode=1), [])
+        self.assertEqual(engine.size, 1)
+        self.assertEqual(step(9, 'minion3'), [])
+        self.assertEqual(engine.size, 1)
+        self.assertEqual(step(9, 'minion4'), ['minion5'])
+        self.assertEqual(engine.size, 1)
+        self.assertEqual(step(10, 'minion5'), ['minion6', 'minion7'])
+        self.assertEqual(engine.size, 2)
+
+    def test_batch_wait(self):
+        '''
+        Test that the slot of a returned minion is only reused after the
+        batch_wait
+        '''
+        engine = self._engine(['foo', 'bar'], batch=1, batch_wait=2)
+        self._ret(engine, 'ping', 'foo', 0)
+        self._ret(engine, 'ping', 'bar', 0)
+        engine.started('job', engine.schedule(0)[0])
+        self._ret(engine, 'job', 'foo', 1)
+        self.assertEqual(engine.schedule(1)[0], [])
+        self.assertEqual(engine.deadline(), 3)
+        self.assertEqual(engine.schedule(3)[0], ['bar'])
+
+
+class BatchEngineRunTestCase(TestCase):
+    '''
+    Unit Tests for batch runs with the batch engine
+    '''
+    def test_run(self):
+        '''
+        Test a run where the minions return right away
+        '''
+        opts = {'batch': '2',
+                'batch_engine': True,
+                'conf_file': {},
+                'tgt': '*',
+                'fun': 'test.echo',
+                'arg': ['hello'],
+                'timeout': 5,
+                'gather_job_timeout': 5}
+        minions = ['foo', 'bar', 'baz']
+        events = []
+        running = set()
+        published = []
+
+        def run_job(tgt, fun, arg, tgt_type, jid='', **kwargs):
+            # The returns are read from one subscription to salt/job/
+            self.assertIs(kwargs.get('listen'), False)
+            if fun == 'test.ping':
+                events.extend(('salt/job/{0}/ret/{1}'.format(jid, minion),
+                               {'id': minion, 'return': True})
+                              for minion in minions)
+                return {'jid': jid, 'minions': minions}
+            self.assertLessEqual(len(running) + len(tgt), 2)
+            running.update(tgt)
+            published.append(tgt)
+            events.extend(('salt/job/{0}/ret/{1}'.format(jid, minion),
+                           {'id': minion, 'jid': jid, 'return': arg[0], 'retcode': 0})
+                          for minion in tgt)
+            return {'jid': jid, 'minions': tgt}
+
+        def get_event(**kwargs):
+            tag, data = events.pop(0)
+            running.discard(data['id'])
+            return {'tag': tag, 'data': data}
+
+        local = MagicMock()
+        local.run_job.side_effect = run_job
+        local.event.get_event.side_effect = get_event
+        local.event.cpub = False
+        with patch('salt.client.get_local_client', MagicMock(return_value=local)):
+            batch = Batch(opts, quiet=True)
+        ret = list(batch.run())
+        self.assertEqual(ret, [{'foo': 'hello'}, {'bar': 'hello'}, {'baz': 'hello'}])
+        self.assertEqual(published, [['foo'], ['bar'], ['baz']])
+        local.event.close_pub.assert_called_once_with()
+
+
+class BatchAsyncTestCase(salt.ext.tornado.testing.AsyncTestCase):
+    '''
+    Unit Tests for batch runs on an IOLoop
+    '''
+    @salt.ext.tornado.testing.gen_test
+    def test_run(self):
+        '''
+        Test a run where a minion times out
+        '''
+        opts = {'batch': '1',
+                'sock_dir': '',
+                'tgt': '*',
+                'fun': 'test.echo',
+                'arg': ['hello'],
+                'timeout': 0.05,
+                'gather_job_timeout': 0.05}
+        event = MagicMock()
+        handlers = []
+        event.set_event_handler.side_effect = handlers.append
+        event.subscriber.connect.return_value = salt.ext.tornado.gen.maybe_future(None)
+        published = []
+
+        @salt.ext.tornado.gen.coroutine
+        def run_job_async(tgt, fun, arg, tgt_type, jid='', **kwargs):
+            published.append((tgt, fun))
+            if fun == 'test.ping':
+                tgt = ['foo', 'bar']
+            for minion in tgt:
+                if minion == 'bar' and fun != 'test.ping':
+                    continue
+                self.io_loop.add_callback(
+                    handlers[0],
+                    ('salt/job/{0}/ret/{1}'.format(jid, minion),
+                     {'id': minion, 'jid': jid, 'return': arg[0] if arg else True}))
+            raise salt.ext.tornado.gen.Return({'jid': jid, 'minions': tgt})
+
+        local = MagicMock()
+        local.run_job_async.side_effect = run_job_async
+        with patch('salt.client.get_local_client', MagicMock(return_value=local)), \
+                patch('salt.utils.event.get_master_event', MagicMock(return_value=event)), \
+                patch('salt.utils.event.SaltEvent.unpack', MagicMock(side_effect=lambda raw, serial: raw)):
+            ret = yield BatchAsync(opts, io_loop=self.io_loop).run()
+        self.assertEqual(ret, {'foo': 'hello', 'bar': {}})
+        self.assertEqual(published, [('*', 'test.ping'),
+                                     (['foo'], 'test.echo'),
+                                     (['bar'], 'test.echo'),
+                                     (['bar'], 'saltutil.find_job')])
+        event.destroy.assert_called_once_with()
@@ -559,6 +559,9 @@ class FakeCache(object):
     def fetch(self, bank, key):
         return self.data[bank, key]
 
+    def fetch_many(self, banks, key):
+        return dict((bank, self.data.get((bank, key), {})) for bank in banks)
+
 
 class RemoteFuncsTestCase(TestCase):
     '''
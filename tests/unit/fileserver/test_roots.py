@@ -192,3 +192,65 @@ class RootsTest(TestCase, AdaptedConfigurationTestCaseMixin, LoaderModuleMockMix
         self.assertEqual('dynamo.sls', ret1['rel'])
         self.assertIn('top.sls', ret2)
         self.assertIn('dynamo.sls', ret2)
+
+    def test_roots_index(self):
+        root_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(salt.utils.files.rm_rf, root_dir)
+        for name in ('top.sls', os.path.join('web', 'init.sls')):
+            path = os.path.join(root_dir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with salt.utils.files.fopen(path, 'w') as fp_:
+                fp_.write('{0}: []\n'.format(name))
+        os.makedirs(os.path.join(root_dir, 'empty'))
+        opts = {'file_roots': {'base': [root_dir]},
+                'roots_index': True,
+                'cachedir': tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)}
+        self.addCleanup(salt.utils.files.rm_rf, opts['cachedir'])
+        load = {'saltenv': 'base', 'path': 'top.sls'}
+        with patch.dict(roots.__opts__, opts):
+            # Without an index the file roots are read
+            live = (roots.find_file('top.sls'),
+                    roots.file_hash(load, roots.find_file('top.sls')),
+                    roots.file_list({'saltenv': 'base'}),
+                    roots.file_list_emptydirs({'saltenv': 'base'}))
+            roots.update()
+            index_path = os.path.join(opts['cachedir'], 'roots', 'index.p')
+            index_mtime = os.path.getmtime(index_path)
+
+            with patch('os.path.isfile', side_effect=AssertionError), \
+                    patch('salt.utils.hashutils.get_hash', side_effect=AssertionError):
+                # Only the stat of the indexed file is checked
+                fnd = roots.find_file('top.sls')
+                self.assertEqual(fnd['path'], live[0]['path'])
+                self.assertEqual((roots.file_hash(load, fnd),
+                                  roots.file_list({'saltenv': 'base'}),
+                                  roots.file_list_emptydirs({'saltenv': 'base'})),
+                                 live[1:])
+                self.assertEqual(roots.find_file('missing.sls'),
+                                 {'path': '', 'rel': ''})
+                # Nothing to hash nor rewrite on an update without changes
+                roots.update()
+            self.assertEqual(os.path.getmtime(index_path), index_mtime)
+
+            # Changed and removed files are looked up on disk, added ones are
+            # served from the next update
+            with salt.utils.files.fopen(os.path.join(root_dir, 'top.sls'), 'w') as fp_:
+                fp_.write('changed')
+            with salt.utils.files.fopen(os.path.join(root_dir, 'new.sls'), 'w') as fp_:
+                fp_.write('new')
+            os.remove(os.path.join(root_dir, 'web', 'init.sls'))
+            new_hash = salt.utils.hashutils.get_hash(
+                os.path.join(root_dir, 'top.sls'), 'sha256')
+            self.assertEqual(
+                roots.file_hash(load, roots.find_file('top.sls'))['hsum'], new_hash)
+            self.assertEqual(roots.find_file('web/init.sls')['path'], '')
+            self.assertEqual(roots.find_file('new.sls')['path'], '')
+            roots.update()
+            self.assertEqual(
+                roots.file_hash(load, roots.find_file('top.sls'))['hsum'], new_hash)
+            self.assertIn('new.sls', roots.file_list({'saltenv': 'base'}))
+            self.assertNotIn('web/init.sls', roots.file_list({'saltenv': 'base'}))
+            # An index built with other options is not used
+            with patch.dict(roots.__opts__, {'file_ignore_glob': ['*.sls']}):
+                self.assertEqual(roots.find_file('top.sls')['path'], '')
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''
+Unit tests for the indexed local job cache returner (indexed_local_cache).
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+
+# Import Salt Testing libs
+from tests.support.mixins import LoaderModuleMockMixin
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase
+from tests.support.mock import MagicMock, patch
+
+# Import Salt libs
+import salt.utils.jid
+import salt.returners.local_cache as local_cache
+import salt.returners.indexed_local_cache as indexed_local_cache
+
+
+class IndexedLocalCacheTestCase(TestCase, LoaderModuleMockMixin):
+    '''
+    Test the indexed local cache returner
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.TMP_CACHE_DIR = os.path.join(RUNTIME_VARS.TMP, 'salt_test_indexed_job_cache')
+
+    def setup_loader_modules(self):
+        opts = {'cachedir': self.TMP_CACHE_DIR,
+                'keep_jobs': 24,
+                'hash_type': 'sha256'}
+        return {local_cache: {'__opts__': opts},
+                indexed_local_cache: {'__opts__': opts}}
+
+    def setUp(self):
+        os.makedirs(self.TMP_CACHE_DIR)
+        returners = {}
+        for fun in ('prep_jid', 'returner', 'save_load', 'save_minions',
+                    'get_load', 'get_jid', 'update_endtime', 'get_endtime'):
+            returners['local_cache.{0}'.format(fun)] = getattr(local_cache, fun)
+        patcher = patch.object(indexed_local_cache, '_mminion',
+                               MagicMock(return_value=MagicMock(returners=returners)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        indexed_local_cache._drop_conn()
+        shutil.rmtree(self.TMP_CACHE_DIR, ignore_errors=True)
+
+    def _add_job(self, fun='test.ping', jid=None):
+        jid = indexed_local_cache.prep_jid(passed_jid=jid)
+        indexed_local_cache.save_load(
+            jid, {'jid': jid, 'fun': fun, 'arg': [], 'tgt': '*',
+                  'tgt_type': 'glob', 'user': 'root'}, minions=['minion'])
+        indexed_local_cache.returner(
+            {'jid': jid, 'id': 'minion', 'return': True, 'retcode': 0,
+             'success': True, 'fun': fun})
+        return jid
+
+    def test_returns_are_stored_in_local_cache_layout(self):
+        jid = self._add_job()
+        self.assertEqual(local_cache.get_jids(),
+                         indexed_local_cache.get_jids())
+        self.assertEqual(indexed_local_cache.get_jid(jid)['minion']['return'], True)
+        self.assertEqual(indexed_local_cache.get_load(jid)['Minions'], ['minion'])
+
+    def test_get_jids_filter(self):
+        jids = [self._add_job(jid='2019010100000000000{0}'.format(idx))
+                for idx in range(5)]
+        self._add_job(fun='saltutil.find_job', jid='20190101000000000010')
+
+        ret = indexed_local_cache.get_jids_filter(3)
+        self.assertEqual([job['JID'] for job in ret], jids[2:])
+        self.assertEqual(ret, local_cache.get_jids_filter(3))
+
+        ret = indexed_local_cache.get_jids_filter(1, filter_find_job=False)
+        self.assertEqual([job['Function'] for job in ret], ['saltutil.find_job'])
+
+    def test_get_jids_by_fun(self):
+        self._add_job(fun='state.apply', jid='20190101000000000001')
+        self._add_job(fun='test.ping', jid='20190101000000000002')
+        self._add_job(fun='state.apply', jid='20190101000000000003')
+        ret = indexed_local_cache.get_jids_by_fun('state.apply')
+        self.assertEqual([job['JID'] for job in ret],
+                         ['20190101000000000001', '20190101000000000003'])
+        ret = indexed_local_cache.get_jids_by_fun('state.apply', count=1)
+        self.assertEqual([job['JID'] for job in ret], ['20190101000000000003'])
+
+    def test_clean_old_jobs(self):
+        jid = self._add_job()
+        jid_dir = salt.utils.jid.jid_dir(
+            jid, os.path.join(self.TMP_CACHE_DIR, 'jobs'), 'sha256')
+
+        indexed_local_cache.clean_old_jobs()
+        self.assertTrue(os.path.isdir(jid_dir))
+        self.assertIn(jid, indexed_local_cache.get_jids())
+
+        with patch.dict(indexed_local_cache.__opts__, {'keep_jobs': 0.0000000010}):
+            indexed_local_cache.clean_old_jobs()
+        self.assertFalse(os.path.exists(jid_dir))
+        self.assertFalse(os.path.exists(os.path.dirname(jid_dir)))
+        self.assertEqual(indexed_local_cache.get_jids(), {})
+
+    def test_clean_old_jobs_scrubs_unindexed_jobs(self):
+        '''
+        Jid directories missing from the index or without a jid file are
+        removed too, one top level directory per run
+        '''
+        indexed = self._add_job()
+        stray = local_cache.prep_jid(passed_jid='20190101000000000001')
+        stray_dir = salt.utils.jid.jid_dir(
+            stray, os.path.join(self.TMP_CACHE_DIR, 'jobs'), 'sha256')
+        corrupt = local_cache.prep_jid(passed_jid='20190101000000000002')
+        corrupt_dir = salt.utils.jid.jid_dir(
+            corrupt, os.path.join(self.TMP_CACHE_DIR, 'jobs'), 'sha256')
+        os.remove(os.path.join(corrupt_dir, 'jid'))
+
+        with patch.dict(indexed_local_cache.__opts__, {'keep_jobs': 0.0000000010}):
+            for _ in range(3):
+                indexed_local_cache.clean_old_jobs()
+        self.assertFalse(os.path.exists(stray_dir))
+        self.assertFalse(os.path.exists(corrupt_dir))
+        self.assertNotIn(indexed, indexed_local_cache.get_jids())
+        self.assertEqual(os.listdir(os.path.join(self.TMP_CACHE_DIR, 'jobs')), [])
+
+    def test_reindex_existing_local_cache(self):
+        '''
+        Jobs written by local_cache are picked up by reindex
+        '''
+        jid = local_cache.prep_jid(passed_jid='20190101000000000001')
+        local_cache.save_load(jid, {'jid': jid, 'fun': 'test.ping', 'tgt': '*'},
+                              minions=['minion'])
+        # a jid without a load is indexed but not listed
+        local_cache.prep_jid(passed_jid='20190101000000000002')
+        self.assertEqual(indexed_local_cache.get_jids(), {})
+
+        self.assertEqual(indexed_local_cache.reindex(), 2)
+        self.assertEqual(indexed_local_cache.get_jids(), local_cache.get_jids())
+
+        # jobs removed from disk are dropped from the index by the next run
+        shutil.rmtree(salt.utils.jid.jid_dir(
+            jid, os.path.join(self.TMP_CACHE_DIR, 'jobs'), 'sha256'))
+        self.assertEqual(indexed_local_cache.reindex(), 1)
+        self.assertEqual(indexed_local_cache.get_jids(), {})
@@ -5,6 +5,9 @@ unit tests for the cache runner
 
 # Import Python Libs
 from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
 
 # Import Salt Testing Libs
 from tests.support.runtests import RUNTIME_VARS
@@ -15,7 +18,9 @@ from tests.support.mock import (
 )
 
 # Import Salt Libs
+import salt.payload
 import salt.runners.cache as cache
+import salt.utils.files
 import salt.utils.master
 
 
@@ -45,3 +50,47 @@ class CacheTest(TestCase, LoaderModuleMockMixin):
 
         with patch.object(salt.utils.master, 'MasterPillarUtil', MockMaster):
             self.assertEqual(cache.grains(), mock_data)
+
+    def test_memcache_stats(self):
+        '''
+        test cache.memcache_stats runner
+        '''
+        cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, cachedir, ignore_errors=True)
+        opts = {'cachedir': cachedir, 'memcache_stats': True}
+        stats_dir = os.path.join(cachedir, 'memcache_stats')
+        os.makedirs(stats_dir)
+        serial = salt.payload.Serial(opts)
+        for pid in (1001, 1002, 1003):
+            with salt.utils.files.fopen(os.path.join(stats_dir, '{0}.p'.format(pid)), 'wb') as fp_:
+                serial.dump({'localfs': {'hits': pid - 1000, 'misses': 1}}, fp_)
+
+        with patch.dict(cache.__opts__, opts), \
+                patch('salt.utils.process.os_is_running', lambda pid: pid != 1003):
+            self.assertEqual(cache.memcache_stats(),
+                             {'localfs': {'hits': 3, 'misses': 2}})
+            self.assertEqual(cache.memcache_stats(per_process=True),
+                             {1001: {'localfs': {'hits': 1, 'misses': 1}},
+                              1002: {'localfs': {'hits': 2, 'misses': 1}}})
+        # The counters of the dead process were removed
+        self.assertEqual(sorted(os.listdir(stats_dir)), ['1001.p', '1002.p'])
+
+    def test_ext_pillar_cache_stats(self):
+        '''
+        test cache.ext_pillar_cache_stats runner
+        '''
+        cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, cachedir, ignore_errors=True)
+        opts = {'cachedir': cachedir}
+        stats_dir = os.path.join(cachedir, 'ext_pillar_cache_stats')
+        os.makedirs(stats_dir)
+        serial = salt.payload.Serial(opts)
+        for pid in (1001, 1002):
+            with salt.utils.files.fopen(os.path.join(stats_dir, '{0}.p'.format(pid)), 'wb') as fp_:
+                serial.dump({'http_json': {'hits': 2, 'misses': 1, 'coalesced': 1}}, fp_)
+
+        with patch.dict(cache.__opts__, opts), \
+                patch('salt.utils.process.os_is_running', lambda pid: True):
+            self.assertEqual(cache.ext_pillar_cache_stats(),
+                             {'http_json': {'hits': 4, 'misses': 2, 'coalesced': 2,
+                                            'hit_rate': 0.75}})
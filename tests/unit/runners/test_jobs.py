@@ -10,12 +10,14 @@ from __future__ import absolute_import, print_function, unicode_literals
 from tests.support.mixins import LoaderModuleMockMixin
 from tests.support.unit import TestCase
 from tests.support.mock import (
+    MagicMock,
     patch
 )
 
 # Import Salt Libs
 import salt.runners.jobs as jobs
 import salt.minion
+from salt.ext import six
 
 
 class JobsTest(TestCase, LoaderModuleMockMixin):
@@ -75,3 +77,60 @@ class JobsTest(TestCase, LoaderModuleMockMixin):
 
             self.assertEqual(jobs.list_jobs(search_target='non-existant'),
                              returns['non-existant'])
+
+    def test_list_jobs_with_search_function(self):
+        '''
+        test jobs.list_jobs runner looking up the jobs of a function in the
+        returner
+        '''
+        mock_jobs_cache = {
+            '20160524035503086853': {'Arguments': [],
+                                     'Function': 'test.ping',
+                                     'StartTime': '2016, May 24 03:55:03.086853',
+                                     'Target': 'node-1-1.com',
+                                     'Target-type': 'glob',
+                                     'User': 'root'},
+            '20160524035524895387': {'Arguments': [],
+                                     'Function': 'state.apply',
+                                     'StartTime': '2016, May 24 03:55:24.895387',
+                                     'Target': 'node-1-2.com',
+                                     'Target-type': 'glob',
+                                     'User': 'root'}
+        }
+
+        def return_mock_jobs():
+            return mock_jobs_cache
+
+        def return_mock_jobs_by_fun(fun):
+            return [dict(job, JID=jid)
+                    for jid, job in six.iteritems(mock_jobs_cache)
+                    if job['Function'] == fun]
+
+        get_jids = MagicMock(side_effect=return_mock_jobs)
+        get_jids_by_fun = MagicMock(side_effect=return_mock_jobs_by_fun)
+
+        class MockMasterMinion(object):
+
+            returners = {'local_cache.get_jids': get_jids,
+                         'local_cache.get_jids_by_fun': get_jids_by_fun}
+
+            def __init__(self, *args, **kwargs):
+                pass
+
+        with patch.object(salt.minion, 'MasterMinion', MockMasterMinion):
+            self.assertEqual(jobs.list_jobs(search_function='state.apply'),
+                             {'20160524035524895387':
+                              mock_jobs_cache['20160524035524895387']})
+            self.assertEqual(
+                jobs.list_jobs(search_function=['state.apply', 'test.ping'],
+                               search_target='node-1-1.com'),
+                {'20160524035503086853': mock_jobs_cache['20160524035503086853']})
+            get_jids.assert_not_called()
+            self.assertEqual(get_jids_by_fun.call_count, 3)
+
+            # Globs are matched against all the jobs
+            self.assertEqual(jobs.list_jobs(search_function='test.*'),
+                             {'20160524035503086853':
+                              mock_jobs_cache['20160524035503086853']})
+            get_jids.assert_called_once_with()
+            self.assertEqual(get_jids_by_fun.call_count, 3)
@@ -63,6 +63,29 @@ class LocalClientTestCase(TestCase,
         with self.assertRaises(StopIteration):
             next(ret)
 
+    def test_get_iter_returns_heartbeat(self):
+        '''
+        Minions sending heartbeats for the job are not sent saltutil.find_job
+        '''
+        jid = '20191016000000000000'
+        local_client = client.LocalClient(mopts=self.get_temp_config('master'))
+        local_client.returners = MagicMock()
+        events = [
+            [{'tag': 'salt/job/{0}/heartbeat/m1'.format(jid),
+              'data': {'id': 'm1', 'jid': jid, 'heartbeat': 60}}, None],
+            [{'tag': 'salt/job/{0}/ret/m1'.format(jid),
+              'data': {'id': 'm1', 'jid': jid, 'return': True}}, None],
+        ]
+        local_client.get_returns_no_block = MagicMock(
+            return_value=iter(events[0] + [None] * 30 + events[1] + [None] * 1000))
+        local_client.gather_job_info = MagicMock(return_value={})
+        ret = list(local_client.get_iter_returns(jid, ['m1', 'm2'], timeout=0.05,
+                                                 gather_job_timeout=0))
+        self.assertEqual(ret, [{'m1': {'ret': True, 'jid': jid}}])
+        # m2 was pinged but did not respond, m1 was never pinged
+        self.assertEqual([call[0][1] for call in local_client.gather_job_info.call_args_list],
+                         [['m2']])
+
     def test_create_local_client(self):
         local_client = client.LocalClient(mopts=self.get_temp_config('master'))
         self.assertIsInstance(local_client, client.LocalClient, 'LocalClient did not create a LocalClient instance')
@@ -87,6 +110,31 @@ class LocalClientTestCase(TestCase,
 
         self.assertDictEqual(valid_pub_data, self.client._check_pub_data(valid_pub_data))
 
+    def test_run_job_subscribes_before_publishing(self):
+        def _pub(*args, **kwargs):
+            # The returns sent before the reply of the master are not dropped
+            # by the event publisher
+            self.assertIn('salt/job/{0}'.format(kwargs['jid']),
+                          [tag for tag, _ in self.client.event.pending_tags])
+            return {'jid': kwargs['jid'], 'minions': ['m1']}
+
+        with patch.dict(self.client.opts, {'event_subscription_filter': True}), \
+                patch.object(self.client, 'pub', side_effect=_pub):
+            pub_data = self.client.run_job('*', 'test.ping', listen=True)
+            tags = [tag for tag, _ in self.client.event.pending_tags]
+            self.assertEqual(tags.count('salt/job/{0}'.format(pub_data['jid'])), 1)
+            self.client._clean_up_subscriptions(pub_data['jid'])
+
+            # Nothing is left subscribed when the job is not published
+            pending_tags = list(self.client.event.pending_tags)
+            with patch.object(self.client, 'pub',
+                              return_value={'jid': None, 'minions': []}):
+                self.assertEqual(self.client.run_job('*', 'test.ping', listen=True), {})
+            with patch.object(self.client, 'pub', side_effect=SaltClientError):
+                self.assertRaises(SaltClientError, self.client.run_job,
+                                  '*', 'test.ping', listen=True)
+            self.assertEqual(self.client.event.pending_tags, pending_tags)
+
     def test_cmd_subset(self):
         with patch('salt.client.LocalClient.cmd', return_value={'minion1': ['first.func', 'second.func'],
                                                                 'minion2': ['first.func', 'second.func']}):
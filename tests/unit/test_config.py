@@ -1723,6 +1723,36 @@ class ConfigTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             self.assertNotIn('environment', ret)
             self.assertEqual(ret['saltenv'], 'foo')
 
+    def test_update_worker_pools(self):
+        '''
+        Ensure the worker pools get a default pool and their commands are
+        routed to one pool only
+        '''
+        opts = {'transport': 'zeromq',
+                'worker_threads': 5,
+                'worker_pools': {'auth': {'commands': '_auth'},
+                                 'returns': {'worker_threads': 4,
+                                             'commands': ['_return', '_auth']}}}
+        salt.config._update_worker_pools(opts)
+        self.assertEqual(opts['worker_pools'], {
+            'auth': {'worker_threads': 1, 'commands': ['_auth']},
+            'returns': {'worker_threads': 4, 'commands': ['_return']},
+            'default': {'worker_threads': 5, 'commands': []},
+        })
+
+        opts = {'transport': 'zeromq',
+                'worker_threads': 5,
+                'worker_pools': {'returns': {'workers': 4}}}
+        self.assertRaises(SaltConfigurationError,
+                          salt.config._update_worker_pools, opts)
+
+        opts = {'transport': 'zeromq',
+                'transport_opts': {'tcp': {}},
+                'worker_threads': 5,
+                'worker_pools': {'returns': {'commands': ['_return']}}}
+        salt.config._update_worker_pools(opts)
+        self.assertEqual(opts['worker_pools'], {})
+
 
 class APIConfigTestCase(DefaultConfigsBase, TestCase):
     '''
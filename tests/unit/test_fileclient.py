@@ -408,3 +408,63 @@ class FileclientCacheTest(TestCase, AdaptedConfigurationTestCaseMixin, LoaderMod
                 log.debug('cache_loc = %s', cache_loc)
                 log.debug('content = %s', content)
                 self.assertTrue(saltenv in content)
+
+    def test_cache_files_bulk(self):
+        '''
+        Ensure the files are cached with as few _serve_files requests as the
+        bulk buffer size allows, and only the changed files are sent
+        '''
+        patched_opts = dict((x, y) for x, y in six.iteritems(self.minion_opts))
+        patched_opts.update(self.MOCKED_OPTS)
+        paths = ['salt://foo.txt', 'salt://missing.txt'] + \
+            ['salt://{0}/{1}'.format(SUBDIR, x) for x in SUBDIR_FILES]
+
+        with patch.dict(fileclient.__opts__, patched_opts):
+            client = fileclient.get_file_client(fileclient.__opts__, pillar=False)
+            with patch.object(client.channel, 'send',
+                              wraps=client.channel.send) as send:
+                ret = client.cache_files(paths, 'dev')
+            self.assertEqual(send.call_count, 1)
+            self.assertIs(ret[1], False)
+            for path, dest in zip(paths[2:], ret[2:]):
+                self.assertEqual(
+                    dest,
+                    os.path.join(fileclient.__opts__['cachedir'], 'files', 'dev',
+                                 path[len('salt://'):]))
+                with salt.utils.files.fopen(dest) as fp_:
+                    self.assertIn('dev', fp_.read())
+
+            with salt.utils.files.fopen(
+                    os.path.join(self.FS_ROOT, 'dev', 'foo.txt'), 'w') as fp_:
+                fp_.write('changed')
+            with patch.dict(fileclient.__opts__, {'file_bulk_buffer_size': 1}), \
+                    patch.object(client.channel, 'send',
+                                 wraps=client.channel.send) as send:
+                self.assertEqual(client.cache_files(paths, 'dev'), ret)
+            # The changed file, larger than the bulk buffer, was fetched with
+            # _file_hash, _file_find and two _serve_file requests
+            cmds = [call[0][0]['cmd'] for call in send.call_args_list]
+            self.assertEqual(cmds, ['_serve_files', '_file_hash', '_file_find',
+                                    '_serve_file', '_serve_file'])
+            with salt.utils.files.fopen(ret[0]) as fp_:
+                self.assertEqual(fp_.read(), 'changed')
+
+    def test_verified_files(self):
+        '''
+        Ensure the files are checked against the master once within
+        verified_files
+        '''
+        patched_opts = dict((x, y) for x, y in six.iteritems(self.minion_opts))
+        patched_opts.update(self.MOCKED_OPTS)
+
+        with patch.dict(fileclient.__opts__, patched_opts):
+            client = fileclient.get_file_client(fileclient.__opts__, pillar=False)
+            with fileclient.verified_files() as files:
+                dest = client.cache_file('salt://foo.txt', 'base')
+                with patch.object(client.channel, 'send') as send:
+                    self.assertEqual(client.cache_file('salt://foo.txt', 'base'), dest)
+                    self.assertEqual(client.cache_files(['salt://foo.txt'], 'base'),
+                                     [dest])
+                self.assertEqual(send.call_count, 0)
+                self.assertEqual(files, {('base', 'salt://foo.txt', None): dest})
+            self.assertIsNone(fileclient._VERIFIED.files)
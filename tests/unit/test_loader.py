@@ -1381,3 +1381,152 @@ class LoaderLoadCachedGrainsTest(TestCase):
         grains = salt.loader.grains(self.opts)
         osrelease_info = grains['osrelease_info']
         assert isinstance(osrelease_info, tuple), osrelease_info
+
+
+index_provider_template = '''
+def func():
+    return 'provider'
+'''
+
+index_virtual_template = '''
+__virtualname__ = 'indexed'
+
+def __virtual__():
+    return __virtualname__
+
+def func():
+    return 'virtual'
+'''
+
+index_missing_template = '''
+def __virtual__():
+    return (False, 'not on this host')
+
+def func():
+    return 'missing'
+'''
+
+
+class LazyLoaderIndexTest(TestCase):
+    '''
+    Test the persisted index of the loader
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.opts = salt.config.minion_config(None)
+        cls.opts['grains'] = salt.loader.grains(cls.opts)
+        if not os.path.isdir(RUNTIME_VARS.TMP):
+            os.makedirs(RUNTIME_VARS.TMP)
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.opts
+
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, self.module_dir, ignore_errors=True)
+        self.cache_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.loader_opts = copy.deepcopy(self.opts)
+        self.loader_opts['cachedir'] = self.cache_dir
+        self.loader_opts['loader_index'] = True
+        for name, template in (('indexprovider', index_provider_template),
+                               ('indexvirtual', index_virtual_template),
+                               ('indexmissing', index_missing_template)):
+            self.write_module(name, template)
+
+    def write_module(self, name, content):
+        path = os.path.join(self.module_dir, '{0}.py'.format(name))
+        with salt.utils.files.fopen(path, 'w') as fh:
+            fh.write(content)
+        remove_bytecode(path)
+
+    def get_loader(self, opts=None):
+        return salt.loader.LazyLoader(
+            [self.module_dir],
+            opts or self.loader_opts,
+            tag='module')
+
+    def build_index(self):
+        loader = self.get_loader()
+        self.assertEqual(
+            sorted(loader),
+            ['indexed.func', 'indexprovider.func'])
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.cache_dir, 'loader'))), 1)
+
+    def test_only_needed_modules_loaded(self):
+        '''
+        Make sure a function is loaded without importing the other modules
+        '''
+        self.build_index()
+        loader = self.get_loader()
+        self.assertEqual(loader['indexed.func'](), 'virtual')
+        self.assertEqual(loader.loaded_files, set(['indexvirtual']))
+
+    def test_virtual_result(self):
+        '''
+        Make sure the modules whose __virtual__ failed are skipped with their
+        reason, and that the time saved is reported
+        '''
+        self.build_index()
+        loader = self.get_loader()
+        self.assertNotIn('indexmissing.func', loader)
+        self.assertEqual(
+            loader.missing_fun_string('indexmissing.func'),
+            '\'indexmissing\' __virtual__ returned False: not on this host')
+        self.assertEqual(len(loader), 2)
+        self.assertNotIn('indexmissing', loader.loaded_files)
+        self.assertGreater(loader.index_time_saved, 0)
+
+    def test_virtual_result_expires(self):
+        '''
+        Make sure the modules whose __virtual__ failed are skipped by the next
+        runs, and evaluated again once the import environment changed, and
+        that options which don't affect the modules keep the index
+        '''
+        self.build_index()
+        opts = copy.deepcopy(self.loader_opts)
+        opts['pillar'] = {'loader_index_test': True}
+        with patch.object(salt.loader, '_INDEX_ENV', {}):
+            loader = self.get_loader(opts)
+            self.assertNotEqual(loader.index, {})
+            self.assertNotIn('indexmissing.func', loader)
+        self.assertNotIn('indexmissing', loader.loaded_files)
+
+        with patch('salt.loader.index_env', return_value='installed'):
+            loader = self.get_loader(opts)
+            self.assertNotIn('indexmissing.func', loader)
+        self.assertIn('indexmissing', loader.loaded_files)
+
+    def test_changed_module(self):
+        '''
+        Make sure a module which changed since it was indexed is loaded again
+        '''
+        self.build_index()
+        self.write_module(
+            'indexmissing',
+            index_missing_template.replace(
+                '(False, \'not on this host\')', 'True'))
+        loader = self.get_loader()
+        self.assertEqual(loader['indexmissing.func'](), 'missing')
+
+    def test_grains_change(self):
+        '''
+        Make sure a change of the grains uses a new index
+        '''
+        self.build_index()
+        opts = copy.deepcopy(self.loader_opts)
+        opts['grains']['loader_index_test'] = True
+        loader = self.get_loader(opts)
+        self.assertEqual(loader.index, {})
+
+    def test_clear_index(self):
+        '''
+        Make sure clear_index removes the indexes
+        '''
+        self.build_index()
+        salt.loader.clear_index(self.loader_opts)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'loader')))
+        self.assertEqual(self.get_loader().index, {})
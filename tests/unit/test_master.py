@@ -2,10 +2,14 @@
 
 # Import Python libs
 from __future__ import absolute_import
+import collections
+import threading
+import time
 
 # Import Salt libs
 import salt.config
 import salt.master
+from salt.ext.tornado.testing import AsyncTestCase, gen_test
 
 # Import Salt Testing Libs
 from tests.support.unit import TestCase
@@ -331,3 +335,79 @@ class ClearFuncsTestCase(TestCase):
                 patch('salt.utils.master.get_values_of_matching_keys', MagicMock(return_value=['test'])), \
                 patch('salt.utils.minions.CkMinions.auth_check', MagicMock(return_value=False)):
             self.assertEqual(mock_ret, self.clear_funcs.publish(load))
+
+
+class MWorkerConcurrencyTestCase(AsyncTestCase):
+    '''
+    TestCase for the concurrent mode of salt.master.MWorker
+    '''
+
+    def setUp(self):
+        super(MWorkerConcurrencyTestCase, self).setUp()
+        opts = salt.config.master_config(None)
+        opts['mworker_concurrency'] = 4
+        opts['mworker_cmd_concurrency'] = {'_pillar': 1}
+        self.worker = salt.master.MWorker(opts, {}, {}, [], 'MWorker-0')
+        self.worker._setup_concurrency()
+        self.addCleanup(self.worker.executor.shutdown)
+        self.lock = threading.Lock()
+        self.running = collections.Counter()
+        self.max_running = collections.Counter()
+
+    def _run_aes_func(self, data):
+        cmd = data['cmd']
+        with self.lock:
+            self.running[cmd] += 1
+            self.running['total'] += 1
+            for key in (cmd, 'total'):
+                self.max_running[key] = max(self.max_running[key],
+                                            self.running[key])
+        time.sleep(0.2)
+        with self.lock:
+            self.running[cmd] -= 1
+            self.running['total'] -= 1
+        return cmd
+
+    @gen_test
+    def test_cmd_concurrency(self):
+        with patch.object(self.worker, '_run_aes_func', self._run_aes_func):
+            ret = yield [self.worker._handle_payload({'enc': 'aes', 'load': {'cmd': cmd}})
+                         for cmd in ('_pillar', '_pillar', '_return', '_return')]
+        self.assertEqual(ret, ['_pillar', '_pillar', '_return', '_return'])
+        self.assertEqual(self.max_running['_pillar'], 1)
+        self.assertEqual(self.max_running['_return'], 2)
+        self.assertEqual(self.max_running['total'], 3)
+        self.assertEqual(self.worker.queue_depth['_pillar'],
+                         {'waiting': 0, 'running': 0, 'max_waiting': 1})
+
+    @gen_test
+    def test_stats_reset_while_running(self):
+        '''
+        The stats fired and reset by a request finishing first don't break the
+        requests still running
+        '''
+        self.worker.opts['master_stats'] = True
+        self.worker.opts['master_stats_event_iter'] = 0
+        self.worker.aes_funcs = MagicMock()
+        with patch.object(self.worker, '_run_aes_func', self._run_aes_func):
+            ret = yield [self.worker._handle_payload({'enc': 'aes', 'load': {'cmd': '_return'}})
+                         for _ in range(3)]
+        self.assertEqual(ret, ['_return'] * 3)
+        for call in self.worker.aes_funcs.event.fire_event.call_args_list:
+            self.assertEqual(call[0][0]['stats']['_return']['runs'], 1)
+
+        # A failure to fire the stats does not fail the request
+        self.worker.aes_funcs.event.fire_event.side_effect = Exception('closed')
+        with patch.object(self.worker, '_run_aes_func', self._run_aes_func):
+            ret = yield self.worker._handle_payload({'enc': 'aes', 'load': {'cmd': '_return'}})
+        self.assertEqual(ret, '_return')
+
+    @gen_test
+    def test_private_cmd(self):
+        ret = yield self.worker._handle_payload({'enc': 'aes', 'load': {'cmd': '__init__'}})
+        self.assertFalse(ret)
+
+    def test_no_concurrency(self):
+        worker = salt.master.MWorker(salt.config.master_config(None), {}, {}, [], 'MWorker-0')
+        worker._setup_concurrency()
+        self.assertIsNone(worker.executor)
@@ -309,6 +309,33 @@ class MinionTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             finally:
                 minion.destroy()
 
+    def test_fire_job_heartbeats(self):
+        mock_opts = self.get_config('minion', from_scratch=True)
+        mock_opts['job_heartbeat_interval'] = 2
+        io_loop = salt.ext.tornado.ioloop.IOLoop()
+        io_loop.make_current()
+        minion = salt.minion.Minion(mock_opts, io_loop=io_loop)
+        try:
+            minion._fire_master = MagicMock()
+            running = [{'jid': '20191016000000000001', 'fun': 'state.apply', 'pid': 101},
+                       {'jid': '20191016000000000002', 'fun': 'test.sleep', 'pid': 102}]
+            with patch('salt.utils.minion.running', MagicMock(side_effect=[running[:1], running, running[1:]])):
+                # Only the jobs already running on the previous call get a heartbeat
+                minion.fire_job_heartbeats()
+                self.assertFalse(minion._fire_master.called)
+                minion.fire_job_heartbeats()
+                minion.fire_job_heartbeats()
+            self.assertEqual(
+                [call[1]['events'] for call in minion._fire_master.call_args_list],
+                [[{'tag': 'salt/job/20191016000000000001/heartbeat/{0}'.format(minion.opts['id']),
+                   'data': {'id': minion.opts['id'], 'jid': '20191016000000000001',
+                            'fun': 'state.apply', 'pid': 101, 'heartbeat': 2}}],
+                 [{'tag': 'salt/job/20191016000000000002/heartbeat/{0}'.format(minion.opts['id']),
+                   'data': {'id': minion.opts['id'], 'jid': '20191016000000000002',
+                            'fun': 'test.sleep', 'pid': 102, 'heartbeat': 2}}]])
+        finally:
+            minion.destroy()
+
     def test_when_passed_start_event_grains(self):
         mock_opts = self.get_config('minion', from_scratch=True)
         mock_opts['start_event_grains'] = ["os"]
@@ -410,6 +437,78 @@ class MinionTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             io_loop.run_sync(lambda: minion._handle_decoded_payload(job_data))
 
 
+    def _job_worker_minion(self, **kwargs):
+        mock_opts = self.get_config('minion', from_scratch=True)
+        mock_opts.update(multiprocessing=True, job_workers=1)
+        mock_opts.update(kwargs)
+        io_loop = salt.ext.tornado.ioloop.IOLoop()
+        io_loop.make_current()
+        minion = salt.minion.Minion(mock_opts, io_loop=io_loop)
+        minion.proc_dir = mock_opts['cachedir']
+        self.addCleanup(minion.destroy)
+        return minion
+
+    def _wait_job_worker(self, pool, worker):
+        '''
+        Wait for the worker to report its job done, as the io_loop would
+        '''
+        fd_ = worker['conn'].fileno()
+        self.assertTrue(worker['conn'].poll(30))
+        pool._handle_done(fd_, None)
+
+    def test_job_workers_reused(self):
+        '''
+        Ensure the jobs are run by a pre-forked worker, which is replaced after
+        job_worker_max_jobs jobs
+        '''
+        minion = self._job_worker_minion(job_worker_max_jobs=2)
+        pool = minion.job_workers
+        with patch('salt.minion.Minion.gen_modules', MagicMock()), \
+                patch('salt.minion.Minion._target', MagicMock()):
+            self.assertTrue(pool.dispatch({'jid': '1', 'fun': 'test.ping'}))
+            worker = list(pool.workers.values())[0]
+            self.assertTrue(worker['busy'])
+            # The only worker is busy, the next job needs its own process
+            self.assertFalse(pool.dispatch({'jid': '2', 'fun': 'test.ping'}))
+            self._wait_job_worker(pool, worker)
+            self.assertFalse(worker['busy'])
+
+            self.assertTrue(pool.dispatch({'jid': '3', 'fun': 'test.ping'}))
+            self.assertEqual(list(pool.workers.values()), [worker])
+            self._wait_job_worker(pool, worker)
+            self.assertEqual(pool.workers, {})
+            worker['process'].join(30)
+            self.assertFalse(worker['process'].is_alive())
+
+    def test_job_workers_refresh(self):
+        '''
+        Ensure the workers forked before a refresh are replaced once their job
+        is done
+        '''
+        minion = self._job_worker_minion()
+        pool = minion.job_workers
+        with patch('salt.minion.Minion.gen_modules', MagicMock()), \
+                patch('salt.minion.Minion._target', MagicMock()):
+            self.assertTrue(pool.dispatch({'jid': '1', 'fun': 'test.ping'}))
+            worker = list(pool.workers.values())[0]
+            pool.refresh()
+            self.assertEqual(list(pool.workers.values()), [worker])
+            self._wait_job_worker(pool, worker)
+            self.assertEqual(pool.workers, {})
+
+            self.assertTrue(pool.dispatch({'jid': '2', 'fun': 'test.ping'}))
+            new_worker = list(pool.workers.values())[0]
+            self.assertEqual(new_worker['generation'], 1)
+            self.assertNotEqual(new_worker['process'].pid, worker['process'].pid)
+
+    def test_job_workers_process_count_max(self):
+        '''
+        Ensure the pool is not larger than process_count_max
+        '''
+        minion = self._job_worker_minion(job_workers=8, process_count_max=2)
+        self.assertEqual(minion.job_workers.size, 2)
+
+
 class MinionAsyncTestCase(TestCase, AdaptedConfigurationTestCaseMixin, salt.ext.tornado.testing.AsyncTestCase):
 
     def setUp(self):
@@ -9,8 +9,11 @@
 
 # Import python libs
 from __future__ import absolute_import
+import os
 import shutil
 import tempfile
+import threading
+import time
 
 # Import Salt Testing libs
 from tests.support.runtests import RUNTIME_VARS
@@ -19,8 +22,10 @@ from tests.support.unit import TestCase
 from tests.support.mock import MagicMock, patch
 
 # Import salt libs
+import salt.config
 import salt.fileclient
 import salt.pillar
+import salt.utils.files
 import salt.utils.stringutils
 import salt.exceptions
 
@@ -370,6 +375,162 @@ class PillarTestCase(TestCase):
         finally:
             shutil.rmtree(tempdir, ignore_errors=True)
 
+    def test_ext_pillar_concurrency(self):
+        opts = {
+            'optimization_order': [0, 1, 2],
+            'renderer': 'yaml',
+            'renderer_blacklist': [],
+            'renderer_whitelist': [],
+            'state_top': '',
+            'pillar_roots': {'base': []},
+            'file_roots': {'base': []},
+            'extension_modules': '',
+            'ext_pillar': [{'slow1': {}}, {'hung': {}}, {'slow2': {}}, {'ordered': {}}],
+            'ext_pillar_concurrency': 4,
+            'ext_pillar_timeouts': {'hung': 0.5},
+            'ext_pillar_ordered': ['ordered'],
+            'ext_pillar_timing': True,
+        }
+
+        def _slow1(minion_id, pillar):
+            time.sleep(0.3)
+            return {'a': 1, 'src': 'slow1'}
+
+        def _hung(minion_id, pillar):
+            time.sleep(2)
+            return {'hung': True}
+
+        def _slow2(minion_id, pillar):
+            time.sleep(0.3)
+            return {'b': 2, 'src': 'slow2'}
+
+        def _ordered(minion_id, pillar):
+            return {'c': pillar.get('a')}
+
+        ext_pillars = {'slow1': _slow1, 'hung': _hung, 'slow2': _slow2, 'ordered': _ordered}
+        with patch('salt.loader.pillars', MagicMock(return_value=ext_pillars)):
+            pillar = salt.pillar.Pillar(opts, {}, 'minion', 'base')
+        start = time.time()
+        ext, errors = pillar.ext_pillar({})
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(ext, {'a': 1, 'b': 2, 'c': 1, 'src': 'slow2'})
+        self.assertEqual(errors, ['ext_pillar hung timed out after 0.5 seconds'])
+        self.assertEqual([timing['name'] for timing in pillar.ext_pillar_timing],
+                         ['slow1', 'hung', 'slow2', 'ordered'])
+        self.assertEqual(pillar.ext_pillar_timing[1]['error'], 'timeout')
+
+    def test_ext_pillar_timeout_excludes_queue_time(self):
+        '''
+        The time a source waits for a thread of the pool does not count
+        against its timeout
+        '''
+        opts = {
+            'optimization_order': [0, 1, 2],
+            'renderer': 'yaml',
+            'renderer_blacklist': [],
+            'renderer_whitelist': [],
+            'state_top': '',
+            'pillar_roots': {'base': []},
+            'file_roots': {'base': []},
+            'extension_modules': '',
+            'ext_pillar': [{'slow1': {}}, {'slow2': {}}, {'quick': {}}],
+            'ext_pillar_concurrency': 2,
+            'ext_pillar_timeouts': {'quick': 0.3},
+        }
+
+        def _slow(minion_id, pillar):
+            time.sleep(0.5)
+            return {'slow': True}
+
+        def _quick(minion_id, pillar):
+            time.sleep(0.1)
+            return {'quick': True}
+
+        ext_pillars = {'slow1': _slow, 'slow2': _slow, 'quick': _quick}
+        with patch('salt.loader.pillars', MagicMock(return_value=ext_pillars)):
+            pillar = salt.pillar.Pillar(opts, {}, 'minion', 'base')
+        # quick waits for one of the two threads busy with the slow sources
+        ext, errors = pillar.ext_pillar({})
+        self.assertEqual(errors, [])
+        self.assertEqual(ext, {'slow': True, 'quick': True})
+
+    def test_ext_pillar_timeout_hung_pool(self):
+        '''
+        A source queued behind sources which timed out and keep their threads
+        does not block the compile
+        '''
+        opts = {
+            'optimization_order': [0, 1, 2],
+            'renderer': 'yaml',
+            'renderer_blacklist': [],
+            'renderer_whitelist': [],
+            'state_top': '',
+            'pillar_roots': {'base': []},
+            'file_roots': {'base': []},
+            'extension_modules': '',
+            'ext_pillar': [{'hang1': {}}, {'hang2': {}}, {'quick': {}}],
+            'ext_pillar_concurrency': 2,
+            'ext_pillar_timeout': 0.2,
+        }
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def _hang(minion_id, pillar):
+            release.wait(10)
+            return {'hang': True}
+
+        def _quick(minion_id, pillar):
+            return {'quick': True}
+
+        ext_pillars = {'hang1': _hang, 'hang2': _hang, 'quick': _quick}
+        with patch('salt.loader.pillars', MagicMock(return_value=ext_pillars)):
+            pillar = salt.pillar.Pillar(opts, {}, 'minion', 'base')
+        start = time.time()
+        ext, errors = pillar.ext_pillar({})
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(ext, {})
+        self.assertEqual(len(errors), 3)
+        self.assertIn('waiting for a thread', errors[2])
+
+        # Without its own timeout, the queued source gets the timeout of the
+        # sources which timed out
+        opts['ext_pillar_timeouts'] = {'quick': 0}
+        with patch('salt.loader.pillars', MagicMock(return_value=ext_pillars)):
+            pillar = salt.pillar.Pillar(opts, {}, 'minion', 'base')
+        start = time.time()
+        ext, errors = pillar.ext_pillar({})
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(len(errors), 3)
+
+    @with_tempdir()
+    def test_ext_pillar_cache(self, tempdir):
+        opts = salt.config.DEFAULT_MASTER_OPTS.copy()
+        opts.update({
+            'cachedir': tempdir,
+            'extension_modules': os.path.join(tempdir, 'extmods'),
+            'pillar_roots': {'base': []},
+            'file_roots': {'base': []},
+            'optimization_order': [0, 1, 2],
+            'ext_pillar': [{'http': {'url': 'http://cmdb'}}],
+            'ext_pillar_cache': {'http': {'key': ['grains:role']}},
+        })
+        calls = []
+
+        def _http(minion_id, pillar, url):
+            calls.append(minion_id)
+            return {'url': url, 'minions': len(calls)}
+
+        with patch('salt.loader.pillars', MagicMock(return_value={'http': _http})), \
+                patch.object(salt.pillar, '_EXT_PILLAR_CACHE', None):
+            for minion, role in (('web1', 'web'), ('web2', 'web'), ('db1', 'db')):
+                pillar = salt.pillar.Pillar(opts, {'role': role}, minion, 'base')
+                ext, errors = pillar.ext_pillar({})
+                self.assertEqual(errors, [])
+                self.assertEqual(ext['url'], 'http://cmdb')
+            self.assertEqual(calls, ['web1', 'db1'])
+            self.assertEqual(salt.pillar._EXT_PILLAR_CACHE.stats(),
+                             {'http': {'hits': 1, 'misses': 2, 'coalesced': 0}})
+
     def test_dynamic_pillarenv(self):
         opts = {
             'optimization_order': [0, 1, 2],
@@ -818,6 +979,93 @@ sub_with_slashes:
             'test.sub.with.slashes': {'path': '', 'dest': sub_with_slashes_sls.name},
         }
 
+    @with_tempdir()
+    def test_render_cache(self, tempdir):
+        pillar_roots = os.path.join(tempdir, 'pillar')
+        os.makedirs(pillar_roots)
+        opts = salt.config.DEFAULT_MASTER_OPTS.copy()
+        opts.update({
+            '__role': 'master',
+            'cachedir': os.path.join(tempdir, 'cache'),
+            'extension_modules': os.path.join(tempdir, 'extmods'),
+            'pillar_roots': {'base': [pillar_roots]},
+            'file_roots': {'base': [os.path.join(tempdir, 'file')]},
+            'optimization_order': [0, 1, 2],
+            'pillar_render_cache': True,
+        })
+        files = {
+            'top.sls': "base:\n  '*':\n    - web\n",
+            'web.sls': "{% from 'map.jinja' import port %}\n"
+                       "role: {{ salt['grains.get']('role') }}\n"
+                       "os: {{ grains['os'] }}\n"
+                       "port: {{ port }}\n",
+            'map.jinja': '{% set port = 80 %}\n',
+        }
+        for name, contents in files.items():
+            with salt.utils.files.fopen(os.path.join(pillar_roots, name), 'w') as fp_:
+                fp_.write(contents)
+
+        def _compile(minion, grains):
+            return salt.pillar.Pillar(opts, grains, minion, 'base').compile_pillar()
+
+        with patch.object(salt.pillar, '_RENDER_CACHE', None):
+            self.assertEqual(_compile('web1', {'role': 'web', 'os': 'Debian', 'id': 'web1'}),
+                             {'role': 'web', 'os': 'Debian', 'port': 80})
+            self.assertEqual(_compile('web2', {'role': 'web', 'os': 'Debian', 'id': 'web2'}),
+                             {'role': 'web', 'os': 'Debian', 'port': 80})
+            stats = salt.pillar.render_cache_stats()
+            self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+            self.assertEqual(_compile('db1', {'role': 'db', 'os': 'Debian', 'id': 'db1'}),
+                             {'role': 'db', 'os': 'Debian', 'port': 80})
+            with salt.utils.files.fopen(os.path.join(pillar_roots, 'map.jinja'), 'w') as fp_:
+                fp_.write('{% set port = 8080 %}\n')
+            self.assertEqual(_compile('web1', {'role': 'web', 'os': 'Debian', 'id': 'web1'}),
+                             {'role': 'web', 'os': 'Debian', 'port': 8080})
+            stats = salt.pillar.render_cache_stats()
+            self.assertEqual((stats['hits'], stats['misses']), (4, 4))
+
+    @with_tempdir()
+    def test_render_cache_ext_pillar_first(self, tempdir):
+        '''
+        The pillar SLS reading the ext_pillar data are not shared by minions
+        with different ext_pillar data
+        '''
+        pillar_roots = os.path.join(tempdir, 'pillar')
+        os.makedirs(pillar_roots)
+        opts = salt.config.DEFAULT_MASTER_OPTS.copy()
+        opts.update({
+            '__role': 'master',
+            'cachedir': os.path.join(tempdir, 'cache'),
+            'extension_modules': os.path.join(tempdir, 'extmods'),
+            'pillar_roots': {'base': [pillar_roots]},
+            'file_roots': {'base': [os.path.join(tempdir, 'file')]},
+            'optimization_order': [0, 1, 2],
+            'pillar_render_cache': True,
+            'ext_pillar_first': True,
+            'ext_pillar': [{'fake': {}}],
+        })
+        files = {
+            'top.sls': "base:\n  '*':\n    - app\n",
+            'app.sls': "app_port: {{ pillar['port'] }}\n",
+        }
+        for name, contents in files.items():
+            with salt.utils.files.fopen(os.path.join(pillar_roots, name), 'w') as fp_:
+                fp_.write(contents)
+        ports = {'web1': 80, 'web2': 8080}
+
+        def _compile(minion):
+            ext = ({'port': ports[minion]}, [])
+            with patch('salt.pillar.Pillar.ext_pillar', MagicMock(return_value=ext)):
+                pillar = salt.pillar.Pillar(opts, {'id': minion}, minion, 'base')
+                return pillar.compile_pillar()
+
+        with patch.object(salt.pillar, '_RENDER_CACHE', None):
+            self.assertEqual(_compile('web1'), {'port': 80, 'app_port': 80})
+            self.assertEqual(_compile('web2'), {'port': 8080, 'app_port': 8080})
+            self.assertEqual(_compile('web1'), {'port': 80, 'app_port': 80})
+            # top.sls twice, app.sls for web1 only
+            self.assertEqual(salt.pillar.render_cache_stats()['hits'], 3)
+
 
 @patch('salt.transport.client.ReqChannel.factory', MagicMock())
 class RemotePillarTestCase(TestCase):
@@ -5,6 +5,7 @@
 
 # Import Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import fnmatch
 import os
 import shutil
 import tempfile
@@ -21,10 +22,12 @@ from tests.support.helpers import with_tempfile
 # Import Salt libs
 import salt.exceptions
 import salt.state
+import salt.states.pkg
 from salt.utils.odict import OrderedDict
 from salt.utils.decorators import state as statedecorators
 import salt.utils.files
 import salt.utils.platform
+import salt.utils.rendercache
 
 try:
     import pytest
@@ -72,6 +75,100 @@ class StateCompilerTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             with self.assertRaises(salt.exceptions.SaltRenderError):
                 state_obj.call_high(high_data)
 
+    def test_call_chunks_concurrent(self):
+        '''
+        Test that calling the states concurrently returns what calling them
+        in sequence does
+        '''
+        def _high():
+            states = [
+                ('a', 'succeed_with_changes', {}),
+                ('b', 'succeed_without_changes', {'require': [{'test': 'a'}]}),
+                ('c', 'succeed_without_changes', {'watch': ['a']}),
+                ('d', 'fail_without_changes', {}),
+                ('e', 'succeed_with_changes', {'require': [{'test': 'd'}]}),
+                ('f', 'succeed_with_changes', {'onchanges': [{'test': 'b'}]}),
+                ('g', 'succeed_without_changes', {'onfail': [{'test': 'd'}]}),
+                ('h', 'succeed_without_changes', {'require': [{'sls': 'web'}]}),
+            ]
+            high = OrderedDict()
+            for id_, fun, args in states:
+                high[id_] = OrderedDict([
+                    ('test', [fun] + [{key: val} for key, val in args.items()]),
+                    ('__sls__', 'web' if id_ != 'h' else 'app'),
+                    ('__env__', 'base')])
+            return high
+
+        def _call(concurrency):
+            minion_opts = self.get_temp_config('minion', state_concurrency=concurrency,
+                                               state_events=True)
+            with patch('salt.state.State._gather_pillar'):
+                state_obj = salt.state.State(minion_opts, jid='20191016000000000000')
+            event = MagicMock()
+            with patch('salt.utils.event.get_master_event', MagicMock(return_value=event)), \
+                    patch.object(state_obj, '_call_chunks_concurrent',
+                                 wraps=state_obj._call_chunks_concurrent) as concurrent:
+                ret = state_obj.call_high(_high())
+            # The listen states are called through call_chunks too
+            self.assertEqual(bool(concurrent.call_count), concurrency > 1)
+            for state_ret in ret.values():
+                state_ret.pop('start_time')
+                state_ret.pop('duration')
+            return ret, [call[0][0]['ret']['__run_num__']
+                         for call in event.fire_event.call_args_list]
+
+        ret, events = _call(1)
+        self.assertEqual(_call(4), (ret, events))
+        # The watching state used two run numbers for its mod_watch call
+        self.assertEqual(sorted(state_ret['__run_num__'] for state_ret in ret.values()),
+                         [0, 1, 3, 4, 5, 6, 7, 8])
+        self.assertTrue(ret['test_|-c_|-c_|-succeed_without_changes']['changes'])
+
+    def test_mod_aggregate_adjacent(self):
+        '''
+        Test that only the adjacent states differing by their names are
+        aggregated
+        '''
+        high = OrderedDict()
+        for order, (id_, args) in enumerate([('vim', {}),
+                                             ('git', {'version': '1:2.20.1-2'}),
+                                             ('curl', {'fromrepo': 'buster-backports'}),
+                                             ('tmux', {}),
+                                             ('nginx', {})]):
+            args['order'] = order + 1
+            high[id_] = OrderedDict([
+                ('pkg', ['installed'] + [{key: val} for key, val in args.items()]),
+                ('__sls__', 'base'),
+                ('__env__', 'base')])
+        high['nginx-service'] = OrderedDict([
+            ('service', ['running', {'watch': [{'pkg': 'nginx'}]}]),
+            ('__sls__', 'web'),
+            ('__env__', 'base')])
+
+        def _aggregate(adjacent):
+            minion_opts = self.get_temp_config('minion', state_aggregate_adjacent=adjacent)
+            with patch('salt.state.State._gather_pillar'):
+                state_obj = salt.state.State(minion_opts)
+            chunks = state_obj.compile_high_data(high)
+            states = {'pkg.mod_aggregate': salt.states.pkg.mod_aggregate}
+            utils = {'state.gen_tag': salt.state._gen_tag}
+            with patch.object(state_obj, 'states', states), \
+                    patch.object(salt.states.pkg, '__utils__', utils, create=True):
+                for low in chunks:
+                    if low['state'] == 'pkg':
+                        state_obj._mod_aggregate(low, {}, chunks)
+            return dict((low['name'], low) for low in chunks)
+
+        chunks = _aggregate(['pkg'])
+        self.assertEqual(chunks['vim']['pkgs'], ['vim', {'git': '1:2.20.1-2'}])
+        self.assertTrue(chunks['git']['__agg__'])
+        self.assertNotIn('pkgs', chunks['curl'])
+        # The changes of nginx are watched
+        self.assertNotIn('pkgs', chunks['tmux'])
+        self.assertNotIn('__agg__', chunks['nginx'])
+        chunks = _aggregate(False)
+        self.assertFalse(any('pkgs' in low for low in chunks.values()))
+
     def test_verify_onlyif_parse(self):
         low_data = {
             "onlyif": [
@@ -319,6 +416,183 @@ class HighStateTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
         ret = salt.state.find_sls_ids('issue-47182.stateA.newer', high)
         self.assertEqual(ret, [('somestuff', 'cmd')])
 
+    def test_highstate_cache(self):
+        files = {
+            'top.sls': "base:\n  '*':\n    - web\n",
+            'web.sls': ("{% from 'map.jinja' import port %}\n"
+                        "{{ grains['os'] }}:\n  test.succeed_without_changes:\n"
+                        "    - port: {{ port }}\nsecond:\n  test.nop: []\n"),
+            'map.jinja': "{% set port = 80 %}\n",
+        }
+        for name, contents in files.items():
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        config = dict(self.config, highstate_cache=True)
+        config['grains'] = {'os': 'Debian', 'kernel': 'Linux'}
+
+        def compile_low(grains):
+            config['grains'] = dict(config['grains'], **grains)
+            highstate = salt.state.HighState(dict(config))
+            highstate.push_active()
+            try:
+                with patch.object(highstate, '_render_highstate',
+                                  wraps=highstate._render_highstate) as render:
+                    high, errors = highstate.render_highstate(
+                        highstate.top_matches(highstate.get_top()))
+                self.assertEqual(errors, [])
+                low = highstate.state.compile_high_data(high)
+                return low, render.call_count
+            finally:
+                highstate.pop_active()
+
+        low, renders = compile_low({})
+        self.assertEqual(renders, 1)
+        self.assertEqual(low[0]['name'], 'Debian')
+        # The grains not read by the renders are not part of the key
+        self.assertEqual(compile_low({'kernel': 'Other'}), (low, 0))
+        # Nor the order of the states
+        self.assertEqual([chunk['order'] for chunk in low], [10000, 10001])
+        self.assertEqual(compile_low({'os': 'RedHat'})[1], 1)
+        with salt.utils.files.fopen(os.path.join(self.state_tree_dir, 'map.jinja'), 'w') as fp_:
+            fp_.write("{% set port = 8080 %}\n")
+        low, renders = compile_low({'os': 'Debian'})
+        self.assertEqual(renders, 1)
+        self.assertEqual(low[0]['port'], 8080)
+
+        salt.state.clear_highstate_cache(config)
+        self.assertEqual(compile_low({})[1], 1)
+
+    def test_highstate_cache_reads_opts(self):
+        files = {
+            'top.sls': "base:\n  '*':\n    - web\n",
+            'web.sls': ("web:\n  test.succeed_without_changes:\n"
+                        "    - port: {{ opts['id'] }}\n"),
+        }
+        for name, contents in files.items():
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        config = dict(self.config, highstate_cache=True)
+        config['grains'] = {'os': 'Debian'}
+        for _ in range(2):
+            highstate = salt.state.HighState(dict(config))
+            highstate.push_active()
+            try:
+                with patch.object(highstate, '_render_highstate',
+                                  wraps=highstate._render_highstate) as render:
+                    highstate.render_highstate(
+                        highstate.top_matches(highstate.get_top()))
+                self.assertEqual(render.call_count, 1)
+            finally:
+                highstate.pop_active()
+
+    def test_highstate_file_hashes(self):
+        cached = os.path.join(self.config['cachedir'], 'files', 'base', 'web.sls')
+        removed = os.path.join(self.config['cachedir'], 'files', 'base', 'old.sls')
+        local = os.path.join(self.state_tree_dir, 'map.jinja')
+        for path in (cached, local):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with salt.utils.files.fopen(path, 'w') as fp_:
+                fp_.write(path)
+        with patch.object(self.highstate.client, 'get_files',
+                          MagicMock(return_value=[cached, False])) as get_files:
+            ret = self.highstate._highstate_file_hashes([cached, removed, local])
+        # One request for all the files cached from the fileserver
+        get_files.assert_called_once_with(
+            ['salt://web.sls', 'salt://old.sls'], 'base')
+        self.assertEqual(ret, {
+            cached: salt.utils.rendercache.file_digest(cached),
+            removed: None,
+            local: salt.utils.rendercache.file_digest(local),
+        })
+
+    def test_state_file_prefetch(self):
+        files = {
+            'top.sls': "base:\n  '*':\n    - web\n",
+            'web.sls': ("{% from 'map.jinja' import port %}\n"
+                        "web:\n  test.succeed_without_changes:\n"
+                        "    - port: {{ port }}\n"),
+            'map.jinja': "{% set port = 80 %}\n",
+        }
+        for name, contents in files.items():
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        config = dict(self.config, state_file_prefetch=True)
+
+        def call_highstate():
+            highstate = salt.state.HighState(dict(config))
+            highstate.push_active()
+            try:
+                with patch.object(highstate.client, 'get_files',
+                                  wraps=highstate.client.get_files) as get_files:
+                    ret = highstate.call_highstate()
+                self.assertTrue(all(state_ret['result'] for state_ret in ret.values()))
+                return [call[0] for call in get_files.call_args_list]
+            finally:
+                highstate.pop_active()
+
+        self.assertEqual(call_highstate(), [])
+        prefetched = call_highstate()
+        self.assertEqual(len(prefetched), 1)
+        self.assertEqual(sorted(prefetched[0][0]),
+                         ['salt://map.jinja', 'salt://top.sls', 'salt://web.sls'])
+        self.assertEqual(prefetched[0][1], 'base')
+
+
+class RequisiteIndexTestCase(TestCase):
+    '''
+    TestCase for the indexes of the requisite lookups
+    '''
+    def setUp(self):
+        self.high = OrderedDict([
+            ('vim', OrderedDict([('pkg', ['installed']), ('__sls__', 'editors'), ('__env__', 'base')])),
+            ('vimrc', OrderedDict([('file', ['managed', {'name': '/etc/vimrc'}]),
+                                   ('__sls__', 'editors.vim'), ('__env__', 'base')])),
+            ('nginx', OrderedDict([('pkg', ['installed']),
+                                   ('service', ['running', {'name': 'vim'}]),
+                                   ('__sls__', 'web'), ('__env__', 'base')])),
+        ])
+        self.chunks = [
+            {'state': 'pkg', '__id__': 'vim', 'name': 'vim', '__sls__': 'editors'},
+            {'state': 'file', '__id__': 'vimrc', 'name': '/etc/vimrc', '__sls__': 'editors.vim'},
+            {'state': 'pkg', '__id__': 'nginx', 'name': 'nginx', '__sls__': 'web'},
+            {'state': 'service', '__id__': 'nginx', 'name': 'vim', '__sls__': 'web'},
+        ]
+
+    def test_high_index(self):
+        index = salt.state.HighIndex(self.high)
+        for name, state in (('vim', 'pkg'), ('/etc/vimrc', 'file'), ('vim', 'service'),
+                            ('editors', 'sls'), ('web', 'sls'), ('none', 'file')):
+            self.assertEqual(index.find_name(name, state),
+                             salt.state.find_name(name, state, self.high))
+        for sls in ('editors', 'editors.vim', 'web', 'none'):
+            self.assertEqual(index.find_sls_ids(sls),
+                             salt.state.find_sls_ids(sls, self.high))
+        # Arguments added after the index was built
+        self.high['vim']['pkg'].append({'name': 'vim-nox'})
+        index.add('vim', 'pkg', [{'name': 'vim-nox'}])
+        self.assertEqual(index.find_name('vim-nox', 'pkg'), [('vim', 'pkg')])
+
+    def test_chunk_index(self):
+        index = salt.state.ChunkIndex(self.chunks)
+        for req_key, req_val in (('id', 'vim'), ('pkg', 'vim'), ('service', 'vim'),
+                                 ('file', '/etc/vimrc'), ('id', 'nginx'), ('sls', 'editors'),
+                                 ('sls', 'editors.vim'), ('pkg', 'none')):
+            self.assertEqual(
+                index.match(req_key, req_val),
+                [chunk for chunk in self.chunks
+                 if (fnmatch.fnmatch(chunk['__sls__'], req_val) if req_key == 'sls' else
+                     (fnmatch.fnmatch(chunk['name'], req_val) or
+                      fnmatch.fnmatch(chunk['__id__'], req_val)) and
+                     req_key in ('id', chunk['state']))])
+        # Globs and non string values are scanned for
+        self.assertIsNone(index.match('sls', 'editors.*'))
+        self.assertIsNone(index.match('id', None))
+        self.assertIs(index.find('vim'), self.chunks[0])
+        self.assertIsNone(index.find('none'))
+        self.assertTrue(index.current(self.chunks))
+        self.assertFalse(index.current(list(self.chunks)))
+
 
 @skipIf(pytest is None, 'PyTest is missing')
 class StateReturnsTestCase(TestCase):
@@ -266,3 +266,29 @@ class IPCMessagePubSubCase(salt.ext.tornado.testing.AsyncTestCase):
         ret2 = client2.read_sync()
         self.assertEqual(ret1, 'TEST')
         self.assertEqual(ret2, 'TEST')
+
+    def test_subscribe(self):
+        client1 = self.sub_channel
+        client2 = self._get_sub_channel()
+
+        self.io_loop.run_sync(lambda: client1.subscribe([['salt/job/1/', 'startswith'],
+                                                         ['*/beacon/*', 'fnmatch']]))
+        # Let the publisher read the subscription
+        self.io_loop.run_sync(lambda: salt.ext.tornado.gen.sleep(0.1))
+        self.assertEqual(len(self.pub_channel.filters), 1)
+
+        self.pub_channel.publish('JOB2', tag='salt/job/2/ret/minion')
+        self.pub_channel.publish('JOB1', tag='salt/job/1/ret/minion')
+        self.pub_channel.publish('BEACON', tag='salt/beacon/minion/inotify')
+        self.pub_channel.publish('UNTAGGED')
+        self.assertEqual([client1.read_sync(timeout=5) for _ in range(3)],
+                         ['JOB1', 'BEACON', 'UNTAGGED'])
+        self.assertEqual([client2.read_sync(timeout=5) for _ in range(4)],
+                         ['JOB2', 'JOB1', 'BEACON', 'UNTAGGED'])
+
+        # Subscribing to None gets every message again
+        self.io_loop.run_sync(lambda: client1.subscribe(None))
+        self.io_loop.run_sync(lambda: salt.ext.tornado.gen.sleep(0.1))
+        self.assertEqual(self.pub_channel.filters, {})
+        self.pub_channel.publish('JOB2', tag='salt/job/2/ret/minion')
+        self.assertEqual(client1.read_sync(timeout=5), 'JOB2')
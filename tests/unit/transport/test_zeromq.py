@@ -7,6 +7,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import os
 import time
+import collections
 import threading
 import multiprocessing
 import ctypes
@@ -32,8 +33,10 @@ import salt.log.setup
 from salt.ext import six
 import salt.utils.process
 import salt.utils.platform
+import salt.utils.stringutils
 import salt.transport.server
 import salt.transport.client
+import salt.transport.mixins.auth
 import salt.exceptions
 from salt.ext.six.moves import range
 from salt.transport.zeromq import AsyncReqMessageClientPool
@@ -372,6 +375,240 @@ class ZMQConfigTest(TestCase):
                                                          source_port=s_port) == 'tcp://0.0.0.0:{0};{1}:{2}'.format(s_port, m_ip, m_port)
 
 
+class ReqServerChannelPoolsTest(TestCase, AdaptedConfigurationTestCaseMixin):
+    '''
+    Test the routing of the requests to the worker pools
+    '''
+    def setUp(self):
+        self.opts = self.get_temp_config(
+            'master',
+            worker_pools={'auth': {'commands': ['_auth']},
+                          'returns': {'commands': ['_return']}})
+        secrets = {'aes': {'secret': multiprocessing.Array(
+            ctypes.c_char,
+            six.b(salt.crypt.Crypticle.generate_key_string()),
+        )}}
+        patcher = patch.dict(salt.master.SMaster.secrets, secrets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.channel = salt.transport.zeromq.ZeroMQReqServerChannel(self.opts)
+        self.channel.serial = salt.payload.Serial(self.opts)
+
+    def test_worker_uri(self):
+        sock_dir = self.opts['sock_dir']
+        self.assertEqual(self.channel._worker_uri(),
+                         'ipc://{0}'.format(os.path.join(sock_dir, 'workers.ipc')))
+        self.assertEqual(self.channel._worker_uri('returns'),
+                         'ipc://{0}'.format(os.path.join(sock_dir, 'workers-returns.ipc')))
+        self.channel.opts = dict(self.opts, ipc_mode='tcp', tcp_master_workers=4515)
+        self.assertEqual(self.channel._worker_uri(), 'tcp://127.0.0.1:4515')
+        # auth, default, returns
+        self.assertEqual(self.channel._worker_uri('auth'), 'tcp://127.0.0.1:4516')
+        self.assertEqual(self.channel._worker_uri('returns'), 'tcp://127.0.0.1:4518')
+
+    def test_request_cmd(self):
+        serial = salt.payload.Serial(self.opts)
+        crypticle = salt.crypt.Crypticle(
+            self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
+        clear = serial.dumps({'enc': 'clear', 'load': {'cmd': '_auth'}})
+        self.assertEqual(self.channel._request_cmd(clear), '_auth')
+        load = crypticle.dumps({'cmd': '_return', 'id': 'minion'})
+        aes = serial.dumps({'enc': 'aes', 'load': load, 'cmd': '_return'})
+        with patch('salt.crypt.Crypticle.loads') as loads:
+            self.assertEqual(self.channel._request_cmd(aes), '_return')
+            # Requests without the routing field go to the default pool
+            self.assertIsNone(self.channel._request_cmd(
+                serial.dumps({'enc': 'aes', 'load': load})))
+            loads.assert_not_called()
+        self.assertIsNone(self.channel._request_cmd(b'garbage'))
+
+    def test_pool_backlog(self):
+        '''
+        The requests for a pool without room in its queue wait in the router
+        until it has room, instead of being dropped
+        '''
+        context = zmq.Context()
+        self.addCleanup(context.term)
+        workers = context.socket(zmq.DEALER)
+        self.addCleanup(workers.close, 0)
+        workers.bind('inproc://returns')
+        poller = zmq.Poller()
+        poller.register(workers, zmq.POLLIN)
+        self.channel.pool_workers = {'returns': workers}
+        backlog = collections.deque([[b'minion', b'', b'1'],
+                                     [b'minion', b'', b'2']])
+        # No worker is connected yet
+        self.channel._flush_pool_backlog(poller, 'returns', backlog)
+        self.assertEqual(len(backlog), 2)
+        self.assertEqual(dict(poller.poll(0)), {})
+
+        worker = context.socket(zmq.DEALER)
+        self.addCleanup(worker.close, 0)
+        worker.connect('inproc://returns')
+        self.assertEqual(dict(poller.poll(1000)), {workers: zmq.POLLOUT})
+        self.channel._flush_pool_backlog(poller, 'returns', backlog)
+        self.assertEqual(len(backlog), 0)
+        self.assertEqual([worker.recv_multipart() for _ in range(2)],
+                         [[b'minion', b'', b'1'], [b'minion', b'', b'2']])
+        # Only polled for the replies again
+        self.assertEqual(dict(poller.poll(0)), {})
+
+    def test_load_cmd(self):
+        '''
+        The minions only add the routing field when the master has worker
+        pools
+        '''
+        load_cmd = six.get_unbound_function(
+            salt.transport.zeromq.AsyncZeroMQReqChannel._load_cmd)
+        channel = MagicMock()
+        channel.auth.creds = {'aes': 'key', 'publish_port': 4505}
+        self.assertIsNone(load_cmd(channel, {'cmd': '_return'}))
+        channel.auth.creds['worker_pools'] = True
+        self.assertEqual(load_cmd(channel, {'cmd': '_return'}), '_return')
+        self.assertIsNone(load_cmd(channel, b'raw'))
+
+
+class PubServerChannelTopicsTest(TestCase, AdaptedConfigurationTestCaseMixin):
+    '''
+    Test the master side resolution of publish targets with zmq_filtering
+    '''
+    def setUp(self):
+        opts = self.get_temp_config('master', zmq_filtering=True,
+                                    minion_data_cache=True)
+        opts['nodegroups'] = {'web': 'G@role:web',
+                              'notdb': 'not G@role:db',
+                              'nested': 'N@notdb and web*'}
+        self.channel = salt.transport.zeromq.ZeroMQPubServerChannel(opts)
+        self.check_minions = MagicMock(return_value={'minions': ['web1', 'web2'],
+                                                     'missing': [],
+                                                     'ssh_minions': False})
+        patcher = patch.object(self.channel.ckminions, 'check_minions',
+                               self.check_minions)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_grain_target(self):
+        topics = self.channel._publish_topics(
+            {'tgt_type': 'grain', 'tgt': 'role|web', 'delimiter': '|'})
+        self.assertEqual(topics, ['web1', 'web2'])
+        self.check_minions.assert_called_once_with('role|web',
+                                                   tgt_type='grain',
+                                                   delimiter='|')
+
+    def test_resolved_minions(self):
+        '''
+        The minions already resolved by the master are not resolved again
+        '''
+        topics = self.channel._publish_topics(
+            {'tgt_type': 'grain', 'tgt': 'role:web'}, ['web3'])
+        self.assertEqual(topics, ['web3'])
+        self.check_minions.assert_not_called()
+
+    def test_compound_and_nodegroup_targets(self):
+        for tgt_type, tgt in (('compound', 'G@role:web and E@web.*'),
+                              ('nodegroup', 'web'),
+                              ('ipcidr', '10.0.0.0/8')):
+            self.assertEqual(
+                self.channel._publish_topics({'tgt_type': tgt_type, 'tgt': tgt}),
+                ['web1', 'web2'])
+
+    def test_negated_target_broadcast(self):
+        for tgt_type, tgt in (('compound', 'web* and not G@role:db'),
+                              ('nodegroup', 'notdb'),
+                              ('nodegroup', 'nested'),
+                              ('compound', 'N@notdb')):
+            self.assertIsNone(
+                self.channel._publish_topics({'tgt_type': tgt_type, 'tgt': tgt}))
+        self.check_minions.assert_not_called()
+
+    def test_no_match_broadcast(self):
+        self.check_minions.return_value = {'minions': [], 'missing': []}
+        self.assertIsNone(
+            self.channel._publish_topics({'tgt_type': 'grain', 'tgt': 'os:Arch'}))
+        self.assertEqual(
+            self.channel._publish_topics({'tgt_type': 'glob', 'tgt': 'db*'}), [])
+
+    def test_max_minions_broadcast(self):
+        self.channel.opts['zmq_filtering_max_minions'] = 1
+        self.assertIsNone(
+            self.channel._publish_topics({'tgt_type': 'glob', 'tgt': 'web*'}))
+        self.channel.opts['zmq_filtering_max_minions'] = 2
+        self.assertEqual(
+            self.channel._publish_topics({'tgt_type': 'glob', 'tgt': 'web*'}),
+            ['web1', 'web2'])
+
+    def test_unfiltered_tgt_types_broadcast(self):
+        self.channel.opts['zmq_filtering_tgt_types'] = ['glob', 'list']
+        self.assertIsNone(
+            self.channel._publish_topics({'tgt_type': 'grain', 'tgt': 'os:Arch'}))
+        self.channel.opts['zmq_filtering_tgt_types'] = ['grain']
+        self.channel.opts['minion_data_cache'] = False
+        self.assertIsNone(
+            self.channel._publish_topics({'tgt_type': 'grain', 'tgt': 'os:Arch'}))
+        self.check_minions.assert_not_called()
+
+
+class PubServerChannelPayloadTest(TestCase, AdaptedConfigurationTestCaseMixin):
+    '''
+    Test that publishes are encrypted and signed once
+    '''
+    def setUp(self):
+        self.opts = self.get_temp_config('master', sign_pub_messages=True)
+        secrets = {'aes': {'secret': multiprocessing.Array(
+            ctypes.c_char,
+            six.b(salt.crypt.Crypticle.generate_key_string()),
+        )}}
+        patcher = patch.dict(salt.master.SMaster.secrets, secrets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict(salt.transport.mixins.auth.AESPubServerMixin._pub_cache,
+                             clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get_rsa_key = MagicMock(return_value='key')
+        self.sign = MagicMock(return_value=b'sig')
+        for name, mock in (('get_rsa_key', self.get_rsa_key),
+                           ('sign_message_with_key', self.sign)):
+            patcher = patch('salt.crypt.{0}'.format(name), mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _decode(self, payload):
+        payload = salt.payload.Serial(self.opts).loads(payload)
+        crypticle = salt.crypt.Crypticle(
+            self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
+        return payload, crypticle.loads(payload['load'])
+
+    def test_publish_encrypted_once(self):
+        load = {'tgt_type': 'glob', 'tgt': '*', 'jid': 1}
+        first = salt.transport.zeromq.ZeroMQPubServerChannel(self.opts)
+        second = salt.transport.zeromq.ZeroMQPubServerChannel(self.opts)
+        payload = first._encrypt_publish(load)
+        self.assertEqual(second._encrypt_publish(dict(load)), payload)
+        self.sign.assert_called_once_with('key', self._decode(payload)[0]['load'])
+        self.get_rsa_key.assert_called_once()
+
+        payload, decoded = self._decode(
+            first._encrypt_publish(dict(load, jid=2)))
+        self.assertEqual(decoded, dict(load, jid=2))
+        self.assertEqual(salt.utils.stringutils.to_bytes(payload['sig']), b'sig')
+        self.assertEqual(self.sign.call_count, 2)
+        self.get_rsa_key.assert_called_once()
+
+    def test_publish_aes_rotation(self):
+        load = {'tgt_type': 'glob', 'tgt': '*', 'jid': 1}
+        channel = salt.transport.zeromq.ZeroMQPubServerChannel(self.opts)
+        payload = channel._encrypt_publish(load)
+        salt.master.SMaster.secrets['aes']['secret'] = multiprocessing.Array(
+            ctypes.c_char,
+            six.b(salt.crypt.Crypticle.generate_key_string()),
+        )
+        rotated = channel._encrypt_publish(load)
+        self.assertNotEqual(rotated, payload)
+        self.assertEqual(self._decode(rotated)[1], load)
+        self.assertEqual(self.sign.call_count, 2)
+
+
 class PubServerChannel(TestCase, AdaptedConfigurationTestCaseMixin):
 
     @classmethod
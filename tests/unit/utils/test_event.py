@@ -284,6 +284,59 @@ class TestSaltEvent(TestCase):
                 evt = me.get_event(tag='testevents')
                 self.assertGotEvent(evt, {'data': '{0}'.format(i)}, 'Event {0}'.format(i))
 
+    def test_event_subscription_filter(self):
+        '''Test the publisher only sends the subscribed and waited on events'''
+        with eventpublisher_process(self.sock_dir):
+            me = salt.utils.event.MasterEvent(
+                self.sock_dir, opts={'event_subscription_filter': True}, listen=True)
+            me.subscribe('evt1')
+            self.assertIsNone(me.get_event(wait=0.1, tag='evt3'))
+            # Let the publisher read the subscription
+            time.sleep(0.5)
+            unpacked = []
+
+            def unpack(raw, serial=None):
+                mtag, data = salt.utils.event.SaltEvent.unpack(raw, serial)
+                unpacked.append(mtag)
+                return mtag, data
+
+            me.unpack = unpack
+            me.fire_event({'data': 'foo1'}, 'evt1')
+            me.fire_event({'data': 'foo2'}, 'evt2')
+            me.fire_event({'data': 'foo3'}, 'evt3')
+            evt3 = me.get_event(tag='evt3')
+            evt1 = me.get_event(tag='evt1')
+            self.assertGotEvent(evt3, {'data': 'foo3'})
+            self.assertGotEvent(evt1, {'data': 'foo1'})
+            self.assertEqual(unpacked, ['evt1', 'evt3'])
+
+    def test_event_publisher_shards(self):
+        '''Test events go through the shard of their tag and keep their order'''
+        opts = {'event_publisher_shards': 3}
+        self.assertEqual(
+            [salt.utils.event._tag_shard('salt/job/{0}/ret/minion{1}'.format(jid, minion), 3, 3)
+             for jid in range(4) for minion in range(2)],
+            [1, 1, 2, 2, 0, 0, 0, 0])
+        with eventpublisher_process(self.sock_dir, shards=3):
+            me = salt.utils.event.MasterEvent(self.sock_dir, opts=opts, listen=True)
+            self.assertEqual(
+                me.puburi,
+                [os.path.join(self.sock_dir, name)
+                 for name in ('master_event_pub.ipc', 'master_event_pub_1.ipc',
+                              'master_event_pub_2.ipc')])
+            for i in range(20):
+                for jid in range(4):
+                    me.fire_event({'data': i}, 'salt/job/{0}/ret/minion'.format(jid))
+            for jid in range(4):
+                me.subscribe('salt/job/{0}/'.format(jid))
+            for jid in range(4):
+                tag = 'salt/job/{0}/'.format(jid)
+                evts = [me.get_event(tag=tag) for i in range(20)]
+                self.assertEqual([evt['data'] for evt in evts], list(range(20)))
+            start = time.time()
+            self.assertIsNone(me.get_event(wait=0.5, tag='salt/job/'))
+            self.assertGreaterEqual(time.time() - start, 0.5)
+
     # Test the fire_master function. As it wraps the underlying fire_event,
     # we don't need to perform extensive testing.
     def test_send_master_event(self):
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for salt.utils.key_cache
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase
+from tests.support.mock import MagicMock, patch
+
+# Import salt libs
+import salt.utils.key_cache
+import salt.utils.minions
+
+
+class KeyCacheTestCase(TestCase):
+    '''
+    TestCase for salt.utils.key_cache
+    '''
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.opts = {'pki_dir': self.pki_dir,
+                     'key_cache': 'watch',
+                     'minion_data_cache': False,
+                     'transport': 'zeromq'}
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        for minion in ('web1', 'Web2', 'db1'):
+            self._add_key('minions', minion)
+
+    def tearDown(self):
+        shutil.rmtree(self.pki_dir, ignore_errors=True)
+
+    def _add_key(self, key_dir, minion):
+        with open(os.path.join(self.pki_dir, key_dir, minion), 'w') as fp_:
+            fp_.write('key')
+
+    def test_read_without_cache(self):
+        self.assertIsNone(salt.utils.key_cache.read(self.opts, 'minions'))
+
+    def test_write_and_read(self):
+        salt.utils.key_cache.write(self.opts, 'minions')
+        self.assertEqual(salt.utils.key_cache.read(self.opts, 'minions'),
+                         ['db1', 'web1', 'Web2'])
+        # The loaded cache is reused until the file is rewritten
+        with patch('salt.utils.files.fopen', MagicMock(side_effect=IOError)):
+            self.assertEqual(salt.utils.key_cache.read(self.opts, 'minions'),
+                             ['db1', 'web1', 'Web2'])
+
+    def test_missing_key_dir(self):
+        salt.utils.key_cache.write(self.opts, 'minions_denied')
+        self.assertEqual(salt.utils.key_cache.read(self.opts, 'minions_denied'), [])
+
+    def test_stale_cache_is_ignored(self):
+        stamp = salt.utils.key_cache.write(self.opts, 'minions')
+        with patch('salt.utils.key_cache.dir_stamp',
+                   MagicMock(return_value=[stamp[0], stamp[1] + 1])):
+            self.assertIsNone(salt.utils.key_cache.read(self.opts, 'minions'))
+
+    def test_ckminions_uses_key_cache(self):
+        ckminions = salt.utils.minions.CkMinions(self.opts)
+        salt.utils.key_cache.write(self.opts, 'minions')
+        with patch('os.listdir', MagicMock(side_effect=OSError)):
+            self.assertEqual(ckminions._check_glob_minions('web*', False)['minions'],
+                             ['web1'])
+            self.assertEqual(ckminions._all_minions()['minions'],
+                             ['db1', 'web1', 'Web2'])
+
+    def test_ckminions_falls_back_when_stale(self):
+        ckminions = salt.utils.minions.CkMinions(self.opts)
+        stamp = salt.utils.key_cache.write(self.opts, 'minions')
+        self._add_key('minions', 'web3')
+        # Make sure the directory looks changed even with coarse timestamps
+        os.utime(os.path.join(self.pki_dir, 'minions'), (stamp[1] + 5, stamp[1] + 5))
+        self.assertEqual(ckminions._check_glob_minions('web*', False)['minions'],
+                         ['web1', 'web3'])
@@ -2,6 +2,7 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 import codecs
+import fnmatch
 import glob
 import logging
 import os
@@ -13,6 +14,7 @@ import salt.utils.files
 import salt.utils.reactor as reactor
 import salt.utils.yaml
 
+from tests.support.helpers import with_tempdir
 from tests.support.unit import TestCase
 from tests.support.mixins import AdaptedConfigurationTestCaseMixin
 from tests.support.mock import (
@@ -459,6 +461,72 @@ class TestReactor(TestCase, AdaptedConfigurationTestCaseMixin):
                                     self.assertEqual(reactions, LOW_CHUNKS[tag])
 
 
+class TestReactorMatcher(TestCase):
+    '''
+    Tests for matching event tags against the reactor map
+    '''
+    def test_match(self):
+        '''
+        Ensure that the matcher returns the reactors of the same globs as
+        fnmatch, in the order of the map
+        '''
+        react_map = [
+            {'salt/minion/*/start': '/srv/reactor/start.sls'},
+            {'salt/beacon/*/inotify/*': ['/srv/reactor/inotify.sls']},
+            {'*': '/srv/reactor/all.sls'},
+            {'salt/minion/web?/start': ['/srv/reactor/web.sls', '/srv/reactor/lb.sls']},
+            {'salt/auth': '/srv/reactor/auth.sls'},
+            {'salt/minion/[dw]*': '/srv/reactor/dbweb.sls'},
+            {'salt/auth': '/srv/reactor/auth2.sls'},
+            {'salt/minion/*/start': None},
+            {'salt/key': '/srv/reactor/key.sls', 'salt/job': '/srv/reactor/job.sls'},
+            'salt/cloud/*',
+        ]
+        matcher = reactor.ReactorMatcher(react_map)
+        for tag in ('salt/minion/web1/start',
+                    'salt/minion/db1/start',
+                    'salt/minion/web1/stop',
+                    'salt/beacon/web1/inotify//etc/hosts',
+                    'salt/auth',
+                    'salt/auth/extra',
+                    'salt/key',
+                    'salt',
+                    ''):
+            expected = []
+            for ropt in react_map:
+                if not isinstance(ropt, dict) or len(ropt) != 1:
+                    continue
+                key, val = next(iter(ropt.items()))
+                if fnmatch.fnmatch(tag, key):
+                    if isinstance(val, list):
+                        expected.extend(val)
+                    elif val is not None:
+                        expected.append(val)
+            self.assertEqual(matcher.match(tag), expected, tag)
+
+    @with_tempdir()
+    def test_reactor_map_file(self, tempdir):
+        '''
+        Ensure that changes to the reactor map file are picked up
+        '''
+        map_file = os.path.join(tempdir, 'reactor.conf')
+        with salt.utils.files.fopen(map_file, 'w') as fp_:
+            fp_.write('- salt/auth: /srv/reactor/auth.sls\n')
+        with patch('salt.minion.MasterMinion'):
+            react = reactor.Reactor({'reactor': map_file,
+                                     'renderer': 'jinja|yaml',
+                                     'renderer_blacklist': [],
+                                     'renderer_whitelist': []})
+        self.assertEqual(react.list_reactors('salt/auth'), ['/srv/reactor/auth.sls'])
+        matcher = react._matcher
+        self.assertEqual(react.list_reactors('salt/key'), [])
+        self.assertIs(react._matcher, matcher)
+        with salt.utils.files.fopen(map_file, 'w') as fp_:
+            fp_.write('- salt/*: /srv/reactor/salt.sls\n')
+        os.utime(map_file, (0, 0))
+        self.assertEqual(react.list_reactors('salt/key'), ['/srv/reactor/salt.sls'])
+
+
 class TestReactWrap(TestCase, AdaptedConfigurationTestCaseMixin):
     '''
     Tests that we are formulating the wrapper calls properly
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for salt.utils.rendercache
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase
+
+# Import salt libs
+import salt.utils.files
+import salt.utils.rendercache
+
+
+class TrackedDictTestCase(TestCase):
+    '''
+    TestCase for salt.utils.rendercache.TrackedDict
+    '''
+    def test_record_keys(self):
+        grains = salt.utils.rendercache.TrackedDict('grains', {'os': 'Debian', 'id': 'web1'})
+        with salt.utils.rendercache.InputRecorder() as recorder:
+            self.assertEqual(grains['os'], 'Debian')
+            self.assertIsNone(grains.get('kernel'))
+            self.assertFalse('virtual' in grains)
+        self.assertEqual(recorder.keys, set([('grains', 'os'),
+                                             ('grains', 'kernel'),
+                                             ('grains', 'virtual')]))
+
+    def test_record_all(self):
+        grains = salt.utils.rendercache.TrackedDict('grains', {'os': 'Debian'})
+        with salt.utils.rendercache.InputRecorder() as recorder:
+            list(grains.items())
+        self.assertEqual(recorder.keys, set([('grains', salt.utils.rendercache.ALL)]))
+
+    def test_no_recorder(self):
+        grains = salt.utils.rendercache.TrackedDict('grains', {'os': 'Debian'})
+        self.assertEqual(grains['os'], 'Debian')
+        with salt.utils.rendercache.InputRecorder() as recorder:
+            pass
+        self.assertEqual(recorder.keys, set())
+
+
+class RenderCacheTestCase(TestCase):
+    '''
+    TestCase for salt.utils.rendercache.RenderCache
+    '''
+    functions = ['grains.get', 'pillar.get', 'config.get']
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.path = os.path.join(self.tmp_dir, 'web.sls')
+        self.imported = os.path.join(self.tmp_dir, 'map.jinja')
+        self._write(self.path, "role: {{ grains['role'] }}\n")
+        self._write(self.imported, "{% set port = 80 %}\n")
+        self.cache = salt.utils.rendercache.RenderCache(size=10)
+        self.renders = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, path, contents):
+        with salt.utils.files.fopen(path, 'w') as fp_:
+            fp_.write(contents)
+        # Changes within the mtime resolution are caught on the size
+        os.utime(path, (0, 0))
+
+    def _render(self, grains, key=('web.sls', 'base')):
+        grains = salt.utils.rendercache.TrackedDict('grains', grains)
+
+        def _func():
+            self.renders += 1
+            salt.utils.rendercache.record_file(self.imported)
+            return {'role': grains['role']}
+
+        return self.cache.render(key, self.path, {'grains': grains}, _func,
+                                 'jinja|yaml', ['jinja', 'yaml'], self.functions)
+
+    def test_shared_render(self):
+        self.assertEqual(self._render({'role': 'web', 'id': 'web1'}), {'role': 'web'})
+        self.assertEqual(self._render({'role': 'web', 'id': 'web2'}), {'role': 'web'})
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(self._render({'role': 'db', 'id': 'db1'}), {'role': 'db'})
+        self.assertEqual(self.renders, 2)
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['entries'], 2)
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3.0)
+
+    def test_copies(self):
+        self._render({'role': 'web'})['role'] = 'changed'
+        self.assertEqual(self._render({'role': 'web'}), {'role': 'web'})
+
+    def test_file_change(self):
+        self._render({'role': 'web'})
+        self._write(self.imported, "{% set port = 8080 %}\n")
+        self._render({'role': 'web'})
+        self._write(self.path, "role: {{ grains['role'] }} \n")
+        self._render({'role': 'web'})
+        self.assertEqual(self.renders, 3)
+        # The renders made with the old files were dropped
+        self.assertEqual(self.cache.get_stats()['entries'], 1)
+
+    def test_uncacheable(self):
+        self._write(self.path, "cmd: {{ salt['cmd.run']('hostname') }}\n")
+        self._render({'role': 'web'})
+        self._write(self.path, "#!py\ndef run():\n    return {}\n")
+        self._render({'role': 'web'})
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(self.cache.get_stats()['uncacheable'], 2)
+
+    def test_reads_opts(self):
+        self._write(self.path, "id: {{ salt['config.get']('id') }}\n")
+        grains = salt.utils.rendercache.TrackedDict('grains', {'role': 'web'})
+        for minion in ('web1', 'web2', 'web1'):
+            self.cache.render(('web.sls', 'base'), self.path,
+                              {'grains': grains, 'opts': {'id': minion}},
+                              lambda: {}, 'jinja|yaml', ['jinja', 'yaml'],
+                              self.functions)
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+
+    def test_eviction(self):
+        for ind in range(15):
+            self._render({'role': 'web{0}'.format(ind)})
+        self.assertEqual(self.cache.get_stats()['entries'], 10)
+        self._render({'role': 'web14'})
+        self._render({'role': 'web0'})
+        self.assertEqual(self.renders, 16)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for salt.utils.target_index
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import time
+
+# Import Salt Testing libs
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase
+from tests.support.mock import MagicMock, patch
+
+# Import salt libs
+import salt.utils.data
+import salt.utils.minions
+import salt.utils.target_index
+
+MINION_DATA = {
+    'web1': {'grains': {'os': 'Ubuntu', 'osrelease': '18.04', 'num_cpus': 4,
+                        'roles': ['web', 'cache'],
+                        'ip_interfaces': {'eth0': ['10.0.0.1']}},
+             'pillar': {'env': 'prod', 'app': {'name': 'shop', 'port': 8080}}},
+    'web2': {'grains': {'os': 'Ubuntu', 'osrelease': '16.04', 'num_cpus': 2,
+                        'roles': ['web'], 'virtual': True},
+             'pillar': {'env': 'dev', 'app': {'name': 'shop:beta'}}},
+    'db1': {'grains': {'os': 'CentOS', 'osrelease': '7', 'num_cpus': 16,
+                       'roles': [{'db': 'master'}]},
+            'pillar': {'env': 'prod', 'app': {}}},
+    'nodata': None,
+}
+
+EXPRESSIONS = (
+    'os:Ubuntu',
+    'os:ubuntu',
+    'os:Ub*',
+    'os:*',
+    'os:Debian',
+    'osrelease:1?.04',
+    'num_cpus:4',
+    'roles:web',
+    'roles:db:master',
+    'roles:db',
+    'virtual:True',
+    'ip_interfaces:eth0:10.0.0.*',
+    'ip_interfaces:eth0',
+    'app:name:shop:beta',
+    'app:name:shop*',
+    'app:port:8080',
+    'app:*',
+    'env:prod',
+    'missing:key',
+)
+
+
+def _fetch_many(banks, key):
+    return dict((bank, MINION_DATA[bank.split('/')[1]]) for bank in banks)
+
+
+class TargetIndexTestCase(TestCase):
+    '''
+    TestCase for salt.utils.target_index
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.index = salt.utils.target_index.TargetIndex({'cachedir': self.cachedir})
+        self.cache = MagicMock()
+        self.cache.list.return_value = list(MINION_DATA)
+        self.cache.fetch_many.side_effect = _fetch_many
+        self.cache.updated.return_value = 0
+        self.index.sync(self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def _scan(self, search_type, expr, **kwargs):
+        return set(
+            minion for minion, data in MINION_DATA.items()
+            if data and salt.utils.data.subdict_match(data.get(search_type), expr, **kwargs)
+        )
+
+    def test_match_like_subdict_match(self):
+        for search_type in ('grains', 'pillar'):
+            for expr in EXPRESSIONS:
+                self.assertEqual(
+                    self.index.match(search_type, expr, ':'),
+                    self._scan(search_type, expr),
+                    msg='{0} {1}'.format(search_type, expr))
+
+    def test_match_pcre_and_exact(self):
+        self.assertEqual(
+            self.index.match('grains', 'os:(ubuntu|centos)', ':', regex_match=True),
+            self._scan('grains', 'os:(ubuntu|centos)', regex_match=True))
+        self.assertEqual(
+            self.index.match('pillar', 'env:prod', ':', exact_match=True),
+            set(['web1', 'db1']))
+        self.assertEqual(
+            self.index.match('pillar', 'env:pro*', ':', exact_match=True),
+            set())
+
+    def test_unsupported_expressions(self):
+        self.assertIsNone(self.index.match('grains', '*:Ubuntu', ':'))
+        self.assertIsNone(self.index.match('grains', 'roles:0:web', ':'))
+        self.assertEqual(self.index.stats()['misses'], 2)
+
+    def test_incremental_update_and_sync(self):
+        self.assertEqual(self.index.minions(), set(['web1', 'web2', 'db1']))
+        self.assertEqual(self.index.stats()['catchups'], 4)
+
+        self.index.update('web2', {'grains': {'os': 'Debian'}, 'pillar': {}})
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu', ':'),
+                         set(['web1']))
+        # Nothing was fetched again
+        self.index.sync(self.cache)
+        self.assertEqual(self.cache.fetch_many.call_count, 1)
+
+        # db1 was flushed from the cache
+        self.cache.list.return_value = ['web1', 'web2']
+        self.index.sync(self.cache)
+        self.assertEqual(self.index.match('grains', 'os:*', ':'),
+                         set(['web1', 'web2']))
+        stats = self.index.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['updates'], 1)
+        self.assertEqual(stats['minions'], 2)
+
+    def test_match_does_not_read_the_cache(self):
+        '''
+        Lookups only check when the index was last synced
+        '''
+        self.cache.reset_mock()
+        self.assertEqual(self.index.match('grains', 'os:CentOS', ':'),
+                         set(['db1']))
+        self.assertEqual(self.cache.mock_calls, [])
+
+        # An index which was not synced recently is not used
+        with patch('time.time', return_value=time.time() + 3600):
+            self.assertIsNone(self.index.match('grains', 'os:CentOS', ':'))
+        self.assertIsNone(
+            salt.utils.target_index.TargetIndex(
+                {'cachedir': tempfile.mkdtemp(dir=self.cachedir)}).match(
+                    'grains', 'os:CentOS', ':'))
+
+    def test_sync_picks_up_other_writers(self):
+        '''
+        Data written to the cache after a minion was indexed is fetched again
+        '''
+        self.assertEqual(self.index.match('grains', 'os:CentOS', ':'),
+                         set(['db1']))
+        data = dict(MINION_DATA, db1={'grains': {'os': 'Ubuntu'}})
+        self.cache.fetch_many.side_effect = \
+            lambda banks, key: dict((bank, data[bank.split('/')[1]]) for bank in banks)
+        self.cache.updated.side_effect = \
+            lambda bank, key: time.time() if bank == 'minions/db1' else 0
+        self.index.sync(self.cache)
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu', ':'),
+                         set(['web1', 'web2', 'db1']))
+        self.assertEqual(self.cache.fetch_many.call_args[0][0], ['minions/db1'])
+
+        # Drivers without an updated function get every minion indexed again
+        data['web1'] = {'grains': {'os': 'Debian'}}
+        self.cache.updated.side_effect = KeyError('consul.updated')
+        self.index.sync(self.cache)
+        self.assertEqual(sorted(self.cache.fetch_many.call_args[0][0]),
+                         ['minions/db1', 'minions/nodata', 'minions/web1', 'minions/web2'])
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu', ':'),
+                         set(['web2', 'db1']))
+
+
+class CkMinionsTargetIndexTestCase(TestCase):
+    '''
+    CkMinions resolves grain and pillar targets through the target index
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.pki_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        for minion in ('web1', 'web2', 'db1', 'nodata', 'new'):
+            with open(os.path.join(self.pki_dir, 'minions', minion), 'w') as fp_:
+                fp_.write('key')
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+        shutil.rmtree(self.pki_dir, ignore_errors=True)
+
+    def _check(self, index, expr, greedy):
+        opts = {'minion_data_cache': True,
+                'minion_data_cache_index': index,
+                'cachedir': self.cachedir,
+                'pki_dir': self.pki_dir}
+        ckminions = salt.utils.minions.CkMinions(opts)
+        ckminions.cache = MagicMock()
+        ckminions.cache.list.return_value = list(MINION_DATA)
+        ckminions.cache.fetch_many.side_effect = _fetch_many
+        ckminions.cache.updated.return_value = 0
+        if ckminions.index is not None:
+            ckminions.index.sync(ckminions.cache)
+        return sorted(
+            ckminions._check_grain_minions(expr, ':', greedy)['minions'])
+
+    def test_index_matches_scan(self):
+        for expr in EXPRESSIONS:
+            for greedy in (True, False):
+                self.assertEqual(self._check(True, expr, greedy),
+                                 self._check(False, expr, greedy),
+                                 msg='{0} greedy={1}'.format(expr, greedy))
+
+    def test_index_error_falls_back_to_scan(self):
+        with patch.object(salt.utils.target_index.TargetIndex, 'match',
+                          MagicMock(side_effect=Exception('locked'))):
+            self.assertEqual(self._check(True, 'os:Ubuntu', False), ['web1', 'web2'])
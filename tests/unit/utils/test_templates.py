@@ -15,6 +15,7 @@ import salt.utils.files
 
 # Import Salt Testing Libs
 from tests.support.helpers import with_tempdir
+from tests.support.mock import patch
 from tests.support.unit import TestCase, skipIf
 
 log = logging.getLogger(__name__)
@@ -56,6 +57,33 @@ class RenderTestCase(TestCase):
         res = salt.utils.templates.render_jinja_tmpl(tmpl, ctx)
         self.assertEqual(res, 'OK')
 
+    @with_tempdir()
+    def test_render_jinja_cache(self, tempdir):
+        '''
+        Test that the compiled code of a template file is reused until the
+        file changes
+        '''
+        tmplpath = os.path.join(tempdir, 'reaction.sls')
+        tmpl = '''{{ var }}'''
+        with salt.utils.files.fopen(tmplpath, 'w') as fp_:
+            fp_.write(tmpl)
+        with patch.object(salt.utils.templates, '_JINJA_CODE_CACHE', None):
+            salt.utils.templates.cache_jinja_templates()
+            for var in ('OK', 'KO'):
+                ctx = dict(self.context)
+                ctx['var'] = var
+                res = salt.utils.templates.render_jinja_tmpl(tmpl, ctx, tmplpath)
+                self.assertEqual(res, var)
+            self.assertEqual(salt.utils.templates.jinja_template_cache_stats(),
+                             {'hits': 1, 'misses': 1, 'templates': 1})
+            tmpl = '''{{ var }}!'''
+            with salt.utils.files.fopen(tmplpath, 'w') as fp_:
+                fp_.write(tmpl)
+            res = salt.utils.templates.render_jinja_tmpl(tmpl, ctx, tmplpath)
+            self.assertEqual(res, 'KO!')
+            self.assertEqual(salt.utils.templates.jinja_template_cache_stats(),
+                             {'hits': 1, 'misses': 2, 'templates': 1})
+
     ### Tests for mako template
     def test_render_mako_sanity(self):
         tmpl = '''OK'''